@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+Inspect static libraries
+========================
+
+lipo -info, nm, otool 대신 static library( thin, fat )의 architecture,
+object, export하는 symbol을 출력한다. 폴더를 주면 안의 library를 모두
+여러 thread에서 읽는다.
+
+사용방법
+-------
+
+> python libinspect.py __build__
+
+__build__ 아래 .a file의 architecture를 출력한다.
+
+> python libinspect.py -a armv7 -a i386 -s _OBJC_CLASS_$_Foo __build__
+
+armv7, i386이 없거나 _OBJC_CLASS_$_Foo를 export하지 않는 library를 출력하고
+1을 반환한다.
+
+'''
+
+import sys
+import os
+import json
+import getopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from xcodetools.macho import scanLibraries
+
+
+def usage_and_exit(status):
+    print '''\
+usage: libinspect.py [option] <path> ...
+
+options:
+  -a <arch>     required architecture (can be repeated)
+  -s <symbol>   required exported symbol (can be repeated)
+  -m            print member objects
+  -n            print exported symbols
+  -j <count>    number of threads (default : number of cpus)
+  -p <pattern>  file pattern in directories (default : *.a)
+  -o <path>     save result as JSON
+
+'''
+    exit(status)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv,'a:s:mnj:p:o:')
+    except getopt.GetoptError,err:
+        print err
+        usage_and_exit(1)
+
+    if not args:
+        usage_and_exit(2)
+
+    archs = []
+    symbols = []
+    members = False
+    names = False
+    threads = None
+    pattern = '*.a'
+    output = None
+    for k,v in opts:
+        if k == '-a':
+            archs.append(v)
+        elif k == '-s':
+            symbols.append(v)
+        elif k == '-m':
+            members = True
+        elif k == '-n':
+            names = True
+        elif k == '-j':
+            threads = int(v)
+        elif k == '-p':
+            pattern = v
+        elif k == '-o':
+            output = v
+
+    results = scanLibraries(args, threads, pattern, symbols=bool(symbols or names or output))
+    failed = False
+    for info in results:
+        if 'error' in info:
+            print '%s: %s' % (info['path'], info['error'])
+            failed = True
+            continue
+        print '%s: %s' % (info['path'], ' '.join(info['archs']))
+        for arch in archs:
+            if arch not in info['archs']:
+                print '  missing architecture %s' % arch
+                failed = True
+        for s in info['slices']:
+            missing = [symbol for symbol in symbols if symbol not in s['symbols']]
+            if missing:
+                print '  %s does not export %s' % (s['arch'], ' '.join(missing))
+                failed = True
+            if members:
+                print '  %s objects: %s' % (s['arch'], ' '.join(name or '-' for name in s['objects']))
+            if names:
+                print '  %s symbols: %s' % (s['arch'], ' '.join(s['symbols']))
+
+    if output:
+        f = open(output, 'w')
+        json.dump(results, f, indent=1)
+        f.close()
+    if failed:
+        exit(1)
+
+if __name__=='__main__':
+    main(sys.argv[1:])
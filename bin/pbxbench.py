@@ -0,0 +1,605 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+pbxlib benchmark
+================
+
+pbxlib의 성능을 측정한다.
+
+사용방법
+-------
+
+> python pbxbench.py [-n objects] [-s snapshots] [-o result.json] <benchmark>
+
+suite    : PbxProjectGenerator로 만든 project를 읽고, 검색하고, file을 
+           추가/삭제하고, 저장하고, diff 하는 시간을 잰다. (기본 5000 objects)
+snapshot : 큰 project에 대해서 snapshot을 여러번 만들고 수정할때의
+           시간과 메모리를 copy.deepcopy와 비교한다.
+columnar : dict로 저장한 objects와 PbxColumnarObjects의 메모리와
+           검색, 저장 속도를 비교한다. (기본 200000 objects)
+intern   : project 파일을 읽을때 문자열을 intern한 경우와 하지 않은 
+           경우의 메모리를 비교한다. (기본 10000 objects)
+index    : 여러 project를 PbxIndex로 index하는 시간을 process 수에 따라
+           비교하고 다시 update하는 시간을 잰다. 
+           (기본 500 projects, project당 200 objects)
+server   : project를 매번 읽는 경우와 PbxServer에 요청하는 경우의 
+           latency를 비교한다. (기본 5000 objects)
+groups   : 큰 project에 group을 여러 단계로 만들고 찾는 시간을 잰다.
+           (기본 50000 objects, 10000 groups)
+lex      : 큰 project를 lex()와 process 수를 바꿔가며 lexParallel()로 
+           lex하는 시간을 비교한다. (기본 50000 objects)
+
+-o로 결과를 JSON으로 저장하고 compare로 이전 결과와 비교한다.
+
+> python pbxbench.py -o new.json suite
+> python pbxbench.py compare old.json new.json
+
+'''
+
+import sys
+import os
+import copy
+import gc
+import time
+import getopt
+import random
+import StringIO
+import shutil
+import tempfile
+import platform
+import json
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from xcodetools.pbxlib import PbxProject, PbxGroup, PbxFileReference, PbxColumnarObjects, PbxprojWriter
+from xcodetools.pbxlib import lex, lexParallel, token_exprs, parseForPbxproj
+from xcodetools.pbxindex import PbxIndex
+from xcodetools.pbxserver import PbxServer, PbxClient
+from xcodetools.pbxlib import PbxprojCache, PbxBuildFile
+from xcodetools.pbxgen import PbxProjectGenerator
+
+# report()로 출력한 결과 ( -o 옵션으로 저장 )
+results = []
+
+
+def rss():
+    'process가 사용중인 메모리 (bytes)'
+    try:
+        pages = int(open('/proc/self/statm').read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def make_project(nobjects):
+    '|nobjects|개 정도의 object를 가진 project'
+    pbx = PbxProject.createPbxproj('/tmp/Bench/Bench.xcodeproj/project.pbxproj')
+    maingroup = PbxGroup.createObject(pbx, 'Bench')
+    pbx.set('mainGroup', maingroup.getGuid())
+
+    objects = pbx.objects()
+    groups = []
+    for i in range(nobjects / 2):
+        fileref = '%024X' % (2 * i + 1)
+        buildfile = '%024X' % (2 * i + 2)
+        objects[fileref] = {'isa' : 'PBXFileReference',
+                            'lastKnownFileType' : 'sourcecode.c.objc',
+                            'path' : 'Source%d.m' % i,
+                            'sourceTree' : '<group>'}
+        objects[buildfile] = {'isa' : 'PBXBuildFile', 'fileRef' : fileref}
+        if i % 100 == 0:
+            groups.append(PbxGroup.createObject(pbx, 'Group%d' % i))
+        groups[-1].appendValue('children', fileref)
+
+    for g in groups:
+        maingroup.appendValue('children', g.getGuid())
+    return pbx
+
+
+def parsed_objects(objects):
+    '''parser가 만든 것처럼 모든 문자열이 따로 있는 unicode인 objects.
+    
+    큰 project를 parser로 읽는 것은 너무 오래 걸리므로 직접 만든다.
+    '''
+    def clone(v):
+        if isinstance(v, basestring):
+            return u'%s' % v
+        elif isinstance(v, dict):
+            return dict((clone(k), clone(x)) for k, x in v.iteritems())
+        elif isinstance(v, tuple):
+            return tuple(clone(x) for x in v)
+        return v
+    return clone(dict(objects))
+
+
+def clone_project(pbx, objects):
+    'objects만 다른 project'
+    obj = PbxProject()
+    obj.pbxproj = obj
+    obj.pbxdata = dict(pbx.pbxdata)
+    obj.pbxdata['objects'] = objects
+    obj.path = pbx.path
+    obj.name = pbx.name
+    obj.target = pbx.target
+    obj.obj = obj.objectForProject()
+    return obj
+
+
+def deepsize(value):
+    'value가 참조하는 object들의 크기 합. 공유하는 object는 한번만 센다.'
+    seen = set()
+    total = 0
+    stack = [value]
+    while stack:
+        v = stack.pop()
+        if id(v) in seen: continue
+        seen.add(id(v))
+        total += sys.getsizeof(v)
+        if isinstance(v, dict):
+            stack.extend(v.iterkeys())
+            stack.extend(v.itervalues())
+        elif isinstance(v, (tuple, list)):
+            stack.extend(v)
+    return total
+
+
+def report(name, value, unit):
+    results.append({'name' : name, 'value' : value, 'unit' : unit})
+    print '%-40s %12.3f %s' % (name, value, unit)
+
+
+def best(func, repeat):
+    '|repeat|번 실행한 시간 중 가장 짧은 시간 (초)'
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def bench_suite(nobjects, repeat=3, nfiles=100):
+    tempdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tempdir, 'Suite.xcodeproj')
+        start = time.time()
+        PbxProjectGenerator.withObjects(nobjects, targets=4, subprojects=2).generate(path)
+        report('generate', (time.time() - start) * 1000, 'ms')
+        
+        def load():
+            PbxprojCache.clear()
+            return PbxProject.loadPbxproj(path)
+        report('load', best(load, repeat) * 1000, 'ms')
+        pbx = load()
+        print 'project : %d objects, %d bytes' % (len(pbx.objects()), os.path.getsize(pbx.path))
+        
+        targets = pbx.getPbxTargets()
+        report('getPbxTargets', best(pbx.getPbxTargets, repeat) * 1000, 'ms')
+        report('object_if', best(lambda: pbx.object_if({'isa' : 'PBXFileReference', 'path' : 'Source7.m'}), repeat) * 1000, 'ms')
+        report('getAllObjects', best(lambda: pbx.getAllObjects(isa='PBXFileReference'), repeat) * 1000, 'ms')
+        report('getFrameworks', best(lambda: [t.getFrameworks() for t in targets], repeat) * 1000, 'ms')
+        
+        def settings():
+            pbx.invalidateSettings()
+            for target in targets:
+                target.getBuildSettings('Debug')
+        report('getBuildSettings (all targets)', best(settings, repeat) * 1000, 'ms')
+        
+        snapshot = pbx.snapshot()
+        group = pbx.getMainGroup()
+        phase = targets[0].getBuildSourcesPhase()
+        added = []
+        start = time.time()
+        for i in range(nfiles):
+            fileref = PbxFileReference.createObject(pbx, 'Added%d.m' % i)
+            buildfile = PbxBuildFile.createObject(pbx, fileref)
+            group.addFileReference(fileref)
+            phase.addFile(buildfile.getGuid())
+            added.append((fileref, buildfile))
+        report('add file', (time.time() - start) / nfiles * 1000, 'ms/file')
+        
+        start = time.time()
+        for fileref, buildfile in added[::2]:
+            phase.removeFile(buildfile.getGuid())
+            group.removeValue('children', fileref.getGuid())
+            buildfile.removeObjectFromRoot()
+            fileref.removeObjectFromRoot()
+        report('remove file', (time.time() - start) / (nfiles / 2) * 1000, 'ms/file')
+        
+        start = time.time()
+        changes = snapshot.diff(pbx)
+        report('diff (%d added, %d changed)' % (len(changes[0]), len(changes[2])), (time.time() - start) * 1000, 'ms')
+        
+        savepath = os.path.join(tempdir, 'saved.pbxproj')
+        report('save', best(lambda: pbx.saveas(savepath), repeat) * 1000, 'ms')
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def compare(oldpath, newpath, threshold):
+    '''두 결과 file을 비교해서 |threshold| % 이상 느려진 항목이 있으면 True
+    
+    시간( s, ms, us ) 단위인 항목만 비교한다.
+    '''
+    old = dict(((r['benchmark'], r['name']), r) for r in json.load(open(oldpath))['results'])
+    new = json.load(open(newpath))['results']
+    regressed = False
+    print '%-50s %12s %12s %8s' % ('benchmark', 'old', 'new', 'change')
+    for r in new:
+        o = old.get((r['benchmark'], r['name']))
+        if not o or o['unit'] != r['unit'] or not o['value']:
+            continue
+        change = (r['value'] - o['value']) / o['value'] * 100
+        mark = ''
+        if r['unit'].split('/')[0] in ('s', 'ms', 'us') and change > threshold:
+            mark = ' <- slower'
+            regressed = True
+        print '%-50s %12.3f %12.3f %+7.1f%%%s' % ('%s: %s' % (r['benchmark'], r['name']), o['value'], r['value'], change, mark)
+    return regressed
+
+
+def bench_snapshot(nobjects, nsnapshots, edits=10, ndeepcopy=3):
+    pbx = make_project(nobjects)
+    groups = pbx.getMainGroup().get('children')
+    print 'project : %d objects' % len(pbx.objects())
+
+    # copy.deepcopy
+    mem = rss()
+    start = time.time()
+    copies = [copy.deepcopy(pbx.pbxdata) for _ in range(ndeepcopy)]
+    elapsed = time.time() - start
+    report('deepcopy', elapsed / ndeepcopy * 1000, 'ms/copy')
+    report('deepcopy memory', (rss() - mem) / float(ndeepcopy) / 1024 / 1024, 'MB/copy')
+    del copies
+
+    # snapshot
+    mem = rss()
+    snapshots = []
+    start = time.time()
+    for i in range(nsnapshots):
+        snapshots.append(pbx.snapshot())
+    elapsed = time.time() - start
+    report('snapshot', elapsed / nsnapshots * 1000 * 1000, 'us/snapshot')
+
+    start = time.time()
+    for i in range(nsnapshots):
+        snapshots.append(pbx.snapshot())
+        for j in range(edits):
+            group = PbxGroup(pbx, groups[(i * edits + j) % len(groups)])
+            group.set('name', 'Edited%d' % i)
+    elapsed = time.time() - start
+    report('snapshot + %d edits' % edits, elapsed / nsnapshots * 1000, 'ms/snapshot')
+    report('snapshot memory (%d snapshots)' % len(snapshots), (rss() - mem) / 1024.0 / 1024, 'MB')
+
+    start = time.time()
+    snapshots[len(snapshots) / 2].diff(pbx)
+    report('diff', (time.time() - start) * 1000, 'ms')
+
+    start = time.time()
+    pbx.restore(snapshots[0])
+    report('restore', (time.time() - start) * 1000 * 1000, 'us')
+
+    start = time.time()
+    pbx.objects_if({'isa' : 'PBXGroup', 'name' : 'Group0'})
+    report('objects_if after restore', (time.time() - start) * 1000, 'ms')
+
+
+def bench_columnar(nobjects, nqueries=10000):
+    pbx = make_project(nobjects)
+    
+    gc.collect()
+    mem = rss()
+    objects = parsed_objects(pbx.objects())
+    gc.collect()
+    report('dict memory (%d objects)' % len(objects), (rss() - mem) / 1024.0 / 1024, 'MB')
+    
+    mem = rss()
+    start = time.time()
+    columnar = PbxColumnarObjects(objects)
+    elapsed = time.time() - start
+    gc.collect()
+    report('columnar memory', (rss() - mem) / 1024.0 / 1024, 'MB')
+    report('columnar conversion', elapsed, 's')
+    
+    guids = random.Random(0).sample(objects.keys(), min(nqueries, len(objects)))
+    for name, objs in (('dict', objects), ('columnar', columnar)):
+        proj = clone_project(pbx, objs)
+        
+        start = time.time()
+        proj.object_if({'isa' : 'PBXGroup', 'name' : 'Group0'})
+        report('%s object_if' % name, (time.time() - start) * 1000, 'ms')
+        
+        start = time.time()
+        proj.objects_if({'isa' : 'PBXFileReference', 'path' : 'Source7.m'})
+        report('%s objects_if' % name, (time.time() - start) * 1000, 'ms')
+        
+        start = time.time()
+        proj.getAllObjects(isa='PBXGroup')
+        report('%s getAllObjects' % name, (time.time() - start) * 1000, 'ms')
+        
+        start = time.time()
+        for guid in guids:
+            objs[guid].get('isa')
+        report('%s object access' % name, (time.time() - start) / len(guids) * 1000 * 1000, 'us/object')
+        
+        start = time.time()
+        PbxprojWriter(StringIO.StringIO()).writeValue(proj.pbxdata)
+        report('%s write' % name, time.time() - start, 's')
+
+
+def bench_intern(nobjects):
+    pbx = make_project(nobjects)
+    path = tempfile.mktemp('.pbxproj')
+    pbx.saveas(path)
+    try:
+        data = open(path).read().decode('utf-8')
+        print 'project : %d objects, %d bytes' % (len(pbx.objects()), len(data))
+        
+        sizes = {}
+        for internStrings in (False, True):
+            name = internStrings and 'interned' or 'plain'
+            start = time.time()
+            tokens = lex(data, token_exprs, internStrings)
+            report('%s lex' % name, time.time() - start, 's')
+            
+            start = time.time()
+            parsed = parseForPbxproj(tokens).value
+            report('%s parse' % name, time.time() - start, 's')
+            del tokens
+            gc.collect()
+            
+            sizes[name] = deepsize(parsed)
+            report('%s data size' % name, sizes[name] / 1024.0 / 1024, 'MB')
+            del parsed
+        
+        report('saved by interning', (1 - float(sizes['interned']) / sizes['plain']) * 100, '%')
+    finally:
+        os.remove(path)
+
+
+def bench_groups(nobjects, ngroups=10000):
+    pbx = make_project(nobjects)
+    print 'project : %d objects' % len(pbx.objects())
+    paths = ['/Nested/L%d/M%d/G%d' % (i / 1000, i / 100 % 10, i) for i in range(ngroups)]
+    
+    start = time.time()
+    for path in paths:
+        pbx.add_group(path)
+    report('add_group (%d groups)' % ngroups, (time.time() - start) / ngroups * 1000 * 1000, 'us/group')
+    
+    start = time.time()
+    for path in paths:
+        pbx.getGroup(path, False)
+    report('getGroup', (time.time() - start) / ngroups * 1000 * 1000, 'us/group')
+    
+    maingroup = pbx.getMainGroup()
+    start = time.time()
+    for i in range(ngroups):
+        maingroup.addGroupFromPath('Added/A%d/B%d' % (i / 100, i))
+    report('addGroupFromPath', (time.time() - start) / ngroups * 1000 * 1000, 'us/group')
+    
+    start = time.time()
+    for i in range(ngroups):
+        maingroup.getGroupFromPath('Added/A%d/B%d' % (i / 100, i))
+    report('getGroupFromPath', (time.time() - start) / ngroups * 1000 * 1000, 'us/group')
+
+
+def bench_lex(nobjects, repeat=3):
+    tempdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tempdir, 'Lex.xcodeproj')
+        PbxProjectGenerator.withObjects(nobjects).generate(path)
+        data = open(os.path.join(path, 'project.pbxproj')).read().decode('utf-8')
+    finally:
+        shutil.rmtree(tempdir)
+    print 'project : %d bytes, %d cpus' % (len(data), multiprocessing.cpu_count())
+    
+    serial = best(lambda: lex(data, token_exprs), repeat)
+    report('lex', serial, 's')
+    times = []
+    for processes in sorted(set([1, 2, 4, 8, multiprocessing.cpu_count()])):
+        elapsed = best(lambda: lexParallel(data, processes), repeat)
+        report('lexParallel (%d processes)' % processes, elapsed, 's')
+        times.append((processes, elapsed))
+    
+    tokens = lex(data, token_exprs)
+    report('parse', best(lambda: parseForPbxproj(tokens), 1), 's')
+    
+    print
+    print '%9s %8s %8s' % ('processes', 'time', 'speedup')
+    for processes, elapsed in times:
+        print '%9d %7.2fs %7.2fx %s' % (processes, elapsed, serial / elapsed, '#' * int(round(serial / elapsed * 20)))
+
+
+def bench_index(nprojects, nobjects):
+    tempdir = tempfile.mkdtemp()
+    try:
+        for i in range(nprojects):
+            path = os.path.join(tempdir, 'repo%d' % (i % 10), 'Project%d.xcodeproj' % i)
+            os.makedirs(path)
+            make_project(nobjects).saveas(os.path.join(path, 'project.pbxproj'))
+        print 'projects : %d projects, %d objects/project' % (nprojects, nobjects)
+        
+        for processes in sorted(set([1, multiprocessing.cpu_count()])):
+            index = PbxIndex(os.path.join(tempdir, 'index%d.db' % processes))
+            start = time.time()
+            index.update([tempdir], processes)
+            report('full index (%d processes)' % processes, time.time() - start, 's')
+        
+        start = time.time()
+        indexed, _, _ = index.update([tempdir])
+        report('incremental update (no change)', time.time() - start, 's')
+        
+        for i in range(0, nprojects, 50):
+            path = os.path.join(tempdir, 'repo%d' % (i % 10), 'Project%d.xcodeproj' % i, 'project.pbxproj')
+            open(path, 'a').write('\n')
+        start = time.time()
+        indexed, _, _ = index.update([tempdir])
+        report('incremental update (%d changed)' % indexed, time.time() - start, 's')
+        
+        start = time.time()
+        index.findTargetsCompiling('Source7.m')
+        report('query', (time.time() - start) * 1000, 'ms')
+        index.close()
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def bench_server(nobjects, nrequests=100):
+    tempdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tempdir, 'Bench.xcodeproj')
+        os.makedirs(path)
+        pbx = make_project(nobjects)
+        pbx.saveas(os.path.join(path, 'project.pbxproj'))
+        print 'project : %d objects' % len(pbx.objects())
+        
+        # build script마다 project를 읽는 경우
+        start = time.time()
+        for i in range(3):
+            PbxprojCache.clear()
+            PbxProject.loadPbxproj(path).getPbxTargets()
+        report('in-process load + query', (time.time() - start) / 3 * 1000, 'ms')
+        
+        sockpath = os.path.join(tempdir, 'server.sock')
+        server = multiprocessing.Process(target=lambda: PbxServer(sockpath).serve_forever())
+        server.start()
+        try:
+            while not os.path.exists(sockpath):
+                time.sleep(0.01)
+            
+            start = time.time()
+            client = PbxClient(sockpath)
+            client.loadPbxproj(path).getTargetNames()
+            report('server first load + query', (time.time() - start) * 1000, 'ms')
+            client.close()
+            
+            # build script마다 새로 연결하는 경우
+            start = time.time()
+            for i in range(nrequests):
+                client = PbxClient(sockpath)
+                client.loadPbxproj(path).getTargetNames()
+                client.close()
+            report('server connect + load + query', (time.time() - start) / nrequests * 1000, 'ms')
+            
+            client = PbxClient(sockpath)
+            remote = client.loadPbxproj(path)
+            for name, func in (('ping', lambda: client.call('ping')),
+                               ('targets', remote.getTargetNames),
+                               ('setting', lambda: remote.getBuildSetting('PRODUCT_NAME', 'Debug'))):
+                start = time.time()
+                for i in range(nrequests):
+                    func()
+                report('server %s' % name, (time.time() - start) / nrequests * 1000, 'ms/request')
+            client.call('shutdown')
+            client.close()
+        finally:
+            server.join(5)
+            if server.is_alive():
+                server.terminate()
+    finally:
+        shutil.rmtree(tempdir)
+
+
+def usage_and_exit(status):
+    print '''\
+usage: pbxbench.py [option] <benchmark>
+       pbxbench.py [-t percent] compare <old.json> <new.json>
+
+benchmarks:
+  suite         load, query, add/remove files, diff and save
+  snapshot      snapshot/restore vs copy.deepcopy
+  columnar      dict objects vs PbxColumnarObjects
+  intern        parsing with and without string interning
+  index         indexing many projects with PbxIndex
+  server        in-process loading vs PbxServer requests
+  groups        creating and finding nested groups
+  lex           lex vs lexParallel with 1, 2, 4, 8 processes
+
+options:
+  -n <count>    number of objects (default : 50000, columnar : 200000, 
+                intern : 10000, index : 200 per project, server : 5000,
+                suite : 5000, lex : 50000, groups : 50000)
+  -r <count>    number of repeats for suite and lex (default : 3)
+  -o <path>     save results as JSON
+  -t <percent>  threshold for compare (default : 10)
+  -p <count>    number of projects (default : 500)
+  -g <count>    number of groups (default : 10000)
+  -s <count>    number of snapshots (default : 100)
+
+'''
+    exit(status)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv,'n:s:p:r:o:t:g:')
+    except getopt.GetoptError,err:
+        print err
+        usage_and_exit(1)
+
+    if not args:
+        usage_and_exit(2)
+
+    nobjects = None
+    nsnapshots = 100
+    nprojects = 500
+    ngroups = 10000
+    repeat = 3
+    output = None
+    threshold = 10.0
+    for k,v in opts:
+        if k == '-n':
+            nobjects = int(v)
+        elif k == '-s':
+            nsnapshots = int(v)
+        elif k == '-p':
+            nprojects = int(v)
+        elif k == '-g':
+            ngroups = int(v)
+        elif k == '-r':
+            repeat = int(v)
+        elif k == '-o':
+            output = v
+        elif k == '-t':
+            threshold = float(v)
+
+    if args[0] == 'compare' and len(args) == 3:
+        exit(compare(args[1], args[2], threshold) and 1 or 0)
+    elif len(args) != 1:
+        usage_and_exit(2)
+
+    if args[0] == 'suite':
+        bench_suite(nobjects or 5000, repeat)
+    elif args[0] == 'snapshot':
+        bench_snapshot(nobjects or 50000, nsnapshots)
+    elif args[0] == 'columnar':
+        bench_columnar(nobjects or 200000)
+    elif args[0] == 'intern':
+        bench_intern(nobjects or 10000)
+    elif args[0] == 'index':
+        bench_index(nprojects, nobjects or 200)
+    elif args[0] == 'server':
+        bench_server(nobjects or 5000)
+    elif args[0] == 'groups':
+        bench_groups(nobjects or 50000, ngroups)
+    elif args[0] == 'lex':
+        bench_lex(nobjects or 50000, repeat)
+    else:
+        usage_and_exit(2)
+
+    if output:
+        for r in results:
+            r['benchmark'] = args[0]
+        json.dump({'benchmark' : args[0],
+                   'time' : time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'python' : platform.python_version(),
+                   'platform' : platform.platform(),
+                   'options' : dict(opts),
+                   'results' : results}, open(output, 'w'), indent=2, sort_keys=True)
+
+if __name__=='__main__':
+    main(sys.argv[1:])
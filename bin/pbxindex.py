@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+Index Xcode projects
+====================
+
+여러 Xcode 프로젝트를 SQLite database에 index하고 조회한다.
+
+사용방법
+-------
+
+> python pbxindex.py update ~/src
+
+~/src 아래의 .xcodeproj를 모두 병렬로 읽어서 index한다. 다시 실행하면
+바뀐 project만 다시 읽는다.
+
+> python pbxindex.py linking libFoo.a
+> python pbxindex.py compiling main.m
+> python pbxindex.py settings OTHER_LDFLAGS -lz
+
+libFoo.a를 link하는 target, main.m을 compile하는 target, OTHER_LDFLAGS에
+-lz가 있는 target을 출력한다.
+
+'''
+
+import sys
+import os
+import time
+import getopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from xcodetools.pbxindex import PbxIndex
+from xcodetools.pbxlib import PbxprojStats
+
+
+def usage_and_exit(status):
+    print '''\
+usage: pbxindex.py [option] <command> [args]
+
+commands:
+  update <path> ...         index projects under paths
+  projects                  list indexed projects
+  targets [name]            list targets
+  linking <library>         targets linking library (libFoo.a, Foo.framework)
+  compiling <file>          targets compiling file (name, dir/name or absolute path)
+  files <pattern>           files matching glob pattern
+  settings <key> [value]    build settings with key (containing value)
+  sql <query>               run sql query
+
+options:
+  -d <path>     database path (default : ~/.pbxindex.db)
+  -j <count>    number of processes for update (default : number of cpus)
+  --profile     print time spent in each phase (update uses 1 process unless -j)
+
+'''
+    exit(status)
+
+
+def print_rows(rows):
+    for row in rows:
+        print '\t'.join(v is None and '-' or unicode(v) for v in row).encode('utf-8')
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv,'d:j:',['profile'])
+    except getopt.GetoptError,err:
+        print err
+        usage_and_exit(1)
+
+    if not args:
+        usage_and_exit(2)
+
+    dbpath = '~/.pbxindex.db'
+    processes = None
+    for k,v in opts:
+        if k == '-d':
+            dbpath = v
+        elif k == '-j':
+            processes = int(v)
+        elif k == '--profile':
+            PbxprojStats.enable()
+
+    # 다른 process에서 읽은 시간은 측정되지 않는다.
+    if PbxprojStats.enabled and processes is None:
+        processes = 1
+
+    index = PbxIndex(dbpath)
+    command, args = args[0], args[1:]
+
+    if command == 'update' and args:
+        start = time.time()
+        indexed, unchanged, removed = index.update(args, processes)
+        print 'indexed %d, unchanged %d, removed %d projects in %.2fs' % (indexed, unchanged, removed, time.time() - start)
+        for path, error in index.getProjects():
+            if error: print '%s: %s' % (path, error)
+    elif command == 'projects':
+        print_rows(index.getProjects())
+    elif command == 'targets' and len(args) <= 1:
+        print_rows(index.getTargets(*args))
+    elif command == 'linking' and len(args) == 1:
+        print_rows(index.findTargetsLinking(args[0]))
+    elif command == 'compiling' and len(args) == 1:
+        print_rows(index.findTargetsCompiling(args[0]))
+    elif command == 'files' and len(args) == 1:
+        print_rows(index.findFiles(args[0]))
+    elif command == 'settings' and 1 <= len(args) <= 2:
+        print_rows(index.findSettings(*args))
+    elif command == 'sql' and len(args) == 1:
+        print_rows(index.query(args[0]))
+    else:
+        usage_and_exit(2)
+
+    index.close()
+    if PbxprojStats.enabled:
+        PbxprojStats.report()
+
+if __name__=='__main__':
+    main(sys.argv[1:])
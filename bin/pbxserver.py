@@ -0,0 +1,107 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+Project server
+==============
+
+Xcode 프로젝트를 memory에 유지하면서 Unix domain socket으로 조회, 수정
+요청을 처리하는 server를 실행한다.
+
+사용방법
+-------
+
+> python pbxserver.py start &
+
+build script에서는 xcodetools.pbxserver.loadPbxproj()로 project를 읽으면
+server가 이미 읽어둔 project를 사용한다.
+
+> python pbxserver.py status
+> python pbxserver.py stop
+
+'''
+
+import sys
+import os
+import getopt
+import socket
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from xcodetools.pbxserver import PbxServer, PbxClient, PbxServerException, defaultSocketPath
+from xcodetools.pbxlib import PbxprojStats
+
+
+def usage_and_exit(status):
+    print '''\
+usage: pbxserver.py [option] <command>
+
+commands:
+  start         run server in foreground
+  stop          stop running server
+  status        print loaded projects of running server
+
+options:
+  -s <path>     socket path (default : %s)
+  -i <seconds>  interval for checking changed files (default : 1)
+  --profile     print time spent in each phase when server stops
+
+''' % defaultSocketPath()
+    exit(status)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv,'s:i:',['profile'])
+    except getopt.GetoptError,err:
+        print err
+        usage_and_exit(1)
+
+    if len(args) != 1:
+        usage_and_exit(2)
+
+    sockpath = defaultSocketPath()
+    interval = 1.0
+    for k,v in opts:
+        if k == '-s':
+            sockpath = v
+        elif k == '-i':
+            interval = float(v)
+        elif k == '--profile':
+            PbxprojStats.enable()
+
+    if args[0] == 'start':
+        try:
+            server = PbxServer(sockpath, interval)
+        except PbxServerException, e:
+            print e
+            exit(1)
+        print 'listening on %s' % sockpath
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+        if PbxprojStats.enabled:
+            PbxprojStats.report()
+
+    elif args[0] in ('stop', 'status'):
+        try:
+            client = PbxClient(sockpath)
+        except socket.error:
+            print 'server is not running'
+            exit(1)
+        if args[0] == 'stop':
+            client.call('shutdown')
+        else:
+            stats = client.call('stats')
+            print 'requests : %d' % stats['requests']
+            for path, loaded, dirty, loads in stats['projects']:
+                print '%s%s%s (loaded %d times)' % (path, not loaded and ' [unloaded]' or '', dirty and ' [modified]' or '', loads)
+        client.close()
+
+    else:
+        usage_and_exit(2)
+
+if __name__=='__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+Validate pbxproj
+================
+
+Xcode 프로젝트 파일(project.pbxproj)의 무결성을 검사한다.
+
+사용방법
+-------
+
+> python pbxvalidate.py [-w] Sample.xcodeproj [Other.xcodeproj ...]
+
+없는 guid를 가리키는 참조, isa별 필수 key, 중복된 children,
+build file과 build phase의 관계를 검사하고 문제가 있는 object의
+경로를 출력한다. 문제가 있으면 1을 반환하므로 git pre-commit hook
+으로 사용할 수 있다.
+
+-w 옵션을 주면 warning도 error로 취급한다.
+
+'''
+
+import sys
+import os
+import getopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from xcodetools.pbxlib import PbxProject, PbxprojValidator, PbxprojStats
+
+
+def usage_and_exit(status):
+    print '''\
+usage: pbxvalidate.py [option] <project> [<project> ...]
+
+options:
+  -w            treat warnings as errors
+  --profile     print time spent in each phase
+
+'''
+    exit(status)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv,'w',['profile'])
+    except getopt.GetoptError,err:
+        print err
+        usage_and_exit(1)
+
+    if not args:
+        usage_and_exit(2)
+
+    strict = False
+    for k,v in opts:
+        if k == '-w':
+            strict = True
+        elif k == '--profile':
+            PbxprojStats.enable()
+
+    failed = False
+    for path in args:
+        pbx = PbxProject.loadPbxproj(path)
+        if not pbx:
+            print '%s: cannot load project' % path
+            failed = True
+            continue
+
+        validator = PbxprojValidator(pbx)
+        errors = validator.validate()
+        for objpath, msg in errors:
+            print '%s: error: %s: %s' % (path, objpath, msg)
+        for objpath, msg in validator.warnings:
+            print '%s: warning: %s: %s' % (path, objpath, msg)
+
+        if errors or (strict and validator.warnings):
+            failed = True
+
+    if PbxprojStats.enabled:
+        PbxprojStats.report()
+    exit(failed and 1 or 0)
+
+if __name__=='__main__':
+    main(sys.argv[1:])
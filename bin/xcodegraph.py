@@ -0,0 +1,131 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+Build Xcode projects in dependency order
+========================================
+
+project와 subproject의 target 의존 관계를 찾아서 의존하지 않는 target들을
+동시에 build한다.
+
+사용방법
+-------
+
+> python xcodegraph.py order App/App.xcodeproj
+
+build 순서와 target마다 의존하는 target을 출력한다.
+
+> python xcodegraph.py -j 4 -c Release -d durations.json build App/App.xcodeproj
+
+4개씩 동시에 build하고 target별 build 시간을 durations.json에 저장한다.
+다음 build에서는 저장한 시간으로 critical path가 긴 target부터 시작한다.
+
+> python xcodegraph.py -j 8 -d durations.json simulate App/App.xcodeproj
+
+저장한 시간으로 worker 1 ~ 8개일때 build 시간을 예측한다.
+
+'''
+
+import sys
+import os
+import getopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from xcodetools.xcodegraph import BuildGraph, GraphBuild, BuildGraphException
+
+
+def usage_and_exit(status):
+    print '''\
+usage: xcodegraph.py [option] <command> <project> ...
+
+commands:
+  order         print targets in build order with their dependencies
+  build         build targets in parallel
+  simulate      predict build time for 1 .. -j workers from recorded durations
+
+options:
+  -j <count>    number of parallel xcodebuild (default : number of cpus)
+  -c <name>     configuration
+  -s <sdk>      sdk
+  -k            keep going after a target failed (default : stop)
+  -d <path>     durations json. build reads and updates, simulate reads
+  -b <path>     BUILD_DIR shared by all targets
+  -l <path>     directory for xcodebuild log of each target
+  -t <target>   build only target (and its dependencies) of the first project
+
+'''
+    exit(status)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv,'j:c:s:kd:b:l:t:')
+    except getopt.GetoptError,err:
+        print err
+        usage_and_exit(1)
+
+    if len(args) < 2:
+        usage_and_exit(2)
+
+    jobs = None
+    configuration = None
+    sdk = None
+    keepGoing = False
+    durationsPath = None
+    builddir = None
+    logdir = None
+    targets = None
+    for k,v in opts:
+        if k == '-j':
+            jobs = int(v)
+        elif k == '-c':
+            configuration = v
+        elif k == '-s':
+            sdk = v
+        elif k == '-k':
+            keepGoing = True
+        elif k == '-d':
+            durationsPath = v
+        elif k == '-b':
+            builddir = v
+        elif k == '-l':
+            logdir = v
+        elif k == '-t':
+            targets = (targets or []) + [v]
+
+    command, paths = args[0], args[1:]
+    graph = BuildGraph()
+    durations = GraphBuild.loadDurations(durationsPath)
+    try:
+        graph.addProject(paths[0], targets)
+        for path in paths[1:]:
+            graph.addProject(path)
+        order = graph.getOrder()
+    except BuildGraphException, e:
+        print e
+        exit(1)
+
+    if command == 'order':
+        for node in order:
+            print '%s\t%s' % (node.name, ' '.join(dep.name for dep in node.deps))
+    elif command == 'build':
+        build = GraphBuild(graph, configuration, sdk, jobs, keepGoing, builddir, logdir, durations)
+        succeeded = build.build()
+        if durationsPath:
+            build.saveDurations(durationsPath)
+        if not succeeded:
+            exit(1)
+    elif command == 'simulate':
+        import multiprocessing
+        if not durations:
+            print 'no recorded durations. every target takes 1s.'
+        path, length = graph.getCriticalPath(durations)
+        print 'critical path %.1fs : %s' % (length, ' -> '.join(node.name for node in path))
+        for workers in range(1, (jobs or multiprocessing.cpu_count()) + 1):
+            print '%3d workers %8.1fs' % (workers, graph.simulate(workers, durations)[0])
+    else:
+        usage_and_exit(2)
+
+if __name__=='__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+Analyze xcodebuild log
+======================
+
+xcodebuild 출력에서 오래 걸린 build 단계( CompileC, Ld, ... )와 
+warning, error를 찾는다.
+
+사용방법
+-------
+
+> python xcodelog.py build.log
+
+저장한 log를 분석한다. xcodebuild > build.log로 저장한 log에는 시간이 
+없으므로 단계별 개수와 warning, error만 출력한다.
+
+> python xcodelog.py -r build.log -- xcodebuild -target Sample build
+
+xcodebuild를 실행하면서 출력을 분석한다. -r로 줄마다 받은 시간을 붙여서 
+저장하면 나중에 다시 분석할 수 있다.
+
+build가 실패했으면 1을 반환한다.
+
+'''
+
+import sys
+import os
+import getopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.pardir))
+from xcodetools.xcodelog import XcodebuildLog, XcodebuildLogRecorder
+from xcodetools.xcodelib import ProcessRunner, _echo
+
+
+def usage_and_exit(status):
+    print '''\
+usage: xcodelog.py [option] <build.log>
+       xcodelog.py [option] -- <command> [args]
+
+options:
+  -n <count>    number of slowest steps (default : 10)
+  -o <path>     save steps and diagnostics as JSON
+  -r <path>     record output of command with timestamps
+
+'''
+    exit(status)
+
+
+def main(argv):
+
+    try:
+        opts, args = getopt.getopt(argv,'n:o:r:')
+    except getopt.GetoptError,err:
+        print err
+        usage_and_exit(1)
+
+    if not args:
+        usage_and_exit(2)
+
+    count = 10
+    output = None
+    record = None
+    for k,v in opts:
+        if k == '-n':
+            count = int(v)
+        elif k == '-o':
+            output = v
+        elif k == '-r':
+            record = v
+
+    if '--' in argv:
+        log = XcodebuildLog()
+        runner = ProcessRunner(args)
+        runner.addListener(_echo)
+        runner.addListener(log)
+        if record:
+            recorder = XcodebuildLogRecorder(record)
+            runner.addListener(recorder)
+        result = runner.run()
+        if record:
+            recorder.close()
+        if result.error:
+            print '%s: %s' % (args[0], result.error)
+            exit(1)
+        log.finish(result.endTime)
+        print
+    elif len(args) == 1:
+        log = XcodebuildLog.parseFile(args[0])
+    else:
+        usage_and_exit(2)
+
+    log.report(count=count)
+    if output:
+        log.saveJSON(output)
+    if log.succeeded is False or log.getErrors():
+        exit(1)
+
+if __name__=='__main__':
+    main(sys.argv[1:])
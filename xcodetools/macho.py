@@ -0,0 +1,662 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+Mach-O, ar( static library ) file을 읽고 fat( universal ) file을 만든다.
+
+lipo가 없는 곳에서도 lipo -create, -info, -thin과 같은 일을 한다.
+file은 mmap으로 읽고 slice는 buffer로 그대로 써서 memory로 복사하지 않는다.
+
+archive의 object, symbol도 nm, otool 없이 읽는다. 필요한 header와 
+symbol table만 읽으므로 큰 library도 전체를 읽지 않는다.
+scanLibraries()는 폴더의 library들을 thread pool에서 읽는다.
+
+usage:
+
+createFat(['Release-iphoneos/libFoo.a', 'Release-iphonesimulator/libFoo.a'], 'libFoo.a')
+
+f = MachOFile('libFoo.a')
+print f.getInfo()               # Architectures in the fat file: libFoo.a are: armv7 i386
+f.thin('armv7', 'libFoo-armv7.a')
+for obj in f.getSlice('armv7').getObjects():
+    print obj.name, [sym.name for sym in obj.getSymbols() if sym.isExported()]
+f.close()
+
+for info in scanLibraries('__build__'):
+    print info['path'], info['archs']
+
+'''
+
+__all__ = ['MachOError', 'MachOFile', 'MachOSlice', 'MachOObject', 'MachOSymbol', 'createFat', 
+           'getArchName', 'getCpuType', 'inspectLibrary', 'scanLibraries']
+
+import os
+import mmap
+import struct
+import fnmatch
+import tempfile
+import collections
+import multiprocessing.pool
+import unittest
+
+FAT_MAGIC = 0xcafebabe
+FAT_MAGIC_64 = 0xcafebabf
+MH_MAGIC = 0xfeedface
+MH_MAGIC_64 = 0xfeedfacf
+AR_MAGIC = '!<arch>\n'
+
+CPU_ARCH_ABI64 = 0x01000000
+CPU_SUBTYPE_MASK = 0xff000000
+CPU_TYPE_X86 = 7
+CPU_TYPE_X86_64 = CPU_TYPE_X86 | CPU_ARCH_ABI64
+CPU_TYPE_ARM = 12
+CPU_TYPE_ARM64 = CPU_TYPE_ARM | CPU_ARCH_ABI64
+CPU_TYPE_POWERPC = 18
+CPU_TYPE_POWERPC64 = CPU_TYPE_POWERPC | CPU_ARCH_ABI64
+
+# arch 이름 : (cputype, cpusubtype)
+_archs = [
+    ('i386',    (CPU_TYPE_X86, 3)),
+    ('x86_64',  (CPU_TYPE_X86_64, 3)),
+    ('x86_64h', (CPU_TYPE_X86_64, 8)),
+    ('armv4t',  (CPU_TYPE_ARM, 5)),
+    ('armv6',   (CPU_TYPE_ARM, 6)),
+    ('armv5',   (CPU_TYPE_ARM, 7)),
+    ('armv7',   (CPU_TYPE_ARM, 9)),
+    ('armv7f',  (CPU_TYPE_ARM, 10)),
+    ('armv7s',  (CPU_TYPE_ARM, 11)),
+    ('armv7k',  (CPU_TYPE_ARM, 12)),
+    ('armv6m',  (CPU_TYPE_ARM, 14)),
+    ('armv7m',  (CPU_TYPE_ARM, 15)),
+    ('armv7em', (CPU_TYPE_ARM, 16)),
+    ('arm64',   (CPU_TYPE_ARM64, 0)),
+    ('arm64e',  (CPU_TYPE_ARM64, 2)),
+    ('ppc',     (CPU_TYPE_POWERPC, 0)),
+    ('ppc64',   (CPU_TYPE_POWERPC64, 0)),
+]
+_archNames = dict((cpu, name) for name, cpu in _archs)
+_cpuTypes = dict(_archs)
+
+# fat file에서 slice를 맞추는 크기( 2^n ). lipo와 같이 page 크기
+_pageAlign = {CPU_TYPE_ARM : 14, CPU_TYPE_ARM64 : 14}
+_defaultAlign = 12
+
+# ar member header : name, date, uid, gid, mode, size, fmag
+_arHeader = struct.Struct('16s12s6s6s8s10s2s')
+
+LC_SEGMENT = 0x1
+LC_SYMTAB = 0x2
+LC_SEGMENT_64 = 0x19
+
+N_STAB = 0xe0
+N_TYPE = 0x0e
+N_EXT = 0x01
+N_UNDF = 0x0
+N_ABS = 0x2
+N_SECT = 0xe
+N_INDR = 0xa
+
+
+class MachOError(Exception):
+    pass
+
+
+def getArchName(cputype, cpusubtype):
+    '(cputype, cpusubtype) -> "armv7". 모르는 type은 "cputype(12) cpusubtype(99)"'
+    cpusubtype &= ~CPU_SUBTYPE_MASK
+    name = _archNames.get((cputype, cpusubtype))
+    if name: return name
+    return 'cputype(%d) cpusubtype(%d)' % (cputype, cpusubtype)
+
+
+def getCpuType(arch):
+    '"armv7" -> (cputype, cpusubtype). 모르는 이름은 MachOError'
+    try:
+        return _cpuTypes[arch]
+    except KeyError:
+        raise MachOError('unknown architecture: %s' % arch)
+
+
+class MachOSlice(object):
+    '''MachOFile 안의 Mach-O 혹은 ar file 하나
+
+    offset, size : file 안의 위치
+    kind : 'macho' 혹은 'archive'
+    align : fat file에서 맞출 크기( 2^align )
+    '''
+    def __init__(self, machofile, offset, size, cputype, cpusubtype, kind, align=None):
+        self.file = machofile
+        self.offset = offset
+        self.size = size
+        self.cputype = cputype
+        self.cpusubtype = cpusubtype
+        self.kind = kind
+        self.align = align is None and _pageAlign.get(cputype, _defaultAlign) or align
+
+    def getArch(self):
+        return getArchName(self.cputype, self.cpusubtype)
+
+    def getKey(self):
+        'capability bit를 뺀 (cputype, cpusubtype). 같은 fat file에 같은 key가 둘 있을 수 없다.'
+        return self.cputype, self.cpusubtype & ~CPU_SUBTYPE_MASK
+
+    def getBuffer(self):
+        'slice 내용. 복사하지 않는다.'
+        return buffer(self.file.data, self.offset, self.size)
+
+    def getObjects(self):
+        'archive면 member object, Mach-O면 자기 자신인 MachOObject'
+        if self.kind == 'macho':
+            return [MachOObject(self.file, None, self.offset, self.size)]
+        ret = []
+        for name, start, size in self.file.iterArchive(self.offset, self.size):
+            if self.file._parseHeader(start):
+                ret.append(MachOObject(self.file, name, start, size))
+        return ret
+
+    def getSymbols(self):
+        'object들의 symbol ( nm )'
+        ret = []
+        for obj in self.getObjects():
+            ret.extend(obj.getSymbols())
+        return ret
+
+    def __repr__(self):
+        return '<MachOSlice %s %s %d+%d>' % (self.getArch(), self.kind, self.offset, self.size)
+
+
+# type : nm과 같은 글자. T( text ), D( data ), B( bss ), S( 다른 section ), U( undefined ), 
+#        C( common ), A( absolute ), I( indirect ). local symbol은 소문자
+# member : archive 안의 object 이름. archive가 아니면 None
+MachOSymbol = collections.namedtuple('MachOSymbol', 'name type value member')
+MachOSymbol.isExported = lambda self: self.type in 'TDBSCAI'
+MachOSymbol.isUndefined = lambda self: self.type == 'U'
+
+
+class MachOObject(object):
+    '''Mach-O object file 하나. archive의 member이면 name은 member 이름'''
+    def __init__(self, machofile, name, offset, size):
+        self.file = machofile
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.cputype, self.cpusubtype, self.is64 = machofile._parseHeader(offset)
+        magic, = struct.unpack_from('<I', machofile.data, offset)
+        self.endian = magic in (MH_MAGIC, MH_MAGIC_64) and '<' or '>'
+
+    def getArch(self):
+        return getArchName(self.cputype, self.cpusubtype)
+
+    def _loadCommands(self):
+        '(cmd, offset)'
+        data = self.file.data
+        ncmds, sizeofcmds = struct.unpack_from(self.endian + 'II', data, self.offset + 16)
+        pos = self.offset + (self.is64 and 32 or 28)
+        end = min(pos + sizeofcmds, self.offset + self.size)
+        for i in range(ncmds):
+            if pos + 8 > end:
+                raise MachOError('%s(%s): load command %d is out of file' % (self.file.path, self.name, i))
+            cmd, cmdsize = struct.unpack_from(self.endian + 'II', data, pos)
+            yield cmd, pos
+            if cmdsize < 8: break
+            pos += cmdsize
+
+    def getSections(self):
+        '[(segment 이름, section 이름)]. symbol의 n_sect는 1부터 이 순서'
+        data = self.file.data
+        ret = []
+        for cmd, pos in self._loadCommands():
+            if cmd == LC_SEGMENT:
+                nsects, = struct.unpack_from(self.endian + 'I', data, pos + 48)
+                first, size = pos + 56, 68
+            elif cmd == LC_SEGMENT_64:
+                nsects, = struct.unpack_from(self.endian + 'I', data, pos + 64)
+                first, size = pos + 72, 80
+            else:
+                continue
+            for i in range(nsects):
+                sectname, segname = struct.unpack_from('16s16s', data, first + i * size)
+                ret.append((segname.rstrip('\0'), sectname.rstrip('\0')))
+        return ret
+
+    def getSymbols(self):
+        'symbol table의 symbol. debug( stab ) symbol은 뺀다.'
+        data = self.file.data
+        symtab = [pos for cmd, pos in self._loadCommands() if cmd == LC_SYMTAB]
+        if not symtab: return []
+        symoff, nsyms, stroff, strsize = struct.unpack_from(self.endian + 'IIII', data, symtab[0] + 8)
+        nlist = struct.Struct(self.endian + (self.is64 and 'IBBhQ' or 'IBBhI'))
+        symoff += self.offset
+        strstart = self.offset + stroff
+        strend = min(strstart + strsize, self.offset + self.size)
+        if symoff + nsyms * nlist.size > self.offset + self.size:
+            raise MachOError('%s(%s): symbol table is out of file' % (self.file.path, self.name))
+
+        sections = None
+        ret = []
+        for i in range(nsyms):
+            strx, ntype, nsect, _, value = nlist.unpack_from(data, symoff + i * nlist.size)
+            if ntype & N_STAB: continue
+            kind = ntype & N_TYPE
+            if kind == N_UNDF:
+                letter = value and 'C' or 'U'
+            elif kind == N_ABS:
+                letter = 'A'
+            elif kind == N_INDR:
+                letter = 'I'
+            elif kind == N_SECT:
+                if sections is None: sections = self.getSections()
+                section = 0 < nsect <= len(sections) and sections[nsect - 1] or None
+                letter = {('__TEXT', '__text') : 'T', ('__DATA', '__data') : 'D', 
+                          ('__DATA', '__bss') : 'B'}.get(section, 'S')
+            else:
+                letter = '?'
+            if not ntype & N_EXT and letter not in 'UC':
+                letter = letter.lower()
+            name = ''
+            if strx and strstart + strx < strend:
+                nameend = data.find('\0', strstart + strx, strend)
+                name = data[strstart + strx:nameend < 0 and strend or nameend]
+            ret.append(MachOSymbol(name, letter, value, self.name))
+        return ret
+
+    def __repr__(self):
+        return '<MachOObject %s %s>' % (self.name, self.getArch())
+
+
+class MachOFile(object):
+    '''mmap으로 읽은 Mach-O, ar 혹은 fat file
+
+    fat : fat file이면 True
+    slices : MachOSlice. fat file이 아니면 file 전체가 slice 하나
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.fat = False
+        self.slices = []
+        self.data = None
+        f = open(path, 'rb')
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise MachOError('%s: empty file' % path)
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        try:
+            self._parse()
+        except struct.error:
+            self.close()
+            raise MachOError('%s: truncated file' % path)
+        except MachOError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _parse(self):
+        data = self.data
+        magic, = struct.unpack_from('>I', data, 0)
+        if magic in (FAT_MAGIC, FAT_MAGIC_64):
+            self.fat = True
+            nfat, = struct.unpack_from('>I', data, 4)
+            for i in range(nfat):
+                if magic == FAT_MAGIC:
+                    cputype, cpusubtype, offset, size, align = struct.unpack_from('>iIIII', data, 8 + i * 20)
+                else:
+                    cputype, cpusubtype, offset, size, align, _ = struct.unpack_from('>iIQQII', data, 8 + i * 32)
+                if offset + size > len(data):
+                    raise MachOError('%s: slice %d is out of file' % (self.path, i))
+                kind = data[offset:offset + len(AR_MAGIC)] == AR_MAGIC and 'archive' or 'macho'
+                self.slices.append(MachOSlice(self, offset, size, cputype, cpusubtype, kind, align))
+        else:
+            self.slices.append(self._parseThin(0, len(data)))
+
+    def _parseThin(self, offset, size):
+        data = self.data
+        if data[offset:offset + len(AR_MAGIC)] == AR_MAGIC:
+            cputype, cpusubtype = self._parseArchive(offset, size)
+            return MachOSlice(self, offset, size, cputype, cpusubtype, 'archive')
+        cpu = self._parseHeader(offset)
+        if not cpu:
+            raise MachOError('%s: not a Mach-O, ar or fat file' % self.path)
+        return MachOSlice(self, offset, size, cpu[0], cpu[1], 'macho')
+
+    def _parseHeader(self, offset):
+        'Mach-O header의 (cputype, cpusubtype, 64bit). Mach-O가 아니면 None'
+        if offset + 12 > len(self.data): return None
+        for endian in '<>':
+            magic, cputype, cpusubtype = struct.unpack_from(endian + 'Iii', self.data, offset)
+            if magic in (MH_MAGIC, MH_MAGIC_64):
+                return cputype, cpusubtype & 0xffffffff, magic == MH_MAGIC_64
+        return None
+
+    def iterArchive(self, offset, size):
+        '''ar member를 차례로 (이름, data offset, data size)
+
+        BSD( #1/<길이> )와 GNU( /<offset>, // ) 형식의 긴 이름을 읽는다.
+        '''
+        data = self.data
+        end = offset + size
+        pos = offset + len(AR_MAGIC)
+        longnames = ''
+        while pos + _arHeader.size <= end:
+            name, _, _, _, _, msize, fmag = _arHeader.unpack_from(data, pos)
+            if fmag != '`\n':
+                raise MachOError('%s: bad archive member header at %d' % (self.path, pos))
+            msize = int(msize)
+            pos += _arHeader.size
+            name = name.rstrip(' ')
+            start = pos
+            if name.startswith('#1/'):
+                namelen = int(name[3:])
+                name = data[pos:pos + namelen].rstrip('\0')
+                start += namelen
+            elif name == '//':
+                longnames = data[pos:pos + msize]
+            elif name.startswith('/') and name[1:].isdigit():
+                index = int(name[1:])
+                name = longnames[index:longnames.index('\n', index)].rstrip('/')
+            elif name.endswith('/') and name != '/':
+                name = name[:-1]
+            if pos + msize > end:
+                raise MachOError('%s: archive member %s is out of file' % (self.path, name))
+            yield name, start, pos + msize - start
+            # member는 2 byte 단위
+            pos += msize + (msize & 1)
+
+    def _parseArchive(self, offset, size):
+        'archive의 object file에서 (cputype, cpusubtype). 모든 object가 같아야 한다.'
+        cpu = None
+        for name, start, msize in self.iterArchive(offset, size):
+            if name.startswith('__.SYMDEF') or name in ('/', '//', '/SYM64/'):
+                continue
+            header = self._parseHeader(start)
+            if not header: continue
+            if cpu is None:
+                cpu = header[:2]
+            elif (cpu[0], cpu[1] & ~CPU_SUBTYPE_MASK) != (header[0], header[1] & ~CPU_SUBTYPE_MASK):
+                raise MachOError('%s: archive member %s is %s, not %s' %
+                                 (self.path, name, getArchName(*header[:2]), getArchName(*cpu)))
+        if cpu is None:
+            raise MachOError('%s: archive has no Mach-O object files' % self.path)
+        return cpu
+
+    def getArchs(self):
+        return [s.getArch() for s in self.slices]
+
+    def getSlice(self, arch):
+        key = getCpuType(arch)
+        for s in self.slices:
+            if s.getKey() == key: return s
+        raise MachOError('%s does not contain architecture %s' % (self.path, arch))
+
+    def getInfo(self):
+        'lipo -info와 같은 출력'
+        if self.fat:
+            return 'Architectures in the fat file: %s are: %s' % (self.path, ' '.join(self.getArchs()))
+        return 'Non-fat file: %s is architecture: %s' % (self.path, self.slices[0].getArch())
+
+    def thin(self, arch, output):
+        '|arch| slice만 |output|에 쓴다. ( lipo -thin )'
+        if not self.fat:
+            raise MachOError('%s is not a fat file' % self.path)
+        _writeFile(output, [(0, self.getSlice(arch).getBuffer())])
+
+
+def inspectLibrary(path, symbols=True):
+    '''|path| library의 architecture, object, export하는 symbol
+
+    return : {'path', 'fat', 'archs' : [arch], 'slices' : [{'arch', 'kind', 'size', 
+              'objects' : [이름], 'symbols' : [export하는 symbol 이름]}]}
+             |symbols|가 아니면 'symbols'는 없다.
+    '''
+    with MachOFile(path) as f:
+        slices = []
+        for s in f.slices:
+            objects = s.getObjects()
+            info = {'arch' : s.getArch(), 'kind' : s.kind, 'size' : s.size, 
+                    'objects' : [obj.name for obj in objects]}
+            if symbols:
+                info['symbols'] = sorted(set(sym.name for obj in objects 
+                                             for sym in obj.getSymbols() if sym.isExported()))
+            slices.append(info)
+        return {'path' : path, 'fat' : f.fat, 'archs' : f.getArchs(), 'slices' : slices}
+
+
+def scanLibraries(paths, threads=None, pattern='*.a', symbols=True):
+    '''|paths|( 폴더 혹은 file ) 아래의 |pattern| file을 |threads|개의 thread에서 inspectLibrary()한다.
+
+    읽을 수 없는 file은 {'path', 'error'}
+    return : path 순서로 정렬한 inspectLibrary() 결과
+    '''
+    if isinstance(paths, basestring): paths = [paths]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                files.extend(os.path.join(dirpath, name) for name in fnmatch.filter(filenames, pattern))
+        else:
+            files.append(path)
+    files.sort()
+
+    def inspect(path):
+        try:
+            return inspectLibrary(path, symbols)
+        except (MachOError, IOError, OSError), e:
+            return {'path' : path, 'error' : str(e)}
+
+    threads = threads or multiprocessing.cpu_count()
+    if threads <= 1 or len(files) <= 1:
+        return map(inspect, files)
+    pool = multiprocessing.pool.ThreadPool(min(threads, len(files)))
+    try:
+        return pool.map(inspect, files)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _writeFile(output, chunks):
+    '''|chunks|( [(offset, data)] )를 |output|에 쓴다.
+
+    다 쓴 다음 rename 하므로 실패해도 |output|이 반쯤 쓰이지 않는다.
+    '''
+    dirname = os.path.dirname(os.path.abspath(output))
+    fd, tmppath = tempfile.mkstemp(prefix='.%s.' % os.path.basename(output), dir=dirname)
+    try:
+        f = os.fdopen(fd, 'wb')
+        try:
+            pos = 0
+            for offset, data in chunks:
+                if offset > pos:
+                    f.write('\0' * (offset - pos))
+                    pos = offset
+                # 큰 slice도 1MB씩 buffer로 쓴다.
+                for start in range(0, len(data), 1024 * 1024):
+                    f.write(buffer(data, start, 1024 * 1024))
+                pos += len(data)
+        finally:
+            f.close()
+        os.chmod(tmppath, 0644)
+        os.rename(tmppath, output)
+    except:
+        if os.path.exists(tmppath):
+            os.remove(tmppath)
+        raise
+
+
+def createFat(inputs, output, align=None):
+    '''|inputs|( Mach-O, ar 혹은 fat file )의 slice를 모두 가진 fat file을 만든다. ( lipo -create )
+
+    같은 architecture가 둘 이상이면 MachOError.
+    |align| : {arch : 2^n}. 없으면 page 크기로 맞춘다.
+    return : 만든 file의 architecture 이름
+    '''
+    files = []
+    try:
+        slices = []
+        for path in inputs:
+            files.append(MachOFile(path))
+            slices.extend(files[-1].slices)
+        if not slices:
+            raise MachOError('no input files')
+
+        seen = {}
+        for s in slices:
+            if s.getKey() in seen:
+                raise MachOError('%s and %s have the same architecture (%s) and can\'t be in the same fat output file' %
+                                 (seen[s.getKey()].file.path, s.file.path, s.getArch()))
+            seen[s.getKey()] = s
+
+        aligns = dict((s, (align or {}).get(s.getArch(), s.align)) for s in slices)
+        # lipo처럼 align 순서로, arm64는 마지막에 둔다.
+        slices.sort(key=lambda s: (aligns[s], s.cputype == CPU_TYPE_ARM64))
+
+        fat64 = sum(s.size + (1 << aligns[s]) for s in slices) >= 1 << 32
+        pos = 8 + len(slices) * (fat64 and 32 or 20)
+        header = [struct.pack('>II', fat64 and FAT_MAGIC_64 or FAT_MAGIC, len(slices))]
+        chunks = []
+        for s in slices:
+            alignment = 1 << aligns[s]
+            pos = (pos + alignment - 1) & ~(alignment - 1)
+            if fat64:
+                header.append(struct.pack('>iIQQII', s.cputype, s.cpusubtype, pos, s.size, aligns[s], 0))
+            else:
+                header.append(struct.pack('>iIIII', s.cputype, s.cpusubtype, pos, s.size, aligns[s]))
+            chunks.append((pos, s.getBuffer()))
+            pos += s.size
+
+        _writeFile(output, [(0, ''.join(header))] + chunks)
+        return [s.getArch() for s in slices]
+    finally:
+        for f in files:
+            f.close()
+
+
+class MachOTestCase(unittest.TestCase):
+    # llvm-mc로 만든 object와 llvm-libtool-darwin으로 만든 static library
+    testdata = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'macho')
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tempdir)
+
+    def fixture(self, name):
+        return os.path.join(self.testdata, name)
+
+    def temp(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def testThin(self):
+        for arch in ('armv7', 'arm64', 'i386'):
+            with MachOFile(self.fixture('foo-%s.o' % arch)) as f:
+                self.assertFalse(f.fat)
+                self.assertEqual(f.getArchs(), [arch])
+                self.assertEqual(f.slices[0].kind, 'macho')
+            with MachOFile(self.fixture('libfoo-%s.a' % arch)) as f:
+                self.assertEqual(f.getArchs(), [arch])
+                self.assertEqual(f.slices[0].kind, 'archive')
+                self.assertEqual([m[0] for m in f.iterArchive(0, len(f.data))],
+                                 ['__.SYMDEF', 'foo-%s.o' % arch, 'bar-%s.o' % arch])
+                self.assertEqual(f.getInfo(), 'Non-fat file: %s is architecture: %s' % (f.path, arch))
+
+    def testCreate(self):
+        output = self.temp('fat.o')
+        inputs = [self.fixture('foo-%s.o' % arch) for arch in ('armv7', 'i386', 'arm64')]
+        self.assertEqual(createFat(inputs, output), ['i386', 'armv7', 'arm64'])
+        # llvm-lipo -create로 만든 file과 같다.
+        self.assertEqual(open(output, 'rb').read(), open(self.fixture('fat.o'), 'rb').read())
+
+        with MachOFile(output) as f:
+            self.assertTrue(f.fat)
+            self.assertEqual(f.getInfo(), 'Architectures in the fat file: %s are: i386 armv7 arm64' % output)
+            for s, path in zip(f.slices, [inputs[1], inputs[0], inputs[2]]):
+                self.assertEqual(s.offset % (1 << s.align), 0)
+                self.assertEqual(str(s.getBuffer()), open(path, 'rb').read())
+            f.thin('armv7', self.temp('armv7.o'))
+            self.assertRaises(MachOError, f.thin, 'x86_64', self.temp('x86_64.o'))
+        self.assertEqual(open(self.temp('armv7.o'), 'rb').read(), open(inputs[0], 'rb').read())
+
+    def testCreateArchive(self):
+        output = self.temp('libfoo.a')
+        createFat([self.fixture('libfoo-armv7.a'), self.fixture('libfoo-i386.a')], output, {'armv7' : 2, 'i386' : 2})
+        # fat file도 입력으로 쓸 수 있다.
+        createFat([output, self.fixture('libfoo-arm64.a')], self.temp('libfoo3.a'))
+        with MachOFile(self.temp('libfoo3.a')) as f:
+            # fat file에서 읽은 slice는 그 align을 그대로 쓴다.
+            self.assertEqual(f.getArchs(), ['armv7', 'i386', 'arm64'])
+            self.assertEqual([s.kind for s in f.slices], ['archive'] * 3)
+            self.assertEqual(str(f.getSlice('i386').getBuffer()), open(self.fixture('libfoo-i386.a'), 'rb').read())
+        with MachOFile(output) as f:
+            self.assertEqual([(s.offset, s.align) for s in f.slices], [(48, 2), (48 + 1064, 2)])
+
+    def testErrors(self):
+        self.assertRaises(MachOError, createFat, [self.fixture('foo-armv7.o'), self.fixture('libfoo-armv7.a')],
+                          self.temp('dup.a'))
+        self.assertFalse(os.path.exists(self.temp('dup.a')))
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+        open(self.temp('text'), 'w').write('hello world')
+        self.assertRaises(MachOError, MachOFile, self.temp('text'))
+        open(self.temp('empty'), 'w').close()
+        self.assertRaises(MachOError, MachOFile, self.temp('empty'))
+        # 다른 architecture object가 섞인 archive
+        data = open(self.fixture('libfoo-armv7.a'), 'rb').read()
+        i386 = open(self.fixture('foo-i386.o'), 'rb').read()
+        open(self.temp('mixed.a'), 'wb').write(data + '%-16s%-12s%-6s%-6s%-8s%-10d`\n' % ('i386.o', 0, 0, 0, 644, len(i386)) + i386)
+        self.assertRaises(MachOError, MachOFile, self.temp('mixed.a'))
+
+        self.assertEqual(getArchName(CPU_TYPE_ARM, 9 | 0x80000000), 'armv7')
+        self.assertRaises(MachOError, inspectLibrary, self.temp('text'))
+        self.assertEqual(getArchName(99, 1), 'cputype(99) cpusubtype(1)')
+        self.assertRaises(MachOError, getCpuType, 'armv99')
+
+    def testSymbols(self):
+        # llvm-nm libfoo-arm64.a 결과
+        with MachOFile(self.fixture('libfoo-arm64.a')) as f:
+            s = f.slices[0]
+            self.assertEqual([obj.name for obj in s.getObjects()], ['foo-arm64.o', 'bar-arm64.o'])
+            self.assertEqual([(sym.name, sym.type, sym.value, sym.member) for sym in s.getSymbols()],
+                             [('ltmp0', 't', 0, 'foo-arm64.o'), ('_foo', 'T', 0, 'foo-arm64.o'),
+                              ('_fooHelper', 'T', 4, 'foo-arm64.o'), ('_bar', 'U', 0, 'foo-arm64.o'),
+                              ('ltmp0', 't', 0, 'bar-arm64.o'), ('local', 't', 4, 'bar-arm64.o'),
+                              ('ltmp1', 'd', 8, 'bar-arm64.o'), ('_bar', 'T', 0, 'bar-arm64.o'),
+                              ('_barData', 'D', 8, 'bar-arm64.o')])
+        with MachOFile(self.fixture('foo-i386.o')) as f:
+            obj, = f.slices[0].getObjects()
+            self.assertEqual(obj.name, None)
+            self.assertEqual(obj.getSections(), [('__TEXT', '__text')])
+            self.assertEqual(sorted(sym.name for sym in obj.getSymbols() if sym.isExported()), ['_foo', '_fooHelper'])
+
+    def testScan(self):
+        output = self.temp('lib/libfoo.a')
+        os.mkdir(self.temp('lib'))
+        createFat([self.fixture('libfoo-%s.a' % arch) for arch in ('armv7', 'arm64')], output)
+        open(self.temp('lib/libbad.a'), 'w').write('!<arch>\n')
+        results = scanLibraries([self.temp('lib'), self.fixture('libfoo-i386.a')], threads=4)
+        self.assertEqual([r['path'] for r in results],
+                         sorted([self.fixture('libfoo-i386.a'), self.temp('lib/libbad.a'), output]))
+        results = dict((r['path'], r) for r in results)
+        self.assertTrue('no Mach-O object' in results[self.temp('lib/libbad.a')]['error'])
+        info = results[output]
+        self.assertEqual((info['fat'], info['archs']), (True, ['armv7', 'arm64']))
+        for s in info['slices']:
+            self.assertEqual(s['objects'], ['foo-%s.o' % s['arch'], 'bar-%s.o' % s['arch']])
+            self.assertEqual(s['symbols'], ['_bar', '_barData', '_foo', '_fooHelper'])
+        self.assertFalse('symbols' in scanLibraries(output, symbols=False)[0]['slices'][0])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,335 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+test와 benchmark에 사용할 Xcode project를 만든다.
+
+target, group 깊이, file, subproject, build setting 수를 정해서
+PbxProject.createPbxproj()로 만들고 PbxprojWriter로 저장한다. 같은 인자와
+seed로 만들면 guid까지 같은 파일이 나온다.
+
+usage:
+
+gen = PbxProjectGenerator(targets=3, depth=3, files=500, subprojects=2)
+pbx = gen.generate('/tmp/Gen/Gen.xcodeproj')
+
+# object 수로 크기를 정하는 경우
+pbx = PbxProjectGenerator.withObjects(50000).generate('/tmp/Big/Big.xcodeproj')
+
+'''
+
+__all__ = ['PbxProjectGenerator']
+
+import os
+import random
+import hashlib
+import unittest
+
+from pbxlib import PbxProject, PbxprojCache
+
+
+class PbxProjectGenerator(object):
+    '''project 생성기
+
+    |targets|       PBXNativeTarget 수
+    |application|   첫번째 target이 application인지. 나머지는 static library
+    |depth|         main group 아래 source group의 깊이
+    |breadth|       group 하나가 가지는 하위 group 수
+    |files|         source file 수. .m, .h 한쌍씩 만들고 .m은 target 하나가 compile한다.
+    |resources|     target마다 resources build phase에 넣을 file 수
+    |frameworks|    target마다 link하는 system framework 수
+    |subprojects|   같은 폴더에 만들고 첫번째 target이 link, dependency하는 project 수
+    |settings|      configuration마다 추가로 넣는 build setting 수
+    |configurations| build configuration 이름
+    |seed|          file 배치와 guid를 정하는 seed
+    '''
+    frameworkNames = ('Foundation', 'UIKit', 'CoreGraphics', 'QuartzCore', 'CoreData',
+                      'Security', 'SystemConfiguration', 'AudioToolbox', 'CoreText', 'MapKit')
+
+    def __init__(self, targets=1, depth=2, breadth=3, files=20, resources=2, frameworks=3,
+                 subprojects=0, settings=10, configurations=('Debug', 'Release'), seed=0,
+                 application=True):
+        self.targets = max(1, targets)
+        self.application = application
+        self.depth = depth
+        self.breadth = max(1, breadth)
+        self.files = files
+        self.resources = resources
+        self.frameworks = min(frameworks, len(self.frameworkNames))
+        self.subprojects = subprojects
+        self.settings = settings
+        self.configurations = tuple(configurations)
+        self.seed = seed
+
+    @classmethod
+    def withObjects(cls, nobjects, **kwargs):
+        '대략 |nobjects|개의 object를 가진 project를 만드는 생성기'
+        # source file 하나당 .m, .h file reference와 build file
+        files = max(1, nobjects / 3)
+        breadth = kwargs.pop('breadth', 2)
+        depth = kwargs.pop('depth', 1)
+        # leaf group 하나에 50개 정도의 file이 들어가도록
+        while breadth ** depth * 50 < files and depth < 6:
+            depth += 1
+        return cls(files=files, breadth=breadth, depth=depth, **kwargs)
+
+    def generate(self, path):
+        '''|path|( .xcodeproj 혹은 project.pbxproj )에 project를 만들어 저장한다.
+
+        subproject는 같은 폴더에 Sub<n>.xcodeproj로 만든다.
+        return : 만든 PbxProject
+        '''
+        pbxpath = os.path.abspath(path)
+        if not pbxpath.endswith('project.pbxproj'):
+            pbxpath = os.path.join(pbxpath, 'project.pbxproj')
+        xcodeproj = os.path.dirname(pbxpath)
+        if not os.path.isdir(xcodeproj):
+            os.makedirs(xcodeproj)
+
+        subprojects = []
+        for n in range(self.subprojects):
+            sub = PbxProjectGenerator(targets=1, depth=1, breadth=2, files=max(1, self.files / 10),
+                                      resources=0, frameworks=1, settings=self.settings / 2,
+                                      configurations=self.configurations, seed=self.seed * 1000 + n + 1,
+                                      application=False)
+            subpath = os.path.join(os.path.dirname(xcodeproj), 'Sub%d.xcodeproj' % n)
+            subprojects.append((subpath, sub.generate(subpath)))
+
+        pbx = _ProjectBuilder(self, pbxpath).build(subprojects)
+        pbx.save()
+        PbxprojCache.pop(pbxpath, None)
+        return pbx
+
+
+class _ProjectBuilder(object):
+    'PbxProjectGenerator.generate() 한번에 사용하는 상태'
+    def __init__(self, gen, pbxpath):
+        self.gen = gen
+        self.pbxpath = pbxpath
+        self.name = os.path.splitext(os.path.basename(os.path.dirname(pbxpath)))[0]
+        self.random = random.Random('%s:%s' % (gen.seed, self.name))
+        self.prefix = hashlib.md5('%s:%s' % (gen.seed, self.name)).hexdigest()[:8].upper()
+        self.counter = 0
+        self.pbx = None
+
+    def guid(self):
+        self.counter += 1
+        return '%s%016X' % (self.prefix, self.counter)
+
+    def add(self, obj):
+        guid = self.guid()
+        self.pbx.setObject(guid, obj)
+        return guid
+
+    def group(self, name, children=(), path=None):
+        obj = {'isa' : 'PBXGroup', 'children' : tuple(children), 'sourceTree' : '<group>'}
+        if path: obj['path'] = path
+        else: obj['name'] = name
+        return self.add(obj)
+
+    def fileref(self, path, filetype, sourceTree='<group>', name=None):
+        obj = {'isa' : 'PBXFileReference', 'lastKnownFileType' : filetype,
+               'path' : path, 'sourceTree' : sourceTree}
+        if name: obj['name'] = name
+        return self.add(obj)
+
+    def configurationList(self, settings):
+        'configuration마다 |settings|를 가진 XCConfigurationList'
+        configs = []
+        for configuration in self.gen.configurations:
+            buildSettings = dict(settings)
+            buildSettings['GCC_PREPROCESSOR_DEFINITIONS'] = ('$(inherited)', '%s=1' % configuration.upper())
+            buildSettings['GCC_OPTIMIZATION_LEVEL'] = configuration == 'Debug' and '0' or 's'
+            for i in range(self.gen.settings):
+                buildSettings['GEN_SETTING_%d' % i] = i % 3 and 'value%d' % i or '$(GEN_BASE) %d' % i
+            configs.append(self.add({'isa' : 'XCBuildConfiguration',
+                                     'buildSettings' : buildSettings,
+                                     'name' : configuration}))
+        return self.add({'isa' : 'XCConfigurationList',
+                         'buildConfigurations' : tuple(configs),
+                         'defaultConfigurationIsVisible' : '0',
+                         'defaultConfigurationName' : self.gen.configurations[-1]})
+
+    def build(self, subprojects):
+        gen = self.gen
+        self.pbx = pbx = PbxProject.createPbxproj(self.pbxpath)
+        project = pbx.objectForProject()
+
+        # project level setting
+        listguid = pbx.get('buildConfigurationList')
+        projectlist = self.configurationList({'SDKROOT' : 'iphoneos', 'GEN_BASE' : self.name,
+                                              'HEADER_SEARCH_PATHS' : ('$(inherited)', 'include')})
+        pbx.setObject(listguid, pbx.object(projectlist))
+        pbx.removeObject(projectlist)
+
+        # targets
+        products = []
+        targets = []
+        for t in range(gen.targets):
+            isapp = t == 0 and gen.application
+            name = t and '%sLib%d' % (self.name, t) or self.name
+            product = isapp and '%s.app' % name or 'lib%s.a' % name
+            products.append(self.fileref(product, isapp and 'wrapper.application' or 'archive.ar',
+                                         'BUILT_PRODUCTS_DIR'))
+            phases = [self.add({'isa' : isa, 'buildActionMask' : '2147483647', 'files' : (),
+                                'runOnlyForDeploymentPostprocessing' : '0'})
+                      for isa in ('PBXSourcesBuildPhase', 'PBXFrameworksBuildPhase', 'PBXResourcesBuildPhase')]
+            settings = {'PRODUCT_NAME' : '$(TARGET_NAME)',
+                        'OTHER_LDFLAGS' : isapp and ('-ObjC',) or (),
+                        'HEADER_SEARCH_PATHS' : ('$(inherited)', '%s/include' % name)}
+            targets.append(self.add({'isa' : 'PBXNativeTarget',
+                                     'buildConfigurationList' : self.configurationList(settings),
+                                     'buildPhases' : tuple(phases),
+                                     'buildRules' : (),
+                                     'dependencies' : (),
+                                     'name' : name,
+                                     'productName' : name,
+                                     'productReference' : products[-1],
+                                     'productType' : isapp and 'com.apple.product-type.application'
+                                                           or 'com.apple.product-type.library.static'}))
+
+        # source group tree
+        leaves = []
+        def makeGroups(name, level):
+            if level == gen.depth:
+                leaves.append([name, []])
+                return leaves[-1]
+            return [name, [makeGroups('%s_%d' % (name, i), level + 1) for i in range(gen.breadth)]]
+        tree = makeGroups(self.name, 0)
+
+        for i in range(gen.files):
+            leaf = leaves[self.random.randrange(len(leaves))]
+            target = targets[self.random.randrange(len(targets))]
+            source = self.fileref('Source%d.m' % i, 'sourcecode.c.objc')
+            header = self.fileref('Source%d.h' % i, 'sourcecode.c.h')
+            leaf[1].extend((header, source))
+            self._addToPhase(target, 'PBXSourcesBuildPhase', source)
+
+        def addGroups(node):
+            name, children = node
+            if children and isinstance(children[0], list):
+                children = [addGroups(child) for child in children]
+            return self.group(name, children, path=name)
+        sources = addGroups(tree)
+
+        # resources, frameworks
+        resources = []
+        frameworks = []
+        for t, target in enumerate(targets):
+            for i in range(gen.resources):
+                ref = self.fileref('Image%d_%d.png' % (t, i), 'image.png')
+                resources.append(ref)
+                self._addToPhase(target, 'PBXResourcesBuildPhase', ref)
+            for name in gen.frameworkNames[:gen.frameworks]:
+                ref = self.fileref('System/Library/Frameworks/%s.framework' % name, 'wrapper.framework',
+                                   'SDKROOT', '%s.framework' % name)
+                frameworks.append(ref)
+                self._addToPhase(target, 'PBXFrameworksBuildPhase', ref)
+
+        # subprojects
+        libraries = []
+        projectrefs = []
+        for subpath, sub in subprojects:
+            libraries.append(self._addSubproject(targets[0], subpath, sub, projectrefs))
+
+        maingroup = [sources,
+                     self.group('Resources', resources),
+                     self.group('Frameworks', frameworks)]
+        if libraries:
+            maingroup.append(self.group('Libraries', libraries))
+        productgroup = self.group('Products', products)
+        maingroup.append(productgroup)
+
+        project['mainGroup'] = self.group(self.name, maingroup)
+        project['productRefGroup'] = productgroup
+        project['targets'] = tuple(targets)
+        if projectrefs:
+            project['projectReferences'] = tuple(projectrefs)
+        pbx.obj = pbx.objectForProject()
+        return pbx
+
+    def _addToPhase(self, target, isa, fileref):
+        buildfile = self.add({'isa' : 'PBXBuildFile', 'fileRef' : fileref})
+        for guid in self.pbx.object(target)['buildPhases']:
+            phase = self.pbx.object(guid)
+            if phase['isa'] == isa:
+                phase['files'] += (buildfile,)
+                return buildfile
+
+    def _addSubproject(self, target, subpath, sub, projectrefs):
+        'Xcode가 다른 project를 추가할때 만드는 object들'
+        relpath = os.path.relpath(subpath, os.path.dirname(os.path.dirname(self.pbxpath)))
+        portal = self.fileref(relpath, 'wrapper.pb-project', name=os.path.basename(subpath))
+
+        subtarget = sub.getPbxTargets()[0]
+        libname = subtarget.getProductFileName()
+        remote = self.add({'isa' : 'PBXContainerItemProxy', 'containerPortal' : portal, 'proxyType' : '2',
+                           'remoteGlobalIDString' : subtarget.get('productReference'),
+                           'remoteInfo' : subtarget.getName()})
+        library = self.add({'isa' : 'PBXReferenceProxy', 'fileType' : 'archive.ar', 'path' : libname,
+                            'remoteRef' : remote, 'sourceTree' : 'BUILT_PRODUCTS_DIR'})
+        projectrefs.append({'ProductGroup' : self.group('Products', (library,)), 'ProjectRef' : portal})
+        self._addToPhase(target, 'PBXFrameworksBuildPhase', library)
+
+        proxy = self.add({'isa' : 'PBXContainerItemProxy', 'containerPortal' : portal, 'proxyType' : '1',
+                          'remoteGlobalIDString' : subtarget.getGuid(), 'remoteInfo' : subtarget.getName()})
+        dependency = self.add({'isa' : 'PBXTargetDependency', 'name' : subtarget.getName(), 'targetProxy' : proxy})
+        targetobj = self.pbx.object(target)
+        targetobj['dependencies'] += (dependency,)
+        return portal
+
+
+class PbxProjectGeneratorTestCase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tempdir)
+
+    def _path(self, *names):
+        return os.path.join(self.tempdir, *names)
+
+    def testValid(self):
+        gen = PbxProjectGenerator(targets=3, depth=2, breadth=2, files=30, subprojects=2)
+        gen.generate(self._path('Gen', 'Gen.xcodeproj'))
+
+        pbx = PbxProject._parsePbxproj(self._path('Gen', 'Gen.xcodeproj', 'project.pbxproj'))
+        self.assertEqual(pbx.validate(), [])
+        targets = pbx.getPbxTargets()
+        self.assertEqual(sorted(t.getName() for t in targets), ['Gen', 'GenLib1', 'GenLib2'])
+        self.assertEqual(sum(len(t.getBuildSourcesPhase().get('files')) for t in targets), 30)
+        self.assertEqual(len(pbx.getAllObjects(isa='PBXGroup', name='Products')), 3)
+
+        app = [t for t in targets if t.getName() == 'Gen'][0]
+        self.assertEqual(len(app.get('dependencies')), 2)
+        self.assertTrue('System/Library/Frameworks/Foundation.framework' in app.getFrameworks())
+        self.assertEqual(app.getBuildSetting('PRODUCT_NAME', 'Debug'), 'Gen')
+        self.assertEqual(app.getBuildSetting('GEN_SETTING_0', 'Release'), 'Gen 0')
+
+        for n in range(2):
+            sub = PbxProject._parsePbxproj(self._path('Gen', 'Sub%d.xcodeproj' % n, 'project.pbxproj'))
+            self.assertEqual(sub.validate(), [])
+            self.assertEqual(sub.getPbxTargets()[0].getProductFileName(), 'libSub%d.a' % n)
+
+    def testDeterministic(self):
+        gen = PbxProjectGenerator(targets=2, files=50, subprojects=1, seed=7)
+        contents = []
+        for name in ('a', 'b'):
+            gen.generate(self._path(name, 'Gen.xcodeproj'))
+            contents.append([open(self._path(name, p, 'project.pbxproj')).read()
+                             for p in ('Gen.xcodeproj', 'Sub0.xcodeproj')])
+        self.assertEqual(contents[0], contents[1])
+
+        PbxProjectGenerator(targets=2, files=50, subprojects=1, seed=8).generate(self._path('c', 'Gen.xcodeproj'))
+        self.assertNotEqual(open(self._path('c', 'Gen.xcodeproj', 'project.pbxproj')).read(), contents[0][0])
+
+    def testSize(self):
+        pbx = PbxProjectGenerator.withObjects(3000).generate(self._path('Big.xcodeproj'))
+        self.assertTrue(2800 < len(pbx.objects()) < 3300, len(pbx.objects()))
+        self.assertEqual(pbx.validate(), [])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,537 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+여러 Xcode project를 SQLite에 index해서 조회하기 위한 library
+
+project 파일을 병렬로 읽어서 object, target, build phase, file 경로,
+build setting을 SQLite database에 저장한다. 다시 update하면 파일의
+sha1이 바뀐 project만 다시 읽는다.
+
+usage:
+
+index = PbxIndex('~/.pbxindex.db')
+index.update(['~/src'])                         # ~/src 아래의 .xcodeproj를 모두 index
+index.findTargetsLinking('libFoo.a')            # [(project path, target name), ...]
+index.findTargetsCompiling('main.m')
+index.findSettings('OTHER_LDFLAGS')
+
+'''
+
+__all__ = ['PbxIndex', 'PbxIndexException']
+
+import os
+import sys
+import time
+import hashlib
+import sqlite3
+import itertools
+import multiprocessing
+import unittest
+
+from pbxlib import PbxProject, PbxprojCache, _targets, _isobject
+
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS projects (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT UNIQUE NOT NULL,
+    sha1        TEXT,
+    mtime       REAL,
+    size        INTEGER,
+    indexed     REAL,
+    error       TEXT
+);
+CREATE TABLE IF NOT EXISTS objects (
+    project     INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    guid        TEXT NOT NULL,
+    isa         TEXT,
+    name        TEXT,
+    path        TEXT
+);
+CREATE INDEX IF NOT EXISTS objects_guid ON objects(project, guid);
+CREATE INDEX IF NOT EXISTS objects_isa ON objects(isa);
+
+CREATE TABLE IF NOT EXISTS targets (
+    project     INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    guid        TEXT NOT NULL,
+    isa         TEXT,
+    name        TEXT,
+    productName TEXT,
+    productType TEXT
+);
+CREATE INDEX IF NOT EXISTS targets_guid ON targets(project, guid);
+CREATE INDEX IF NOT EXISTS targets_name ON targets(name);
+
+CREATE TABLE IF NOT EXISTS buildphases (
+    project     INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    guid        TEXT NOT NULL,
+    target      TEXT NOT NULL,
+    isa         TEXT,
+    name        TEXT
+);
+CREATE INDEX IF NOT EXISTS buildphases_target ON buildphases(project, target);
+
+CREATE TABLE IF NOT EXISTS files (
+    project     INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    guid        TEXT NOT NULL,
+    filename    TEXT,
+    path        TEXT,
+    sourceTree  TEXT,
+    fileType    TEXT,
+    fullpath    TEXT
+);
+CREATE INDEX IF NOT EXISTS files_guid ON files(project, guid);
+CREATE INDEX IF NOT EXISTS files_filename ON files(filename);
+CREATE INDEX IF NOT EXISTS files_fullpath ON files(fullpath);
+
+CREATE TABLE IF NOT EXISTS buildfiles (
+    project     INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    target      TEXT NOT NULL,
+    phase       TEXT NOT NULL,
+    phaseisa    TEXT,
+    fileref     TEXT
+);
+CREATE INDEX IF NOT EXISTS buildfiles_fileref ON buildfiles(project, fileref);
+CREATE INDEX IF NOT EXISTS buildfiles_target ON buildfiles(project, target);
+
+CREATE TABLE IF NOT EXISTS settings (
+    project     INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    target      TEXT,
+    configuration TEXT,
+    key         TEXT,
+    value       TEXT
+);
+CREATE INDEX IF NOT EXISTS settings_key ON settings(key);
+CREATE INDEX IF NOT EXISTS settings_project ON settings(project, target);
+'''
+
+# _extractProject()가 만드는 row의 column ( project column 제외 )
+_columns = {
+    'objects'     : ('guid', 'isa', 'name', 'path'),
+    'targets'     : ('guid', 'isa', 'name', 'productName', 'productType'),
+    'buildphases' : ('guid', 'target', 'isa', 'name'),
+    'files'       : ('guid', 'filename', 'path', 'sourceTree', 'fileType', 'fullpath'),
+    'buildfiles'  : ('target', 'phase', 'phaseisa', 'fileref'),
+    'settings'    : ('target', 'configuration', 'key', 'value'),
+}
+
+
+class PbxIndexException(Exception):
+    'index database 관련 exception'
+    pass
+
+
+def _pbxpath(path):
+    '.xcodeproj 혹은 project.pbxproj 경로에서 project.pbxproj 경로'
+    path = os.path.abspath(os.path.expanduser(path))
+    if os.path.isdir(path):
+        path = os.path.join(path, 'project.pbxproj')
+    return path
+
+def _sha1(path):
+    h = hashlib.sha1()
+    f = open(path, 'rb')
+    try:
+        for chunk in iter(lambda: f.read(1024 * 1024), ''):
+            h.update(chunk)
+    finally:
+        f.close()
+    return h.hexdigest()
+
+def _settingValue(value):
+    if isinstance(value, (list, tuple)):
+        return ' '.join(value)
+    return unicode(value)
+
+def _fullpaths(objects, projectdir):
+    '''file reference guid -> 전체 경로
+
+    group의 path를 따라 올라가서 경로를 만든다. SDKROOT, BUILT_PRODUCTS_DIR 같은
+    sourceTree는 $(SDKROOT)/path 처럼 남겨둔다.
+    '''
+    parents = {}
+    for guid, obj in objects.iteritems():
+        for child in obj.get('children') or ():
+            parents[child] = guid
+
+    cache = {}
+    def fullpath(guid):
+        if guid in cache: return cache[guid]
+        obj = objects.get(guid) or {}
+        path = obj.get('path') or ''
+        tree = obj.get('sourceTree') or '<group>'
+
+        if tree == '<absolute>' or os.path.isabs(path):
+            ret = path
+        elif tree == 'SOURCE_ROOT':
+            ret = os.path.join(projectdir, path)
+        elif tree == '<group>':
+            parent = parents.get(guid)
+            base = parent and fullpath(parent) or projectdir
+            ret = os.path.join(base, path)
+        else:
+            ret = os.path.join('$(%s)' % tree, path)
+
+        ret = cache[guid] = os.path.normpath(ret)
+        return ret
+
+    return fullpath
+
+def _extractProject(job):
+    '''project 하나를 읽어서 database에 넣을 row들을 만든다.
+
+    multiprocessing.Pool의 worker에서 실행되므로 pickle할 수 있는 값만 반환한다.
+    return : (path, sha1, rows, error)
+    '''
+    path, sha1 = job
+    pbxpath = _pbxpath(path)
+    try:
+        try:
+            pbx = PbxProject.loadPbxproj(pbxpath)
+            if not pbx:
+                return path, sha1, None, 'cannot load project'
+            return path, sha1, _projectRows(pbx, os.path.dirname(path)), None
+        except (Exception, SystemExit), e:
+            # lexer는 잘못된 문자를 만나면 sys.exit()를 호출한다.
+            return path, sha1, None, '%s: %s' % (e.__class__.__name__, e)
+    finally:
+        # 같은 경로를 다시 읽을 수 있도록 cache에서 뺀다.
+        PbxprojCache.pop(os.path.abspath(pbxpath), None)
+
+def _projectRows(pbx, projectdir):
+    'table 이름 -> row list'
+    rows = dict((table, []) for table in _columns)
+    objects = dict((guid, obj) for guid, obj in pbx.objects().iteritems() if _isobject(obj))
+    fullpath = _fullpaths(objects, projectdir)
+
+    for guid, obj in objects.iteritems():
+        isa = obj.get('isa')
+        rows['objects'].append((guid, isa, obj.get('name'), obj.get('path')))
+
+        if isa == 'PBXFileReference':
+            path = obj.get('path') or obj.get('name') or ''
+            rows['files'].append((guid, os.path.basename(path), obj.get('path'), obj.get('sourceTree'),
+                                  obj.get('lastKnownFileType') or obj.get('explicitFileType'),
+                                  fullpath(guid)))
+
+        elif isa in _targets:
+            rows['targets'].append((guid, isa, obj.get('name'), obj.get('productName'), obj.get('productType')))
+            for phaseguid in obj.get('buildPhases') or ():
+                phase = objects.get(phaseguid)
+                if not phase: continue
+                rows['buildphases'].append((phaseguid, guid, phase.get('isa'), phase.get('name')))
+                for buildfile in phase.get('files') or ():
+                    fileref = (objects.get(buildfile) or {}).get('fileRef')
+                    rows['buildfiles'].append((guid, phaseguid, phase.get('isa'), fileref))
+
+        if isa in _targets or isa == 'PBXProject':
+            configlist = objects.get(obj.get('buildConfigurationList')) or {}
+            owner = isa != 'PBXProject' and guid or None
+            for configguid in configlist.get('buildConfigurations') or ():
+                config = objects.get(configguid) or {}
+                for key, value in (config.get('buildSettings') or {}).iteritems():
+                    rows['settings'].append((owner, config.get('name'), key, _settingValue(value)))
+
+    return rows
+
+
+class PbxIndex(object):
+    '''여러 project를 index하는 SQLite database.
+
+    update()로 project를 index하고 find...() 함수로 조회한다.
+    '''
+    def __init__(self, dbpath=':memory:'):
+        if dbpath != ':memory:':
+            dbpath = os.path.expanduser(dbpath)
+        self.dbpath = dbpath
+        self.db = sqlite3.connect(dbpath)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.executescript(_schema)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    #
+    # index
+    #
+
+    @staticmethod
+    def findProjects(paths):
+        '|paths|( .xcodeproj, project.pbxproj 혹은 directory ) 아래의 .xcodeproj 경로'
+        ret = []
+        for path in paths:
+            path = os.path.abspath(os.path.expanduser(path))
+            if os.path.basename(path) == 'project.pbxproj':
+                path = os.path.dirname(path)
+
+            if path.endswith('.xcodeproj'):
+                if os.path.isfile(_pbxpath(path)):
+                    ret.append(path)
+                continue
+
+            for root, dirs, _ in os.walk(path):
+                for d in list(dirs):
+                    if d.endswith('.xcodeproj'):
+                        dirs.remove(d)
+                        if os.path.isfile(os.path.join(root, d, 'project.pbxproj')):
+                            ret.append(os.path.join(root, d))
+                    elif d.startswith('.') or d.endswith(('.xcworkspace', '.framework', '.app', '.bundle')):
+                        dirs.remove(d)
+        return sorted(set(ret))
+
+    def update(self, paths, processes=None, prune=True):
+        '''|paths| 아래의 project를 index한다.
+
+        크기와 mtime이 바뀐 project만 sha1을 계산하고, sha1이 바뀐 project만
+        |processes|개의 process에서 병렬로 다시 읽는다. |prune|이면 |paths|
+        아래에서 없어진 project를 지운다.
+
+        return : (다시 읽은 project 수, 바뀌지 않은 project 수, 지운 project 수)
+        '''
+        projects = self.findProjects(paths)
+        known = dict((row[0], row[1:]) for row in
+                     self.db.execute('SELECT path, sha1, mtime, size FROM projects'))
+
+        jobs = []
+        unchanged = 0
+        for path in projects:
+            st = os.stat(_pbxpath(path))
+            old = known.get(path)
+            if old and old[1] == st.st_mtime and old[2] == st.st_size:
+                unchanged += 1
+                continue
+
+            sha1 = _sha1(_pbxpath(path))
+            if old and old[0] == sha1:
+                self.db.execute('UPDATE projects SET mtime = ?, size = ? WHERE path = ?',
+                                (st.st_mtime, st.st_size, path))
+                unchanged += 1
+                continue
+            jobs.append((path, sha1))
+
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        pool = None
+        if processes > 1 and len(jobs) > 1:
+            pool = multiprocessing.Pool(min(processes, len(jobs)))
+            results = pool.imap_unordered(_extractProject, jobs)
+        else:
+            results = itertools.imap(_extractProject, jobs)
+
+        try:
+            for path, sha1, rows, error in results:
+                self._store(path, sha1, rows, error)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        removed = 0
+        if prune:
+            roots = [os.path.abspath(os.path.expanduser(p)) for p in paths]
+            current = set(projects)
+            for path in known:
+                if path in current: continue
+                if any(path == r or path.startswith(r.rstrip(os.sep) + os.sep) for r in roots):
+                    self.removeProject(path)
+                    removed += 1
+
+        self.db.commit()
+        return len(jobs), unchanged, removed
+
+    def _store(self, path, sha1, rows, error):
+        'project 하나의 row를 새로 넣는다.'
+        st = os.stat(_pbxpath(path))
+        self.removeProject(path)
+        cur = self.db.execute('INSERT INTO projects (path, sha1, mtime, size, indexed, error) VALUES (?, ?, ?, ?, ?, ?)',
+                              (path, sha1, st.st_mtime, st.st_size, time.time(), error))
+        project = cur.lastrowid
+        if not rows: return
+
+        for table, columns in _columns.iteritems():
+            sql = 'INSERT INTO %s (project, %s) VALUES (?, %s)' % (table, ', '.join(columns), ', '.join('?' * len(columns)))
+            self.db.executemany(sql, ((project,) + row for row in rows[table]))
+
+    def removeProject(self, path):
+        self.db.execute('DELETE FROM projects WHERE path = ?', (path,))
+
+    #
+    # query
+    #
+
+    def query(self, sql, params=()):
+        'sql을 직접 실행한 결과 list'
+        return self.db.execute(sql, params).fetchall()
+
+    def getProjects(self):
+        '(path, error) list'
+        return self.query('SELECT path, error FROM projects ORDER BY path')
+
+    def getTargets(self, name=None):
+        '(project path, target name, product type) list'
+        sql = 'SELECT p.path, t.name, t.productType FROM targets t JOIN projects p ON p.id = t.project'
+        if name is None:
+            return self.query(sql + ' ORDER BY p.path, t.name')
+        return self.query(sql + ' WHERE t.name = ? ORDER BY p.path', (name,))
+
+    def _findTargetsWithFile(self, phaseisa, filename):
+        if os.path.isabs(filename):
+            cond, params = 'f.fullpath = ?', (os.path.normpath(filename),)
+        elif os.sep in filename:
+            # LIKE는 _, %를 wildcard로 쓰고 대소문자를 구분하지 않으므로 끝부분을 직접 비교한다.
+            suffix = os.sep + filename
+            cond, params = 'substr(f.fullpath, -length(?)) = ?', (suffix, suffix)
+        else:
+            cond, params = 'f.filename = ?', (filename,)
+
+        return self.query('''SELECT DISTINCT p.path, t.name FROM files f
+                              JOIN buildfiles b ON b.project = f.project AND b.fileref = f.guid
+                              JOIN targets t ON t.project = b.project AND t.guid = b.target
+                              JOIN projects p ON p.id = f.project
+                              WHERE b.phaseisa = ? AND %s ORDER BY p.path, t.name''' % cond,
+                          (phaseisa,) + params)
+
+    def findTargetsLinking(self, library):
+        '|library|( libFoo.a, Foo.framework )를 link하는 (project path, target name) list'
+        return self._findTargetsWithFile('PBXFrameworksBuildPhase', library)
+
+    def findTargetsCompiling(self, filename):
+        '''|filename|을 compile하는 (project path, target name) list
+
+        |filename|은 파일 이름, 경로 뒷부분( src/main.m ), 혹은 절대 경로
+        '''
+        return self._findTargetsWithFile('PBXSourcesBuildPhase', filename)
+
+    def findFiles(self, pattern):
+        '전체 경로가 glob |pattern|에 맞는 (project path, file path) list'
+        return self.query('''SELECT p.path, f.fullpath FROM files f JOIN projects p ON p.id = f.project
+                              WHERE f.fullpath GLOB ? ORDER BY p.path, f.fullpath''', (pattern,))
+
+    def findSettings(self, key, value=None):
+        '''build setting |key|( |value|를 포함하는 )를 가진
+        (project path, target name 혹은 None, configuration, value) list
+        '''
+        sql = '''SELECT p.path, t.name, s.configuration, s.value FROM settings s
+                 JOIN projects p ON p.id = s.project
+                 LEFT JOIN targets t ON t.project = s.project AND t.guid = s.target
+                 WHERE s.key = ?'''
+        params = (key,)
+        if value is not None:
+            sql += ' AND s.value LIKE ?'
+            params += ('%' + value + '%',)
+        return self.query(sql + ' ORDER BY p.path, t.name, s.configuration', params)
+
+
+#
+# test
+#
+
+def _createTestProject(dirpath, name, libraries=(), sources=(), settings=None):
+    'test용 project를 만들어서 저장하고 .xcodeproj 경로를 반환'
+    from pbxlib import PbxGroup, PbxFileReference, PbxBuildFile, PbxBuildConfiguration
+
+    projpath = os.path.join(dirpath, name + '.xcodeproj')
+    os.makedirs(projpath)
+    pbx = PbxProject.createPbxproj(os.path.join(projpath, 'project.pbxproj'))
+    maingroup = PbxGroup.createObject(pbx, name)
+    pbx.set('mainGroup', maingroup.getGuid())
+    frameworks = PbxGroup.createObject(pbx, 'Frameworks')
+    maingroup.appendValue('children', frameworks.getGuid())
+
+    phases = []
+    for isa, names, group in (('PBXSourcesBuildPhase', sources, maingroup),
+                              ('PBXFrameworksBuildPhase', libraries, frameworks)):
+        files = []
+        for filename in names:
+            fileref = PbxFileReference.createObject(pbx, filename)
+            group.appendValue('children', fileref.getGuid())
+            files.append(PbxBuildFile.createObject(pbx, fileref.getGuid()).getGuid())
+        guid = pbx.createPbxGuid()
+        pbx.setObject(guid, {'isa' : isa, 'buildActionMask' : '2147483647', 'files' : tuple(files),
+                             'runOnlyForDeploymentPostprocessing' : '0'})
+        phases.append(guid)
+
+    config = PbxBuildConfiguration.createObject(pbx, 'Debug', dict(settings or {}))
+    listguid = pbx.createPbxGuid()
+    pbx.setObject(listguid, {'isa' : 'XCConfigurationList', 'buildConfigurations' : (config.getGuid(),),
+                             'defaultConfigurationIsVisible' : '0', 'defaultConfigurationName' : 'Debug'})
+    guid = pbx.createPbxGuid()
+    pbx.setObject(guid, {'isa' : 'PBXNativeTarget', 'buildConfigurationList' : listguid,
+                         'buildPhases' : tuple(phases), 'dependencies' : (), 'name' : name,
+                         'productName' : name, 'productType' : 'com.apple.product-type.application'})
+    pbx.appendValue('targets', guid)
+    pbx.save()
+    return projpath
+
+
+class PbxIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tempdir = tempfile.mkdtemp()
+        self.app = _createTestProject(self.tempdir, 'App', libraries=('libFoo.a', 'UIKit.framework'),
+                                      sources=('main.m', 'src/App.m'), settings={'OTHER_LDFLAGS' : ('-ObjC', '-lz')})
+        self.lib = _createTestProject(os.path.join(self.tempdir, 'lib'), 'Lib', sources=('Foo.m', 'main.m', 'Src/myXfile.m'),
+                                      settings={'GCC_OPTIMIZATION_LEVEL' : '0'})
+        self.index = PbxIndex()
+
+    def tearDown(self):
+        import shutil
+        self.index.close()
+        shutil.rmtree(self.tempdir)
+
+    def testFindProjects(self):
+        self.assertEqual(PbxIndex.findProjects([self.tempdir]), sorted([self.app, self.lib]))
+        self.assertEqual(PbxIndex.findProjects([os.path.join(self.app, 'project.pbxproj')]), [self.app])
+
+    def testQuery(self):
+        self.assertEqual(self.index.update([self.tempdir], processes=2), (2, 0, 0))
+        self.assertEqual(self.index.getProjects(), [(self.app, None), (self.lib, None)])
+
+        self.assertEqual(self.index.findTargetsLinking('libFoo.a'), [(self.app, 'App')])
+        self.assertEqual(self.index.findTargetsLinking('libBar.a'), [])
+        self.assertEqual(self.index.findTargetsCompiling('main.m'), [(self.app, 'App'), (self.lib, 'Lib')])
+        self.assertEqual(self.index.findTargetsCompiling('src/App.m'), [(self.app, 'App')])
+        # _, %는 wildcard가 아니고 대소문자를 구분한다.
+        self.assertEqual(self.index.findTargetsCompiling('src/my_file.m'), [])
+        self.assertEqual(self.index.findTargetsCompiling('Src/my%.m'), [])
+        self.assertEqual(self.index.findTargetsCompiling('Src/myXfile.m'), [(self.lib, 'Lib')])
+        self.assertEqual(self.index.findSettings('OTHER_LDFLAGS', '-lz'), [(self.app, 'App', 'Debug', '-ObjC -lz')])
+        self.assertEqual(len(self.index.findFiles('*/src/*.m')), 1)
+        self.assertEqual(self.index.getTargets('Lib'), [(self.lib, 'Lib', 'com.apple.product-type.application')])
+
+    def testIncremental(self):
+        self.assertEqual(self.index.update([self.tempdir], processes=1), (2, 0, 0))
+        self.assertEqual(self.index.update([self.tempdir], processes=1), (0, 2, 0))
+
+        # 내용이 바뀐 project만 다시 읽는다.
+        pbx = PbxProject.loadPbxproj(self.lib)
+        pbx.getPbxTargets()[0].set('name', 'Renamed')
+        pbx.save()
+        PbxprojCache.pop(os.path.abspath(_pbxpath(self.lib)))
+        os.utime(_pbxpath(self.lib), (0, 0))
+        self.assertEqual(self.index.update([self.tempdir], processes=1), (1, 1, 0))
+        self.assertEqual(self.index.getTargets('Renamed'), [(self.lib, 'Renamed', 'com.apple.product-type.application')])
+        self.assertEqual(self.index.getTargets('Lib'), [])
+
+        # mtime만 바뀐 경우는 sha1만 비교한다.
+        os.utime(_pbxpath(self.app), (0, 0))
+        self.assertEqual(self.index.update([self.tempdir], processes=1), (0, 2, 0))
+
+        import shutil
+        shutil.rmtree(self.lib)
+        self.assertEqual(self.index.update([self.tempdir], processes=1), (0, 1, 1))
+        self.assertEqual(self.index.query('SELECT COUNT(*) FROM targets'), [(1,)])
+
+    def testError(self):
+        open(_pbxpath(self.lib), 'w').write('// !$*UTF8*$!\n{ objects = { ')
+        self.index.update([self.tempdir], processes=1)
+        projects = dict(self.index.getProjects())
+        self.assertEqual(projects[self.app], None)
+        self.assertTrue(projects[self.lib])
+
+
+if __name__=='__main__':
+    unittest.main()
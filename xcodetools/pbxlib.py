@@ -18,21 +18,142 @@ ref : http://www.jayconrod.com/cgi/view_post.py?37
 """
 
 import os
+import errno
+import fcntl
 import hashlib
 import sys
 import re
+import time
 import copy
+import fnmatch
+import tempfile
 import unittest
 import operator
+import threading
+import functools
+import contextlib
+import itertools
+import multiprocessing
+from array import array
 
 __author__ = 'jinsub ahn <jinny831@gmail.com>'
 
 __all__ = ['PbxBuildConfiguration', 'PbxBuildConfigurationList', 'PbxBuildFile', 'PbxBuildPhase', 
-           'PbxContainerItemProxy', 'PbxFileReference', 'PbxFrameworksBuildPhase', 'PbxGroup', 
-           'PbxHeadersBuildPhase', 'PbxNativeTarget', 'PbxObject', 'PbxProject', 'PbxReferenceProxy', 
-           'PbxResourcesBuildPhase', 'PbxSourcesBuildPhase', 'PbxTargetDependency', 'PbxVariantGroup', 
-           'PbxVersionGroup', 'Pbxfile', 'PbxprojCache', 'PbxprojParser', 'PbxprojParserExcpetion', 
-           'PbxprojTestCase', 'PbxprojWriter']
+           'PbxBuildSettingsEditor', 'PbxBuildSettingsResolver', 'PbxColumnTable', 
+           'PbxColumnarObjects', 'PbxColumnarRow', 'PbxContainerItemProxy', 'PbxCowObjects', 
+           'PbxFileLock', 'PbxFileReference', 'PbxFrameworksBuildPhase', 'PbxFrozenObjects', 
+           'PbxGroup', 'PbxGroupIndex', 'PbxHeadersBuildPhase', 'PbxInstrumentation', 
+           'PbxNativeTarget', 'PbxObject', 'PbxProject', 'PbxProjectSnapshot', 'PbxRWLock', 
+           'PbxReferenceProxy', 'PbxResourcesBuildPhase', 'PbxSourcesBuildPhase', 
+           'PbxTargetDependency', 'PbxVariantGroup', 'PbxVersionGroup', 'Pbxfile', 'PbxprojCache', 
+           'PbxprojConflictException', 'PbxprojParser', 'PbxprojParserExcpetion', 
+           'PbxprojSettingsException', 'PbxprojStats', 'PbxprojTestCase', 'PbxprojValidator', 
+           'PbxprojWriter', 'Xcconfig', 'XcconfigCache']
+
+#
+# instrumentation
+#
+
+class PbxInstrumentation(object):
+    '''단계별 시간( timer )과 개수( counter )를 모으는 registry
+    
+    lex, parse, load, save, createPbxObject 등의 시간과 token, object, 
+    scan한 object, 저장한 byte 수를 모은다. 꺼져 있으면( 기본 ) 측정하는 곳은 
+    enabled만 확인하고 넘어간다. timer는 겹칠 수 있다. ( load 안에 lex, parse )
+    
+    listener는 측정할때마다 listener(kind, name, value)로 불린다. 
+    kind는 'time'( 초 ) 혹은 'count'
+    
+    usage:
+    
+    PbxprojStats.enable()
+    pbx = PbxProject.loadPbxproj(path)
+    PbxprojStats.report()
+    '''
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.timers = {}            # name -> [calls, seconds]
+        self.counters = {}          # name -> value
+        self.listeners = []
+    
+    def enable(self, enabled=True):
+        self.enabled = enabled
+    
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.counters.clear()
+    
+    def addListener(self, listener):
+        self.listeners.append(listener)
+    
+    def removeListener(self, listener):
+        self.listeners.remove(listener)
+    
+    def addTime(self, name, seconds):
+        with self.lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = [0, 0.0]
+            timer[0] += 1
+            timer[1] += seconds
+        for listener in self.listeners:
+            listener('time', name, seconds)
+    
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for listener in self.listeners:
+            listener('count', name, value)
+    
+    @contextlib.contextmanager
+    def timer(self, name):
+        'with 안의 시간을 |name|에 더한다. ( enabled일때만 )'
+        if not self.enabled:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.time() - start)
+    
+    def getStats(self):
+        "{ 'timers' : { name : (calls, seconds) }, 'counters' : { name : value } }"
+        with self.lock:
+            return {'timers' : dict((k, tuple(v)) for k, v in self.timers.iteritems()),
+                    'counters' : dict(self.counters)}
+    
+    def report(self, out=None):
+        '시간이 오래 걸린 순서로 출력한다.'
+        out = out or sys.stderr
+        stats = self.getStats()
+        out.write('%-32s %8s %12s %10s\n' % ('timer', 'calls', 'total(ms)', 'avg(ms)'))
+        for name, (calls, seconds) in sorted(stats['timers'].iteritems(), key=lambda x: -x[1][1]):
+            out.write('%-32s %8d %12.1f %10.3f\n' % (name, calls, seconds * 1000, seconds * 1000 / calls))
+        if stats['counters']:
+            out.write('\n%-32s %8s\n' % ('counter', 'value'))
+            for name, value in sorted(stats['counters'].iteritems()):
+                out.write('%-32s %8d\n' % (name, value))
+
+# pbxlib 전체에서 사용하는 registry
+PbxprojStats = PbxInstrumentation()
+
+def _timed(name):
+    '호출 시간을 PbxprojStats의 |name| timer에 더하는 decorator'
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PbxprojStats.enabled:
+                return func(*args, **kwargs)
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PbxprojStats.addTime(name, time.time() - start)
+        return wrapper
+    return decorator
 
 #
 # lexer 
@@ -60,33 +181,132 @@ token_exprs = [
     (r'"([^"\\\r\n]*(?:\\.[^"\\\r\n]*?)*?)"',         STRING),
 ]
 
-def lex(characters, token_exprs):
-    ' lexer '
-    pos = 0
+@_timed('lex')
+def lex(characters, token_exprs, internStrings=True):
+    ''' lexer 
+    
+    |internStrings|이면 STRING token을 intern한다. isa, sourceTree 같은 key와 값, 
+    여러번 나오는 guid가 하나의 문자열을 공유하므로 읽은 project의 메모리가 줄어든다.
+    ( ascii로만 된 문자열은 unicode 대신 str이 된다. )
+    '''
+    regexes = [(re.compile(pattern), tag) for pattern, tag in token_exprs]
+    tokens, _ = _lexrange(characters, regexes, 0, len(characters), internStrings, {})
+    if PbxprojStats.enabled:
+        PbxprojStats.count('lex.tokens', len(tokens))
+    return tokens
+
+def _lexrange(characters, regexes, pos, end, internStrings, strings, strict=True):
+    '''|characters|를 |pos|부터 |end|까지 lex한다.
+    
+    마지막 token은 |end|를 넘어갈 수 있다. 잘못된 글자가 있으면 |strict|이면 
+    종료하고 아니면 마지막 token이 끝난 위치로 None을 돌려준다.
+    return : (tokens, 마지막 token이 끝난 위치)
+    '''
     tokens = []
-    while pos < len(characters):
+    while pos < end:
         match = None
-        for token_expr in token_exprs:
-            pattern, tag = token_expr
-            regex = re.compile(pattern)
+        for regex, tag in regexes:
             match = regex.match(characters, pos)
             if match:
-                if len(match.groups()) > 0:
+                if regex.groups > 0:
                     text = match.group(1)
                 else:
                     text = match.group(0)
                 if tag:
-                    token = (text, tag)
-                    if tag:
-                        tokens.append(token)
+                    if tag is STRING and internStrings:
+                        text = _internstr(text, strings)
+                    tokens.append((text, tag))
                 break
         if not match:
+            if not strict: return tokens, None
             sys.stderr.write('Illegal character: %s:%s\n' % (characters[pos],characters[pos-10:pos+10]))
             sys.exit(1)
         else:
             pos = match.end(0)
+    return tokens, pos
+
+# objects dictionary의 object들이 시작하는 줄 ( tab 두개 다음 guid )
+_lexBoundary = re.compile(r'\n\t\t(?=[^\s}])')
+_lexParallelLock = threading.Lock()
+_lexParallelText = None
+
+@_timed('lex')
+def lexParallel(characters, processes=None, chunks=None, internStrings=True):
+    '''큰 project file을 여러 process에서 나눠서 lex한다. 
+    
+    objects dictionary의 object 사이에서 |chunks|개( 기본값은 process당 4개 )로
+    나눠서 각각 lex하고 순서대로 이어 붙인다. 결과는 lex(characters, token_exprs)와 같다.
+    process는 fork로 만들어서 |characters|를 넘겨받는다.
+    '''
+    processes = processes or multiprocessing.cpu_count()
+    chunks = chunks or processes * 4
+    points = [0]
+    for i in range(1, chunks):
+        match = _lexBoundary.search(characters, max(points[-1], len(characters) * i // chunks))
+        if not match: break
+        if match.end() > points[-1]: 
+            points.append(match.end())
+    points.append(len(characters))
+    
+    tokens = _lexChunks(characters, zip(points, points[1:]), processes, internStrings)
+    if PbxprojStats.enabled:
+        PbxprojStats.count('lex.tokens', len(tokens))
     return tokens
 
+def _lexChunks(characters, ranges, processes, internStrings):
+    '''|ranges|의 ( start, end ) 들을 |processes|개의 process에서 lex해서 이어 붙인다.
+    
+    token 중간에서 나눈 경우( string이나 comment 안 )에는 앞 chunk의 마지막 token이
+    다음 chunk의 시작을 넘어가므로, 그 chunk는 앞 token이 끝난 곳부터 다시 lex한다.
+    '''
+    global _lexParallelText
+    regexes = [(re.compile(pattern), tag) for pattern, tag in token_exprs]
+    strings = {}
+    
+    # daemon process( Pool의 worker )는 process를 만들 수 없다.
+    if processes <= 1 or len(ranges) <= 1 or multiprocessing.current_process().daemon:
+        tokens, _ = _lexrange(characters, regexes, 0, len(characters), internStrings, strings)
+        return tokens
+    
+    with _lexParallelLock:
+        _lexParallelText = characters
+        pool = multiprocessing.Pool(min(processes, len(ranges)))
+        try:
+            results = pool.map(_lexchunk, [(start, end, internStrings) for start, end in ranges], 1)
+        finally:
+            pool.terminate()
+            _lexParallelText = None
+    
+    tags = {'S' : STRING, 'R' : RESERVED}
+    tokens = []
+    pos = 0
+    for (start, end), (lexend, texts, codes) in zip(ranges, results):
+        if start != pos or lexend is None:
+            if pos < end:
+                part, pos = _lexrange(characters, regexes, pos, end, internStrings, strings)
+                tokens.extend(part)
+            continue
+        if internStrings:
+            # chunk 안에서 같은 문자열은 이미 하나의 object이므로 서로 다른 문자열만 intern한다.
+            interned = dict((text, _internstr(text, strings)) for text in set(texts))
+            texts = map(interned.__getitem__, texts)
+        tokens.extend(itertools.izip(texts, map(tags.__getitem__, codes)))
+        pos = lexend
+    return tokens
+
+def _lexchunk(args):
+    '''_lexChunks의 worker. 
+    
+    tag는 parent의 STRING, RESERVED와 같은 object여야 하므로 글자로 바꿔서 돌려준다.
+    return : ( 마지막 token이 끝난 위치, token 문자열들, tag 글자들 ) 
+    '''
+    start, end, internStrings = args
+    regexes = [(re.compile(pattern), tag) for pattern, tag in token_exprs]
+    # 잘못된 글자가 있으면( token 중간에서 시작한 경우 ) parent에서 다시 lex한다.
+    tokens, pos = _lexrange(_lexParallelText, regexes, start, end, internStrings, {}, False)
+    if pos is None: return None, None, None
+    return pos, [text for text, _ in tokens], ''.join(tag is STRING and 'S' or 'R' for _, tag in tokens)
+
 # lexer function pbxproj fil
 def pbxlexer(tokens):
     'lexer function for pbxproj file'
@@ -263,6 +483,7 @@ class Phrase(Parser):
             return None
 
 # Top level parser
+@_timed('parse')
 def parseForPbxproj(tokens):
     ast = Phrase(stmt())(tokens, 0)
     return ast
@@ -276,24 +497,34 @@ def stmt():
     '''
     return dict_stmt() | list_stmt()
 
+def _extend(l, r):
+    '''Exp의 separator에서 쓰는 함수. 
+    
+    l+r로 tuple을 매번 새로 만들면 list가 길때 O(n^2)이므로 |l|에 이어 붙인다.
+    ( |l|은 parsing중에 새로 만든 list이다. )
+    '''
+    l.extend(r)
+    return l
+
 # Statements
 def list_stmt():
     '''
     list_stmt := '(' ')' | '(' object_stmt * ')' | '(' object_stmt * ',' ')' 
     '''
-    separator = keyword(',') ^ (lambda x: lambda l, r: l+r)
+    separator = keyword(',') ^ (lambda x: _extend)
     def listitem_process(x):
-        return (x,) 
+        return [x] 
     def process_list(parsed):
         ((_,v),_) = parsed
         if v == None: v = ()
-        return v
+        return tuple(v)
     def process_list2(parsed):
         (((_,v),_),_) = parsed
-        return v
+        return tuple(v)
     
-    return keyword('(') + Opt( Exp(Lazy(object_stmt) ^ listitem_process, separator) ) + keyword(')') ^ process_list |\
-           keyword('(') + Exp(Lazy(object_stmt) ^ listitem_process, separator) + keyword(',') + keyword(')') ^ process_list2
+    # pbxproj의 list는 항상 ','로 끝나므로 먼저 시도한다.
+    return keyword('(') + Exp(Lazy(object_stmt) ^ listitem_process, separator) + keyword(',') + keyword(')') ^ process_list2 |\
+           keyword('(') + Opt( Exp(Lazy(object_stmt) ^ listitem_process, separator) ) + keyword(')') ^ process_list
 
 def dict_keyval_stmt():
     '''
@@ -301,7 +532,7 @@ def dict_keyval_stmt():
     '''
     def process(parsed):
         ((k,_),v) = parsed
-        return (k,v)
+        return [k,v]
     return String() + keyword('=') + Lazy(object_stmt) ^ process
 
 
@@ -327,10 +558,11 @@ def dict_stmt():
             ret[k] = v
         return ret
     
-    separator = keyword(';') ^ (lambda x: lambda l,r: l+r)
+    # pbxproj의 dict는 항상 ';'로 끝나므로 먼저 시도한다.
+    separator = keyword(';') ^ (lambda x: _extend)
     parser = keyword('{') + keyword('}') ^ (lambda x: {}) | \
-             keyword('{') + Exp(dict_keyval_stmt(), separator) + keyword('}') ^ dict_process2 |\
-             keyword('{') + Exp(dict_keyval_stmt(), separator) + keyword(';') + keyword('}') ^ dict_process
+             keyword('{') + Exp(dict_keyval_stmt(), separator) + keyword(';') + keyword('}') ^ dict_process |\
+             keyword('{') + Exp(dict_keyval_stmt(), separator) + keyword('}') ^ dict_process2
                
     return parser
 
@@ -352,6 +584,14 @@ class PbxprojParserExcpetion(Exception):
     'exception for parsing'
     pass
 
+class PbxprojSettingsException(Exception):
+    'exception for build settings ( cyclic reference 등 )'
+    pass
+
+class PbxprojConflictException(Exception):
+    '읽은 이후에 다른 process가 바꾼 file을 저장하려고 할때'
+    pass
+
     
 
 class PbxprojParser:
@@ -408,6 +648,12 @@ class PbxprojWriter:
             self.writeString(str(value))
         elif isinstance(value,dict):
             self.writeDict(value)
+        elif isinstance(value,PbxCowObjects):
+            self.writeDict(dict(value.iterrawitems()))
+        elif isinstance(value,PbxColumnarObjects):
+            self.writeColumnarObjects(value)
+        elif isinstance(value,PbxColumnarRow):
+            self.writeDict(value)
         elif isinstance(value,(tuple,list)):
             self.writeArray(value)
         else:
@@ -437,7 +683,7 @@ class PbxprojWriter:
             
             # isa를 가지고 있으면 isa에 따라서 키를 정렬 
             # 보기에 안좋아서 정렬하도록함. 
-            if type(data[keys[0]]) == dict and data[keys[0]].get('isa'):
+            if _isobject(data[keys[0]]) and data[keys[0]].get('isa'):
                 keys.sort(key=lambda x: data[x]['isa'])
                 
             # 
@@ -456,6 +702,49 @@ class PbxprojWriter:
                 
         self.endElement("}")
     
+    def writeColumnarObjects(self, objects):
+        '''PbxColumnarObjects를 row view를 만들지 않고 column에서 바로 쓴다.
+        
+        writeDict()와 같은 순서( isa, guid 순 )로 쓴다.
+        '''
+        self.beginElement("{")
+        
+        if objects:
+            self.writeln('')
+            guids = objects.guids
+            for table in sorted(objects.tables, key=lambda t: t.isa):
+                oneline = table.isa in ('PBXFileReference','PBXBuildFile' )
+                columns = table.columns
+                keys = sorted(columns.keys() + (table.isa is not None and ['isa'] or []))
+                rows = sorted((guids[gid], row) for row, gid in enumerate(table.rows) if gid >= 0)
+                
+                for guid, row in rows:
+                    self.writeValue(guid)
+                    self.write("=")
+                    self.beginElement("{")
+                    if not oneline : self.writeln('')
+                    
+                    for k in keys:
+                        if k == 'isa':
+                            v = table.isa
+                        else:
+                            v = columns[k][row]
+                            if v is None: continue
+                            v = objects._decode(v)
+                        self.writeValue(k)
+                        self.write("=")
+                        self.writeValue(v)
+                        
+                        if oneline:
+                            self.write(';')
+                        else: 
+                            self.writeln(";")
+                    
+                    self.endElement("}")
+                    self.writeln(";")
+        
+        self.endElement("}")
+    
     def writeString(self, data):
         if data and re.match(r'^\w*$', data):
             self.write(data)
@@ -513,6 +802,209 @@ def get_bundletype(filename):
 
 #cache for pbxproj
 PbxprojCache = {}
+# PbxprojCache와 path별 loading lock을 보호한다.
+_PbxprojCacheLock = threading.Lock()
+_PbxprojLoadingLocks = {}
+
+def _loadingLock(key):
+    '같은 path를 여러 thread가 동시에 읽을때 한번만 parse 하기 위한 lock'
+    with _PbxprojCacheLock:
+        lock = _PbxprojLoadingLocks.get(key)
+        if lock is None:
+            lock = _PbxprojLoadingLocks[key] = threading.Lock()
+        return lock
+
+#
+# concurrency
+#
+
+class PbxRWLock(object):
+    '''여러 reader 혹은 하나의 writer만 허용하는 lock.
+    
+    기다리는 writer가 있으면 새 reader는 기다린다( writer 우선 ). 이미 
+    read lock을 가진 thread는 다시 read lock을 잡을 수 있고, write lock을 
+    가진 thread는 read, write lock을 모두 다시 잡을 수 있다. read lock을 
+    가진 채로 write lock을 잡으려고 하면 deadlock 대신 RuntimeError.
+    
+    usage:
+    
+    with lock.reading():
+        ...
+    with lock.writing():
+        ...
+    '''
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}          # thread -> read lock count
+        self._writer = None
+        self._writes = 0
+        self._waitingWriters = 0
+    
+    def acquireRead(self):
+        me = threading.current_thread()
+        with self._cond:
+            if self._writer is me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._waitingWriters:
+                self._cond.wait()
+            self._readers[me] = 1
+    
+    def releaseRead(self):
+        me = threading.current_thread()
+        with self._cond:
+            count = self._readers.get(me)
+            if not count:
+                raise RuntimeError('release unlocked read lock')
+            if count > 1:
+                self._readers[me] = count - 1
+                return
+            del self._readers[me]
+            if not self._readers:
+                self._cond.notify_all()
+    
+    def acquireWrite(self, blocking=True):
+        '|blocking|이 아니면 바로 lock을 잡을 수 없을때 False'
+        me = threading.current_thread()
+        with self._cond:
+            if self._writer is me:
+                self._writes += 1
+                return True
+            if me in self._readers:
+                raise RuntimeError('cannot upgrade read lock to write lock')
+            if not blocking and (self._writer is not None or self._readers):
+                return False
+            self._waitingWriters += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waitingWriters -= 1
+            self._writer = me
+            self._writes = 1
+            return True
+    
+    def releaseWrite(self):
+        with self._cond:
+            if self._writer is not threading.current_thread():
+                raise RuntimeError('release unlocked write lock')
+            self._writes -= 1
+            if not self._writes:
+                self._writer = None
+                self._cond.notify_all()
+    
+    @contextlib.contextmanager
+    def reading(self):
+        self.acquireRead()
+        try:
+            yield
+        finally:
+            self.releaseRead()
+    
+    @contextlib.contextmanager
+    def writing(self):
+        self.acquireWrite()
+        try:
+            yield
+        finally:
+            self.releaseWrite()
+
+class PbxFileLock(object):
+    '''pbxproj file에 대한 process간 advisory lock ( fcntl.flock )
+    
+    저장할때 rename으로 file이 바뀌므로 같은 폴더의 .project.pbxproj.lock을 
+    lock 한다. 같은 process 안에서도 PbxFileLock object끼리는 서로 기다린다.
+    
+    usage:
+    
+    with PbxFileLock(pbxpath):
+        ...
+    '''
+    def __init__(self, path):
+        dirname, basename = os.path.split(os.path.abspath(path))
+        self.lockpath = os.path.join(dirname, '.%s.lock' % basename)
+        self.fd = None
+    
+    def acquire(self, blocking=True):
+        '|blocking|이 아니면 다른 process가 lock을 가지고 있을때 False'
+        fd = os.open(self.lockpath, os.O_RDWR | os.O_CREAT, 0644)
+        try:
+            fcntl.flock(fd, blocking and fcntl.LOCK_EX or fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError, e:
+            os.close(fd)
+            if not blocking and e.errno in (errno.EAGAIN, errno.EACCES):
+                return False
+            raise
+        self.fd = fd
+        return True
+    
+    def release(self):
+        if self.fd is None:
+            raise RuntimeError('release unlocked file lock')
+        fd, self.fd = self.fd, None
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc):
+        self.release()
+
+class _PbxprojDigestFile(object):
+    '쓰는 내용의 sha1을 같이 계산하는 file'
+    def __init__(self, fileobj):
+        self.file = fileobj
+        self.sha1 = hashlib.sha1()
+        self.size = 0
+    
+    def write(self, data):
+        self.sha1.update(data)
+        self.size += len(data)
+        self.file.write(data)
+
+def _filedigest(path):
+    'file 내용의 sha1. file이 없으면 None'
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        return hashlib.sha1(f.read()).hexdigest()
+    finally:
+        f.close()
+
+def _locking(write=False, settings=False):
+    '''PbxProject.enableConcurrency() 이후에만 lock을 잡는 decorator
+    
+    self.pbxproj의 rwlock으로 read 혹은 write lock을 잡는다. |settings|이면 
+    build setting 계산 결과( cache )를 위해 settingsLock도 잡는다.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            pbxproj = self.pbxproj
+            rwlock = getattr(pbxproj, 'rwlock', None)
+            if rwlock is None:
+                return func(self, *args, **kwargs)
+            
+            if write: rwlock.acquireWrite()
+            else: rwlock.acquireRead()
+            try:
+                if settings:
+                    with pbxproj.settingsLock:
+                        return func(self, *args, **kwargs)
+                return func(self, *args, **kwargs)
+            finally:
+                if write: rwlock.releaseWrite()
+                else: rwlock.releaseRead()
+        return wrapper
+    return decorator
+
+_reading = _locking()
+_writing = _locking(write=True)
+_resolving = _locking(settings=True)
 
 class PbxObject(object):
     'pbxobject의 최상의 object'
@@ -525,6 +1017,20 @@ class PbxObject(object):
         
         if guid:
             self.obj = self.pbxdata['objects'][guid]
+    
+    def _getObj(self):
+        # snapshot()/restore() 이후에는 snapshot과 공유하는 object를 수정하지 
+        # 않도록 objects에서 다시 가져온다.
+        if self.guid and self._generation != self.pbxproj.generation:
+            self._obj = self.pbxdata['objects'].get(self.guid, self._obj)
+            self._generation = self.pbxproj.generation
+        return self._obj
+    
+    def _setObj(self, obj):
+        self._obj = obj
+        self._generation = self.pbxproj and self.pbxproj.generation or 0
+    
+    obj = property(_getObj, _setObj)
             
     def getRootObject(self):
         return self.pbxdata['objects']
@@ -535,15 +1041,18 @@ class PbxObject(object):
     def getObject(self,guid):
         return self.pbxdata['objects'][guid]
     
+    @_reading
     def get(self,key):
         if self.obj.has_key(key):
             return self.obj[key]
         else:
             return None
         
+    @_writing
     def set(self,key,val):
         self.obj[key] = val
         
+    @_writing
     def appendValue(self, key, aVal):
         value = self.get(key)
         value += (aVal,)
@@ -551,6 +1060,7 @@ class PbxObject(object):
         assert aVal in self.get(key)
         return True;
     
+    @_writing
     def removeValue(self, key, aVal):
         value = self.get(key)
         value = list(value)
@@ -560,6 +1070,7 @@ class PbxObject(object):
         assert aVal not in self.get(key)
         return True;
     
+    @_writing
     def removeObjectFromRoot(self):
         if self.guid:
             del self.pbxdata['objects'][self.guid]
@@ -573,6 +1084,10 @@ class Pbxfile:
         
 class PbxProject(PbxObject):
     'pbxproj file를 조회 수정하기 위한 class.'
+    
+    # 이 크기( bytes ) 이상인 file은 cpu가 여러개이면 lexParallel()로 읽는다.
+    parallelLexThreshold = 4 * 1024 * 1024
+    
     def __init__(self, pbxproj=None, guid=None):
         self.path = None
         self.data = None
@@ -580,27 +1095,99 @@ class PbxProject(PbxObject):
         self.target = None
         self.valid = False
         self.file_basepath = None
+        self.settingsResolver = None
+        self.groupIndex = None
+        # 마지막으로 읽거나 저장한 file 내용의 sha1 ( isChangedOnDisk() )
+        self.digest = None
+        # enableConcurrency() 이후에 사용
+        self.rwlock = None
+        self.settingsLock = None
+        # snapshot()/restore() 할때마다 증가
+        self.generation = 0
         PbxObject.__init__(self, pbxproj, guid)
         
     @staticmethod
-    def loadPbxproj(path):
-        ' load project file'
-        pbxpath = None
-
+    def loadPbxproj(path, columnar=False, concurrent=False):
+        ''' load project file
+        
+        |columnar|이면 objects를 PbxColumnarObjects에 저장한다. ( useColumnarStorage() )
+        |concurrent|이면 여러 thread에서 사용할 수 있게 한다. ( enableConcurrency() )
+        
+        여러 thread가 동시에 같은 path를 읽으면 한번만 parse 한다.
+        '''
+        pbxpath = PbxProject._findPbxproj(path)
+        if not pbxpath: return None
+
+        key = os.path.abspath(pbxpath)
+        loading = _loadingLock(key)
+        with loading:
+            obj = PbxprojCache.get(key)
+            if obj is None:
+                obj = PbxProject._parsePbxproj(pbxpath)
+                if obj:
+                    with _PbxprojCacheLock:
+                        PbxprojCache[key] = obj
+            
+            with _PbxprojCacheLock:
+                if _PbxprojLoadingLocks.get(key) is loading:
+                    del _PbxprojLoadingLocks[key]
+            
+            if obj:
+                if concurrent: obj.enableConcurrency()
+                if columnar: obj.useColumnarStorage()
+        return obj
+    
+    @staticmethod
+    def modifyPbxproj(path, edit, optimistic=True):
+        '''|path|의 project를 읽어서 edit(pbx)를 적용하고 저장한다. 
+        
+        여러 process가 동시에 같은 project를 수정해도 수정이 사라지지 않는다.
+        |optimistic|이면 lock 없이 읽고 수정한 다음 저장할때만 PbxFileLock을 
+        잡는다. 그 사이에 다른 process가 file을 바꿨으면 lock을 잡은채로 다시 
+        읽어서 |edit|을 다시 적용한다( |edit|은 여러번 호출될 수 있다 ). 
+        아니면 처음부터 lock을 잡고 읽는다.
+        
+        PbxprojCache는 사용하지 않고 저장한 path는 cache에서 지운다.
+        return : 저장한 PbxProject, project file이 없으면 None
+        '''
+        pbxpath = PbxProject._findPbxproj(path)
+        if not pbxpath: return None
+        
+        pbx = None
+        if optimistic:
+            pbx = PbxProject._parsePbxproj(pbxpath)
+            edit(pbx)
+        
+        with PbxFileLock(pbxpath):
+            if pbx is None or pbx.isChangedOnDisk():
+                pbx = PbxProject._parsePbxproj(pbxpath)
+                edit(pbx)
+            pbx.saveas(pbxpath)
+        
+        with _PbxprojCacheLock:
+            PbxprojCache.pop(os.path.abspath(pbxpath), None)
+        return pbx
+    
+    @staticmethod
+    def _findPbxproj(path):
+        'project.pbxproj 경로. 없으면 None'
         path = os.path.expanduser(path)
-
-        # find project file path
         if os.path.isfile(path): 
-            pbxpath = path
+            return path
         elif os.path.isfile(os.path.join(path,'project.pbxproj')): 
-            pbxpath = os.path.join(path,'project.pbxproj')
-
-        if PbxprojCache.has_key(os.path.abspath(pbxpath)):
-            return PbxprojCache[os.path.abspath(pbxpath)]
-        
-        pbx = file(pbxpath).read().decode('utf-8')
+            return os.path.join(path,'project.pbxproj')
+        return None
+    
+    @staticmethod
+    @_timed('load')
+    def _parsePbxproj(pbxpath):
+        raw = file(pbxpath).read()
+        pbx = raw.decode('utf-8')
         
-        tokens = lex(pbx, token_exprs)
+        if len(raw) >= PbxProject.parallelLexThreshold and multiprocessing.cpu_count() > 1:
+            tokens = lexParallel(pbx)
+        else:
+            tokens = lex(pbx, token_exprs)
 
         # data parsing
         data = parseForPbxproj(tokens).value
@@ -614,9 +1201,11 @@ class PbxProject(PbxObject):
             obj.name =  os.path.basename(os.path.dirname(pbxpath))
             obj.target = os.path.splitext(obj.name)[0]
             obj.obj = obj.objectForProject()
+            obj.digest = hashlib.sha1(raw).hexdigest()
             
-            PbxprojCache[os.path.abspath(pbxpath)] = obj
-            
+        if PbxprojStats.enabled:
+            PbxprojStats.count('load.bytes', len(raw))
+            PbxprojStats.count('load.objects', data and len(data['objects']) or 0)
         return obj
     
     @staticmethod
@@ -676,45 +1265,108 @@ class PbxProject(PbxObject):
     # save function
     #
         
-    def save(self):
-        self.saveas(self.path)
+    def save(self, lock=False):
+        '''project file에 저장한다.
+        
+        |lock|이면 PbxFileLock을 잡고 저장하고, 읽은 이후에 다른 process가 file을 
+        바꿨으면 PbxprojConflictException. ( 다시 읽어서 적용하려면 modifyPbxproj() )
+        '''
+        if not lock:
+            self.saveas(self.path)
+            return
+        
+        with PbxFileLock(self.path):
+            if self.isChangedOnDisk():
+                raise PbxprojConflictException('%s was changed by another process' % self.path)
+            self.saveas(self.path)
 
+    @_reading
+    @_timed('save')
     def saveas(self,path):
-        f = file(path,'w')
-        writer = PbxprojWriter(f)
-        writer.writeValue(self.pbxdata)
-        f.close()
+        '''|path|에 저장한다.
+        
+        같은 폴더의 임시 file에 쓰고 fsync한 다음 rename하므로 다른 process는 
+        이전 file 혹은 새 file만 본다. 중간에 실패해도 원래 file은 그대로다.
+        '''
+        path = os.path.abspath(path)
+        fd, temppath = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path), suffix='.tmp',
+                                        dir=os.path.dirname(path))
+        try:
+            f = os.fdopen(fd, 'w')
+            try:
+                out = _PbxprojDigestFile(f)
+                with PbxprojStats.timer('save.write'):
+                    PbxprojWriter(out).writeValue(self.pbxdata)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                f.close()
+            
+            mode = 0644
+            if os.path.exists(path):
+                mode = os.stat(path).st_mode & 0777
+            os.chmod(temppath, mode)
+            os.rename(temppath, path)
+        except:
+            if os.path.exists(temppath):
+                os.remove(temppath)
+            raise
+        
+        if self.path and path == os.path.abspath(self.path):
+            self.digest = out.sha1.hexdigest()
+        if PbxprojStats.enabled:
+            PbxprojStats.count('save.bytes', out.size)
+    
+    def isChangedOnDisk(self):
+        '마지막으로 읽거나 저장한 이후에 project file이 바뀌었는지'
+        return _filedigest(self.path) != self.digest
         
     #
     # object 조회 
     #
         
+    @_reading
+    @_timed('scan.object_if')
     def object_if(self,dic):
         'objects 값 중에서 key와 value를 동일하게 가지고 있는 object를 반환 '
-        for k,v in self.pbxdata['objects'].iteritems():
+        objs = self.pbxdata['objects']
+        if isinstance(objs, PbxColumnarObjects):
+            for k in objs.select(dic):
+                return k,objs[k]
+            return None
+        
+        for k,v in _iterobjects(self.pbxdata['objects']):
             found = True
             for qk, qv in dic.iteritems():
-                if type(v) != dict or not v.has_key(qk) or v[qk] != qv:
+                if not _isobject(v) or not v.has_key(qk) or v[qk] != qv:
                     found = False
             
             if found:
-                return k,v
+                return k,self.pbxdata['objects'][k]
         return None
         
+    @_reading
+    @_timed('scan.objects_if')
     def objects_if(self,dic):
         'objects 값 중에서 key와 value를 동일하게 가지고 있는 object를 반환 '
         
+        objs = self.getRootObject()
+        if isinstance(objs, PbxColumnarObjects):
+            return [(k, objs[k]) for k in objs.select(dic)]
+        
         ret = []
         
-        for k,v in self.getRootObject().iteritems():
+        for k,v in _iterobjects(self.getRootObject()):
             found = True
             for qk, qv in dic.iteritems():
-                if type(v) != dict or not v.has_key(qk) or v[qk] != qv:
+                if not _isobject(v) or not v.has_key(qk) or v[qk] != qv:
                     found = False
             
             if found:
-                ret.append((k,v))
-        return ret
+                ret.append(k)
+        
+        objs = self.getRootObject()
+        return [(k, objs[k]) for k in ret]
 
     def xcodeprojpath(self):
         return os.path.dirname(self.path)
@@ -795,6 +1447,7 @@ class PbxProject(PbxObject):
     #
     # public function
     #
+    @_writing
     def addProject(self, project_path,group=None, dependency=True, link=True):
         assert os.path.exists(project_path)
         
@@ -832,7 +1485,7 @@ class PbxProject(PbxObject):
                    'name':'Products',
                    'sourceTree':'<group>'}
             guid = self.createPbxGuid()
-            self.pbxdata['objects'][guid] = obj
+            self.setObject(guid, obj)
             groupguid = guid
             
         # project reference를 project에 등록.
@@ -860,6 +1513,7 @@ class PbxProject(PbxObject):
 
         return True
     
+    @_writing
     def removeProject(self, project_path):
         # project file reference 제거
         fileref = self.getAllObjectsWithConditions({'isa':'PBXFileReference','path':self.get_relative_proj_path(project_path)})
@@ -938,18 +1592,16 @@ class PbxProject(PbxObject):
                 else:
                     raise Exception('not support object')
     
+    @_writing
     def add_header_search_path(self,configuration, paths):
+        'project, 모든 target의 |configuration|에 header search path를 추가한다.'
         
         if type(paths) not in (list,tuple):
             paths = (paths,)
         
-        _,obj = self.object_if({'isa':'XCBuildConfiguration','name':configuration})
-        if not obj : return False
-        
-        if obj['buildSettings'].has_key('HEADER_SEARCH_PATHS'):
-            obj['buildSettings']['HEADER_SEARCH_PATHS'] += paths 
-        else:
-            obj['buildSettings']['HEADER_SEARCH_PATHS'] = paths 
+        editor = PbxBuildSettingsEditor(self.pbxproj)
+        editor.append('HEADER_SEARCH_PATHS', paths)
+        return bool(editor.apply(configurations=(configuration,)))
     
 
     #
@@ -975,108 +1627,64 @@ class PbxProject(PbxObject):
         return guid
     
     def _get_root_group(self):
-        _,obj = self.object_if({'isa':'PBXProject'})
-        if not obj : return None
+        guid = self.obj and self.obj.get('mainGroup')
+        if not guid : return None
         
-        maingroup = self.pbxdata['objects'][obj['mainGroup']]
-        return obj['mainGroup'], maingroup
+        return guid, self.pbxdata['objects'][guid]
     
     def getGroup(self, group_path, createGroup = True):
         found = self._get_group(group_path)
         if found:
-            return createPbxObject(found[0])
+            return createPbxObject(self, found[0])
         elif createGroup :
             key, _ = self.add_group(group_path)
-            return createPbxObject(key)
+            return createPbxObject(self, key)
         else:
             return None
         
     
+    @_writing
     def add_group(self,group_path, children=()):
         ''' project에 group을 생성한다.
         
         |group_path|에서 주어진 경로를 찾아보고 없으면 group를 만든다.
         '''
         
-        # 기존에 있으면 해달 group를 return 
-        group = self._get_group(group_path)
-        if group : return group
-        
-        # 없으면 가장 맞는 group를 찾아보고 없으면 만든다.
-        path = group_path.rstrip('/')
-        
-        # /a/b/c 경로에서 먼저 뒤 경로를 제거하고 찾아본다.
-        # 경로상에서 존제하는 group를 찾는다.
-        exist_group = self._get_group('/')
-        nonexists_group = []
-        while path:
-            group = self._get_group(path)
-            if group :
-                exist_group = group
-                break
-            else:
-                nonexists_group.insert(0,path.split('/')[-1])
-                path = '/'.join(path.split('/')[:-1])
+        # 경로상에서 존재하는 가장 깊은 group를 찾는다.
+        guid, names = self.getGroupIndex().closest(group_path)
+        if guid is None:
+            guid, _ = self._get_root_group()
+        curgroup = (guid, self.pbxdata['objects'][guid])
         
-        # 결로상에 없는 group를 만든다.
-        curgroup = exist_group
-        for g in nonexists_group:
-            # group 생
+        # 경로상에 없는 group를 만든다.
+        for g in names:
             groupguid = self._create_guid()
             groupobj = {"isa":"PBXGroup",
                         "name":g,
                         "sourceTree":"<group>",
                         "children":()}
             
-            self.pbxdata['objects'][groupguid] = groupobj
-            # curgroup의 children에 추
+            self.setObject(groupguid, groupobj)
+            # curgroup의 children에 추가
             curgroup[1]['children']+=(groupguid,)
             
             # curgroup 변경 
-            curgroup = (groupguid, groupobj)
+            curgroup = (groupguid, self.pbxdata['objects'][groupguid])
          
         return curgroup
     
         
-    
+    @_reading
     def _get_group(self, group_path):
         ''' path형태로 표현한 group를 찾아 준다.
         
         / 로 시작하면 root 부터 찾는 절대경로의 group를 찾
         아닌경우에는 맞는 이름으로 검색한다.
         '''
-        path = group_path.strip('/').split('/')
-        groups = dict(self.objects_if({'isa':'PBXGroup'}))
-        is_abs_path = group_path.startswith('/')
-        
-        curgroup = None
-        curgroupkey = None
-        
-        if is_abs_path:
-            curgroupkey, curgroup = self._get_root_group()
-
-        else:
-            for k,v in groups.iteritems():
-                if (v.get('name') == path[0] or v.get('path') == path[0]):
-                    curgroupkey,curgroup = k,v
-                    path.pop(0)
-                    break
-        
-        found = True        
-        for p in path:
-            if not p: continue
-            found = False
-            for guid in curgroup['children']:
-                group = groups.get(guid)
-                if group and ( group.get('name') == p or group.get('path') == p):
-                    curgroup = group
-                    curgroupkey = guid
-                    found = True
-                    break
-            
-        if found:
-            return curgroupkey,curgroup
-        return None
+        guid, names = self.getGroupIndex().closest(group_path)
+        if guid is None or names:
+            return None
+        return guid, self.pbxdata['objects'][guid]
     
         
     def _add_item_to_group(self, guid, group_path):
@@ -1178,8 +1786,9 @@ class PbxProject(PbxObject):
         return filerefobj['path']
     
     
+    @_reading
     def hasGuid(self,guid):
-        return self.pbxdata['objects'].get(guid) != None
+        return guid in self.pbxdata['objects']
 
     def createPbxGuid(self):
         'guid 생성'
@@ -1198,22 +1807,31 @@ class PbxProject(PbxObject):
     def getPbxTargets(self):
         return self.getAllObjects(isa='PBXNativeTarget')
     
+    @_writing
     def setObject(self,key,val):
         self.pbxdata['objects'][key] = val
+        if self.groupIndex and val.get('isa') == 'PBXGroup':
+            self.groupIndex.addGroup(key, val)
         
+    @_writing
     def removeObject(self, guid):
-        if guid in self.pbxdata['objects'].keys():
+        if guid in self.pbxdata['objects']:
             del self.pbxdata['objects'][guid]
         
     def getAllGroups(self):
         return self.getAllObjects(isa='PBXGroup')
     
+    @_reading
+    @_timed('scan.getAllObjects')
     def getAllObjects(self, **conds):
         objs = self.pbxdata['objects']
         ret = []
         if not objs: return ret
         
-        for guid, obj in objs.iteritems():
+        if isinstance(objs, PbxColumnarObjects):
+            return [createPbxObject(self.pbxproj, guid) for guid in objs.select(conds, True)]
+        
+        for guid, obj in _iterobjects(objs):
             
             # check condition
             for ck,cv in conds.iteritems():
@@ -1242,13 +1860,15 @@ class PbxProject(PbxObject):
 
         return ret
     
+    @_reading
+    @_timed('scan.getAllObjectsHasGuid')
     def getAllObjectsHasGuid(self, guid):
         '주어진 |guid|를 가지고 있는 object 구하기'
         objs = self.pbxdata['objects']
         ret = []
         if not objs: return ret
         
-        for k, v in objs.iteritems():
+        for k, v in _iterobjects(objs):
             for _, subv in v.iteritems():
                 if isinstance(subv,(list,tuple)):
                     if guid in subv:
@@ -1283,6 +1903,111 @@ class PbxProject(PbxObject):
         if not guid : return None
         return createPbxObject(self.pbxproj, guid)
     
+    #
+    # snapshot
+    #
+    
+    @_writing
+    def snapshot(self):
+        '''현재 상태의 snapshot을 만든다. 
+        
+        objects를 공유하므로 O(1)이고, 이후 수정할때는 손댄 object만 복사된다.
+        '''
+        objects = self.pbxdata['objects']
+        if isinstance(objects, PbxCowObjects):
+            frozen = objects.freeze()
+        else:
+            frozen = PbxFrozenObjects(changes=objects)
+        
+        data = dict(self.pbxdata)
+        del data['objects']
+        self._setObjects(PbxCowObjects(frozen))
+        return PbxProjectSnapshot(self, frozen, data)
+    
+    @_writing
+    def restore(self, snapshot):
+        '|snapshot| 상태로 되돌린다. O(1)'
+        self.pbxdata.clear()
+        self.pbxdata.update(snapshot.data)
+        self._setObjects(PbxCowObjects(snapshot.frozen))
+        self.file_basepath = None
+        self.invalidateSettings()
+        self.invalidateGroups()
+    
+    @_writing
+    def useColumnarStorage(self):
+        '''objects를 PbxColumnarObjects로 바꾼다.
+        
+        큰 project에서 메모리를 적게 사용하고 isa로 검색하는 object_if, 
+        getAllObjects가 빨라진다. 
+        '''
+        objects = self.pbxdata['objects']
+        if isinstance(objects, PbxColumnarObjects): return
+        self._setObjects(PbxColumnarObjects(objects))
+        self.invalidateSettings()
+    
+    def enableConcurrency(self):
+        '''여러 thread에서 이 project를 사용할 수 있게 한다.
+        
+        조회는 read lock, 수정은 write lock을 잡으므로 조회는 동시에 실행된다.
+        여러 함수에 걸친 수정을 한번에 하려면 rwlock.writing()으로 감싼다.
+        '''
+        if self.rwlock is None:
+            self.settingsLock = threading.RLock()
+            self.getSettingsResolver()
+            self.getGroupIndex()
+            self.rwlock = PbxRWLock()
+    
+    def _setObjects(self, objects):
+        self.pbxdata['objects'] = objects
+        self.generation += 1
+        self.obj = self.objectForProject()
+    
+    @_reading
+    def validate(self):
+        'PbxprojValidator로 검사한 error 목록'
+        return PbxprojValidator(self.pbxproj).validate()
+    
+    def getGroupIndex(self):
+        'group 경로를 찾는 PbxGroupIndex ( 한번 만들면 계속 사용 )'
+        if not self.groupIndex:
+            self.groupIndex = PbxGroupIndex(self.pbxproj)
+        return self.groupIndex
+    
+    def invalidateGroups(self):
+        '''PbxGroupIndex를 지운다. 
+        
+        setObject()를 쓰지 않고 objects에 직접 group을 추가하거나 group의 name, path를 
+        PbxGroup.set()을 쓰지 않고 바꾼 경우에 호출한다.
+        '''
+        if self.groupIndex:
+            self.groupIndex.invalidate()
+    
+    #
+    # build settings
+    #
+    
+    def getSettingsResolver(self):
+        'project에 대한 PbxBuildSettingsResolver ( 한번 만들면 계속 사용 )'
+        if not self.settingsResolver:
+            self.settingsResolver = PbxBuildSettingsResolver(self.pbxproj)
+        return self.settingsResolver
+    
+    def invalidateSettings(self, guid=None):
+        '|guid| ( XCBuildConfiguration, XCConfigurationList )에 의존하는 계산 결과를 지운다.'
+        if self.settingsResolver:
+            self.settingsResolver.invalidate(guid)
+    
+    def getBuildSettings(self, configuration, target=None, conditions=None):
+        return self.getSettingsResolver().getSettings(configuration, target, conditions)
+    
+    def getBuildSetting(self, key, configuration, target=None, conditions=None):
+        return self.getSettingsResolver().getSetting(key, configuration, target, conditions)
+    
+# isa 이름과 class 이름이 규칙( PBXxxx -> Pbxxxx )에 맞지 않는 것들
+__isaclasses = { 'XCConfigurationList' : 'PbxBuildConfigurationList' }
+
+@_timed('wrap')
 def createPbxObject(pbxproj, guid):
     obj = pbxproj.pbxdata['objects'].get(guid)
     if not obj : return None
@@ -1290,8 +2015,10 @@ def createPbxObject(pbxproj, guid):
     isa = obj['isa']
     
     def getClassForType(name):
-        class_name = ''
-        if name[:3] == 'PBX':
+        class_name = __isaclasses.get(name, '')
+        if class_name:
+            pass
+        elif name[:3] == 'PBX':
             class_name = 'Pbx' + name[3:]
         elif name[:2] == 'XC':
             class_name = 'Pbx' + name[2:]
@@ -1319,21 +2046,33 @@ class PbxBuildConfigurationList(PbxObject):
         
         ret = []
         for g in guids:
-            ret.append(createPbxObject(g))
+            ret.append(createPbxObject(self.pbxproj, g))
 
         return ret
     
+    def getConfiguration(self, name):
+        '|name| 이름을 가진 XCBuildConfiguration'
+        for g in self.get('buildConfigurations') or ():
+            obj = self.getObject(g)
+            if obj.get('name') == name:
+                return createPbxObject(self.pbxproj, g)
+        return None
+    
+    @_writing
     def addConfiguration(self, configuration):
         if isinstance(configuration, PbxBuildConfiguration):
             self.appendValue('buildConfigurations', configuration.getGuid())
         elif isinstance(configuration, (str,unicode)):
             self.appendValue('buildConfigurations', configuration)
+        self.pbxproj.invalidateSettings(self.guid)
         
+    @_writing
     def removeConfiguration(self, configuration):
         if isinstance(configuration, PbxBuildConfiguration):
             self.removeValue('buildConfigurations', configuration.getGuid())
         elif isinstance(configuration, (str,unicode)):
             self.removeValue('buildConfigurations', configuration)
+        self.pbxproj.invalidateSettings(self.guid)
         
 
 class PbxBuildConfiguration(PbxObject):
@@ -1349,13 +2088,40 @@ class PbxBuildConfiguration(PbxObject):
         pbxproj.setObject(guid, obj)
         return createPbxObject(pbxproj,guid)
     
+    @_writing
     def setSettings(self, key, value):
         settings = self.get('buildSettings')
         settings[key] = value
+        self.pbxproj.invalidateSettings(self.guid)
+        
+    def getName(self):
+        return self.get('name')
         
     def getSetting(self, key):
-        settings = self.get('buildSettings')
-        return settings[key]
+        'xcconfig를 포함한 setting 값 ( $(VAR)는 확장하지 않음 )'
+        return self.getSettings()[key]
+    
+    def getSettings(self, conditions=None):
+        'baseConfigurationReference의 xcconfig 위에 buildSettings를 덮어쓴 setting'
+        context = dict(conditions or {})
+        context['config'] = self.getName()
+        
+        settings = {}
+        xcconfig = self.getXcconfig()
+        if xcconfig:
+            xcconfig.applySettings(settings, context)
+        _applySettings(settings, (self.get('buildSettings') or {}).iteritems(), context)
+        return settings
+    
+    def getXcconfigPath(self):
+        guid = self.get('baseConfigurationReference')
+        if not guid or not self.pbxproj.hasGuid(guid): return None
+        return createPbxObject(self.pbxproj, guid).getAbspath()
+    
+    def getXcconfig(self):
+        path = self.getXcconfigPath()
+        if not path: return None
+        return Xcconfig.load(path)
     
     def __str__(self):
         return str(self.obj)
@@ -1426,9 +2192,11 @@ class PbxBuildPhase(PbxObject):
             
         return ret
     
+    @_writing
     def addFile(self, fileguid):
         return self.appendValue('files', fileguid)
     
+    @_writing
     def removeFile(self, fileguid):
         return self.removeValue('files', fileguid)
 
@@ -1459,6 +2227,12 @@ class PbxFileReference(PbxObject):
     
     def getAbspath(self):
         relpath = self.getPath()
+        sourcetree = self.get('sourceTree')
+        if sourcetree == '<absolute>' or os.path.isabs(relpath):
+            return relpath
+        if sourcetree == 'SOURCE_ROOT':
+            return self.pbxproj.getAbsPathFromRelProjPath(relpath)
+        
         groups = self.pbxproj.getAllObjects(isa='PBXGroup', children=self.getGuid())
         path = [self.pbxproj.getRootPath()]
         if groups: path = [groups[0].getAbspath()]
@@ -1570,6 +2344,7 @@ class PbxGroup(PbxObject):
         
         return os.path.abspath(os.path.normcase(reduce(os.path.join,path)))
     
+    @_writing
     def addFileReference(self, fileref):
         assert isinstance(fileref, PbxFileReference)
         
@@ -1578,26 +2353,23 @@ class PbxGroup(PbxObject):
             
         self.appendValue('children', fileref.getGuid())
         
+    @_writing
     def addGroup(self, group):
         self.appendValue('children', group.getGuid())
     
+    @_writing
+    def set(self, key, val):
+        PbxObject.set(self, key, val)
+        if key in ('name', 'path'):
+            self.pbxproj.invalidateGroups()
+    
+    @_reading
     def getGroupFromPath(self, group_path):
-        path = group_path.strip('/').split('/')
-
-        found = True     
-        curgroup = self   
-        for p in path:
-            if not p: continue
-            found = False
-            for subgroup in curgroup.getSubgroups():
-                if subgroup.getName() == p or subgroup.getPath() == p:
-                    curgroup = subgroup
-                    found = True
-                    break
-            
-        if found:
-            return curgroup
-        return None
+        names = [p for p in group_path.split('/') if p]
+        guid, left = self.pbxproj.getGroupIndex().walk(self.guid, names)
+        if left:
+            return None
+        return createPbxObject(self.pbxproj, guid)
     
     @staticmethod
     def createObject(pbxproj, name):
@@ -1609,21 +2381,15 @@ class PbxGroup(PbxObject):
         pbxproj.setObject(guid, obj)
         return createPbxObject(pbxproj,guid)
     
+    @_writing
     def addGroupFromPath(self, group_path):
-        path = group_path.strip('/').split('/')
-        curgroup = self   
-        for p in path:
-            if not p: continue
-            found = False
-            for subgroup in curgroup.getSubgroups():
-                if subgroup.getName() == p or subgroup.getPath() == p:
-                    curgroup = subgroup
-                    found = True
-                    break
-            if not found:
-                newGroup = PbxGroup.createObject(self.pbxproj, p)
-                curgroup.addGroup(newGroup)
-                curgroup = newGroup
+        names = [p for p in group_path.split('/') if p]
+        guid, left = self.pbxproj.getGroupIndex().walk(self.guid, names)
+        curgroup = createPbxObject(self.pbxproj, guid)
+        for p in names[len(names) - left:]:
+            newGroup = PbxGroup.createObject(self.pbxproj, p)
+            curgroup.addGroup(newGroup)
+            curgroup = newGroup
                 
         return curgroup
     
@@ -1631,6 +2397,131 @@ class PbxGroup(PbxObject):
     def __str__(self):
         return '(%d : type: PBXGroup, name:%s, path %s) ' % (id(self), self.getName(), self.getPath())
     
+
+class PbxGroupIndex(object):
+    '''group 경로를 찾기 위한 trie.
+    
+    group마다 하위 group의 name, path -> guid 인 node를 만들어 두므로 경로를 
+    찾고 만드는 시간은 경로 길이에 비례한다. 상대 경로의 첫 이름은 모든 group의 
+    name, path -> guid 목록( names )에서 찾는다.
+    
+    children은 바뀔때마다 새 tuple이 되므로 node를 만들때의 children과 다르면 
+    그 node만 다시 만든다( 끝에 하나 추가된 경우는 고친다 ). group의 name, path가 
+    바뀌거나 setObject()를 쓰지 않고 group을 추가하면 invalidate()해야 한다.
+    '''
+    def __init__(self, pbxproj):
+        self.pbxproj = pbxproj
+        self.nodes = {}
+        self.names = None
+    
+    def invalidate(self):
+        self.nodes = {}
+        self.names = None
+    
+    @staticmethod
+    def _keys(obj):
+        return set(k for k in (obj.get('name'), obj.get('path')) if k)
+    
+    def _addEntry(self, entries, guid):
+        obj = self.pbxproj.pbxdata['objects'].get(guid)
+        if obj is not None and obj.get('isa') == 'PBXGroup':
+            for key in self._keys(obj):
+                # 이름이 같으면 앞에 있는 group
+                entries.setdefault(key, guid)
+    
+    def _node(self, guid):
+        '|guid| group의 하위 group name, path -> guid. group이 아니면 None'
+        obj = self.pbxproj.pbxdata['objects'].get(guid)
+        if obj is None or obj.get('isa') != 'PBXGroup':
+            return None
+        children = obj.get('children') or ()
+        
+        node = self.nodes.get(guid)
+        if node is not None and node[0] is not children:
+            old, entries = node
+            if old == children:
+                pass
+            elif len(children) == len(old) + 1 and children[:-1] == old:
+                self._addEntry(entries, children[-1])
+            else:
+                node = None
+            if node is not None:
+                node = self.nodes[guid] = (children, entries)
+        
+        if node is None:
+            entries = {}
+            for child in children:
+                self._addEntry(entries, child)
+            node = self.nodes[guid] = (children, entries)
+        return node[1]
+    
+    def walk(self, guid, names):
+        '''|guid| group에서 |names|를 따라 하위 group으로 갈 수 있는 곳까지 간다.
+        
+        return : ( 마지막 group guid, 찾지 못한 names 수 )
+        '''
+        for i, name in enumerate(names):
+            child = self._child(guid, name)
+            if child is None:
+                return guid, len(names) - i
+            guid = child
+        return guid, 0
+    
+    def _child(self, guid, name):
+        entries = self._node(guid)
+        child = entries and entries.get(name) or None
+        if child is not None and not self._isGroup(child, name):
+            # 지워졌거나 이름이 바뀐 group
+            self.nodes.pop(guid, None)
+            child = self._node(guid).get(name)
+        return child
+    
+    def _isGroup(self, guid, name):
+        obj = self.pbxproj.pbxdata['objects'].get(guid)
+        return obj is not None and obj.get('isa') == 'PBXGroup' and name in self._keys(obj)
+    
+    def _candidates(self, name):
+        'name이나 path가 |name|인 group들'
+        if self.names is None:
+            names = {}
+            for guid, obj in self.pbxproj.objects_if({'isa' : 'PBXGroup'}):
+                for key in self._keys(obj):
+                    names.setdefault(key, []).append(guid)
+            self.names = names
+        
+        for guid in self.names.get(name, ()):
+            if self._isGroup(guid, name):
+                yield guid
+    
+    def addGroup(self, guid, obj):
+        'setObject()로 추가한 group'
+        if self.names is not None:
+            for key in self._keys(obj):
+                guids = self.names.setdefault(key, [])
+                if guid not in guids: guids.append(guid)
+    
+    def closest(self, group_path):
+        '''|group_path|에서 있는 가장 깊은 group.
+        
+        / 로 시작하면 main group 부터 찾고 아니면 첫 이름이 같은 group들에서 찾는다.
+        return : ( group guid, 찾지 못한 이름들 ). 첫 group도 없으면 guid는 None
+        '''
+        names = [p for p in group_path.split('/') if p]
+        if group_path.startswith('/'):
+            root = self.pbxproj._get_root_group()
+            if not root: return None, names
+            guid, left = self.walk(root[0], names)
+            return guid, names[len(names) - left:]
+        
+        best = None, names
+        if not names: return best
+        for candidate in self._candidates(names[0]):
+            guid, left = self.walk(candidate, names[1:])
+            if best[0] is None or left < len(best[1]):
+                best = guid, names[len(names) - left:]
+            if not left: break
+        return best
+    
     
 class PbxNativeTarget(PbxObject):
     ''' PBXNativeTarget 정보 조회 및 수정을 위한 Class.
@@ -1691,6 +2582,7 @@ class PbxNativeTarget(PbxObject):
     def getProductType(self):
         return self.get('productType')
     
+    @_writing
     def addFramework(self, framework):
         fileref_hash = self.pbxproj._add_filereference(framework, 'wrapper.framework', self.pbxproj.createPbxGuid(), 'System/Library/Frameworks/'+framework, 'SDKROOT')
         libfile_hash = self.pbxproj._add_buildfile(fileref_hash, self.pbxproj.createPbxGuid())
@@ -1702,6 +2594,7 @@ class PbxNativeTarget(PbxObject):
         
         return True
     
+    @_writing
     def removeFramework(self, framework):
         obj = self.pbxproj.object_if({'isa':'PBXFileReference', 'lastKnownFileType':'wrapper.framework', 'path':framework})
         if not obj :
@@ -1731,6 +2624,7 @@ class PbxNativeTarget(PbxObject):
         
         return True
     
+    @_reading
     def getFrameworks(self):
         ret = []
         for f in self.getBuildFrameworksPhase().getFiles():
@@ -1739,6 +2633,7 @@ class PbxNativeTarget(PbxObject):
         
         return ret
     
+    @_writing
     def addTargetDependency(self, dep_targetname):
         # target container proxy 찾기 
         try:
@@ -1792,6 +2687,7 @@ class PbxNativeTarget(PbxObject):
          
         return True
     
+    @_writing
     def removeTargetDependency(self, dep_targetname):
         # 기존에 container가 있는지 확인
         try:
@@ -1833,6 +2729,7 @@ class PbxNativeTarget(PbxObject):
         
         return True
     
+    @_writing
     def addSource(self, path, group = None):
         assert os.path.exists(path)
         if not group :
@@ -1860,6 +2757,7 @@ class PbxNativeTarget(PbxObject):
 
         return True
     
+    @_writing
     def addHeader(self, path, group = None):
         assert os.path.exists(path)
         if not group :
@@ -1886,6 +2784,7 @@ class PbxNativeTarget(PbxObject):
         self.getBuildHeadersPhase().appendValue('files',buildfile.getGuid())
         return True
     
+    @_writing
     def addResource(self, path, group = None):
         assert os.path.exists(path)
         if not group :
@@ -1912,6 +2811,7 @@ class PbxNativeTarget(PbxObject):
         self.getBuildResourcesPhase().appendValue('files',buildfile.getGuid())
         return True
     
+    @_writing
     def addLibrary(self, libname, group = None):
         # libname must be library path or library name of other project
         assert os.path.exists(libname) or os.path.basename(libname) == libname
@@ -1951,6 +2851,7 @@ class PbxNativeTarget(PbxObject):
 
         return True
     
+    @_writing
     def removeLibrary(self, libname):
         # remove file reference
         filerefs = self.pbxproj.getAllObjects(isa='PBXFileReference', path=libname)
@@ -2001,13 +2902,1434 @@ class PbxNativeTarget(PbxObject):
     
     def isLibrary(self):
         return self.get('productType') == "com.apple.product-type.library.static"
+
+    def getBuildSettings(self, configuration, conditions=None):
+        'project, target의 setting을 합친 최종 build setting'
+        return self.pbxproj.getSettingsResolver().getSettings(configuration, self, conditions)
     
+    def getBuildSetting(self, key, configuration, conditions=None):
+        return self.pbxproj.getSettingsResolver().getSetting(key, configuration, self, conditions)
     
     
-class PbxprojTestCase(unittest.TestCase):
-    def setUp(self):
-        self.source = '~/Desktop/aa/aa.xcodeproj'
-        self.pbx = PbxProject.loadPbxproj(self.source)
+    
+#
+# copy-on-write snapshot
+#
+
+def _iterobjects(objects):
+    '(guid, object)를 복사하지 않고 순회한다. 읽기 전용으로만 사용해야 한다.'
+    if isinstance(objects, dict):
+        items = objects.iteritems()
+    else:
+        items = objects.iterrawitems()
+    if PbxprojStats.enabled:
+        return _countscanned(items)
+    return items
+
+def _countscanned(items):
+    count = 0
+    try:
+        for item in items:
+            count += 1
+            yield item
+    finally:
+        PbxprojStats.count('scan.objects', count)
+
+def _cowcopy(obj):
+    'object 복사. buildSettings, projectReferences 같은 안쪽의 dict도 복사한다.'
+    ret = {}
+    for k, v in obj.iteritems():
+        if isinstance(v, dict):
+            v = _cowcopy(v)
+        elif isinstance(v, (list, tuple)) and v and isinstance(v[0], dict):
+            v = type(v)(isinstance(x, dict) and _cowcopy(x) or x for x in v)
+        elif isinstance(v, list):
+            v = list(v)
+        ret[k] = v
+    return ret
+
+class PbxFrozenObjects(object):
+    '''snapshot에 고정된 objects. 
+    
+    바뀌지 않으므로 여러 snapshot과 project가 공유한다. 이전 layer에서 
+    바뀐 object( changes )와 지워진 guid( removed )만 가지고 있다.
+    '''
+    # layer가 이보다 깊어지면 하나로 합친다.
+    maxdepth = 32
+    
+    def __init__(self, parent=None, changes=None, removed=frozenset()):
+        self.parent = parent
+        self.changes = changes is not None and changes or {}
+        self.removed = removed
+        self.depth = parent and parent.depth + 1 or 0
+    
+    def get(self, guid, default=None):
+        layer = self
+        while layer:
+            obj = layer.changes.get(guid)
+            if obj is not None: return obj
+            if guid in layer.removed: return default
+            layer = layer.parent
+        return default
+    
+    def iterrawitems(self):
+        hidden = set()
+        layer = self
+        while layer.parent:
+            for guid, obj in layer.changes.iteritems():
+                if guid not in hidden:
+                    yield guid, obj
+            hidden.update(layer.changes)
+            hidden.update(layer.removed)
+            layer = layer.parent
+        
+        for guid, obj in layer.changes.iteritems():
+            if guid not in hidden:
+                yield guid, obj
+    
+    iteritems = iterrawitems
+    
+    def compact(self):
+        'layer들을 하나로 합친 PbxFrozenObjects'
+        return PbxFrozenObjects(changes=dict(self.iterrawitems()))
+
+class _PbxRawObjects(object):
+    'PbxCowObjects를 복사하지 않고 읽기만 하는 view'
+    def __init__(self, objects):
+        self.objects = objects
+    
+    def get(self, guid, default=None):
+        return self.objects.rawget(guid, default)
+    
+    def iterrawitems(self):
+        return self.objects.iterrawitems()
+
+class PbxCowObjects(object):
+    '''snapshot을 만든 project의 pbxdata['objects'].
+    
+    PbxFrozenObjects를 공유하고 있다가 object에 처음 접근할때 그 object만 
+    복사해서( copy-on-write ) 수정할 수 있게 한다. object_if 같은 검색은
+    _iterobjects()로 복사 없이 순회하고 찾은 object만 복사한다.
+    '''
+    def __init__(self, frozen):
+        self.frozen = frozen
+        self.local = {}
+        self.removed = set()
+    
+    def __getitem__(self, guid):
+        obj = self.local.get(guid)
+        if obj is not None:
+            return obj
+        if guid in self.removed:
+            raise KeyError(guid)
+        
+        obj = self.frozen.get(guid)
+        if obj is None:
+            raise KeyError(guid)
+        # 동시에 읽는 thread들이 같은 복사본을 사용하도록 setdefault
+        return self.local.setdefault(guid, _cowcopy(obj))
+    
+    def get(self, guid, default=None):
+        try:
+            return self[guid]
+        except KeyError:
+            return default
+    
+    def rawget(self, guid, default=None):
+        '복사하지 않고 읽기 ( 수정하면 안됨 )'
+        obj = self.local.get(guid)
+        if obj is not None:
+            return obj
+        if guid in self.removed:
+            return default
+        return self.frozen.get(guid, default)
+    
+    def getraw(self):
+        return _PbxRawObjects(self)
+    
+    def __setitem__(self, guid, obj):
+        self.local[guid] = obj
+        self.removed.discard(guid)
+    
+    def __delitem__(self, guid):
+        if guid not in self:
+            raise KeyError(guid)
+        self.local.pop(guid, None)
+        self.removed.add(guid)
+    
+    def __contains__(self, guid):
+        return self.rawget(guid) is not None
+    
+    has_key = __contains__
+    
+    def __len__(self):
+        return sum(1 for _ in self.iterrawitems())
+    
+    def __nonzero__(self):
+        for _ in self.iterrawitems():
+            return True
+        return False
+    
+    def __iter__(self):
+        for guid, _ in self.iterrawitems():
+            yield guid
+    
+    def keys(self):
+        return list(self)
+    
+    def iterrawitems(self):
+        # 순회 도중에 복사된 object가 빠지지 않도록 현재 상태를 기준으로 한다.
+        local = dict(self.local)
+        removed = set(self.removed)
+        for item in local.iteritems():
+            yield item
+        for guid, obj in self.frozen.iterrawitems():
+            if guid not in local and guid not in removed:
+                yield guid, obj
+    
+    def iteritems(self):
+        for guid in self.keys():
+            yield guid, self[guid]
+    
+    def items(self):
+        return list(self.iteritems())
+    
+    def values(self):
+        return [obj for _, obj in self.iteritems()]
+    
+    def freeze(self):
+        '지금까지의 수정을 PbxFrozenObjects로 고정한다. 손댄 object의 수에만 비례'
+        # 읽기만 하고 바뀌지 않은 object는 다시 공유한다.
+        for guid, obj in self.local.items():
+            if self.frozen.get(guid) == obj:
+                del self.local[guid]
+        
+        if not self.local and not self.removed:
+            return self.frozen
+        
+        frozen = PbxFrozenObjects(self.frozen, self.local, frozenset(self.removed))
+        if frozen.depth > PbxFrozenObjects.maxdepth:
+            frozen = frozen.compact()
+        return frozen
+
+class PbxProjectSnapshot(object):
+    '''PbxProject.snapshot()으로 만든 snapshot.
+    
+    usage:
+    
+    snap = pbx.snapshot()
+    target.addFramework('QuartzCore.framework')
+    added, removed, changed = snap.diff(pbx)
+    pbx.restore(snap)
+    '''
+    def __init__(self, pbxproj, frozen, data):
+        self.pbxproj = pbxproj
+        self.frozen = frozen
+        # pbxdata에서 objects를 제외한 값
+        self.data = data
+    
+    def createProject(self):
+        'snapshot을 공유하는 새로운 PbxProject'
+        obj = PbxProject()
+        obj.pbxproj = obj
+        obj.pbxdata = dict(self.data)
+        obj.pbxdata['objects'] = PbxCowObjects(self.frozen)
+        obj.path = self.pbxproj.path
+        obj.name = self.pbxproj.name
+        obj.target = self.pbxproj.target
+        obj.obj = obj.objectForProject()
+        return obj
+    
+    def diff(self, other):
+        '''|other|( snapshot 혹은 project )와 비교 
+        
+        return : (추가된 guid, 없어진 guid, 바뀐 guid)
+        '''
+        if isinstance(other, PbxProject):
+            other = other.pbxdata['objects']
+            if isinstance(other, dict):
+                # |other| project를 바꾸지 않도록 복사한다.
+                theirs = dict(other)
+            else:
+                theirs = dict(other.iterrawitems())
+        else:
+            theirs = dict(other.frozen.iterrawitems())
+        
+        removed, changed = [], []
+        for guid, obj in self.frozen.iterrawitems():
+            their = theirs.pop(guid, None)
+            if their is None:
+                removed.append(guid)
+            elif their is not obj and their != obj:
+                changed.append(guid)
+        return theirs.keys(), removed, changed
+    
+    
+#
+# build settings resolver
+#
+
+# $(NAME), ${NAME}, $(NAME:modifier...)
+_settingref = re.compile(r'\$(?:\(([A-Za-z0-9_]+)((?::[A-Za-z0-9_]+)*)\)|\{([A-Za-z0-9_]+)((?::[A-Za-z0-9_]+)*)\})')
+
+# $(NAME:modifier) 에서 사용할 수 있는 modifier
+_settingModifiers = {
+    'lower'             : lambda v: v.lower(),
+    'upper'             : lambda v: v.upper(),
+    'identifier'        : lambda v: re.sub(r'[^A-Za-z0-9_]', '_', v),
+    'rfc1034identifier' : lambda v: re.sub(r'[^A-Za-z0-9.\-]', '-', v),
+    'base'              : lambda v: os.path.splitext(os.path.basename(v))[0],
+    'file'              : os.path.basename,
+    'dir'               : os.path.dirname,
+    'suffix'            : lambda v: os.path.splitext(v)[1],
+}
+
+def _settingAsString(value):
+    if value is None: return ''
+    if isinstance(value, (list, tuple)): return ' '.join(value)
+    if not isinstance(value, basestring): return str(value)
+    return value
+
+def _settingAsList(value):
+    if value is None: return ()
+    if isinstance(value, (list, tuple)): return tuple(value)
+    return tuple(_settingAsString(value).split())
+
+def _inheritSetting(value, inherited):
+    '|value|안의 $(inherited)를 하위 layer의 값 |inherited|로 바꾼다.'
+    if isinstance(value, (list, tuple)):
+        ret = []
+        for item in value:
+            if item in ('$(inherited)', '${inherited}'):
+                ret.extend(_settingAsList(inherited))
+            elif 'inherited' in item:
+                ret.append(_inheritSetting(item, inherited))
+            else:
+                ret.append(item)
+        return tuple(ret)
+    
+    if isinstance(value, basestring) and 'inherited' in value:
+        inherited = _settingAsString(inherited)
+        return value.replace('$(inherited)', inherited).replace('${inherited}', inherited).strip()
+    return value
+
+def _splitConditionalKey(key):
+    ''''KEY[sdk=iphoneos*][arch=*]' -> ('KEY', (('sdk','iphoneos*'), ('arch','*')))'''
+    name, _, rest = key.partition('[')
+    conditions = re.findall(r'([A-Za-z_]+)\s*=\s*([^\]]*)\]', '[' + rest)
+    return name.strip(), tuple((k, v.strip()) for k, v in conditions)
+
+def _matchConditions(conditions, context):
+    for k, pattern in conditions:
+        value = context.get(k)
+        if value is None or not fnmatch.fnmatchcase(value, pattern):
+            return False
+    return True
+
+def _applySettings(settings, items, context):
+    '''(key, value)들을 |settings|에 덮어쓴다.
+    
+    KEY[sdk=iphoneos*] 같은 조건부 setting은 |context|와 맞는 경우에만, 
+    같은 level의 일반 setting 보다 나중에 적용한다.
+    '''
+    conditional = []
+    for k, v in items:
+        if '[' in k:
+            conditional.append((k, v))
+        else:
+            settings[k] = _inheritSetting(v, settings.get(k))
+    
+    for k, v in conditional:
+        name, conditions = _splitConditionalKey(k)
+        if _matchConditions(conditions, context):
+            settings[name] = _inheritSetting(v, settings.get(name))
+
+class PbxBuildSettingsResolver(object):
+    '''target, configuration 별로 실제 build에 쓰이는 setting을 계산한다.
+    
+    project xcconfig -> project -> target xcconfig -> target 순서로 layer를 
+    덮어 쓰면서 $(inherited)를 풀어 둔 layer와 $(VAR)까지 확장한 값을 각각 
+    memoize 한다. setting이 바뀌면 invalidate(guid)로 그 configuration에 의존하는
+    항목만 지운다. xcconfig file은 path로 invalidate 한다.
+    
+    |conditions|는 KEY[sdk=iphoneos*] 같은 조건부 setting을 고를때 사용한다. 
+    ex) {'sdk':'iphoneos5.0', 'arch':'armv7'}
+    
+    usage:
+    
+    resolver = pbx.getSettingsResolver()
+    resolver.getSetting('HEADER_SEARCH_PATHS', 'Release', target)
+    resolver.getAllSettings()       # { (target name, configuration) : settings }
+    '''
+    def __init__(self, pbxproj, environment=None):
+        self.pbxproj = pbxproj
+        # build setting, 기본 변수에 없을때 사용할 값 
+        self.environment = environment or {}
+        
+        # (target guid | None, configuration, conditions) -> (settings, builtins, sources)
+        self._layers = {}
+        # (target guid | None, configuration, conditions) -> { key : expanded value }
+        self._resolved = {}
+        # guid 혹은 xcconfig path -> set of (target guid | None, configuration, conditions)
+        self._dependents = {}
+        self._targets = None
+        
+    @_resolving
+    def invalidate(self, guid=None):
+        '|guid|에 의존하는 결과만 지운다. guid가 없으면 모두 지운다.'
+        if guid is None:
+            self._layers.clear()
+            self._resolved.clear()
+            self._dependents.clear()
+            self._targets = None
+            return
+        
+        for cachekey in self._dependents.pop(guid, ()):
+            self._layers.pop(cachekey, None)
+            self._resolved.pop(cachekey, None)
+    
+    @_resolving
+    def invalidateChangedXcconfigs(self):
+        'disk에서 바뀐 xcconfig에 의존하는 결과를 지운다.'
+        for path in [k for k in self._dependents if k.endswith('.xcconfig')]:
+            if Xcconfig.isChanged(path):
+                self.invalidate(path)
+    
+    def getConfigurationNames(self):
+        configlist = self.pbxproj.getConfigureList()
+        if not configlist: return []
+        return [c.getName() for c in configlist.getConfigurations()]
+    
+    @_resolving
+    @_timed('settings')
+    def getSetting(self, key, configuration, target=None, conditions=None):
+        '확장된 setting 값. 없으면 None'
+        return self._get(key, self._cacheKey(configuration, target, conditions))
+    
+    @_resolving
+    @_timed('settings')
+    def getSettings(self, configuration, target=None, conditions=None):
+        '확장된 모든 setting 값'
+        cachekey = self._cacheKey(configuration, target, conditions)
+        settings = self._getLayer(cachekey)[0]
+        ret = {}
+        for key in settings:
+            ret[key] = self._get(key, cachekey)
+        return ret
+    
+    @_resolving
+    def getAllSettings(self):
+        '모든 (target 이름, configuration)에 대한 setting'
+        ret = {}
+        configurations = self.getConfigurationNames()
+        for target in self.pbxproj.getPbxTargets():
+            for configuration in configurations:
+                ret[(target.getName(), configuration)] = self.getSettings(configuration, target)
+        return ret
+    
+    @_resolving
+    def expand(self, value, configuration, target=None, conditions=None):
+        '|value|안의 $(VAR)를 주어진 target, configuration 기준으로 확장한다.'
+        cachekey = self._cacheKey(configuration, target, conditions)
+        return self._expandValue(value, self._getLayer(cachekey), self._getResolved(cachekey), [])
+    
+    #
+    # private function
+    #
+    
+    def _cacheKey(self, configuration, target, conditions):
+        conditions = conditions and tuple(sorted(conditions.iteritems())) or ()
+        if target is None:
+            return (None, configuration, conditions)
+        if isinstance(target, PbxObject):
+            return (target.getGuid(), configuration, conditions)
+        
+        # target 이름 혹은 guid
+        if self._targets is None:
+            self._targets = dict((t.getName(), t.getGuid()) for t in self.pbxproj.getPbxTargets())
+        return (self._targets.get(target, target), configuration, conditions)
+    
+    def _getResolved(self, cachekey):
+        resolved = self._resolved.get(cachekey)
+        if resolved is None:
+            resolved = self._resolved[cachekey] = {}
+        return resolved
+    
+    def _get(self, key, cachekey):
+        resolved = self._getResolved(cachekey)
+        if key in resolved:
+            return resolved[key]
+        return self._expandKey(key, self._getLayer(cachekey), resolved, [])
+    
+    def _getLayer(self, cachekey):
+        layer = self._layers.get(cachekey)
+        if layer is not None:
+            return layer
+        
+        targetguid, configuration, conditions = cachekey
+        objects = self.pbxproj.objects()
+        if targetguid is None:
+            lower, sources = {}, []
+            ownerobj = self.pbxproj.objectForProject()
+        else:
+            lower, _, sources = self._getLayer((None, configuration, conditions))
+            sources = list(sources)
+            ownerobj = objects[targetguid]
+        
+        context = dict(conditions)
+        context['config'] = configuration
+        
+        settings = dict(lower)
+        configguid = self._findConfiguration(ownerobj, configuration, sources)
+        if configguid:
+            config = createPbxObject(self.pbxproj, configguid)
+            xcconfig = config.getXcconfig()
+            if xcconfig:
+                xcconfig.applySettings(settings, context)
+                sources.extend(xcconfig.getIncludedPaths())
+            _applySettings(settings, (config.get('buildSettings') or {}).iteritems(), context)
+        
+        layer = (settings, self._builtins(targetguid, configuration), sources)
+        self._layers[cachekey] = layer
+        for guid in sources:
+            self._dependents.setdefault(guid, set()).add(cachekey)
+        return layer
+    
+    def _findConfiguration(self, ownerobj, configuration, sources):
+        objects = self.pbxproj.objects()
+        listguid = ownerobj.get('buildConfigurationList')
+        configlist = objects.get(listguid)
+        if not configlist: return None
+        
+        sources.append(listguid)
+        for guid in configlist.get('buildConfigurations') or ():
+            obj = objects.get(guid)
+            if obj and obj.get('name') == configuration:
+                sources.append(guid)
+                return guid
+        return None
+    
+    def _builtins(self, targetguid, configuration):
+        pbx = self.pbxproj
+        ret = {'CONFIGURATION' : configuration}
+        if pbx.path:
+            ret['PROJECT_DIR'] = ret['SRCROOT'] = ret['SOURCE_ROOT'] = pbx.getRootPath()
+            ret['PROJECT_FILE_PATH'] = pbx.xcodeprojpath()
+            ret['PROJECT_NAME'] = pbx.target
+        if targetguid:
+            target = pbx.objects().get(targetguid) or {}
+            ret['TARGET_NAME'] = target.get('name')
+            ret['PRODUCT_NAME'] = target.get('productName')
+        return ret
+    
+    def _expandKey(self, key, layer, resolved, stack):
+        if key in resolved:
+            return resolved[key]
+        if key in stack:
+            raise PbxprojSettingsException('cyclic reference : %s' % ' -> '.join(stack + [key]))
+        
+        settings, builtins, _ = layer
+        if key in settings:
+            value = settings[key]
+        elif key in builtins:
+            value = builtins[key]
+        else:
+            value = self.environment.get(key)
+        
+        if value is not None:
+            stack.append(key)
+            try:
+                value = self._expandValue(value, layer, resolved, stack)
+            finally:
+                stack.pop()
+        
+        resolved[key] = value
+        return value
+    
+    def _expandValue(self, value, layer, resolved, stack):
+        if isinstance(value, (list, tuple)):
+            return tuple([self._expandValue(v, layer, resolved, stack) for v in value])
+        if not isinstance(value, basestring) or '$' not in value:
+            return value
+        
+        def replace(m):
+            if m.group(1):
+                name, modifiers = m.group(1), m.group(2)
+            else:
+                name, modifiers = m.group(3), m.group(4)
+            ret = _settingAsString(self._expandKey(name, layer, resolved, stack))
+            for modifier in modifiers.split(':')[1:]:
+                func = _settingModifiers.get(modifier)
+                if func: ret = func(ret)
+            return ret
+        
+        return _settingref.sub(replace, value)
+    
+    
+#
+# bulk build settings editor
+#
+
+class PbxBuildSettingsEditor(object):
+    '''여러 target, configuration의 build setting을 한번에 수정한다.
+    
+    set/append/remove/replace로 수정 내용을 모아 두었다가 apply()에서 
+    configuration list들을 한번만 돌면서 모두 적용한다. |key|에 re.compile()한 
+    pattern을 주면 pattern과 맞는 모든 key에 적용한다.
+    
+    usage:
+    
+    editor = PbxBuildSettingsEditor(pbx)
+    editor.set('CODE_SIGN_IDENTITY', 'iPhone Distribution')
+    editor.append('HEADER_SEARCH_PATHS', ('../include',))
+    editor.remove('OTHER_LDFLAGS', '-all_load')
+    editor.replace(re.compile('_SEARCH_PATHS$'), r'^\.\./old', '../new')
+    
+    # dry run : [(target name | None, configuration, key, old, new) ...]
+    for change in editor.apply(configurations=['Release'], dryRun=True):
+        print change
+    '''
+    def __init__(self, pbxproj):
+        self.pbxproj = pbxproj
+        self.edits = []
+    
+    def set(self, key, value):
+        self.edits.append((key, self._set, (value,)))
+        return self
+    
+    def append(self, key, values, unique=True):
+        self.edits.append((key, self._append, (_settingAsList(values), unique)))
+        return self
+    
+    def remove(self, key, values=None):
+        'values가 없으면 key를 지운다.'
+        if values is not None: values = _settingAsList(values)
+        self.edits.append((key, self._remove, (values,)))
+        return self
+    
+    def replace(self, key, pattern, repl):
+        self.edits.append((key, self._replace, (re.compile(pattern), repl)))
+        return self
+    
+    @_writing
+    def apply(self, targets=None, configurations=None, project=True, dryRun=False):
+        '''수정 내용을 적용하고 바뀐 내용을 반환한다.
+        
+        targets        : target 이름 혹은 PbxNativeTarget list. None이면 모든 target
+        configurations : configuration 이름 list. None이면 모든 configuration
+        project        : project level의 configuration도 수정할지 여부
+        dryRun         : True이면 실제로 수정하지 않고 바뀔 내용만 반환
+        '''
+        objects = self.pbxproj.objects()
+        
+        owners = []
+        if project:
+            owners.append((None, self.pbxproj.objectForProject()))
+        if targets is None or targets:
+            names = None
+            if targets is not None:
+                names = set(isinstance(t, PbxObject) and t.getName() or t for t in targets)
+            for _, obj in self.pbxproj.objects_if({'isa':'PBXNativeTarget'}):
+                if names is None or obj.get('name') in names:
+                    owners.append((obj.get('name'), obj))
+        
+        changes = []
+        for ownername, ownerobj in owners:
+            configlist = objects.get(ownerobj.get('buildConfigurationList'))
+            if not configlist: continue
+            
+            for guid in configlist.get('buildConfigurations') or ():
+                config = objects.get(guid)
+                if not config: continue
+                if configurations is not None and config.get('name') not in configurations: continue
+                
+                settings = config.get('buildSettings') or {}
+                edited = self._edit(settings)
+                changed = False
+                for key in sorted(set(settings) | set(edited)):
+                    old, new = settings.get(key), edited.get(key)
+                    if old != new:
+                        changes.append((ownername, config.get('name'), key, old, new))
+                        changed = True
+                
+                if changed and not dryRun:
+                    config['buildSettings'] = edited
+                    self.pbxproj.invalidateSettings(guid)
+        return changes
+    
+    @staticmethod
+    def report(changes):
+        '|changes|를 사람이 읽을 수 있는 문자열로'
+        lines = []
+        for ownername, configuration, key, old, new in changes:
+            lines.append('%s/%s %s : %r -> %r' % (ownername or '<project>', configuration, key, old, new))
+        return '\n'.join(lines)
+    
+    #
+    # private function
+    #
+    
+    def _edit(self, settings):
+        edited = dict(settings)
+        for key, func, args in self.edits:
+            if isinstance(key, basestring):
+                func(edited, key, *args)
+            else:
+                for k in [k for k in edited if key.search(k)]:
+                    func(edited, k, *args)
+        return edited
+    
+    def _set(self, settings, key, value):
+        settings[key] = value
+    
+    def _append(self, settings, key, values, unique):
+        old = settings.get(key)
+        items = list(_settingAsList(old))
+        for v in values:
+            if not unique or v not in items:
+                items.append(v)
+        
+        if isinstance(old, basestring):
+            settings[key] = ' '.join(items)
+        else:
+            settings[key] = tuple(items)
+    
+    def _remove(self, settings, key, values):
+        if key not in settings: return
+        if values is None:
+            del settings[key]
+            return
+        
+        old = settings[key]
+        items = [v for v in _settingAsList(old) if v not in values]
+        if not items:
+            del settings[key]
+        elif isinstance(old, basestring):
+            settings[key] = ' '.join(items)
+        else:
+            settings[key] = tuple(items)
+    
+    def _replace(self, settings, key, pattern, repl):
+        old = settings.get(key)
+        if isinstance(old, (list, tuple)):
+            settings[key] = tuple(pattern.sub(repl, v) for v in old)
+        elif isinstance(old, basestring):
+            settings[key] = pattern.sub(repl, old)
+    
+    
+#
+# validator
+#
+
+_buildphases = ('PBXSourcesBuildPhase', 'PBXHeadersBuildPhase', 'PBXFrameworksBuildPhase', 
+                'PBXResourcesBuildPhase', 'PBXCopyFilesBuildPhase', 'PBXShellScriptBuildPhase')
+_targets = ('PBXNativeTarget', 'PBXAggregateTarget', 'PBXLegacyTarget')
+_groups = ('PBXGroup', 'PBXVariantGroup', 'XCVersionGroup')
+_fileelements = ('PBXFileReference', 'PBXGroup', 'PBXVariantGroup', 'PBXReferenceProxy', 'XCVersionGroup')
+
+# isa -> (필수 key, guid를 값으로 가지는 key, guid list를 값으로 가지는 key)
+_pbxschema = {
+    'PBXProject'            : (('buildConfigurationList', 'mainGroup', 'targets'),
+                               ('buildConfigurationList', 'mainGroup', 'productRefGroup'),
+                               ('targets',)),
+    'PBXNativeTarget'       : (('buildConfigurationList', 'buildPhases', 'name'),
+                               ('buildConfigurationList', 'productReference'),
+                               ('buildPhases', 'dependencies', 'buildRules')),
+    'PBXAggregateTarget'    : (('buildConfigurationList', 'name'),
+                               ('buildConfigurationList',),
+                               ('buildPhases', 'dependencies')),
+    'PBXLegacyTarget'       : (('buildConfigurationList', 'name'),
+                               ('buildConfigurationList',),
+                               ('buildPhases', 'dependencies')),
+    'PBXGroup'              : (('children', 'sourceTree'), (), ('children',)),
+    'PBXVariantGroup'       : (('children', 'sourceTree'), (), ('children',)),
+    'XCVersionGroup'        : (('children', 'sourceTree'), ('currentVersion',), ('children',)),
+    'PBXFileReference'      : (('sourceTree',), (), ()),
+    'PBXReferenceProxy'     : (('remoteRef', 'sourceTree'), ('remoteRef',), ()),
+    'PBXBuildFile'          : (('fileRef',), ('fileRef',), ()),
+    'PBXContainerItemProxy' : (('containerPortal', 'proxyType', 'remoteGlobalIDString'), ('containerPortal',), ()),
+    'PBXTargetDependency'   : ((), ('target', 'targetProxy'), ()),
+    'XCConfigurationList'   : (('buildConfigurations',), (), ('buildConfigurations',)),
+    'XCBuildConfiguration'  : (('buildSettings', 'name'), ('baseConfigurationReference',), ()),
+}
+for _isa in _buildphases:
+    _pbxschema[_isa] = (('files',), (), ('files',))
+
+# key -> 참조되는 object가 가져야 하는 isa
+_pbxreftypes = {
+    'buildConfigurationList'     : ('XCConfigurationList',),
+    'buildConfigurations'        : ('XCBuildConfiguration',),
+    'baseConfigurationReference' : ('PBXFileReference',),
+    'buildPhases'                : _buildphases,
+    'targets'                    : _targets,
+    'target'                     : _targets,
+    'dependencies'               : ('PBXTargetDependency',),
+    'targetProxy'                : ('PBXContainerItemProxy',),
+    'remoteRef'                  : ('PBXContainerItemProxy',),
+    'containerPortal'            : ('PBXFileReference', 'PBXProject'),
+    'files'                      : ('PBXBuildFile',),
+    'fileRef'                    : _fileelements,
+    'children'                   : _fileelements,
+    'mainGroup'                  : ('PBXGroup',),
+    'productRefGroup'            : ('PBXGroup',),
+    'productReference'           : ('PBXFileReference',),
+    'currentVersion'             : ('PBXFileReference',),
+}
+
+class PbxprojValidator(object):
+    '''project의 무결성 검사.
+    
+    objects를 한번만 돌면서 _pbxschema에 따라 필수 key, guid 참조, 중복된 
+    children, build file과 build phase의 관계를 확인한다. 문제는 
+    (object path, message) 형태로 errors, warnings에 모인다.
+    
+    usage:
+    
+    validator = PbxprojValidator(pbx)
+    for path, msg in validator.validate():
+        print path, msg
+    '''
+    def __init__(self, pbxproj):
+        self.pbxproj = pbxproj
+        self.errors = []
+        self.warnings = []
+    
+    def validate(self):
+        'error 목록을 반환한다. warning은 self.warnings에 남는다.'
+        self.errors = []
+        self.warnings = []
+        
+        data = self.pbxproj.pbxdata
+        objects = data.get('objects')
+        if objects is None:
+            self.errors.append(('objects', 'missing objects'))
+            return self.errors
+        
+        # 읽기만 하므로 snapshot을 사용중인 경우에도 복사하지 않는다.
+        if isinstance(objects, PbxCowObjects):
+            objects = objects.getraw()
+        
+        rootguid = data.get('rootObject')
+        rootobj = objects.get(rootguid)
+        if not rootobj or rootobj.get('isa') != 'PBXProject':
+            self.errors.append(('rootObject', 'rootObject %s is not a PBXProject' % rootguid))
+        
+        parentOf = {}       # group child guid -> group guid
+        phaseOf = {}        # build file guid -> build phase guid
+        buildfiles = []
+        
+        for guid, obj in _iterobjects(objects):
+            isa = _isobject(obj) and obj.get('isa') or None
+            if not isa:
+                self._addError(guid, isa, None, 'object has no isa')
+                continue
+            
+            schema = _pbxschema.get(isa)
+            if not schema: continue
+            required, refs, lists = schema
+            
+            for key in required:
+                if key not in obj:
+                    self._addError(guid, isa, None, 'missing required key "%s"' % key)
+            
+            for key in refs:
+                value = obj.get(key)
+                if value is None or (value == '' and key not in required): continue
+                msg = self._checkRef(objects, key, value)
+                if msg: self._addError(guid, isa, key, msg)
+            
+            for key in lists:
+                value = obj.get(key)
+                if value is None: continue
+                if not isinstance(value, (list, tuple)):
+                    self._addError(guid, isa, key, 'not a list')
+                    continue
+                
+                owners = None
+                if key == 'children': owners = parentOf
+                elif key == 'files': owners = phaseOf
+                
+                seen = set()
+                for i, ref in enumerate(value):
+                    if ref in seen:
+                        msg = 'duplicate child %s' % ref
+                    else:
+                        seen.add(ref)
+                        msg = self._checkRef(objects, key, ref)
+                        if owners is None:
+                            pass
+                        elif ref not in owners:
+                            owners[ref] = guid
+                        elif not msg:
+                            msg = '%s is also in %s' % (ref, owners[ref])
+                    
+                    if msg: self._addError(guid, isa, '%s[%d]' % (key, i), msg)
+            
+            if isa == 'PBXBuildFile':
+                buildfiles.append(guid)
+            elif isa == 'PBXTargetDependency':
+                if not obj.get('target') and not obj.get('targetProxy'):
+                    self._addError(guid, isa, None, 'target dependency has neither target nor targetProxy')
+            elif isa == 'PBXContainerItemProxy':
+                # 같은 project 안의 target을 가리키는 경우
+                if obj.get('containerPortal') == rootguid:
+                    msg = self._checkRef(objects, 'remoteGlobalIDString', obj.get('remoteGlobalIDString'))
+                    if msg: self._addError(guid, isa, 'remoteGlobalIDString', msg)
+            elif isa == 'PBXProject':
+                for i, projref in enumerate(obj.get('projectReferences') or ()):
+                    for key in ('ProductGroup', 'ProjectRef'):
+                        msg = self._checkRef(objects, key, projref.get(key))
+                        if msg: self._addError(guid, isa, 'projectReferences[%d]/%s' % (i, key), msg)
+        
+        for guid in buildfiles:
+            if guid not in phaseOf:
+                self.warnings.append(('objects/%s(PBXBuildFile)' % guid, 'build file is not in any build phase'))
+        
+        return self.errors
+    
+    def _addError(self, guid, isa, key, msg):
+        'objects/guid(isa)/key 형태의 path는 error인 경우에만 만든다.'
+        path = 'objects/%s(%s)' % (guid, isa)
+        if key is not None:
+            path = '%s/%s' % (path, key)
+        self.errors.append((path, msg))
+    
+    def _checkRef(self, objects, key, ref):
+        '문제가 있으면 message를 반환'
+        obj = objects.get(ref)
+        if obj is None:
+            return 'reference to missing object %s' % ref
+        
+        types = _pbxreftypes.get(key)
+        if types and obj.get('isa') not in types:
+            return '%s is %s, expected %s' % (ref, obj.get('isa'), ' or '.join(types))
+        return None
+    
+    
+#
+# columnar object store
+#
+
+# 이 key들의 값( guid tuple )은 guid id의 array로 저장한다.
+_guidlistkeys = frozenset(key for _, _, lists in _pbxschema.values() for key in lists)
+
+def _isobject(value):
+    'objects의 값( dict 혹은 PbxColumnarRow )인지'
+    return isinstance(value, (dict, PbxColumnarRow))
+
+def _internstr(s, table=None):
+    '''문자열을 intern한다.
+    
+    py2의 unicode는 글자당 4byte이므로 ascii로만 된 unicode는 str로 바꾼다.
+    ascii가 아닌 문자열은 |table|을 사용한다.
+    '''
+    if isinstance(s, unicode):
+        try:
+            s = s.encode('ascii')
+        except UnicodeError:
+            if table is None: return s
+            return table.setdefault(s, s)
+    return intern(s)
+
+class PbxColumnTable(object):
+    'isa가 같은 object들을 column으로 저장하는 table'
+    def __init__(self, isa, index):
+        self.isa = isa
+        self.index = index          # PbxColumnarObjects.tables에서의 위치
+        self.rows = array('i')      # row -> guid id ( 지워진 row는 -1 )
+        self.columns = {}           # key -> [row별 값, 없으면 None]
+        self.free = []              # 지워진 row
+    
+    def append(self, gid):
+        if self.free:
+            row = self.free.pop()
+            self.rows[row] = gid
+            return row
+        
+        self.rows.append(gid)
+        for column in self.columns.itervalues():
+            column.append(None)
+        return len(self.rows) - 1
+    
+    def remove(self, row):
+        self.rows[row] = -1
+        for column in self.columns.itervalues():
+            column[row] = None
+        self.free.append(row)
+    
+    def setValue(self, row, key, value):
+        column = self.columns.get(key)
+        if column is None:
+            if value is None: return
+            column = self.columns[_internstr(key)] = [None] * len(self.rows)
+        column[row] = value
+
+class PbxColumnarRow(object):
+    '''PbxColumnarObjects의 object 하나를 dict처럼 보여주는 view.
+    
+    값을 가지고 있지 않고 읽고 쓸때마다 column을 찾아가므로 object가 지워지거나 
+    isa가 바뀌어도 항상 현재 값을 보여준다.
+    '''
+    __slots__ = ('store', 'gid')
+    __hash__ = None
+    
+    def __init__(self, store, gid):
+        self.store = store
+        self.gid = gid
+    
+    def _locate(self):
+        loc = self.store.locations[self.gid]
+        if loc < 0:
+            return None, -1
+        return self.store.tables[loc & 0xff], loc >> 8
+    
+    def __getitem__(self, key):
+        table, row = self._locate()
+        if table is None:
+            raise KeyError(key)
+        if key == 'isa' and table.isa is not None:
+            return table.isa
+        column = table.columns.get(key)
+        if column is None or column[row] is None:
+            raise KeyError(key)
+        return self.store._decode(column[row])
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    has_key = __contains__
+    
+    def __setitem__(self, key, value):
+        table, row = self._locate()
+        if table is None:
+            raise KeyError(key)
+        if key == 'isa':
+            if value != table.isa:
+                self.store._move(self.gid, value)
+            return
+        table.setValue(row, key, self.store._encode(key, value))
+    
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key == 'isa':
+            self.store._move(self.gid, None)
+            return
+        table, row = self._locate()
+        table.columns[key][row] = None
+    
+    def setdefault(self, key, default=None):
+        # 저장된 값( buildSettings 같은 dict )을 그대로 돌려준다.
+        if key not in self:
+            self[key] = default
+        return self[key]
+    
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default: return default[0]
+            raise
+        del self[key]
+        return value
+    
+    def update(self, other):
+        for k, v in other.items():
+            self[k] = v
+    
+    def keys(self):
+        table, row = self._locate()
+        if table is None: return []
+        ret = [k for k, column in table.columns.iteritems() if column[row] is not None]
+        if table.isa is not None:
+            ret.append('isa')
+        return ret
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    iterkeys = __iter__
+    
+    def __len__(self):
+        return len(self.keys())
+    
+    def iteritems(self):
+        for k in self.keys():
+            yield k, self[k]
+    
+    def items(self):
+        return list(self.iteritems())
+    
+    def values(self):
+        return [v for _, v in self.iteritems()]
+    
+    def copy(self):
+        return dict(self.iteritems())
+    
+    def __eq__(self, other):
+        if isinstance(other, PbxColumnarRow):
+            if other.store is self.store and other.gid == self.gid: return True
+            other = other.copy()
+        return self.copy() == other
+    
+    def __ne__(self, other):
+        return not self == other
+    
+    def __repr__(self):
+        return repr(self.copy())
+
+class PbxColumnarObjects(object):
+    '''pbxdata['objects']를 isa별 column으로 저장하는 store.
+    
+    object마다 dict를 만드는 대신 isa별 PbxColumnTable에 key별 list로 값을 
+    저장한다. 문자열은 intern하고, children 같은 guid list는 guid id의 array로
+    저장한다. objects[guid]는 dict처럼 동작하는 PbxColumnarRow를 반환하므로 
+    PbxObject.get()/set()은 그대로 사용할 수 있다.
+    
+    usage:
+    
+    pbx = PbxProject.loadPbxproj(path, columnar=True)
+    # 혹은 
+    pbx.useColumnarStorage()
+    '''
+    def __init__(self, objects=None):
+        self.guids = []                 # guid id -> guid
+        self.ids = {}                   # guid -> guid id
+        self.locations = array('l')     # guid id -> row << 8 | table index ( 없으면 -1 )
+        self.tables = []
+        self.tableOf = {}               # isa -> PbxColumnTable
+        self.strings = {}               # ascii가 아닌 문자열의 intern table
+        self.count = 0
+        
+        if objects:
+            for guid, obj in _iterobjects(objects):
+                self._insert(guid, obj, True)
+    
+    #
+    # 내부 함수
+    #
+    
+    def _guidId(self, guid):
+        gid = self.ids.get(guid)
+        if gid is None:
+            guid = _internstr(guid, self.strings)
+            gid = self.ids[guid] = len(self.guids)
+            self.guids.append(guid)
+            self.locations.append(-1)
+        return gid
+    
+    def _table(self, isa):
+        table = self.tableOf.get(isa)
+        if table is None:
+            if len(self.tables) > 0xff:
+                raise ValueError('too many isa types')
+            if isa is not None:
+                isa = _internstr(isa, self.strings)
+            table = self.tableOf[isa] = PbxColumnTable(isa, len(self.tables))
+            self.tables.append(table)
+        return table
+    
+    def _encode(self, key, value, own=False):
+        '''저장할 값으로 바꾼다. 
+        
+        |own|이면 value를 다른 곳에서 참조하지 않으므로 안쪽의 dict도 
+        intern된 문자열로 새로 만든다.
+        '''
+        if isinstance(value, basestring):
+            return _internstr(value, self.strings)
+        if isinstance(value, tuple):
+            if key in _guidlistkeys and all(isinstance(x, basestring) for x in value):
+                return array('i', [self._guidId(x) for x in value])
+            if own:
+                return tuple([self._encode(None, x, own) for x in value])
+        elif own and isinstance(value, dict):
+            return dict((_internstr(k, self.strings), self._encode(k, v, own)) for k, v in value.iteritems())
+        return value
+    
+    def _decode(self, value):
+        if type(value) is array:
+            guids = self.guids
+            return tuple([guids[i] for i in value])
+        return value
+    
+    def _insert(self, guid, obj, own=False):
+        # obj가 같은 object의 row view일 수 있으므로 먼저 값을 꺼내둔다.
+        items = [(k, v) for k, v in obj.iteritems() if k != 'isa']
+        isa = obj.get('isa')
+        
+        gid = self._guidId(guid)
+        if self.locations[gid] >= 0:
+            self._remove(gid)
+        
+        table = self._table(isa)
+        row = table.append(gid)
+        self.locations[gid] = row << 8 | table.index
+        self.count += 1
+        
+        for k, v in items:
+            table.setValue(row, k, self._encode(k, v, own))
+    
+    def _remove(self, gid):
+        loc = self.locations[gid]
+        self.tables[loc & 0xff].remove(loc >> 8)
+        self.locations[gid] = -1
+        self.count -= 1
+    
+    def _move(self, gid, isa):
+        'isa가 바뀐 object를 다른 table로 옮긴다.'
+        obj = PbxColumnarRow(self, gid).copy()
+        obj['isa'] = isa
+        self._insert(self.guids[gid], obj)
+    
+    def _liveid(self, guid):
+        gid = self.ids.get(guid)
+        if gid is None or self.locations[gid] < 0:
+            return None
+        return gid
+    
+    #
+    # dict interface
+    #
+    
+    def __getitem__(self, guid):
+        gid = self._liveid(guid)
+        if gid is None:
+            raise KeyError(guid)
+        return PbxColumnarRow(self, gid)
+    
+    def get(self, guid, default=None):
+        gid = self._liveid(guid)
+        if gid is None:
+            return default
+        return PbxColumnarRow(self, gid)
+    
+    def __setitem__(self, guid, obj):
+        self._insert(guid, obj)
+    
+    def __delitem__(self, guid):
+        gid = self._liveid(guid)
+        if gid is None:
+            raise KeyError(guid)
+        self._remove(gid)
+    
+    def __contains__(self, guid):
+        return self._liveid(guid) is not None
+    
+    has_key = __contains__
+    
+    def __len__(self):
+        return self.count
+    
+    def __iter__(self):
+        guids = self.guids
+        for table in list(self.tables):
+            for gid in table.rows.tolist():
+                if gid >= 0:
+                    yield guids[gid]
+    
+    iterkeys = __iter__
+    
+    def keys(self):
+        return list(self)
+    
+    def iteritems(self):
+        for guid in self.keys():
+            gid = self._liveid(guid)
+            if gid is not None:
+                yield guid, PbxColumnarRow(self, gid)
+    
+    iterrawitems = iteritems
+    
+    def items(self):
+        return list(self.iteritems())
+    
+    def values(self):
+        return [obj for _, obj in self.iteritems()]
+    
+    #
+    # 검색
+    #
+    
+    def select(self, conds, contains=False):
+        '''|conds|의 key, value를 모두 가진 object의 guid 목록.
+        
+        row view를 만들지 않고 column을 직접 비교한다. isa가 조건에 있으면 
+        그 isa의 table만 본다. |contains|이면 list 값은 포함 여부로 비교한다.
+        ( PbxProject.getAllObjects() )
+        '''
+        conds = dict(conds)
+        if 'isa' in conds:
+            table = self.tableOf.get(conds.pop('isa'))
+            tables = table and [table] or []
+        else:
+            tables = self.tables
+        
+        if PbxprojStats.enabled:
+            PbxprojStats.count('scan.objects', sum(len(table.rows) for table in tables))
+        
+        ret = []
+        for table in tables:
+            tests = []
+            for key, value in conds.iteritems():
+                column = table.columns.get(key)
+                if column is None: break
+                if key in _guidlistkeys and isinstance(value, basestring):
+                    value = self.ids.get(value, -1)
+                elif key in _guidlistkeys and isinstance(value, tuple):
+                    value = array('i', [self.ids.get(x, -1) for x in value])
+                tests.append((column, value))
+            else:
+                for row, gid in enumerate(table.rows):
+                    if gid < 0: continue
+                    for column, value in tests:
+                        v = column[row]
+                        if v is None or (contains and not v): break
+                        if contains and isinstance(v, (tuple, list, array)):
+                            if value not in v: break
+                        elif v != value: break
+                    else:
+                        ret.append(self.guids[gid])
+        return ret
+    
+    def getTableSizes(self):
+        'isa -> object 수'
+        return dict((table.isa, len(table.rows) - len(table.free)) for table in self.tables)
+    
+    
+#
+# xcconfig
+#
+
+#cache for xcconfig : abspath -> Xcconfig
+XcconfigCache = {}
+
+class Xcconfig(object):
+    """.xcconfig file.
+    
+    #include 로 포함된 file들은 각각 따로 parse 되어 XcconfigCache에 저장된다.
+    file의 mtime이 바뀐 경우에만 다시 parse 하므로 여러 target이 같은 
+    include chain을 공유해도 한번만 parse 한다.
+    
+    usage:
+    
+    xc = Xcconfig.load('Config/Release.xcconfig')
+    settings = xc.getSettings({'config':'Release', 'sdk':'iphoneos5.0'})
+    """
+    def __init__(self, path, mtime=None):
+        self.path = path
+        self.mtime = mtime
+        # (key, value) 혹은 include인 경우 (None, path)
+        self.entries = []
+        
+    @staticmethod
+    def load(path):
+        'cache에서 xcconfig를 찾고 없거나 바뀌었으면 parse 한다. file이 없으면 None'
+        path = os.path.abspath(os.path.expanduser(path))
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        
+        xcconfig = XcconfigCache.get(path)
+        if xcconfig and xcconfig.mtime == mtime:
+            return xcconfig
+        
+        xcconfig = Xcconfig(path, mtime)
+        xcconfig.parse(file(path).read().decode('utf-8'))
+        XcconfigCache[path] = xcconfig
+        return xcconfig
+    
+    @staticmethod
+    def isChanged(path):
+        xcconfig = XcconfigCache.get(path)
+        if not xcconfig: return True
+        try:
+            return os.stat(path).st_mtime != xcconfig.mtime
+        except OSError:
+            return True
+    
+    def parse(self, data):
+        basedir = os.path.dirname(self.path)
+        self.entries = []
+        for line in data.splitlines():
+            line = line.strip()
+            
+            m = re.match(r'#include\??\s*"(.*)"', line)
+            if m:
+                self.entries.append((None, os.path.normpath(os.path.join(basedir, m.group(1)))))
+                continue
+            
+            # comment
+            if '//' in line:
+                line = line[:line.index('//')].strip()
+            
+            m = re.match(r'([A-Za-z0-9_]+(?:\[[^\]]*\])*)\s*=\s*(.*?);?$', line)
+            if m:
+                key = re.sub(r'\s+', '', m.group(1))
+                self.entries.append((key, m.group(2).strip()))
+    
+    def getIncludes(self):
+        return [v for k, v in self.entries if k is None]
+    
+    def getIncludedPaths(self, stack=None):
+        '이 file과 include된 모든 file의 path'
+        stack = stack or []
+        if self.path in stack: return []
+        ret = [self.path]
+        for path in self.getIncludes():
+            xcconfig = Xcconfig.load(path)
+            if xcconfig:
+                ret.extend(xcconfig.getIncludedPaths(stack + [self.path]))
+        return ret
+    
+    def getSettings(self, context=None, lower=None):
+        settings = dict(lower or {})
+        self.applySettings(settings, context or {})
+        return settings
+    
+    def applySettings(self, settings, context, stack=None):
+        '|settings| 위에 include된 file, 이 file의 setting 순서로 덮어쓴다.'
+        stack = stack or []
+        if self.path in stack:
+            raise PbxprojSettingsException('cyclic #include : %s' % ' -> '.join(stack + [self.path]))
+        
+        conditional = []
+        for k, v in self.entries:
+            if k is None:
+                xcconfig = Xcconfig.load(v)
+                if xcconfig:
+                    xcconfig.applySettings(settings, context, stack + [self.path])
+                else:
+                    sys.stderr.write('xcconfig not found : %s\n' % v)
+            elif '[' in k:
+                conditional.append((k, v))
+            else:
+                settings[k] = _inheritSetting(v, settings.get(k))
+        
+        _applySettings(settings, conditional, context)
+    
+    def __str__(self):
+        return '(Xcconfig : %s)' % self.path
+    
+
+class PbxprojTestCase(unittest.TestCase):
+    def setUp(self):
+        from pbxgen import PbxProjectGenerator
+        self.tempdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tempdir, 'aa', 'aa.xcodeproj')
+        PbxProjectGenerator(targets=2, files=10, subprojects=1).generate(self.source)
+        self.pbx = PbxProject.loadPbxproj(self.source)
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tempdir)
+        PbxprojCache.pop(os.path.join(self.source, 'project.pbxproj'), None)
 
     def testListFramework(self):
         try:
@@ -2094,6 +4416,842 @@ class PbxprojTestCase(unittest.TestCase):
         pbx.save()
         
                 
+def _addTestTarget(pbx, name, settings, configurations=('Debug', 'Release')):
+    'test에서 사용할 PBXNativeTarget 추가'
+    configs = []
+    for configname in configurations:
+        configs.append(PbxBuildConfiguration.createObject(pbx, configname, dict(settings)).getGuid())
+    
+    listguid = pbx.createPbxGuid()
+    pbx.setObject(listguid, {'isa' : 'XCConfigurationList',
+                             'buildConfigurations' : tuple(configs),
+                             'defaultConfigurationIsVisible' : '0',
+                             'defaultConfigurationName' : configurations[-1]})
+    guid = pbx.createPbxGuid()
+    pbx.setObject(guid, {'isa' : 'PBXNativeTarget',
+                         'buildConfigurationList' : listguid,
+                         'buildPhases' : (),
+                         'dependencies' : (),
+                         'name' : name,
+                         'productName' : name})
+    pbx.appendValue('targets', guid)
+    return createPbxObject(pbx, guid)
+
+class PbxBuildSettingsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pbx = PbxProject.createPbxproj('/tmp/Sample/Sample.xcodeproj/project.pbxproj')
+        configlist = self.pbx.getConfigureList()
+        for name in ('Debug', 'Release'):
+            config = PbxBuildConfiguration.createObject(self.pbx, name, {'HEADER_SEARCH_PATHS' : ('include',),
+                                                                         'OTHER_LDFLAGS' : '-ObjC',
+                                                                         'PRODUCT_NAME' : '$(TARGET_NAME)'})
+            configlist.addConfiguration(config)
+        
+        self.app = _addTestTarget(self.pbx, 'App', {'HEADER_SEARCH_PATHS' : ('$(inherited)', '$(SRCROOT)/lib'),
+                                          'OTHER_LDFLAGS' : '$(inherited) -lz',
+                                          'INFOPLIST_FILE' : '$(PRODUCT_NAME:lower)-Info.plist'})
+        self.lib = _addTestTarget(self.pbx, 'Lib', {})
+        self.resolver = self.pbx.getSettingsResolver()
+        
+    def testInherited(self):
+        self.assertEqual(self.app.getBuildSetting('HEADER_SEARCH_PATHS', 'Debug'), ('include', '/tmp/Sample/lib'))
+        self.assertEqual(self.app.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-ObjC -lz')
+        self.assertEqual(self.lib.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-ObjC')
+        self.assertEqual(self.pbx.getBuildSetting('PRODUCT_NAME', 'Debug', 'Lib'), 'Lib')
+        
+    def testExpand(self):
+        self.assertEqual(self.app.getBuildSetting('INFOPLIST_FILE', 'Release'), 'app-Info.plist')
+        self.assertEqual(self.resolver.expand('$(CONFIGURATION)/${TARGET_NAME}', 'Release', self.app), 'Release/App')
+        self.assertEqual(self.app.getBuildSetting('NOT_DEFINED', 'Release'), None)
+        
+        allsettings = self.resolver.getAllSettings()
+        self.assertEqual(len(allsettings), 4)
+        self.assertEqual(allsettings[('Lib', 'Release')]['PRODUCT_NAME'], 'Lib')
+    
+    def testCyclicReference(self):
+        config = self.app.getConfigurations().getConfiguration('Debug')
+        config.setSettings('A', '$(B)')
+        config.setSettings('B', 'x $(A)')
+        self.assertRaises(PbxprojSettingsException, self.app.getBuildSetting, 'A', 'Debug')
+    
+    def testInvalidate(self):
+        self.assertEqual(self.app.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-ObjC -lz')
+        self.assertEqual(self.lib.getBuildSetting('OTHER_LDFLAGS', 'Release'), '-ObjC')
+        
+        # target setting을 바꾸면 그 target, configuration만 다시 계산
+        self.app.getConfigurations().getConfiguration('Debug').setSettings('OTHER_LDFLAGS', '-all_load')
+        self.assertIn((self.lib.getGuid(), 'Release', ()), self.resolver._resolved)
+        self.assertEqual(self.app.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-all_load')
+        
+        # project setting을 바꾸면 모든 target에 반영
+        self.pbx.getConfigureList().getConfiguration('Release').setSettings('OTHER_LDFLAGS', '-lc++')
+        self.assertEqual(self.lib.getBuildSetting('OTHER_LDFLAGS', 'Release'), '-lc++')
+        self.assertEqual(self.app.getBuildSetting('OTHER_LDFLAGS', 'Release'), '-lc++ -lz')
+        self.assertEqual(self.app.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-all_load')
+    
+    
+class PbxBuildSettingsEditorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pbx = PbxProject.createPbxproj('/tmp/Sample/Sample.xcodeproj/project.pbxproj')
+        for name in ('Debug', 'Release'):
+            config = PbxBuildConfiguration.createObject(self.pbx, name, {'OTHER_LDFLAGS' : '-ObjC -all_load'})
+            self.pbx.getConfigureList().addConfiguration(config)
+        self.app = _addTestTarget(self.pbx, 'App', {'HEADER_SEARCH_PATHS' : ('$(inherited)', '../old/include')})
+        self.lib = _addTestTarget(self.pbx, 'Lib', {'HEADER_SEARCH_PATHS' : ('../old/include',)})
+    
+    def testDryRun(self):
+        editor = PbxBuildSettingsEditor(self.pbx)
+        editor.replace(re.compile('SEARCH_PATHS$'), r'^\.\./old', '../new')
+        editor.set('CODE_SIGN_IDENTITY', 'iPhone Distribution')
+        changes = editor.apply(configurations=['Release'], project=False, dryRun=True)
+        
+        self.assertEqual(len(changes), 4)
+        self.assertIn(('App', 'Release', 'HEADER_SEARCH_PATHS', ('$(inherited)', '../old/include'), ('$(inherited)', '../new/include')), changes)
+        self.assertEqual(self.lib.getBuildSetting('HEADER_SEARCH_PATHS', 'Release'), ('../old/include',))
+        self.assertTrue(PbxBuildSettingsEditor.report(changes))
+        
+        # buildSettings가 없는 configuration에도 만들지 않는다.
+        config = self.pbx.objects()[self.lib.getConfigurations().getConfiguration('Release').getGuid()]
+        del config['buildSettings']
+        self.assertEqual(len(editor.apply(configurations=['Release'], project=False, dryRun=True)), 3)
+        self.assertNotIn('buildSettings', config)
+    
+    def testApply(self):
+        # resolver cache를 먼저 만들어 둔다.
+        self.assertEqual(self.app.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-ObjC -all_load')
+        
+        editor = PbxBuildSettingsEditor(self.pbx)
+        editor.remove('OTHER_LDFLAGS', '-all_load')
+        editor.apply(targets=[])
+        
+        editor = PbxBuildSettingsEditor(self.pbx)
+        editor.append('HEADER_SEARCH_PATHS', ('../old/include', 'include'))
+        editor.apply(targets=['App'], project=False)
+        
+        self.assertEqual(self.app.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-ObjC')
+        self.assertEqual(self.app.getBuildSetting('HEADER_SEARCH_PATHS', 'Debug'), ('../old/include', 'include'))
+        self.assertEqual(self.lib.getBuildSetting('HEADER_SEARCH_PATHS', 'Debug'), ('../old/include',))
+    
+    def testAddHeaderSearchPath(self):
+        self.assertTrue(self.pbx.add_header_search_path('Debug', '/usr/include'))
+        for target in (self.app, self.lib):
+            self.assertIn('/usr/include', target.getBuildSetting('HEADER_SEARCH_PATHS', 'Debug'))
+            self.assertNotIn('/usr/include', target.getBuildSetting('HEADER_SEARCH_PATHS', 'Release'))
+        self.assertFalse(self.pbx.add_header_search_path('Profile', '/usr/include'))
+    
+    
+class PbxprojValidatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pbx = PbxProject.createPbxproj('/tmp/Sample/Sample.xcodeproj/project.pbxproj')
+        self.maingroup = PbxGroup.createObject(self.pbx, 'Sample')
+        self.pbx.set('mainGroup', self.maingroup.getGuid())
+        self.pbx.getConfigureList().addConfiguration(PbxBuildConfiguration.createObject(self.pbx, 'Debug', {}))
+        
+        self.target = _addTestTarget(self.pbx, 'App', {})
+        self.phase = self.pbx.createPbxGuid()
+        self.pbx.setObject(self.phase, {'isa':'PBXSourcesBuildPhase', 'buildActionMask':'2147483647', 'files':()})
+        self.target.appendValue('buildPhases', self.phase)
+        
+        self.fileref = PbxFileReference.createObject(self.pbx, 'main.m')
+        self.maingroup.addFileReference(self.fileref)
+        self.buildfile = PbxBuildFile.createObject(self.pbx, self.fileref)
+        createPbxObject(self.pbx, self.phase).addFile(self.buildfile.getGuid())
+    
+    def testValid(self):
+        validator = PbxprojValidator(self.pbx)
+        self.assertEqual(validator.validate(), [])
+        self.assertEqual(validator.warnings, [])
+    
+    def testBrokenReferences(self):
+        self.fileref.removeObjectFromRoot()
+        self.maingroup.appendValue('children', self.maingroup.get('children')[0])
+        createPbxObject(self.pbx, self.phase).addFile(self.target.getGuid())
+        del self.pbx.object(self.target.get('buildConfigurationList'))['buildConfigurations']
+        
+        paths = [path for path, _ in self.pbx.validate()]
+        guid = self.buildfile.getGuid()
+        self.assertIn('objects/%s(PBXBuildFile)/fileRef' % guid, paths)
+        self.assertIn('objects/%s(PBXGroup)/children[0]' % self.maingroup.getGuid(), paths)
+        self.assertIn('objects/%s(PBXGroup)/children[1]' % self.maingroup.getGuid(), paths)
+        self.assertIn('objects/%s(PBXSourcesBuildPhase)/files[1]' % self.phase, paths)
+        self.assertIn('objects/%s(XCConfigurationList)' % self.target.get('buildConfigurationList'), paths)
+    
+    def testBuildFileInPhases(self):
+        orphan = PbxBuildFile.createObject(self.pbx, self.fileref)
+        phase = self.pbx.createPbxGuid()
+        self.pbx.setObject(phase, {'isa':'PBXResourcesBuildPhase', 'files':(self.buildfile.getGuid(),)})
+        
+        validator = PbxprojValidator(self.pbx)
+        errors = validator.validate()
+        self.assertEqual(len(errors), 1)
+        # 어느 phase가 먼저 검사되는지는 dict 순서에 따라 다르다.
+        self.assertTrue(errors[0][0].endswith('BuildPhase)/files[0]'))
+        self.assertIn('%s is also in ' % self.buildfile.getGuid(), errors[0][1])
+        self.assertEqual(validator.warnings, [('objects/%s(PBXBuildFile)' % orphan.getGuid(), 'build file is not in any build phase')])
+    
+    
+class PbxSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pbx = PbxProject.createPbxproj('/tmp/Sample/Sample.xcodeproj/project.pbxproj')
+        self.pbx.getConfigureList().addConfiguration(PbxBuildConfiguration.createObject(self.pbx, 'Debug', {'A' : '1'}))
+        self.target = _addTestTarget(self.pbx, 'App', {'OTHER_LDFLAGS' : '-ObjC'})
+        self.group = PbxGroup.createObject(self.pbx, 'Sample')
+        
+    def testSnapshot(self):
+        snap = self.pbx.snapshot()
+        
+        # snapshot 이전에 만든 object로 수정해도 snapshot은 바뀌지 않는다.
+        self.target.set('name', 'Other')
+        self.target.getConfigurations().getConfiguration('Debug').setSettings('OTHER_LDFLAGS', '-lz')
+        self.group.removeObjectFromRoot()
+        added = PbxGroup.createObject(self.pbx, 'Added')
+        
+        self.assertEqual(self.pbx.getBuildSetting('OTHER_LDFLAGS', 'Debug', self.target), '-lz')
+        
+        old = snap.createProject()
+        target = old.getPbxTargets()[0]
+        self.assertEqual(target.getName(), 'App')
+        self.assertEqual(target.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-ObjC')
+        self.assertTrue(old.hasGuid(self.group.getGuid()))
+        self.assertFalse(old.hasGuid(added.getGuid()))
+        
+        added_guids, removed_guids, changed_guids = snap.diff(self.pbx)
+        self.assertEqual(added_guids, [added.getGuid()])
+        self.assertEqual(removed_guids, [self.group.getGuid()])
+        self.assertEqual(len(changed_guids), 2)
+        
+        self.pbx.restore(snap)
+        self.assertEqual(self.target.getName(), 'App')
+        self.assertEqual(self.pbx.getBuildSetting('OTHER_LDFLAGS', 'Debug', self.target), '-ObjC')
+        self.assertEqual(snap.diff(self.pbx), ([], [], []))
+    
+    def testDiffProject(self):
+        # snapshot하지 않은 project와 비교해도 그 project는 바뀌지 않는다.
+        snap = self.pbx.snapshot()
+        other = PbxProject.createPbxproj('/tmp/Other/Other.xcodeproj/project.pbxproj')
+        objects = other.pbxdata['objects']
+        self.assertTrue(isinstance(objects, dict))
+        guid = self.target.getGuid()
+        objects[guid] = self.pbx.objects()[guid]
+        count = len(objects)
+        
+        added, removed, changed = snap.diff(other)
+        self.assertNotIn(guid, added + removed + changed)
+        self.assertEqual(len(objects), count)
+        self.assertIn(guid, objects)
+    
+    def testNestedSnapshots(self):
+        first = self.pbx.snapshot()
+        self.target.set('name', 'Second')
+        second = self.pbx.snapshot()
+        self.target.set('name', 'Third')
+        self.group.removeObjectFromRoot()
+        
+        self.pbx.restore(second)
+        self.assertEqual(self.target.getName(), 'Second')
+        self.assertTrue(self.pbx.hasGuid(self.group.getGuid()))
+        self.pbx.restore(first)
+        self.assertEqual(self.target.getName(), 'App')
+        self.assertEqual(len(self.pbx.getPbxTargets()), 1)
+        self.assertEqual(second.diff(first), ([], [], [self.target.getGuid()]))
+    
+    def testSave(self):
+        import StringIO
+        expected = StringIO.StringIO()
+        PbxprojWriter(expected).writeValue(self.pbx.pbxdata)
+        
+        self.pbx.snapshot()
+        self.target.set('name', 'App')
+        saved = StringIO.StringIO()
+        PbxprojWriter(saved).writeValue(self.pbx.pbxdata)
+        self.assertEqual(saved.getvalue(), expected.getvalue())
+    
+    
+class PbxprojLexerTestCase(unittest.TestCase):
+    data = u'''// !$*UTF8*$!
+{
+	objects = {
+		0000000000000000000000A1 /* main.m */ = {isa = PBXFileReference; path = main.m; sourceTree = "<group>"; };
+		0000000000000000000000A2 /* 한글.m */ = {isa = PBXFileReference; path = "한글.m"; sourceTree = "<group>"; };
+		0000000000000000000000B1 = {isa = PBXGroup; children = (0000000000000000000000A1, 0000000000000000000000A2, ); sourceTree = "<group>"; };
+	};
+	rootObject = 0000000000000000000000B1;
+}
+'''
+    def testIntern(self):
+        data = parseForPbxproj(lex(self.data, token_exprs)).value
+        objects = data['objects']
+        a1 = objects['0000000000000000000000A1']
+        a2 = objects['0000000000000000000000A2']
+        
+        self.assertTrue(a1['isa'] is a2['isa'])
+        self.assertTrue(a1['sourceTree'] is a2['sourceTree'])
+        keys = dict((k, k) for k in a2)
+        for k in a1:
+            self.assertTrue(keys[k] is k)
+        
+        guids = dict((k, k) for k in objects)
+        self.assertTrue(objects['0000000000000000000000B1']['children'][0] is guids['0000000000000000000000A1'])
+        self.assertEqual(type(a1['path']), str)
+        self.assertEqual(a2['path'], u'한글.m')
+    
+    def testPlain(self):
+        data = parseForPbxproj(lex(self.data, token_exprs, False)).value
+        objects = data['objects']
+        self.assertEqual(type(objects['0000000000000000000000A1']['path']), unicode)
+        self.assertFalse(objects['0000000000000000000000A1']['isa'] is objects['0000000000000000000000A2']['isa'])
+    
+    def testParallel(self):
+        import shutil
+        from pbxgen import PbxProjectGenerator
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'Big.xcodeproj')
+            PbxProjectGenerator.withObjects(1000).generate(path)
+            data = file(os.path.join(path, 'project.pbxproj')).read().decode('utf-8')
+        finally:
+            shutil.rmtree(tempdir)
+        data = data.replace(u'path="Source1.m";', u'path="한글 /* ; */ \\"1\\".m" /* 주석 = { */;')
+        self.assertTrue(u'한글' in data)
+        
+        tokens = lex(data, token_exprs)
+        for processes, chunks in ((2, None), (3, 7), (2, 50)):
+            self.assertEqual(lexParallel(data, processes, chunks), tokens)
+        parallel = lexParallel(data, 2)
+        self.assertTrue(all(a[1] is b[1] for a, b in zip(parallel, tokens)))
+        self.assertEqual(parseForPbxproj(parallel).value, parseForPbxproj(tokens).value)
+        self.assertEqual(lexParallel(data, 2, internStrings=False), lex(data, token_exprs, False))
+        self.assertEqual(lexParallel(self.data, 2), lex(self.data, token_exprs))
+    
+    def testParallelInsideToken(self):
+        # string, comment 중간에서 나눠도 결과가 같아야 한다.
+        tokens = lex(self.data, token_exprs)
+        ranges = []
+        for text in (u'"한글.m"', u'/* main.m */', u'"<group>"'):
+            ranges.append(self.data.index(text) + 2)
+        ranges.append(self.data.index(u'rootObject'))
+        points = [0] + sorted(ranges) + [len(self.data)]
+        self.assertEqual(_lexChunks(self.data, zip(points, points[1:]), 2, True), tokens)
+    
+    def testParser(self):
+        # ',' ';'로 끝나지 않는 list, dict
+        data = parseForPbxproj(lex(u'{a = (1, 2); b = {c = (); d = {}}; e = (x)}', token_exprs)).value
+        self.assertEqual(data, {'a' : ('1', '2'), 'b' : {'c' : (), 'd' : {}}, 'e' : ('x',)})
+    
+    
+class PbxColumnarTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pbx = PbxProject.createPbxproj('/tmp/Sample/Sample.xcodeproj/project.pbxproj')
+        self.pbx.getConfigureList().addConfiguration(PbxBuildConfiguration.createObject(self.pbx, 'Debug', {'A' : '1'}))
+        self.target = _addTestTarget(self.pbx, 'App', {'OTHER_LDFLAGS' : '-ObjC'})
+        self.group = PbxGroup.createObject(self.pbx, 'Sample')
+        self.pbx.set('mainGroup', self.group.getGuid())
+        self.fileref = PbxFileReference.createObject(self.pbx, 'Sample/main.m')
+        self.group.appendValue('children', self.fileref.getGuid())
+    
+    def _write(self):
+        import StringIO
+        out = StringIO.StringIO()
+        PbxprojWriter(out).writeValue(self.pbx.pbxdata)
+        return out.getvalue()
+    
+    def testSave(self):
+        expected = self._write()
+        self.pbx.useColumnarStorage()
+        self.assertTrue(isinstance(self.pbx.objects(), PbxColumnarObjects))
+        self.assertEqual(self._write(), expected)
+    
+    def testGetSet(self):
+        self.pbx.useColumnarStorage()
+        
+        # useColumnarStorage() 이전에 만든 object도 계속 사용할 수 있다.
+        self.assertEqual(self.group.get('children'), (self.fileref.getGuid(),))
+        self.group.appendValue('children', self.target.getGuid())
+        self.assertEqual(self.pbx.object(self.group.getGuid())['children'][-1], self.target.getGuid())
+        self.assertEqual(self.fileref.get('path'), 'Sample/main.m')
+        self.assertEqual(self.fileref.get('isa'), 'PBXFileReference')
+        self.assertEqual(self.group.get('path'), None)
+        
+        self.group.set('path', 'Sample')
+        self.assertEqual(self.pbx.object(self.group.getGuid()).get('path'), 'Sample')
+        self.assertEqual(self.target.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-ObjC')
+        self.target.getConfigurations().getConfiguration('Debug').setSettings('OTHER_LDFLAGS', '-lz')
+        self.assertEqual(self.target.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-lz')
+        
+        self.fileref.removeObjectFromRoot()
+        self.assertFalse(self.pbx.hasGuid(self.fileref.getGuid()))
+        self.assertEqual(self.pbx.objects().getTableSizes()['PBXFileReference'], 0)
+        
+        added = PbxGroup.createObject(self.pbx, 'Added')
+        self.assertEqual(added.get('name'), 'Added')
+        self.assertEqual(len(self.pbx.objects()), len(self.pbx.objects().keys()))
+    
+    def testQuery(self):
+        expected = (self.pbx.object_if({'isa' : 'PBXGroup', 'name' : 'Sample'}),
+                    sorted(k for k, _ in self.pbx.objects_if({'isa' : 'XCBuildConfiguration'})),
+                    [o.getGuid() for o in self.pbx.getAllObjects(children=self.fileref.getGuid())],
+                    [o.getGuid() for o in self.pbx.getAllObjectsHasGuid(self.fileref.getGuid())])
+        self.pbx.useColumnarStorage()
+        found = (self.pbx.object_if({'isa' : 'PBXGroup', 'name' : 'Sample'}),
+                 sorted(k for k, _ in self.pbx.objects_if({'isa' : 'XCBuildConfiguration'})),
+                 [o.getGuid() for o in self.pbx.getAllObjects(children=self.fileref.getGuid())],
+                 [o.getGuid() for o in self.pbx.getAllObjectsHasGuid(self.fileref.getGuid())])
+        self.assertEqual(found, expected)
+        self.assertEqual(self.pbx.object_if({'isa' : 'PBXGroup', 'name' : 'None'}), None)
+        
+        guid, _ = self.pbx.add_group('/A/B')
+        self.assertEqual(self.group.getGroupFromPath('A/B').getGuid(), guid)
+    
+    def testSnapshotAndValidate(self):
+        self.pbx.useColumnarStorage()
+        errors = self.pbx.validate()
+        
+        snap = self.pbx.snapshot()
+        self.target.set('name', 'Other')
+        self.assertEqual(snap.diff(self.pbx), ([], [], [self.target.getGuid()]))
+        self.pbx.restore(snap)
+        self.assertEqual(self.target.getName(), 'App')
+        self.assertEqual(self.pbx.validate(), errors)
+    
+    
+class PbxConcurrencyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pbx = PbxProject.createPbxproj('/tmp/Sample/Sample.xcodeproj/project.pbxproj')
+        self.pbx.getConfigureList().addConfiguration(PbxBuildConfiguration.createObject(self.pbx, 'Debug', {}))
+        self.target = _addTestTarget(self.pbx, 'App', {'COUNT' : '0', 'LAST' : '0'}, ('Debug',))
+        self.config = self.target.getConfigurations().getConfiguration('Debug')
+        self.group = PbxGroup.createObject(self.pbx, 'Sample')
+        self.pbx.set('mainGroup', self.group.getGuid())
+    
+    def _run(self, funcs):
+        'funcs를 각각 thread에서 실행하고 발생한 exception 목록을 돌려준다.'
+        errors = []
+        def run(func):
+            try:
+                func()
+            except Exception, e:
+                import traceback
+                errors.append(traceback.format_exc())
+        threads = [threading.Thread(target=run, args=(f,)) for f in funcs]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        return errors
+    
+    def testRWLock(self):
+        lock = PbxRWLock()
+        events = []
+        
+        lock.acquireRead()
+        # 다른 thread도 read lock은 바로 잡지만 write lock은 잡지 못한다.
+        self.assertEqual(self._run([lambda: (lock.acquireRead(), lock.releaseRead()),
+                                    lambda: events.append(lock.acquireWrite(False))]), [])
+        self.assertEqual(events, [False])
+        self.assertRaises(RuntimeError, lock.acquireWrite)
+        lock.acquireRead()
+        lock.releaseRead()
+        lock.releaseRead()
+        self.assertRaises(RuntimeError, lock.releaseRead)
+        
+        # writer는 read, write lock을 다시 잡을 수 있다.
+        with lock.writing():
+            with lock.writing():
+                with lock.reading():
+                    self.assertEqual(self._run([lambda: events.append(lock.acquireWrite(False))]), [])
+        self.assertEqual(events, [False, False])
+        self.assertRaises(RuntimeError, lock.releaseWrite)
+    
+    def _stress(self):
+        self.pbx.enableConcurrency()
+        writers, readers, count = 4, 4, 30
+        done = []
+        
+        def write(n):
+            added = []
+            for i in xrange(count):
+                # 여러 함수에 걸친 수정은 writing()으로 묶는다.
+                with self.pbx.rwlock.writing():
+                    fileref = PbxFileReference.createObject(self.pbx, 'Sample/file%d_%d.m' % (n, i))
+                    self.group.appendValue('children', fileref.getGuid())
+                    self.config.setSettings('COUNT', str(len(self.group.get('children'))))
+                    self.config.setSettings('LAST', fileref.getGuid())
+                added.append(fileref)
+                if i % 2:
+                    with self.pbx.rwlock.writing():
+                        removed = added.pop(0)
+                        self.group.removeValue('children', removed.getGuid())
+                        removed.removeObjectFromRoot()
+                        self.config.setSettings('COUNT', str(len(self.group.get('children'))))
+            done.extend(added)
+        
+        def read():
+            import StringIO
+            while len(done) < writers * (count // 2):
+                with self.pbx.rwlock.reading():
+                    children = self.group.get('children')
+                    self.assertEqual(self.pbx.getBuildSetting('COUNT', 'Debug', 'App'), str(len(children)))
+                    last = self.target.getBuildSetting('LAST', 'Debug')
+                    self.assertTrue(last == '0' or self.pbx.hasGuid(last))
+                    for guid in children:
+                        self.assertTrue(self.pbx.hasGuid(guid))
+                
+                # lock 없이 호출해도 각 함수는 일관된 상태를 본다.
+                refs = self.pbx.objects_if({'isa' : 'PBXFileReference'})
+                self.assertTrue(all(guid for guid, _ in refs))
+                with self.pbx.rwlock.reading():
+                    refs = self.pbx.getAllObjects(isa='PBXFileReference')
+                    self.assertTrue(all(ref.getPath() for ref in refs))
+                out = StringIO.StringIO()
+                with self.pbx.rwlock.reading():
+                    PbxprojWriter(out).writeValue(self.pbx.pbxdata)
+                    nobjects = len(self.pbx.objects())
+                data = parseForPbxproj(lex(out.getvalue().decode('utf-8'), token_exprs)).value
+                self.assertEqual(len(data['objects']), nobjects)
+        
+        errors = self._run([lambda n=n: write(n) for n in range(writers)] + [read] * readers)
+        self.assertEqual(errors, [])
+        
+        children = self.group.get('children')
+        self.assertEqual(sorted(children), sorted(f.getGuid() for f in done))
+        self.assertEqual(len(self.pbx.getAllObjects(isa='PBXFileReference')), writers * (count // 2))
+        self.assertEqual(self.pbx.getBuildSetting('COUNT', 'Debug', 'App'), str(len(children)))
+    
+    def testStress(self):
+        self._stress()
+    
+    def testStressColumnar(self):
+        self.pbx.useColumnarStorage()
+        self._stress()
+    
+    def testStressSnapshot(self):
+        self.pbx.snapshot()
+        self._stress()
+    
+    def testLoadOnce(self):
+        import tempfile
+        import shutil
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'Sample.xcodeproj', 'project.pbxproj')
+            os.makedirs(os.path.dirname(path))
+            self.pbx.saveas(path)
+            
+            parsed = []
+            parse = PbxProject._parsePbxproj
+            def counting(pbxpath):
+                parsed.append(pbxpath)
+                return parse(pbxpath)
+            PbxProject._parsePbxproj = staticmethod(counting)
+            try:
+                loaded = []
+                errors = self._run([lambda: loaded.append(PbxProject.loadPbxproj(path, concurrent=True))] * 8)
+            finally:
+                PbxProject._parsePbxproj = staticmethod(parse)
+                PbxprojCache.pop(os.path.abspath(path), None)
+            
+            self.assertEqual(errors, [])
+            self.assertEqual(parsed, [path])
+            self.assertEqual(len(set(id(pbx) for pbx in loaded)), 1)
+            self.assertTrue(loaded[0].rwlock is not None)
+            self.assertEqual(_PbxprojLoadingLocks, {})
+        finally:
+            shutil.rmtree(tempdir)
+
+def _addTestFile(pbx, name):
+    'main group에 file을 추가하고 COUNT setting을 하나 늘린다.'
+    fileref = PbxFileReference.createObject(pbx, 'Sample/%s.m' % name)
+    pbx.getMainGroup().appendValue('children', fileref.getGuid())
+    settings = pbx.getConfigureList().getConfiguration('Debug').get('buildSettings')
+    settings['COUNT'] = str(int(settings['COUNT']) + 1)
+
+def _modifyTestProject(path, name, count, optimistic):
+    'test에서 여러 process가 동시에 실행한다.'
+    for i in range(count):
+        PbxProject.modifyPbxproj(path, lambda pbx: _addTestFile(pbx, '%s_%d' % (name, i)), optimistic)
+
+class PbxprojSaveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'Sample.xcodeproj', 'project.pbxproj')
+        os.makedirs(os.path.dirname(self.path))
+        
+        pbx = PbxProject.createPbxproj(self.path)
+        pbx.getConfigureList().addConfiguration(PbxBuildConfiguration.createObject(pbx, 'Debug', {'COUNT' : '0'}))
+        pbx.set('mainGroup', PbxGroup.createObject(pbx, 'Sample').getGuid())
+        pbx.save()
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tempdir)
+        PbxprojCache.pop(os.path.abspath(self.path), None)
+    
+    def _load(self):
+        return PbxProject._parsePbxproj(self.path)
+    
+    def _files(self):
+        return [f for f in os.listdir(os.path.dirname(self.path)) if not f.endswith('.lock')]
+    
+    def testAtomicSave(self):
+        os.chmod(self.path, 0640)
+        pbx = self._load()
+        pbx.set('name', 'Saved')
+        pbx.save()
+        self.assertEqual(self._load().get('name'), 'Saved')
+        self.assertEqual(os.stat(self.path).st_mode & 0777, 0640)
+        self.assertEqual(self._files(), ['project.pbxproj'])
+        self.assertFalse(pbx.isChangedOnDisk())
+        
+        # 쓰는 도중에 실패해도 원래 file은 그대로 남는다.
+        saved = open(self.path).read()
+        pbx.set('name', object())
+        self.assertRaises(TypeError, pbx.save)
+        self.assertEqual(open(self.path).read(), saved)
+        self.assertEqual(self._files(), ['project.pbxproj'])
+    
+    def testConflict(self):
+        first, second = self._load(), self._load()
+        _addTestFile(first, 'first')
+        first.save(lock=True)
+        
+        _addTestFile(second, 'second')
+        self.assertTrue(second.isChangedOnDisk())
+        self.assertRaises(PbxprojConflictException, second.save, True)
+        self.assertEqual(len(self._load().getMainGroup().get('children')), 1)
+    
+    def testModifyReapply(self):
+        calls = []
+        def edit(pbx):
+            calls.append(pbx)
+            if len(calls) == 1:
+                # 수정하는 도중에 다른 process가 저장한 경우
+                other = self._load()
+                _addTestFile(other, 'other')
+                other.save(lock=True)
+            _addTestFile(pbx, 'mine')
+        
+        pbx = PbxProject.modifyPbxproj(os.path.dirname(self.path), edit)
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(pbx is calls[-1])
+        
+        saved = self._load()
+        self.assertEqual([saved.object(guid)['name'] for guid in saved.getMainGroup().get('children')], ['other.m', 'mine.m'])
+        self.assertEqual(saved.getConfigureList().getConfiguration('Debug').getSetting('COUNT'), '2')
+    
+    def _modifyFromProcesses(self, optimistic):
+        import multiprocessing
+        processes, count = 4, 5
+        workers = [multiprocessing.Process(target=_modifyTestProject, args=(self.path, 'p%d' % n, count, optimistic))
+                   for n in range(processes)]
+        for w in workers: w.start()
+        for w in workers: w.join()
+        self.assertEqual([w.exitcode for w in workers], [0] * processes)
+        
+        pbx = self._load()
+        self.assertEqual(len(pbx.getMainGroup().get('children')), processes * count)
+        self.assertEqual(pbx.getConfigureList().getConfiguration('Debug').getSetting('COUNT'), str(processes * count))
+        self.assertEqual(self._files(), ['project.pbxproj'])
+    
+    def testOptimisticProcesses(self):
+        self._modifyFromProcesses(True)
+    
+    def testLockedProcesses(self):
+        self._modifyFromProcesses(False)
+
+class PbxInstrumentationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'Sample.xcodeproj', 'project.pbxproj')
+        os.makedirs(os.path.dirname(self.path))
+        pbx = PbxProject.createPbxproj(self.path)
+        pbx.set('mainGroup', PbxGroup.createObject(pbx, 'Sample').getGuid())
+        _addTestTarget(pbx, 'App', {})
+        pbx.save()
+        PbxprojStats.reset()
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tempdir)
+        PbxprojStats.enable(False)
+        PbxprojStats.reset()
+    
+    def testDisabled(self):
+        events = []
+        PbxprojStats.addListener(lambda *event: events.append(event))
+        try:
+            pbx = PbxProject._parsePbxproj(self.path)
+            pbx.getPbxTargets()
+            pbx.save()
+        finally:
+            del PbxprojStats.listeners[:]
+        self.assertEqual(events, [])
+        self.assertEqual(PbxprojStats.getStats(), {'timers' : {}, 'counters' : {}})
+    
+    def testPhases(self):
+        events = []
+        listener = lambda *event: events.append(event)
+        PbxprojStats.enable()
+        PbxprojStats.addListener(listener)
+        try:
+            pbx = PbxProject._parsePbxproj(self.path)
+            self.assertEqual(len(pbx.getPbxTargets()), 1)
+            pbx.object_if({'isa' : 'PBXNativeTarget'})
+            pbx.save()
+        finally:
+            PbxprojStats.removeListener(listener)
+        
+        stats = PbxprojStats.getStats()
+        timers, counters = stats['timers'], stats['counters']
+        for name in ('load', 'lex', 'parse', 'wrap', 'scan.getAllObjects', 'scan.object_if', 'save', 'save.write'):
+            self.assertTrue(name in timers, name)
+        self.assertEqual(timers['load'][0], 1)
+        self.assertTrue(timers['load'][1] >= timers['parse'][1])
+        
+        nobjects = len(pbx.objects())
+        self.assertTrue(counters['lex.tokens'] > nobjects)
+        self.assertEqual(counters['load.objects'], nobjects)
+        self.assertEqual(counters['load.bytes'], os.path.getsize(self.path))
+        self.assertEqual(counters['save.bytes'], os.path.getsize(self.path))
+        self.assertTrue(nobjects < counters['scan.objects'] <= 2 * nobjects)
+        
+        self.assertTrue(('count', 'lex.tokens', counters['lex.tokens']) in events)
+        self.assertEqual(len([e for e in events if e[:2] == ('time', 'wrap')]), timers['wrap'][0])
+        
+        import StringIO
+        out = StringIO.StringIO()
+        PbxprojStats.report(out)
+        self.assertTrue('load.bytes' in out.getvalue())
+    
+    def testColumnarScan(self):
+        pbx = PbxProject._parsePbxproj(self.path)
+        pbx.useColumnarStorage()
+        PbxprojStats.enable()
+        pbx.getPbxTargets()
+        self.assertEqual(PbxprojStats.getStats()['counters']['scan.objects'], 1)
+
+class PbxGroupIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pbx = PbxProject.createPbxproj('/tmp/Sample/Sample.xcodeproj/project.pbxproj')
+        self.main = PbxGroup.createObject(self.pbx, 'Sample')
+        self.pbx.set('mainGroup', self.main.getGuid())
+    
+    def testAddAndFind(self):
+        guid, group = self.pbx.add_group('/A/B/C')
+        self.assertEqual(group['name'], 'C')
+        self.assertEqual(self.pbx.add_group('/A/B/C')[0], guid)
+        self.assertEqual(self.pbx._get_group('/A/B/C')[0], guid)
+        self.assertEqual(self.pbx._get_group('B/C')[0], guid)
+        self.assertEqual(self.pbx.getGroup('/A/B/C').getGuid(), guid)
+        self.assertEqual(self.pbx._get_group('/B/C'), None)
+        self.assertEqual(self.pbx.getGroup('/A/X', False), None)
+        self.assertEqual(self.pbx._get_group('/')[0], self.main.getGuid())
+        
+        # 상대 경로는 있는 곳까지 찾고 나머지를 만든다.
+        guid2, _ = self.pbx.add_group('B/C/D')
+        self.assertEqual(self.pbx._get_group('/A/B/C/D')[0], guid2)
+        self.assertEqual(self.main.getGroupFromPath('A/B/C/D').getGuid(), guid2)
+        self.assertEqual(self.main.addGroupFromPath('A/B/C/D').getGuid(), guid2)
+        
+        self.assertTrue(self.pbx._add_file_to_group('F0', '/A/E'))
+        self.assertEqual(self.pbx._get_group('/A/E')[1]['children'], ('F0',))
+        self.assertEqual(len(self.pbx.getAllGroups()), 6)
+    
+    def testFromPath(self):
+        b = self.main.addGroupFromPath('A/B')
+        self.assertEqual(self.main.getGroupFromPath('/A/B/').getGuid(), b.getGuid())
+        self.assertEqual(self.main.getGroupFromPath('X/B'), None)
+        self.assertEqual(self.main.getGroupFromPath('').getGuid(), self.main.getGuid())
+        
+        # index를 쓰지 않고 추가한 group
+        c = PbxGroup.createObject(self.pbx, 'C')
+        b.addGroup(c)
+        self.assertEqual(self.main.getGroupFromPath('A/B/C').getGuid(), c.getGuid())
+        self.assertEqual(self.pbx._get_group('C')[0], c.getGuid())
+    
+    def testChanges(self):
+        b = self.main.addGroupFromPath('A/B')
+        a = self.main.getGroupFromPath('A')
+        b.set('name', 'B2')
+        self.assertEqual(self.main.getGroupFromPath('A/B'), None)
+        self.assertEqual(self.main.getGroupFromPath('A/B2').getGuid(), b.getGuid())
+        self.assertEqual(self.pbx._get_group('B2')[0], b.getGuid())
+        
+        snapshot = self.pbx.snapshot()
+        a.removeValue('children', b.getGuid())
+        self.assertEqual(self.main.getGroupFromPath('A/B2'), None)
+        self.pbx.restore(snapshot)
+        self.assertEqual(self.main.getGroupFromPath('A/B2').getGuid(), b.getGuid())
+        
+        self.pbx.removeObject(b.getGuid())
+        self.assertEqual(self.main.getGroupFromPath('A/B2'), None)
+        self.assertEqual(self.pbx._get_group('B2'), None)
+    
+    def testColumnar(self):
+        guid, _ = self.pbx.add_group('/A/B')
+        self.pbx.useColumnarStorage()
+        self.assertEqual(self.pbx._get_group('/A/B')[0], guid)
+        self.assertEqual(self.main.addGroupFromPath('A/B/C').getGuid(), self.pbx._get_group('B/C')[0])
+    
+    
+class XcconfigTestCase(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tempdir = tempfile.mkdtemp()
+        configdir = os.path.join(self.tempdir, 'Config')
+        os.makedirs(configdir)
+        self.common = os.path.join(configdir, 'Common.xcconfig')
+        file(self.common, 'w').write('// common settings\n'
+                                     'OTHER_LDFLAGS = -ObjC\n'
+                                     'GCC_PREPROCESSOR_DEFINITIONS = COMMON=1\n'
+                                     'ARCHS[sdk=iphonesimulator*] = i386\n'
+                                     'ARCHS = armv7\n')
+        file(os.path.join(configdir, 'Project.xcconfig'), 'w').write('#include "Common.xcconfig"\n'
+                                     'GCC_PREPROCESSOR_DEFINITIONS = $(inherited) PROJECT=1;\n'
+                                     'OTHER_LDFLAGS[config=Debug] = $(inherited) -lDebug // debug only\n')
+        
+        self.pbx = PbxProject.createPbxproj(os.path.join(self.tempdir, 'Sample.xcodeproj', 'project.pbxproj'))
+        fileref = self.pbx.createPbxGuid()
+        self.pbx.setObject(fileref, {'isa' : 'PBXFileReference',
+                                     'lastKnownFileType' : 'text.xcconfig',
+                                     'path' : 'Config/Project.xcconfig',
+                                     'sourceTree' : 'SOURCE_ROOT'})
+        for name in ('Debug', 'Release'):
+            config = PbxBuildConfiguration.createObject(self.pbx, name, {'GCC_PREPROCESSOR_DEFINITIONS' : ('$(inherited)', 'TARGET=1')})
+            config.set('baseConfigurationReference', fileref)
+            self.pbx.getConfigureList().addConfiguration(config)
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tempdir)
+    
+    def testParse(self):
+        xcconfig = Xcconfig.load(self.common)
+        self.assertEqual(xcconfig.getSettings({'sdk' : 'iphoneos5.0'})['ARCHS'], 'armv7')
+        self.assertEqual(xcconfig.getSettings({'sdk' : 'iphonesimulator5.0'})['ARCHS'], 'i386')
+        self.assertTrue(Xcconfig.load(self.common) is xcconfig)
+        
+        # mtime이 바뀌면 다시 parse
+        os.utime(self.common, (xcconfig.mtime + 10, xcconfig.mtime + 10))
+        self.assertTrue(Xcconfig.load(self.common) is not xcconfig)
+    
+    def testConfigurationSettings(self):
+        config = self.pbx.getConfigureList().getConfiguration('Debug')
+        self.assertEqual(config.getSetting('OTHER_LDFLAGS'), '-ObjC -lDebug')
+        self.assertEqual(config.getSetting('GCC_PREPROCESSOR_DEFINITIONS'), ('COMMON=1', 'PROJECT=1', 'TARGET=1'))
+        
+        release = self.pbx.getConfigureList().getConfiguration('Release')
+        self.assertEqual(release.getSetting('OTHER_LDFLAGS'), '-ObjC')
+    
+    def testResolver(self):
+        resolver = self.pbx.getSettingsResolver()
+        self.assertEqual(resolver.getSetting('ARCHS', 'Debug', conditions={'sdk' : 'iphonesimulator5.0'}), 'i386')
+        self.assertEqual(resolver.getSetting('ARCHS', 'Debug'), 'armv7')
+        
+        file(self.common, 'w').write('ARCHS = armv6\n')
+        os.utime(self.common, (1, 1))
+        self.assertEqual(resolver.getSetting('ARCHS', 'Debug'), 'armv7')
+        resolver.invalidateChangedXcconfigs()
+        self.assertEqual(resolver.getSetting('ARCHS', 'Debug'), 'armv6')
+    
+    
 if __name__=='__main__':
     unittest.main()
     
@@ -0,0 +1,617 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+읽은 PbxProject를 memory에 유지하면서 Unix domain socket으로 조회, 수정
+요청을 처리하는 server와 client
+
+요청과 응답은 한줄에 하나씩 JSON-RPC 2.0 형식으로 주고 받는다.
+
+> {"jsonrpc": "2.0", "id": 1, "method": "targets", "params": {"path": "App.xcodeproj"}}
+< {"jsonrpc": "2.0", "id": 1, "result": ["App"]}
+
+project마다 read/write lock( PbxRWLock )을 가지고 있어서 같은 project에 대한
+조회는 동시에, 수정은 하나씩 처리하고 다른 project에 대한 요청은 서로 기다리지
+않는다. 요청을 처리하기 전에 파일이
+밖에서 바뀌었는지 확인해서 다시 읽고, 저장은 PbxProject.save(lock=True)로 한다.
+
+usage:
+
+# server
+server = PbxServer('/tmp/pbxserver.sock')
+server.serve_forever()
+
+# client
+pbx = loadPbxproj('App.xcodeproj')          # server가 없으면 같은 process에서 처리
+pbx.getTargetNames()
+pbx.setBuildSetting('OTHER_LDFLAGS', '-ObjC', targets=['App'])
+pbx.save()
+
+'''
+
+__all__ = ['PbxClient', 'PbxProjectManager', 'PbxRemoteProject', 'PbxServer', 'PbxServerException',
+           'defaultSocketPath', 'loadPbxproj']
+
+import os
+import json
+import errno
+import socket
+import inspect
+import tempfile
+import threading
+import contextlib
+import SocketServer
+import unittest
+
+from pbxlib import PbxProject, PbxprojCache, PbxprojConflictException, PbxBuildSettingsEditor, PbxRWLock
+from pbxindex import _fullpaths
+
+
+def defaultSocketPath():
+    'user별 기본 socket 경로'
+    return os.path.join(tempfile.gettempdir(), 'pbxserver-%d.sock' % os.getuid())
+
+
+class PbxServerException(Exception):
+    '''server에서 요청을 처리하지 못한 경우
+
+    code는 JSON-RPC error code
+    '''
+    def __init__(self, message, code=-32000):
+        Exception.__init__(self, message)
+        self.code = code
+
+
+def _pbxpath(path):
+    path = os.path.abspath(os.path.expanduser(path))
+    if os.path.isdir(path):
+        path = os.path.join(path, 'project.pbxproj')
+    return path
+
+def _filestat(path):
+    st = os.stat(path)
+    return st.st_mtime, st.st_size
+
+
+class _PbxProjectEntry(object):
+    'server가 가지고 있는 project 하나'
+    def __init__(self, pbxpath):
+        self.pbxpath = pbxpath
+        self.lock = PbxRWLock()
+        self.pbx = None
+        self.stat = None
+        self.dirty = False
+        self.loads = 0
+
+    def isCurrent(self):
+        'read lock을 가진 상태에서 호출. 읽은 project가 파일과 같은지'
+        try:
+            return self.pbx is not None and _filestat(self.pbxpath) == self.stat
+        except OSError:
+            return False
+
+    def load(self):
+        'write lock을 가진 상태에서 호출. 파일이 바뀌었으면 다시 읽는다.'
+        try:
+            stat = _filestat(self.pbxpath)
+        except OSError:
+            raise PbxServerException('project not found: %s' % self.pbxpath)
+
+        if self.pbx is not None and stat == self.stat:
+            return self.pbx
+        if self.pbx is not None and self.dirty:
+            raise PbxServerException('%s was modified outside the server while it has unsaved changes' % self.pbxpath)
+
+        # 전역 cache에 남기지 않고 server가 직접 관리한다.
+        cachekey = os.path.abspath(self.pbxpath)
+        PbxprojCache.pop(cachekey, None)
+        try:
+            pbx = PbxProject.loadPbxproj(self.pbxpath)
+        finally:
+            PbxprojCache.pop(cachekey, None)
+        if not pbx:
+            raise PbxServerException('cannot load project: %s' % self.pbxpath)
+
+        # 조회 요청은 동시에 처리하므로 build setting cache 등을 보호한다.
+        pbx.enableConcurrency()
+        self.pbx = pbx
+        self.stat = stat
+        self.dirty = False
+        self.loads += 1
+        return pbx
+
+    def save(self):
+        # 다른 process와 PbxFileLock으로 순서를 맞추고 저장은 rename으로 한다.
+        try:
+            self.pbx.save(lock=True)
+        except PbxprojConflictException:
+            raise PbxServerException('%s was modified outside the server while it has unsaved changes' % self.pbxpath)
+        self.stat = _filestat(self.pbxpath)
+        self.dirty = False
+
+
+class PbxProjectManager(object):
+    '''project들을 memory에 유지하고 요청( rpc_... 함수 )을 처리한다.
+
+    PbxServer가 socket으로 받은 요청을 처리하고, server가 없을때는
+    loadPbxproj()가 같은 process에서 직접 사용한다.
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.projects = {}          # project.pbxproj 경로 -> _PbxProjectEntry
+        self.requests = 0
+
+    def call(self, method, params=None):
+        '''|method|를 실행한 결과. |params|는 dict 혹은 list
+
+        실패하면 PbxServerException
+        '''
+        func = getattr(self, 'rpc_' + str(method), None)
+        if func is None:
+            raise PbxServerException('method not found: %s' % method, -32601)
+
+        if isinstance(params, dict):
+            args, kwargs = (), dict((str(k), v) for k, v in params.iteritems())
+        else:
+            args, kwargs = params or (), {}
+        try:
+            inspect.getcallargs(func, *args, **kwargs)
+        except TypeError, e:
+            raise PbxServerException('invalid params for %s: %s' % (method, e), -32602)
+
+        self.requests += 1
+        return func(*args, **kwargs)
+
+    def _entry(self, path):
+        pbxpath = _pbxpath(path)
+        self.lock.acquire()
+        try:
+            entry = self.projects.get(pbxpath)
+            if entry is None:
+                entry = self.projects[pbxpath] = _PbxProjectEntry(pbxpath)
+            return entry
+        finally:
+            self.lock.release()
+
+    @contextlib.contextmanager
+    def _project(self, path, edit=False):
+        '''project lock을 잡고 최신 상태의 PbxProject를 넘겨준다.
+
+        |edit|이면 write lock, 아니면 read lock을 잡는다.
+        '''
+        entry = self._entry(path)
+        if edit:
+            entry.lock.acquireWrite()
+            try:
+                pbx = entry.load()
+                try:
+                    yield pbx
+                finally:
+                    # 실패한 수정도 일부는 적용되었을 수 있다.
+                    entry.dirty = True
+            finally:
+                entry.lock.releaseWrite()
+            return
+
+        entry.lock.acquireRead()
+        while not entry.isCurrent():
+            # 다시 읽어야 하면 read lock을 놓고 write lock으로 읽는다.
+            entry.lock.releaseRead()
+            entry.lock.acquireWrite()
+            try:
+                entry.load()
+            finally:
+                entry.lock.releaseWrite()
+            entry.lock.acquireRead()
+        try:
+            yield entry.pbx
+        finally:
+            entry.lock.releaseRead()
+
+    def _target(self, pbx, name):
+        for target in pbx.getPbxTargets():
+            if target.getName() == name:
+                return target
+        raise PbxServerException('target not found: %s' % name)
+
+    def checkFiles(self):
+        '''밖에서 바뀐 project를 memory에서 내린다. ( 다음 요청때 다시 읽음 )
+
+        저장하지 않은 수정이 있는 project는 그대로 둔다.
+        return : 내린 project 경로 list
+        '''
+        self.lock.acquire()
+        try:
+            entries = self.projects.items()
+        finally:
+            self.lock.release()
+
+        ret = []
+        for pbxpath, entry in entries:
+            # 사용중인 project는 다음에 확인한다.
+            if not entry.lock.acquireWrite(False): continue
+            try:
+                if entry.pbx is None or entry.dirty: continue
+                try:
+                    stat = _filestat(pbxpath)
+                except OSError:
+                    stat = None
+                if stat != entry.stat:
+                    entry.pbx = None
+                    ret.append(pbxpath)
+            finally:
+                entry.lock.releaseWrite()
+        return ret
+
+    #
+    # rpc
+    #
+
+    def rpc_ping(self):
+        return 'pong'
+
+    def rpc_load(self, path):
+        with self._project(path) as pbx:
+            return {'path' : pbx.path,
+                    'name' : pbx.name,
+                    'targets' : [t.getName() for t in pbx.getPbxTargets()]}
+
+    def rpc_unload(self, path):
+        'memory에서 내린다. 저장하지 않은 수정은 버려진다.'
+        pbxpath = _pbxpath(path)
+        self.lock.acquire()
+        try:
+            return self.projects.pop(pbxpath, None) is not None
+        finally:
+            self.lock.release()
+
+    def rpc_stats(self):
+        self.lock.acquire()
+        try:
+            entries = self.projects.values()
+        finally:
+            self.lock.release()
+        return {'requests' : self.requests,
+                'projects' : sorted([e.pbxpath, e.pbx is not None, e.dirty, e.loads] for e in entries)}
+
+    def rpc_targets(self, path):
+        with self._project(path) as pbx:
+            return [t.getName() for t in pbx.getPbxTargets()]
+
+    def rpc_frameworks(self, path, target):
+        with self._project(path) as pbx:
+            return self._target(pbx, target).getFrameworks()
+
+    def rpc_files(self, path, target=None):
+        '''|target|이 compile하는 파일의 전체 경로. |target|이 없으면 project의 모든 파일'''
+        with self._project(path) as pbx:
+            objects = dict(pbx.objects().iteritems())
+            fullpath = _fullpaths(objects, os.path.dirname(pbx.xcodeprojpath()))
+            if target is None:
+                return sorted(fullpath(guid) for guid, obj in objects.iteritems()
+                              if obj.get('isa') == 'PBXFileReference')
+
+            phase = self._target(pbx, target).getBuildSourcesPhase()
+            ret = []
+            for buildfile in phase and phase.get('files') or ():
+                fileref = (objects.get(buildfile) or {}).get('fileRef')
+                if fileref in objects:
+                    ret.append(fullpath(fileref))
+            return ret
+
+    def rpc_settings(self, path, configuration, target=None):
+        with self._project(path) as pbx:
+            return pbx.getBuildSettings(configuration, target and self._target(pbx, target))
+
+    def rpc_setting(self, path, key, configuration, target=None):
+        with self._project(path) as pbx:
+            return pbx.getBuildSetting(key, configuration, target and self._target(pbx, target))
+
+    def rpc_setSetting(self, path, key, value, configurations=None, targets=None):
+        '''build setting을 바꾼다. |targets|가 없으면 project level의 setting
+
+        return : 바뀐 (target, configuration, key, old, new) list
+        '''
+        with self._project(path, edit=True) as pbx:
+            editor = PbxBuildSettingsEditor(pbx)
+            editor.set(key, value)
+            return editor.apply(targets=targets or [], configurations=configurations, project=not targets)
+
+    def rpc_addFramework(self, path, target, framework):
+        with self._project(path, edit=True) as pbx:
+            return self._target(pbx, target).addFramework(framework)
+
+    def rpc_removeFramework(self, path, target, framework):
+        with self._project(path, edit=True) as pbx:
+            return self._target(pbx, target).removeFramework(framework)
+
+    def rpc_save(self, path):
+        entry = self._entry(path)
+        entry.lock.acquireWrite()
+        try:
+            if entry.pbx is None or not entry.dirty:
+                return False
+            entry.save()
+            return True
+        finally:
+            entry.lock.releaseWrite()
+
+
+class _PbxRequestHandler(SocketServer.StreamRequestHandler):
+    '연결 하나에서 한줄씩 요청을 읽어서 처리한다.'
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line: break
+            self.wfile.write(self.server.dispatch(line) + '\n')
+            self.wfile.flush()
+
+
+class PbxServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    '''PbxProjectManager를 Unix domain socket으로 제공하는 server
+
+    연결마다 thread를 하나씩 사용한다. |interval|초마다 밖에서 바뀐 project를
+    memory에서 내린다.
+    '''
+    daemon_threads = True
+
+    def __init__(self, sockpath=None, interval=1.0):
+        self.sockpath = sockpath or defaultSocketPath()
+        self.manager = PbxProjectManager()
+        self.interval = interval
+        self.stopped = threading.Event()
+
+        # 이전 server가 남긴 socket 파일
+        if os.path.exists(self.sockpath):
+            try:
+                PbxClient(self.sockpath).close()
+            except socket.error:
+                os.remove(self.sockpath)
+            else:
+                raise PbxServerException('server is already running: %s' % self.sockpath)
+
+        SocketServer.UnixStreamServer.__init__(self, self.sockpath, _PbxRequestHandler)
+
+        if interval:
+            watcher = threading.Thread(target=self._watch)
+            watcher.daemon = True
+            watcher.start()
+
+    def _watch(self):
+        while not self.stopped.wait(self.interval):
+            self.manager.checkFiles()
+
+    def dispatch(self, line):
+        'JSON-RPC 요청 한줄을 처리한 응답'
+        reqid = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError, e:
+                raise PbxServerException('parse error: %s' % e, -32700)
+            if not isinstance(request, dict) or 'method' not in request:
+                raise PbxServerException('invalid request', -32600)
+
+            reqid = request.get('id')
+            if request['method'] == 'shutdown':
+                threading.Thread(target=self.shutdown).start()
+                result = True
+            else:
+                result = self.manager.call(request['method'], request.get('params'))
+            response = {'jsonrpc' : '2.0', 'id' : reqid, 'result' : result}
+        except PbxServerException, e:
+            response = {'jsonrpc' : '2.0', 'id' : reqid, 'error' : {'code' : e.code, 'message' : str(e)}}
+        except Exception, e:
+            response = {'jsonrpc' : '2.0', 'id' : reqid,
+                        'error' : {'code' : -32000, 'message' : '%s: %s' % (e.__class__.__name__, e)}}
+        return json.dumps(response)
+
+    def server_close(self):
+        self.stopped.set()
+        SocketServer.UnixStreamServer.server_close(self)
+        if os.path.exists(self.sockpath):
+            os.remove(self.sockpath)
+
+
+class PbxClient(object):
+    '''PbxServer에 연결하는 client
+
+    usage:
+
+    client = PbxClient()
+    client.call('targets', path='App.xcodeproj')
+    '''
+    def __init__(self, sockpath=None, timeout=None):
+        self.sockpath = sockpath or defaultSocketPath()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(self.sockpath)
+        except socket.error:
+            self.sock.close()
+            raise
+        self.file = self.sock.makefile('rb')
+        self.lock = threading.Lock()
+        self.lastid = 0
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def call(self, method, **params):
+        'server에서 |method|를 실행한 결과. 실패하면 PbxServerException'
+        self.lock.acquire()
+        try:
+            self.lastid += 1
+            request = {'jsonrpc' : '2.0', 'id' : self.lastid, 'method' : method, 'params' : params}
+            self.sock.sendall(json.dumps(request) + '\n')
+            line = self.file.readline()
+        finally:
+            self.lock.release()
+
+        if not line:
+            raise PbxServerException('connection closed')
+        response = json.loads(line)
+        error = response.get('error')
+        if error:
+            raise PbxServerException(error.get('message'), error.get('code'))
+        return response.get('result')
+
+    def loadPbxproj(self, path):
+        return PbxRemoteProject(self.call, path)
+
+
+class _PbxLocalCaller(object):
+    'server 없이 같은 process의 PbxProjectManager를 사용'
+    manager = None
+
+    def __call__(self, method, **params):
+        if _PbxLocalCaller.manager is None:
+            _PbxLocalCaller.manager = PbxProjectManager()
+        return _PbxLocalCaller.manager.call(method, params)
+
+
+class PbxRemoteProject(object):
+    '''server( 혹은 같은 process )에 있는 project의 proxy
+
+    PbxObject를 넘길 수 없으므로 target은 이름으로 지정한다.
+    '''
+    def __init__(self, call, path):
+        self.call = call
+        self.path = _pbxpath(path)
+        info = call('load', path=self.path)
+        self.name = info['name']
+
+    def getName(self):
+        return self.name
+
+    def getTargetNames(self):
+        return self.call('targets', path=self.path)
+
+    def getFrameworks(self, target):
+        return self.call('frameworks', path=self.path, target=target)
+
+    def getFiles(self, target=None):
+        return self.call('files', path=self.path, target=target)
+
+    def getBuildSettings(self, configuration, target=None):
+        return self.call('settings', path=self.path, configuration=configuration, target=target)
+
+    def getBuildSetting(self, key, configuration, target=None):
+        return self.call('setting', path=self.path, key=key, configuration=configuration, target=target)
+
+    def setBuildSetting(self, key, value, configurations=None, targets=None):
+        return self.call('setSetting', path=self.path, key=key, value=value,
+                         configurations=configurations, targets=targets)
+
+    def addFramework(self, target, framework):
+        return self.call('addFramework', path=self.path, target=target, framework=framework)
+
+    def removeFramework(self, target, framework):
+        return self.call('removeFramework', path=self.path, target=target, framework=framework)
+
+    def save(self):
+        return self.call('save', path=self.path)
+
+    def unload(self):
+        return self.call('unload', path=self.path)
+
+
+def loadPbxproj(path, sockpath=None, fallback=True):
+    '''PbxProject.loadPbxproj()처럼 project를 읽은 PbxRemoteProject
+
+    server가 실행중이면 server에서 처리하고, 없으면 |fallback|일때
+    같은 process에서 처리한다.
+    '''
+    try:
+        call = PbxClient(sockpath).call
+    except socket.error, e:
+        if not fallback or e.errno not in (errno.ENOENT, errno.ECONNREFUSED):
+            raise
+        call = _PbxLocalCaller()
+    return PbxRemoteProject(call, path)
+
+
+#
+# test
+#
+
+class PbxServerTestCase(unittest.TestCase):
+    def setUp(self):
+        from pbxindex import _createTestProject
+        self.tempdir = tempfile.mkdtemp()
+        self.app = _createTestProject(self.tempdir, 'App', libraries=('UIKit.framework',),
+                                      sources=('main.m', 'src/App.m'), settings={'OTHER_LDFLAGS' : '-ObjC'})
+        self.sockpath = os.path.join(self.tempdir, 'server.sock')
+        self.server = PbxServer(self.sockpath, interval=0)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval' : 0.05})
+        self.thread.start()
+
+    def tearDown(self):
+        import shutil
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.tempdir)
+
+    def testQuery(self):
+        pbx = loadPbxproj(self.app, self.sockpath, fallback=False)
+        self.assertEqual(pbx.getTargetNames(), ['App'])
+        self.assertEqual(pbx.getFrameworks('App'), ['UIKit.framework'])
+        self.assertEqual(pbx.getFiles('App'), [os.path.join(self.tempdir, 'main.m'),
+                                               os.path.join(self.tempdir, 'src', 'App.m')])
+        self.assertEqual(pbx.getBuildSetting('OTHER_LDFLAGS', 'Debug', 'App'), '-ObjC')
+        self.assertRaises(PbxServerException, pbx.getFrameworks, 'None')
+
+        client = PbxClient(self.sockpath)
+        self.assertEqual(client.call('ping'), 'pong')
+        try:
+            client.call('none')
+        except PbxServerException, e:
+            self.assertEqual(e.code, -32601)
+        else:
+            self.fail()
+        client.close()
+
+    def testEditAndSave(self):
+        pbx = loadPbxproj(self.app, self.sockpath, fallback=False)
+        changes = pbx.setBuildSetting('OTHER_LDFLAGS', '-lz', targets=['App'])
+        self.assertEqual(changes, [['App', 'Debug', 'OTHER_LDFLAGS', '-ObjC', '-lz']])
+        self.assertTrue(pbx.addFramework('App', 'QuartzCore.framework'))
+        self.assertTrue(pbx.save())
+        self.assertFalse(pbx.save())
+        self.assertEqual([f for f in os.listdir(self.app) if f.endswith('.tmp')], [])
+
+        local = PbxProject.loadPbxproj(self.app)
+        PbxprojCache.pop(os.path.abspath(_pbxpath(self.app)))
+        target = local.getPbxTargets()[0]
+        self.assertEqual(target.getBuildSetting('OTHER_LDFLAGS', 'Debug'), '-lz')
+        self.assertEqual(target.getFrameworks(), ['UIKit.framework', 'System/Library/Frameworks/QuartzCore.framework'])
+
+    def testExternalChange(self):
+        pbx = loadPbxproj(self.app, self.sockpath, fallback=False)
+        self.assertEqual(pbx.getTargetNames(), ['App'])
+
+        local = PbxProject.loadPbxproj(self.app)
+        PbxprojCache.pop(os.path.abspath(_pbxpath(self.app)))
+        local.getPbxTargets()[0].set('name', 'Renamed')
+        local.save()
+        os.utime(_pbxpath(self.app), (0, 0))
+
+        self.assertEqual(self.server.manager.checkFiles(), [_pbxpath(self.app)])
+        self.assertEqual(pbx.getTargetNames(), ['Renamed'])
+
+        # 저장하지 않은 수정이 있으면 덮어쓰지 않는다.
+        pbx.setBuildSetting('A', 'B')
+        os.utime(_pbxpath(self.app), (1, 1))
+        self.assertRaises(PbxServerException, pbx.getTargetNames)
+
+    def testFallback(self):
+        pbx = loadPbxproj(self.app, os.path.join(self.tempdir, 'none.sock'))
+        self.assertEqual(pbx.getTargetNames(), ['App'])
+        self.assertEqual(pbx.getBuildSetting('OTHER_LDFLAGS', 'Debug', 'App'), '-ObjC')
+        self.assertRaises(socket.error, loadPbxproj, self.app, os.path.join(self.tempdir, 'none.sock'), False)
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,503 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+입력 file 내용으로 build 결과를 찾는 build cache.
+
+target( 과 의존하는 다른 project의 target )의 build phase file, header,
+확장한 build setting, sdk, arch, toolchain으로 fingerprint를 만들고
+같은 fingerprint로 만든 library가 cache에 있으면 xcodebuild를 실행하지 않고
+복사해 온다. lipo로 합친 library는 입력 library 내용으로 찾는다.
+
+cache는 <cachedir>/<fingerprint 앞 2자리>/<fingerprint>/ 에 file과
+manifest.json을 저장한다. 전체 크기가 |maxSize|를 넘으면 가장 오래 사용하지
+않은 것부터 지운다. hit, miss 횟수는 stats.json에 누적한다.
+
+usage:
+
+cache = BuildCache('~/.xcodecache', maxSize=2 * 1024 ** 3)
+builder = LibBuild('Foo.xcodeproj', libs=['libFoo.a'], cache=cache)
+builder.build()
+cache.report()
+
+'''
+
+__all__ = ['BuildCache']
+
+import os
+import sys
+import json
+import glob
+import time
+import errno
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+
+from pbxlib import PbxProject, PbxFileLock, createPbxObject, _groups
+from xcodegraph import BuildGraph, BuildGraphException
+
+
+class BuildCache(object):
+    '''content-addressed build cache
+
+    |maxSize| : cache 전체 크기( bytes ). None이면 지우지 않는다.
+    '''
+    # build setting, 입력 file 형식이 바뀌면 올려서 이전 cache를 쓰지 않게 한다.
+    version = 1
+
+    def __init__(self, cachedir, maxSize=None):
+        self.cachedir = os.path.abspath(os.path.expanduser(cachedir))
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        # path -> (mtime, size, sha1). 여러 variant가 같은 file을 다시 읽지 않도록
+        self._digests = {}
+        self._lock = threading.RLock()
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+
+    #
+    # fingerprint
+    #
+
+    def getFingerprint(self, projfile, target, configuration, sdk=None, arch=None, extra=None):
+        '''|projfile|의 |target|( 없으면 첫번째 target )을 build한 결과의 fingerprint
+
+        |extra| : 그 밖에 결과에 영향을 주는 값 ( xcodebuild flag, toolchain version ... )
+        return : sha1 hex. project를 읽을 수 없으면 None
+        '''
+        projfile = self._findProject(projfile)
+        if not projfile: return None
+
+        # PbxBuildSettingsResolver는 thread-safe하지 않다.
+        with self._lock:
+            graph = BuildGraph()
+            try:
+                if target:
+                    graph.addProject(projfile, [target])
+                else:
+                    pbx = graph._loadProject(projfile)
+                    graph._addTarget(pbx, pbx.objectForProject()['targets'][0])
+                nodes = graph.getOrder()
+            except (BuildGraphException, IndexError, KeyError):
+                return None
+
+            conditions = {}
+            if sdk: conditions['sdk'] = sdk
+            if arch: conditions['arch'] = arch
+            inputs = {'version' : self.version, 'configuration' : configuration, 'sdk' : sdk,
+                      'arch' : arch, 'extra' : extra, 'targets' : []}
+            for node in nodes:
+                pbx = graph.projects[os.path.join(os.path.abspath(node.project), 'project.pbxproj')]
+                inputs['targets'].append(self._getTargetInputs(pbx, node, configuration, conditions))
+
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+    def getFilesKey(self, paths, extra=None):
+        '|paths| file 내용으로 만드는 key. lipo 결과를 찾을때 사용한다.'
+        inputs = {'version' : self.version, 'extra' : extra,
+                  'files' : [self._digestPath(path) for path in paths]}
+        return hashlib.sha1(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+    def _findProject(self, projfile):
+        'projfile이 없으면 xcodebuild처럼 현재 폴더의 .xcodeproj'
+        if projfile: return projfile
+        projects = glob.glob('*.xcodeproj')
+        return len(projects) == 1 and projects[0] or None
+
+    def _getTargetInputs(self, pbx, node, configuration, conditions):
+        target = createPbxObject(pbx, node.guid)
+        paths = _PbxFilePaths(pbx)
+        phases = []
+        for phase in target.getBuildPhases():
+            files = []
+            for buildfile in phase.get('files') or ():
+                fileref = pbx.object(buildfile).get('fileRef')
+                files.append(self._digestRef(paths, fileref))
+            phases.append([phase.get('isa'), files])
+
+        # phase에 없어도 #import 할 수 있는 header
+        headers = [self._digestRef(paths, guid) for guid, obj in sorted(pbx.objects().iteritems())
+                   if obj.get('isa') == 'PBXFileReference' and obj.get('lastKnownFileType') == 'sourcecode.c.h']
+
+        settings = pbx.getSettingsResolver().getSettings(configuration, target, conditions)
+        return {'name' : node.name, 'phases' : phases, 'headers' : headers, 'settings' : settings}
+
+    def _digestRef(self, paths, guid):
+        path = paths.getPath(guid)
+        if path is None or not os.path.isabs(path):
+            # SDKROOT, BUILT_PRODUCTS_DIR 같은 곳의 file은 이름만
+            return path
+        return self._digestPath(path)
+
+    def _digestPath(self, path):
+        '[path, sha1]. directory( bundle, folder reference )는 안의 file을 모두 읽는다.'
+        if os.path.isdir(path):
+            digest = hashlib.sha1()
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    filepath = os.path.join(dirpath, name)
+                    digest.update('%s\0%s\0' % (os.path.relpath(filepath, path), self._digestFile(filepath)))
+            return [path, digest.hexdigest()]
+        return [path, self._digestFile(path)]
+
+    def _digestFile(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._digests.get(path)
+        if cached and cached[:2] == (st.st_mtime, st.st_size):
+            return cached[2]
+
+        digest = hashlib.sha1()
+        f = open(path, 'rb')
+        try:
+            for data in iter(lambda: f.read(1024 * 1024), ''):
+                digest.update(data)
+        finally:
+            f.close()
+        with self._lock:
+            self._digests[path] = (st.st_mtime, st.st_size, digest.hexdigest())
+        return digest.hexdigest()
+
+    #
+    # cache entry
+    #
+
+    def _entryPath(self, key):
+        return os.path.join(self.cachedir, key[:2], key)
+
+    def restore(self, key, destdir):
+        '''|key| entry의 file을 |destdir|에 복사한다.
+
+        return : 복사한 file 경로. cache에 없으면 None
+        '''
+        entry = self._entryPath(key)
+        manifest = os.path.join(entry, 'manifest.json')
+        try:
+            names = json.load(open(manifest))['files']
+        except (IOError, ValueError, KeyError):
+            with self._lock: self.misses += 1
+            return None
+
+        if not os.path.isdir(destdir):
+            os.makedirs(destdir)
+        ret = []
+        try:
+            for name in names:
+                shutil.copyfile(os.path.join(entry, name), os.path.join(destdir, name))
+                ret.append(os.path.join(destdir, name))
+        except IOError:
+            # 일부가 지워진 entry
+            shutil.rmtree(entry, ignore_errors=True)
+            with self._lock: self.misses += 1
+            return None
+
+        # eviction에서 쓰는 마지막 사용 시간
+        os.utime(manifest, None)
+        with self._lock: self.hits += 1
+        return ret
+
+    def store(self, key, paths):
+        '''|paths| file들을 |key| entry로 저장한다. 같은 이름의 file은 저장할 수 없다.'''
+        names = [os.path.basename(path) for path in paths]
+        assert len(set(names)) == len(names), names
+        entry = self._entryPath(key)
+        if os.path.exists(entry): return
+
+        parent = os.path.dirname(entry)
+        if not os.path.isdir(parent):
+            try:
+                os.makedirs(parent)
+            except OSError, e:
+                if e.errno != errno.EEXIST: raise
+
+        # 다 복사한 다음 rename 해서 다른 process가 반쯤 쓴 entry를 읽지 않게 한다.
+        tmpdir = tempfile.mkdtemp(prefix='.%s.' % key, dir=parent)
+        size = 0
+        for path, name in zip(paths, names):
+            shutil.copyfile(path, os.path.join(tmpdir, name))
+            size += os.path.getsize(path)
+        f = open(os.path.join(tmpdir, 'manifest.json'), 'w')
+        json.dump({'files' : names, 'size' : size, 'created' : time.time()}, f)
+        f.close()
+        try:
+            os.rename(tmpdir, entry)
+        except OSError:
+            # 다른 process가 먼저 저장했다.
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            return
+        with self._lock: self.stores += 1
+
+        if self.maxSize is not None:
+            self.evict(self.maxSize)
+
+    def getEntries(self):
+        'return : [(마지막 사용 시간, size, entry path)]'
+        ret = []
+        for manifest in glob.glob(os.path.join(self.cachedir, '??', '*', 'manifest.json')):
+            try:
+                size = json.load(open(manifest))['size']
+                ret.append((os.path.getmtime(manifest), size, os.path.dirname(manifest)))
+            except (IOError, OSError, ValueError, KeyError):
+                continue
+        return ret
+
+    def getSize(self):
+        return sum(size for _, size, _ in self.getEntries())
+
+    def evict(self, maxSize):
+        '''전체 크기가 |maxSize| 이하가 될때까지 오래 사용하지 않은 entry를 지운다.
+
+        return : 지운 entry 수
+        '''
+        with PbxFileLock(os.path.join(self.cachedir, 'cache')):
+            entries = sorted(self.getEntries())
+            total = sum(size for _, size, _ in entries)
+            count = 0
+            for _, size, entry in entries:
+                if total <= maxSize: break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+                count += 1
+        with self._lock: self.evictions += count
+        return count
+
+    #
+    # 통계
+    #
+
+    def getHitRate(self):
+        total = self.hits + self.misses
+        return total and float(self.hits) / total or 0.0
+
+    def saveStats(self):
+        '''이번 hit, miss 횟수를 stats.json에 더한다.
+
+        return : 누적 통계 {'hits', 'misses', 'stores', 'evictions'}
+        '''
+        path = os.path.join(self.cachedir, 'stats.json')
+        with PbxFileLock(path):
+            try:
+                stats = json.load(open(path))
+            except (IOError, ValueError):
+                stats = {}
+            with self._lock:
+                for key in ('hits', 'misses', 'stores', 'evictions'):
+                    stats[key] = stats.get(key, 0) + getattr(self, key)
+                    setattr(self, key, 0)
+            f = open(path + '.tmp', 'w')
+            json.dump(stats, f, sort_keys=True)
+            f.close()
+            os.rename(path + '.tmp', path)
+        return stats
+
+    def report(self, out=None):
+        out = out or sys.stdout
+        entries = self.getEntries()
+        out.write('cache: %d hits, %d misses (%.0f%% hit), %d stored, %d evicted\n' %
+                  (self.hits, self.misses, self.getHitRate() * 100, self.stores, self.evictions))
+        out.write('       %d entries, %.1f MB' % (len(entries), sum(size for _, size, _ in entries) / 1048576.0))
+        if self.maxSize is not None:
+            out.write(' / %.1f MB' % (self.maxSize / 1048576.0))
+        out.write('\n')
+
+
+class _PbxFilePaths(object):
+    '''file reference의 절대 경로. PbxFileReference.getAbspath()는 file마다
+    group을 찾으므로 parent를 한번에 계산해 둔다.
+    '''
+    def __init__(self, pbx):
+        self.pbx = pbx
+        self.parents = {}
+        for guid, obj in pbx.objects().iteritems():
+            if obj.get('isa') in _groups:
+                for child in obj.get('children') or ():
+                    self.parents[child] = guid
+        self._paths = {}
+
+    def getPath(self, guid):
+        '''절대 경로. SDKROOT 같이 project 밖을 기준으로 하는 file은 "SDKROOT/path"
+
+        return : file reference가 없으면 None
+        '''
+        if guid in self._paths: return self._paths[guid]
+        obj = self.pbx.objects().get(guid)
+        if obj is None: return None
+
+        path = obj.get('path') or ''
+        tree = obj.get('sourceTree')
+        if tree == '<absolute>' or os.path.isabs(path):
+            ret = path
+        elif tree == 'SOURCE_ROOT':
+            ret = os.path.join(self.pbx.getRootPath(), path)
+        elif tree == '<group>':
+            parent = self.parents.get(guid)
+            base = parent and self.getPath(parent) or self.pbx.getRootPath()
+            ret = os.path.join(base, path)
+        else:
+            ret = '%s/%s' % (tree, path)
+        if os.path.isabs(ret):
+            ret = os.path.normpath(ret)
+        self._paths[guid] = ret
+        return ret
+
+
+class BuildCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        from pbxgen import PbxProjectGenerator
+        from xcodelib import LibBuildTestCase, _writeScript
+        self.tempdir = tempfile.mkdtemp()
+        self.projpath = os.path.join(self.tempdir, 'Gen', 'Gen.xcodeproj')
+        PbxProjectGenerator(targets=2, files=6, resources=1, subprojects=1).generate(self.projpath)
+        # project에 있는 file을 만든다.
+        for path in (self.projpath, os.path.join(self.tempdir, 'Gen', 'Sub0.xcodeproj')):
+            pbx = PbxProject.loadPbxproj(path)
+            paths = _PbxFilePaths(pbx)
+            for guid, obj in pbx.objects().iteritems():
+                filepath = obj.get('isa') == 'PBXFileReference' and paths.getPath(guid)
+                if filepath and os.path.isabs(filepath) and not filepath.endswith('.xcodeproj'):
+                    if not os.path.isdir(os.path.dirname(filepath)):
+                        os.makedirs(os.path.dirname(filepath))
+                    open(filepath, 'w').write(os.path.basename(filepath))
+        self.cache = BuildCache(os.path.join(self.tempdir, 'cache'))
+
+        _writeScript(self.tempdir, 'xcodebuild', LibBuildTestCase.xcodebuild)
+        _writeScript(self.tempdir, 'lipo', LibBuildTestCase.lipo)
+        self.events = os.path.join(self.tempdir, 'events')
+        self.environ = dict(os.environ)
+        os.environ['PATH'] = self.tempdir + os.pathsep + os.environ['PATH']
+        os.environ['FAKE_EVENTS'] = self.events
+        os.environ['FAKE_SLEEP'] = '0'
+        os.environ['XCODETOOLS_TOOLCHAIN_CACHE'] = os.path.join(self.tempdir, 'toolchain.json')
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        for path in glob.glob(os.path.join(self.tempdir, 'Gen', '*.xcodeproj', 'project.pbxproj')):
+            from pbxlib import PbxprojCache
+            PbxprojCache.pop(path, None)
+        shutil.rmtree(self.tempdir)
+
+    def path(self, *names):
+        return os.path.join(self.tempdir, 'Gen', *names)
+
+    def fingerprint(self, **kwargs):
+        args = dict(sdk='iphoneos5.0', arch='armv7')
+        args.update(kwargs)
+        return self.cache.getFingerprint(self.projpath, 'Gen', 'Release', **args)
+
+    def touch(self, path, content):
+        open(path, 'w').write(content)
+        # mtime 해상도보다 빨리 바뀌어도 다시 읽도록
+        self.cache._digests.clear()
+
+    def testFingerprint(self):
+        key = self.fingerprint()
+        self.assertEqual(len(key), 40)
+        self.assertEqual(self.fingerprint(), key)
+        self.assertNotEqual(self.fingerprint(arch='armv6'), key)
+        self.assertNotEqual(self.fingerprint(sdk='iphonesimulator5.0'), key)
+        self.assertNotEqual(self.fingerprint(extra='Xcode 4.3'), key)
+        self.assertEqual(self.cache.getFingerprint(self.projpath, 'None', 'Release'), None)
+
+        # source, resource, 다른 project( dependency )의 file
+        sources = glob.glob(self.path('Gen', '*', '*.m')) + glob.glob(self.path('Gen', '*', '*', '*.m'))
+        for path in (sources[0], self.path('Image0_0.png'), glob.glob(self.path('Sub0', '*', '*.m'))[0]):
+            content = open(path).read()
+            self.touch(path, 'changed')
+            self.assertNotEqual(self.fingerprint(), key, path)
+            self.touch(path, content)
+            self.assertEqual(self.fingerprint(), key)
+
+        # build setting
+        def edit(pbx):
+            target = [t for t in pbx.getPbxTargets() if t.getName() == 'Gen'][0]
+            for config in target.getConfigurations().getConfigurations():
+                config.get('buildSettings')['OTHER_CFLAGS'] = '-DCHANGED'
+        PbxProject.modifyPbxproj(self.projpath, edit)
+        self.assertNotEqual(self.fingerprint(), key)
+
+    def testVersionGroup(self):
+        # .xcdatamodeld( XCVersionGroup ) 안의 model은 .xcdatamodeld를 기준으로 한다.
+        pbx = PbxProject.loadPbxproj(self.projpath)
+        objects = pbx.objects()
+        objects['MODEL0000000000000000001'] = {'isa' : 'PBXFileReference', 'path' : 'Model 2.xcdatamodel', 
+                                               'sourceTree' : '<group>'}
+        objects['MODEL0000000000000000000'] = {'isa' : 'XCVersionGroup', 'path' : 'Model.xcdatamodeld', 
+                                               'sourceTree' : '<group>', 
+                                               'children' : ['MODEL0000000000000000001'],
+                                               'currentVersion' : 'MODEL0000000000000000001'}
+        mainGroup = objects[pbx.objectForProject()['mainGroup']]
+        mainGroup['children'] = list(mainGroup['children']) + ['MODEL0000000000000000000']
+        paths = _PbxFilePaths(pbx)
+        self.assertEqual(paths.getPath('MODEL0000000000000000001'), 
+                         os.path.join(paths.getPath('MODEL0000000000000000000'), 'Model 2.xcdatamodel'))
+        self.assertEqual(paths.getPath('MODEL0000000000000000000'), 
+                         os.path.join(pbx.getRootPath(), 'Model.xcdatamodeld'))
+
+    def testStore(self):
+        lib = os.path.join(self.tempdir, 'libFoo.a')
+        open(lib, 'w').write('foo' * 100)
+        key = self.cache.getFilesKey([lib])
+        dest = os.path.join(self.tempdir, 'out')
+        self.assertEqual(self.cache.restore(key, dest), None)
+        self.cache.store(key, [lib])
+        self.assertEqual(self.cache.restore(key, dest), [os.path.join(dest, 'libFoo.a')])
+        self.assertEqual(open(os.path.join(dest, 'libFoo.a')).read(), 'foo' * 100)
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.stores), (1, 1, 1))
+        self.assertEqual(self.cache.getSize(), 300)
+
+        # 오래 사용하지 않은 것부터 지운다.
+        keys = []
+        for i in range(3):
+            open(lib, 'w').write(str(i) * 100)
+            keys.append(self.cache.getFilesKey([lib]))
+            self.cache.store(keys[-1], [lib])
+            os.utime(os.path.join(self.cache._entryPath(keys[-1]), 'manifest.json'), (1000 + i, 1000 + i))
+        self.assertEqual(self.cache.evict(400), 2)
+        self.assertEqual(self.cache.getSize(), 400)
+        self.assertTrue(os.path.exists(self.cache._entryPath(key)))
+        self.assertFalse(os.path.exists(self.cache._entryPath(keys[0])))
+        self.assertTrue(os.path.exists(self.cache._entryPath(keys[2])))
+
+        self.assertEqual(self.cache.saveStats(), {'hits' : 1, 'misses' : 1, 'stores' : 4, 'evictions' : 2})
+        self.cache.restore(key, dest)
+        self.assertEqual(self.cache.saveStats()['hits'], 2)
+
+    def testLibBuild(self):
+        from xcodelib import LibBuild, BuildVariant
+        from StringIO import StringIO
+        def build():
+            variants = [BuildVariant('iphoneos5.0', 'armv7'), BuildVariant('iphonesimulator5.0', 'i386')]
+            builder = LibBuild(self.projpath, target='Gen', libs=['libFoo.a'], outdir=self.path('out'),
+                               variants=variants, cache=self.cache)
+            self.assertTrue(builder.build())
+            builds = len([line for line in open(self.events) if line.startswith('start')])
+            return builds, open(self.path('out', 'libFoo.a')).read()
+
+        builds, content = build()
+        self.assertEqual(builds, 2)
+        self.assertEqual((self.cache.hits, self.cache.misses, self.cache.stores), (0, 3, 3))
+        self.assertEqual(build(), (2, content))
+        self.assertEqual(self.cache.hits, 3)
+
+        # source가 바뀌면 다시 build한다.
+        source = glob.glob(self.path('Sub0', '*', '*.m'))[0]
+        self.touch(source, 'changed')
+        self.assertEqual(build(), (4, content))
+        out = StringIO()
+        self.cache.report(out)
+        self.assertTrue(out.getvalue().startswith('cache: 4 hits, 5 misses (44% hit), 5 stored'), out.getvalue())
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,511 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+여러 project에 걸친 target 의존 관계( DAG )를 만들고 xcodebuild를 병렬로 실행한다.
+
+target의 dependencies( PBXTargetDependency )가 가리키는 PBXContainerItemProxy를
+따라가서 같은 project나 projectReferences에 있는 다른 project의 target을 찾는다.
+addProject( link )처럼 다른 project의 library를 link만 하는 경우도 의존 관계로 본다.
+
+job은 끝까지 남은 가장 긴 경로( critical path )가 긴 target부터 시작한다.
+기록해 둔 target별 build 시간으로 worker 수에 따른 build 시간을 예측할 수 있다.
+
+usage:
+
+graph = BuildGraph()
+graph.addProject('App/App.xcodeproj')
+
+build = GraphBuild(graph, configuration='Release', jobs=4,
+                   durations=GraphBuild.loadDurations('durations.json'))
+build.build()
+build.saveDurations('durations.json')
+
+for workers in (1, 2, 4):
+    print workers, graph.simulate(workers, durations)[0]
+
+'''
+
+__all__ = ['BuildGraph', 'BuildNode', 'GraphBuild', 'BuildGraphException']
+
+import os
+import sys
+import json
+import time
+import heapq
+import shutil
+import functools
+import collections
+import unittest
+
+from pbxlib import PbxProject, PbxprojCache
+from xcodelib import Xcodebuild, BuildScheduler
+from xcodelog import XcodebuildLogRecorder
+
+
+class BuildGraphException(Exception):
+    pass
+
+
+class BuildNode(object):
+    '''BuildGraph의 target 하나
+
+    project : .xcodeproj 경로
+    name : "<project 이름>/<target 이름>"
+    deps : 먼저 build해야 하는 BuildNode
+    dependents : 이 target에 의존하는 BuildNode
+    '''
+    def __init__(self, project, guid, target):
+        self.project = project
+        self.guid = guid
+        self.target = target
+        self.name = '%s/%s' % (os.path.splitext(os.path.basename(project))[0], target)
+        self.deps = []
+        self.dependents = []
+
+    def addDependency(self, node):
+        if node is self or node in self.deps: return
+        self.deps.append(node)
+        node.dependents.append(self)
+
+    def __repr__(self):
+        return '<BuildNode %s>' % self.name
+
+
+class BuildGraph(object):
+    '''project들의 target 의존 관계
+
+    |implicit|이면 다른 project의 product( PBXReferenceProxy )를 link하는 것도
+    의존 관계로 본다. ( Xcode의 "Find Implicit Dependencies" )
+    '''
+    def __init__(self, implicit=True):
+        self.implicit = implicit
+        # (project.pbxproj 경로, target guid) : BuildNode. 추가한 순서를 유지한다.
+        self.nodes = collections.OrderedDict()
+        self.projects = {}
+
+    def addProject(self, path, targets=None):
+        '''|path| project의 target( |targets|가 있으면 이름이 같은 target )과
+        그 target이 의존하는 다른 project의 target을 추가한다.
+
+        return : 추가한 target의 BuildNode
+        '''
+        pbx = self._loadProject(path)
+        ret = []
+        for guid in pbx.objectForProject().get('targets', ()):
+            obj = pbx.object(guid)
+            if targets is None or obj.get('name') in targets:
+                ret.append(self._addTarget(pbx, guid))
+        if targets is not None and len(ret) != len(targets):
+            missing = set(targets) - set(node.target for node in ret)
+            raise BuildGraphException('%s: no target %s' % (path, ', '.join(sorted(missing))))
+        return ret
+
+    def getNode(self, name):
+        for node in self.nodes.itervalues():
+            if node.name == name: return node
+        return None
+
+    def _loadProject(self, path):
+        pbx = PbxProject.loadPbxproj(path)
+        if not pbx:
+            raise BuildGraphException('%s: cannot read project' % path)
+        self.projects[os.path.abspath(pbx.path)] = pbx
+        return pbx
+
+    def _addTarget(self, pbx, guid):
+        key = (os.path.abspath(pbx.path), guid)
+        node = self.nodes.get(key)
+        if node: return node
+
+        obj = pbx.object(guid)
+        node = BuildNode(pbx.xcodeprojpath(), guid, obj.get('name'))
+        # cycle이 있어도 끝나도록 먼저 등록한다.
+        self.nodes[key] = node
+
+        for depguid in obj.get('dependencies') or ():
+            dep = self._resolveDependency(pbx, pbx.object(depguid))
+            if dep: node.addDependency(self._addTarget(*dep))
+
+        if self.implicit:
+            for dep in self._linkedTargets(pbx, obj):
+                node.addDependency(self._addTarget(*dep))
+        return node
+
+    def _resolveDependency(self, pbx, dependency):
+        'PBXTargetDependency -> (PbxProject, target guid)'
+        if dependency.get('target'):
+            return pbx, dependency['target']
+        proxy = dependency.get('targetProxy') and pbx.object(dependency['targetProxy'])
+        if not proxy: return None
+        other = self._getContainer(pbx, proxy['containerPortal'])
+        target = proxy['remoteGlobalIDString']
+        if target not in other.objects():
+            raise BuildGraphException('%s: no target %s (%s)' % (other.path, target, proxy.get('remoteInfo')))
+        return other, target
+
+    def _linkedTargets(self, pbx, target):
+        'frameworks build phase에 있는 다른 project product의 (PbxProject, target guid)'
+        ret = []
+        for phaseguid in target.get('buildPhases') or ():
+            phase = pbx.object(phaseguid)
+            if phase.get('isa') != 'PBXFrameworksBuildPhase': continue
+            for buildfile in phase.get('files') or ():
+                ref = pbx.object(pbx.object(buildfile).get('fileRef'))
+                if ref.get('isa') != 'PBXReferenceProxy': continue
+                proxy = pbx.object(ref['remoteRef'])
+                other = self._getContainer(pbx, proxy['containerPortal'])
+                product = proxy['remoteGlobalIDString']
+                for guid, obj in other.objects().iteritems():
+                    if obj.get('productReference') == product and 'buildPhases' in obj:
+                        ret.append((other, guid))
+        return ret
+
+    def _getContainer(self, pbx, portal):
+        'PBXContainerItemProxy의 containerPortal이 가리키는 PbxProject'
+        if portal == pbx.pbxdata['rootObject']:
+            return pbx
+        projrefs = [ref['ProjectRef'] for ref in pbx.objectForProject().get('projectReferences') or ()]
+        if portal not in projrefs:
+            raise BuildGraphException('%s: %s is not in projectReferences' % (pbx.path, portal))
+        return self._loadProject(pbx.getAbsPathFromRelProjPath(pbx.object(portal)['path']))
+
+    def getOrder(self):
+        '''의존하는 target이 먼저 오는 순서. 같으면 추가한 순서.
+
+        cycle이 있으면 BuildGraphException
+        '''
+        counts = dict((node, len(node.deps)) for node in self.nodes.itervalues())
+        index = dict((node, i) for i, node in enumerate(self.nodes.itervalues()))
+        ready = [(index[node], node) for node, count in counts.iteritems() if count == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, node = heapq.heappop(ready)
+            order.append(node)
+            for dependent in node.dependents:
+                counts[dependent] -= 1
+                if counts[dependent] == 0:
+                    heapq.heappush(ready, (index[dependent], dependent))
+        if len(order) != len(self.nodes):
+            cycle = self._findCycle([node for node, count in counts.iteritems() if count])
+            raise BuildGraphException('dependency cycle: %s' % ' -> '.join(node.name for node in cycle))
+        return order
+
+    def _findCycle(self, nodes):
+        'getOrder()에서 남은 |nodes|에서 cycle 하나를 찾는다.'
+        remaining = set(nodes)
+        node = nodes[0]
+        path = []
+        # 남은 node는 모두 남은 dependency가 있으므로 따라가면 언젠가 다시 만난다.
+        while node not in path:
+            path.append(node)
+            node = [dep for dep in node.deps if dep in remaining][0]
+        cycle = path[path.index(node):] + [node]
+        cycle.reverse()
+        return cycle
+
+    def _getDuration(self, durations, defaultDuration):
+        if durations and defaultDuration is None:
+            defaultDuration = float(sum(durations.itervalues())) / len(durations)
+        return lambda node: (durations or {}).get(node.name, defaultDuration or 1.0)
+
+    def getPriorities(self, durations=None, defaultDuration=None):
+        '''target마다 그 target부터 끝까지 가장 긴 경로의 build 시간 ( critical path )
+
+        |durations| : {BuildNode.name : 초}. 없는 target은 |defaultDuration|,
+                      그것도 없으면 기록된 시간의 평균
+        return : {BuildNode : 초}
+        '''
+        duration = self._getDuration(durations, defaultDuration)
+        priorities = {}
+        for node in reversed(self.getOrder()):
+            priorities[node] = duration(node) + max([priorities[d] for d in node.dependents] or [0])
+        return priorities
+
+    def getCriticalPath(self, durations=None, defaultDuration=None):
+        'return : (가장 오래 걸리는 의존 경로의 BuildNode, 그 시간)'
+        priorities = self.getPriorities(durations, defaultDuration)
+        if not priorities: return [], 0
+        node = max(self.getOrder(), key=lambda node: (not node.deps, priorities[node]))
+        path = [node]
+        while node.dependents:
+            node = max(node.dependents, key=lambda dependent: priorities[dependent])
+            path.append(node)
+        return path, priorities[path[0]]
+
+    def simulate(self, workers, durations=None, defaultDuration=None):
+        '''|workers|개로 build하면 걸리는 시간을 |durations|로 계산한다.
+
+        BuildScheduler와 같이 critical path가 긴 target부터 시작한다.
+        return : (전체 시간, [(BuildNode, 시작, 끝, worker 번호)])
+        '''
+        duration = self._getDuration(durations, defaultDuration)
+        priorities = self.getPriorities(durations, defaultDuration)
+        index = dict((node, i) for i, node in enumerate(self.getOrder()))
+        counts = dict((node, len(node.deps)) for node in index)
+        ready = [(-priorities[node], index[node], node) for node in index if not node.deps]
+        heapq.heapify(ready)
+        idle = range(workers)
+        running = []
+        schedule = []
+        now = 0.0
+        while ready or running:
+            while ready and idle:
+                _, _, node = heapq.heappop(ready)
+                worker = idle.pop(0)
+                end = now + duration(node)
+                schedule.append((node, now, end, worker))
+                heapq.heappush(running, (end, index[node], node, worker))
+            now, _, node, worker = heapq.heappop(running)
+            idle.append(worker)
+            idle.sort()
+            for dependent in node.dependents:
+                counts[dependent] -= 1
+                if counts[dependent] == 0:
+                    heapq.heappush(ready, (-priorities[dependent], index[dependent], dependent))
+        return now, schedule
+
+
+class GraphBuild(object):
+    '''BuildGraph의 target을 의존 관계에 맞춰 최대 |jobs|개씩 동시에 build한다.
+
+    |keepGoing|이 아니면 target 하나가 실패할때 실행중인 xcodebuild를 멈추고 끝낸다.
+    |durations|( 이전 build의 getDurations() )가 있으면 critical path 계산에 사용한다.
+    |builddir|은 모든 target이 같이 쓰는 BUILD_DIR, |logdir|가 있으면 target마다
+    xcodebuild 출력을 <logdir>/<project>-<target>.log로 저장한다.
+    '''
+    def __init__(self, graph, configuration=None, sdk=None, jobs=None, keepGoing=False,
+                 builddir=None, logdir=None, durations=None, out=None):
+        self.graph = graph
+        self.configuration = configuration
+        self.sdk = sdk
+        self.jobs = jobs
+        self.keepGoing = keepGoing
+        self.builddir = builddir
+        self.logdir = logdir
+        self.durations = durations
+        self.out = out or sys.stdout
+        self.scheduler = None
+
+    def build(self):
+        'return : 모든 target build가 성공했으면 True'
+        priorities = self.graph.getPriorities(self.durations)
+        self.scheduler = BuildScheduler(self.jobs, self.keepGoing)
+        self.scheduler.addListener(self._report)
+        if self.logdir and not os.path.isdir(self.logdir):
+            os.makedirs(self.logdir)
+
+        jobs = {}
+        for node in self.graph.getOrder():
+            xcodebuild = self.createXcodebuild(node)
+            jobs[node] = self.scheduler.addJob(node.name, functools.partial(self._build, node, xcodebuild),
+                                               [jobs[dep] for dep in node.deps],
+                                               priorities[node], xcodebuild.cancel)
+        return self.scheduler.run()
+
+    def createXcodebuild(self, node):
+        xcodebuild = Xcodebuild(projfile=node.project, configuration=self.configuration, target=node.target)
+        if self.sdk:
+            xcodebuild.setSdk(self.sdk)
+        if self.builddir:
+            xcodebuild.setBuildDir(os.path.abspath(self.builddir))
+        # 여러 xcodebuild의 출력이 섞이지 않도록 출력하지 않는다.
+        xcodebuild.echo = False
+        return xcodebuild
+
+    def _build(self, node, xcodebuild):
+        recorder = None
+        if self.logdir:
+            recorder = XcodebuildLogRecorder(os.path.join(self.logdir, node.name.replace('/', '-') + '.log'))
+            xcodebuild.addListener(recorder)
+        try:
+            result = xcodebuild.build()
+        finally:
+            if recorder: recorder.close()
+        for error in xcodebuild.log.getErrors():
+            self.out.write('%s: %s\n' % (node.name, error))
+        if result.error:
+            self.out.write('%s: %s\n' % (node.name, result.error))
+        return result.succeeded()
+
+    def _report(self, job):
+        if job.state == 'running':
+            self.out.write('start     %s\n' % job.name)
+        elif job.state == 'skipped':
+            self.out.write('skipped   %s\n' % job.name)
+        else:
+            self.out.write('%-9s %s (%.1fs)\n' % (job.state, job.name, job.getElapsed()))
+        self.out.flush()
+
+    def getDurations(self):
+        '성공한 target의 build 시간 {BuildNode.name : 초}'
+        if not self.scheduler: return {}
+        return dict((job.name, job.getElapsed()) for job in self.scheduler.jobs if job.state == 'succeeded')
+
+    def saveDurations(self, path):
+        '|path|에 있던 시간에 이번 build 시간을 덮어써서 저장한다.'
+        durations = GraphBuild.loadDurations(path)
+        durations.update(self.getDurations())
+        f = open(path, 'w')
+        json.dump(durations, f, indent=1, sort_keys=True)
+        f.close()
+
+    @staticmethod
+    def loadDurations(path):
+        if not path or not os.path.exists(path): return {}
+        return json.load(open(path))
+
+
+class BuildGraphTestCase(unittest.TestCase):
+    # target마다 FAKE_SLEEP_<target>초 동안 sleep하는 xcodebuild.
+    # 시작, 끝난 시간을 events에 쓰고 FAKE_FAIL target은 실패한다.
+    xcodebuild = '''
+import os, sys, time
+args = sys.argv[1:]
+target = args[args.index('-target') + 1]
+events = os.environ['FAKE_EVENTS']
+def event(kind):
+    fd = os.open(events, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    os.write(fd, '%s %s %f\\n' % (kind, target, time.time()))
+    os.close(fd)
+event('start')
+print 'building', target
+time.sleep(float(os.environ.get('FAKE_SLEEP_' + target, '0.1')))
+event('end')
+if target == os.environ.get('FAKE_FAIL'):
+    print 'error: failed'
+    sys.exit(65)
+'''
+
+    def setUp(self):
+        import tempfile
+        from pbxgen import PbxProjectGenerator
+        from xcodelib import _writeScript
+        self.tempdir = tempfile.mkdtemp()
+        # Gen -> Sub0, Sub1 ( 다른 project ), GenLib2 -> GenLib1
+        self.projpath = os.path.join(self.tempdir, 'Gen', 'Gen.xcodeproj')
+        pbx = PbxProjectGenerator(targets=3, files=6, subprojects=2).generate(self.projpath)
+        self.addDependency(pbx, 'GenLib2', 'GenLib1')
+        self.graph = BuildGraph()
+        self.graph.addProject(self.projpath)
+
+        _writeScript(self.tempdir, 'xcodebuild', self.xcodebuild)
+        self.events = os.path.join(self.tempdir, 'events')
+        self.environ = dict(os.environ)
+        os.environ['PATH'] = self.tempdir + os.pathsep + os.environ['PATH']
+        os.environ['FAKE_EVENTS'] = self.events
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tempdir)
+
+    def addDependency(self, pbx, name, depname):
+        '같은 project 안의 target dependency'
+        targets = dict((t.getName(), t) for t in pbx.getPbxTargets())
+        dep = targets[depname].getGuid()
+        proxy = pbx.createPbxGuid()
+        pbx.setObject(proxy, {'isa' : 'PBXContainerItemProxy', 'containerPortal' : pbx.pbxdata['rootObject'],
+                              'proxyType' : '1', 'remoteGlobalIDString' : dep, 'remoteInfo' : depname})
+        guid = pbx.createPbxGuid()
+        pbx.setObject(guid, {'isa' : 'PBXTargetDependency', 'target' : dep, 'targetProxy' : proxy})
+        targets[name].appendValue('dependencies', guid)
+        pbx.save()
+        PbxprojCache.pop(os.path.abspath(pbx.path), None)
+
+    def readEvents(self):
+        'return : {target : (시작, 끝)}'
+        times = {}
+        for line in open(self.events):
+            kind, target, t = line.split()
+            times.setdefault(target, [None, None])[kind == 'end'] = float(t)
+        return times
+
+    def testGraph(self):
+        order = [node.name for node in self.graph.getOrder()]
+        self.assertEqual(sorted(order), ['Gen/Gen', 'Gen/GenLib1', 'Gen/GenLib2', 'Sub0/Sub0', 'Sub1/Sub1'])
+        for node in self.graph.nodes.itervalues():
+            for dep in node.deps:
+                self.assertTrue(order.index(dep.name) < order.index(node.name))
+        gen = self.graph.getNode('Gen/Gen')
+        self.assertEqual([dep.name for dep in gen.deps], ['Sub0/Sub0', 'Sub1/Sub1'])
+        self.assertEqual(gen.deps[0].project, os.path.join(self.tempdir, 'Gen', 'Sub0.xcodeproj'))
+        self.assertEqual([dep.name for dep in self.graph.getNode('Gen/GenLib2').deps], ['Gen/GenLib1'])
+
+        # link만 하는 경우
+        graph = BuildGraph(implicit=False)
+        graph.addProject(self.projpath, ['Gen'])
+        self.assertEqual(len(graph.nodes), 3)
+        self.assertRaises(BuildGraphException, graph.addProject, self.projpath, ['None'])
+
+    def testCycle(self):
+        pbx = PbxProject._parsePbxproj(os.path.join(self.projpath, 'project.pbxproj'))
+        self.addDependency(pbx, 'GenLib1', 'GenLib2')
+        graph = BuildGraph()
+        graph.addProject(self.projpath)
+        try:
+            graph.getOrder()
+            self.fail()
+        except BuildGraphException, e:
+            self.assertTrue('Gen/GenLib1 -> Gen/GenLib2 -> Gen/GenLib1' in str(e) or
+                            'Gen/GenLib2 -> Gen/GenLib1 -> Gen/GenLib2' in str(e), str(e))
+
+    def testSimulate(self):
+        durations = {'Gen/Gen' : 1, 'Sub0/Sub0' : 1, 'Sub1/Sub1' : 1, 'Gen/GenLib1' : 2, 'Gen/GenLib2' : 2}
+        path, length = self.graph.getCriticalPath(durations)
+        self.assertEqual([node.name for node in path], ['Gen/GenLib1', 'Gen/GenLib2'])
+        self.assertEqual(length, 4)
+        self.assertEqual(self.graph.simulate(1, durations)[0], 7)
+        # GenLib1을 먼저 시작해야 4초
+        wall, schedule = self.graph.simulate(2, durations)
+        self.assertEqual(wall, 4)
+        self.assertEqual(schedule[0][0].name, 'Gen/GenLib1')
+        self.assertEqual(self.graph.simulate(10, durations)[0], 4)
+        # 기록이 없는 target은 평균 시간
+        del durations['Gen/Gen']
+        self.assertEqual(self.graph.simulate(1, durations)[0], 7.5)
+
+    def testBuild(self):
+        from StringIO import StringIO
+        build = GraphBuild(self.graph, jobs=2, logdir=os.path.join(self.tempdir, 'logs'), out=StringIO())
+        self.assertTrue(build.build())
+        times = self.readEvents()
+        self.assertEqual(len(times), 5)
+        for node in self.graph.nodes.itervalues():
+            for dep in node.deps:
+                self.assertTrue(times[dep.target][1] <= times[node.target][0])
+        events = sorted([(start, 1) for start, end in times.values()] + [(end, -1) for start, end in times.values()])
+        self.assertTrue(max(sum(delta for _, delta in events[:i + 1]) for i in range(len(events))) <= 2)
+        self.assertEqual(sorted(build.getDurations()), sorted(node.name for node in self.graph.nodes.itervalues()))
+        self.assertTrue('building Sub0' in open(os.path.join(self.tempdir, 'logs', 'Sub0-Sub0.log')).read())
+
+        path = os.path.join(self.tempdir, 'durations.json')
+        build.saveDurations(path)
+        self.assertEqual(GraphBuild.loadDurations(path), build.getDurations())
+
+    def testFailure(self):
+        from StringIO import StringIO
+        os.environ['FAKE_FAIL'] = 'Sub0'
+        build = GraphBuild(self.graph, jobs=2, keepGoing=True, out=StringIO())
+        self.assertFalse(build.build())
+        states = dict((job.name, job.state) for job in build.scheduler.jobs)
+        self.assertEqual(states, {'Gen/Gen' : 'skipped', 'Sub0/Sub0' : 'failed', 'Sub1/Sub1' : 'succeeded',
+                                  'Gen/GenLib1' : 'succeeded', 'Gen/GenLib2' : 'succeeded'})
+
+        # 실패하면 실행중인 GenLib1을 멈추고 끝낸다.
+        os.environ['FAKE_SLEEP_GenLib1'] = '30'
+        out = StringIO()
+        start = time.time()
+        durations = {'Gen/Gen' : 1, 'Sub0/Sub0' : 1, 'Sub1/Sub1' : 1, 'Gen/GenLib1' : 30, 'Gen/GenLib2' : 1}
+        build = GraphBuild(self.graph, jobs=2, durations=durations, out=out)
+        self.assertFalse(build.build())
+        self.assertTrue(time.time() - start < 10)
+        states = dict((job.name, job.state) for job in build.scheduler.jobs)
+        self.assertEqual(states['Gen/GenLib1'], 'failed')
+        self.assertEqual(states['Gen/GenLib2'], 'skipped')
+        self.assertTrue('Sub0/Sub0: error: failed' in out.getvalue())
+
+
+if __name__=='__main__':
+    unittest.main()
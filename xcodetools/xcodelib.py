@@ -7,28 +7,525 @@ xcodebuild command을 python으로 쉽게 실행시키기 위한 library
 * changelog *
 - 2011-09-21 init.
 - 2011-11-22 add SimpleBuild
+- ProcessRunner : 출력을 한줄씩 읽으면서 실행. timeout, 취소
+- Xcodebuild.log : 마지막 xcodebuild 출력을 분석한 XcodebuildLog
+- BuildScheduler : LibBuild의 sdk, arch별 build와 lipo를 병렬로 실행
+- ToolchainCache : xcodebuild -showsdks, -list, -version 결과를 disk에 저장
+- Xcodebuild.buildAsync, Lipo.createAsync : 기다리지 않고 ProcessFuture를 반환
+- LibBuild(incremental=True) : BUILD_DIR을 지우지 않고 바뀐 library만 lipo
 
 '''
 
-__all__ = ['Xcodebuild', 'Lipo', 'SimpleBuild']
+__all__ = ['Xcodebuild', 'Lipo', 'LibBuild', 'ProcessRunner', 'ProcessResult', 'ProcessFuture', 'ConcurrencyLimit',
+           'BuildScheduler', 'BuildJob', 'BuildVariant', 'ToolchainCache', 'inspectLibrary', 'scanLibraries']
 
 import os
 import re
+import sys
+import copy
+import json
+import glob
+import time
+import errno
 import shlex
+import hashlib
 import shutil
+import signal
+import functools
+import threading
 import subprocess
+import collections
+import multiprocessing
 import unittest
 
+from xcodelog import XcodebuildLog, XcodebuildLogRecorder
+from macho import MachOFile, MachOError, createFat, inspectLibrary, scanLibraries
+
 def _system(cmds, shell=False):
+    '''|cmds|를 실행한다. 
+    
+    return : ( 종료 code, stdout ). stdout은 마지막 ProcessRunner.bufferLines 줄까지만 갖는다.
+             실행하지 못하면 ( None, None )
+    '''
     if isinstance(cmds,(str, unicode)):
         cmds = shlex.split(cmds)
     print cmds
-    p = subprocess.Popen(cmds, shell=shell, stdout=subprocess.PIPE)
-    if not p: return (False, None)
+    result = ProcessRunner(cmds, shell=shell).run()
+    if result.error: return (None, None)
+    
+    return result.returncode, result.getOutput('stdout')
+
+
+def _hashFile(path):
+    '|path| 내용의 sha1'
+    digest = hashlib.sha1()
+    f = open(path, 'rb')
+    try:
+        for data in iter(lambda: f.read(1024 * 1024), ''):
+            digest.update(data)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+def _echo(stream, line):
+    'ProcessRunner listener. 출력을 그대로 sys.stdout, sys.stderr에 쓴다.'
+    out = stream == 'stderr' and sys.stderr or sys.stdout
+    out.write(line)
+
+
+class ProcessResult(object):
+    '''ProcessRunner의 실행 결과.
+    
+    returncode : 종료 code. signal로 끝났으면 음수, 실행하지 못했으면 None
+    error      : 실행하지 못한 경우의 OSError
+    output     : 마지막 bufferLines 줄의 ( stream, line ) 목록. stream은 'stdout', 'stderr'
+    lines      : stream별 줄 수
+    bytes      : stream별 bytes
+    '''
+    def __init__(self, cmds):
+        self.cmds = cmds
+        self.returncode = None
+        self.error = None
+        self.output = []
+        self.lines = {'stdout' : 0, 'stderr' : 0}
+        self.bytes = {'stdout' : 0, 'stderr' : 0}
+        self.startTime = None
+        self.endTime = None
+        self.timedOut = False
+        self.cancelled = False
+    
+    def getElapsed(self):
+        '실행 시간 (초). 실행중이면 지금까지의 시간'
+        if self.startTime is None: return 0.0
+        return (self.endTime or time.time()) - self.startTime
+    
+    def getOutput(self, stream=None):
+        '버퍼에 남은 출력. |stream|이 주어지면 그 stream만'
+        return ''.join(line for s, line in self.output if stream is None or s == stream)
+    
+    def succeeded(self):
+        return self.returncode == 0 and not self.timedOut and not self.cancelled
+    
+    def __repr__(self):
+        return '<ProcessResult %s returncode=%s elapsed=%.2fs>' % (self.cmds, self.returncode, self.getElapsed())
+
+
+class ProcessRunner(object):
+    '''process를 실행하고 stdout, stderr을 한줄씩 읽는다.
+    
+    stdout, stderr을 thread에서 따로 읽으므로 출력이 pipe buffer보다 커도 멈추지 않는다.
+    읽은 줄은 listener( listener(stream, line) )에 넘기고 마지막 |bufferLines| 줄만
+    ProcessResult.output에 남긴다. listener는 한번에 하나씩 호출된다.
+    
+    |timeout| 초가 지나거나 cancel()하면 process group 전체( xcodebuild가 실행한 
+    clang 등 )에 SIGTERM을 보내고 |killTimeout| 초 뒤에도 살아 있으면 SIGKILL을 보낸다.
+    
+    usage:
+    
+    runner = ProcessRunner(['xcodebuild', 'build'], timeout=3600)
+    runner.addListener(lambda stream, line: sys.stdout.write(line))
+    result = runner.run()
+    print result.returncode, result.getElapsed()
+    
+    '''
+    def __init__(self, cmds, cwd=None, env=None, shell=False, timeout=None, bufferLines=1000, killTimeout=5):
+        self.cmds = cmds
+        self.cwd = cwd
+        self.env = env
+        self.shell = shell
+        self.timeout = timeout
+        self.killTimeout = killTimeout
+        self.listeners = []
+        self.process = None
+        self.result = ProcessResult(cmds)
+        self._buffer = collections.deque(maxlen=bufferLines)
+        self._lock = threading.Lock()
+        self._readers = []
+        self._timers = []
+    
+    def addListener(self, listener):
+        self.listeners.append(listener)
+    
+    def removeListener(self, listener):
+        self.listeners.remove(listener)
+    
+    def start(self):
+        '''process를 시작한다. 실행하지 못하면 result.error에 OSError를 저장한다.
+        
+        이미 cancel()했으면 실행하지 않는다.
+        '''
+        result = self.result
+        result.startTime = time.time()
+        if result.cancelled:
+            result.endTime = result.startTime
+            return result
+        try:
+            self.process = subprocess.Popen(self.cmds, cwd=self.cwd, env=self.env, shell=self.shell,
+                                            bufsize=-1, stdin=open(os.devnull), stdout=subprocess.PIPE, 
+                                            stderr=subprocess.PIPE, close_fds=True, 
+                                            preexec_fn=os.setsid)
+        except OSError, e:
+            result.error = e
+            result.endTime = time.time()
+            return result
+        
+        for stream, pipe in (('stdout', self.process.stdout), ('stderr', self.process.stderr)):
+            reader = threading.Thread(target=self._read, args=(stream, pipe))
+            reader.daemon = True
+            reader.start()
+            self._readers.append(reader)
+        
+        if self.timeout is not None:
+            self._schedule(self.timeout, self._expire)
+        return result
+    
+    def wait(self):
+        '''process가 끝날때까지 기다린다. return : ProcessResult'''
+        result = self.result
+        if self.process:
+            for reader in self._readers:
+                # join()에 timeout을 줘야 Ctrl-C를 받는다.
+                while reader.is_alive():
+                    reader.join(1)
+            result.returncode = self.process.wait()
+            result.endTime = time.time()
+        for timer in self._timers:
+            timer.cancel()
+        result.output = list(self._buffer)
+        return result
+    
+    def run(self):
+        'start(), wait()'
+        self.start()
+        return self.wait()
+    
+    def cancel(self):
+        '실행중인 process를 멈춘다. 다른 thread에서 호출할 수 있다.'
+        self.result.cancelled = True
+        self._terminate()
+    
+    def isRunning(self):
+        return self.process is not None and self.process.poll() is None
+    
+    def _read(self, stream, pipe):
+        result = self.result
+        # for line in pipe는 read-ahead buffer가 찰때까지 기다리므로 readline을 쓴다.
+        for line in iter(pipe.readline, ''):
+            with self._lock:
+                result.lines[stream] += 1
+                result.bytes[stream] += len(line)
+                self._buffer.append((stream, line))
+                for listener in self.listeners:
+                    listener(stream, line)
+        pipe.close()
+    
+    def _schedule(self, delay, func):
+        timer = threading.Timer(delay, func)
+        timer.daemon = True
+        timer.start()
+        self._timers.append(timer)
+    
+    def _expire(self):
+        self.result.timedOut = True
+        self._terminate()
+    
+    def _terminate(self):
+        if self.isRunning():
+            self._signal(signal.SIGTERM)
+            self._schedule(self.killTimeout, lambda: self._signal(signal.SIGKILL))
+    
+    def _signal(self, sig):
+        try:
+            os.killpg(self.process.pid, sig)
+        except OSError, e:
+            if e.errno != errno.ESRCH: raise
+
+
+class ConcurrencyLimit(object):
+    '''동시에 실행하는 ProcessFuture 수 제한. 
+    
+    Xcodebuild, Lipo는 기본으로 getDefault()( cpu 수 )를 같이 쓰므로 여러 build를 
+    한꺼번에 시작해도 |count|개씩 실행한다.
+    '''
+    _default = None
+    
+    def __init__(self, count=None):
+        self.count = count or multiprocessing.cpu_count()
+        self.running = 0
+        self._condition = threading.Condition()
+    
+    @classmethod
+    def getDefault(cls):
+        if cls._default is None:
+            cls._default = ConcurrencyLimit()
+        return cls._default
+    
+    def setCount(self, count):
+        with self._condition:
+            self.count = count
+            self._condition.notify_all()
+    
+    def acquire(self, cancelled=None):
+        '''자리가 날때까지 기다린다. 기다리는 동안 cancelled()가 True가 되면 False를 반환'''
+        with self._condition:
+            while True:
+                if cancelled and cancelled(): return False
+                if self.running < self.count: break
+                self._condition.wait()
+            self.running += 1
+            return True
+    
+    def release(self):
+        with self._condition:
+            self.running -= 1
+            self._condition.notify_all()
+    
+    def wakeup(self):
+        'acquire()에서 기다리는 thread가 cancelled()를 다시 확인하게 한다.'
+        with self._condition:
+            self._condition.notify_all()
+
+
+class ProcessFuture(object):
+    '''다른 thread에서 실행중인 일. Xcodebuild.buildAsync(), cleanAsync(), Lipo.createAsync()가 반환한다.
+    
+    |limit|( ConcurrencyLimit )에 자리가 나면 func(future)를 실행한다. func은 process를 만들면 
+    future.setRunner(runner)를 호출해서 cancel()이 process group을 멈출 수 있게 한다.
+    출력은 Xcodebuild.addListener()로 등록한 listener에 실행중에 넘어온다.
+    
+    usage:
+    
+    futures = [xcodebuild.copy().buildAsync() for xcodebuild in builds]
+    futures[0].addDoneCallback(lambda future: sys.stdout.write('done\\n'))
+    for future in futures: print future.result()
+    
+    '''
+    def __init__(self, func, limit=None):
+        self.func = func
+        self.limit = limit
+        self.runner = None
+        self.cancelled = False
+        self.value = None
+        # func이 던진 exception의 sys.exc_info()
+        self.error = None
+        self.callbacks = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def setRunner(self, runner):
+        'func이 실행하는 ProcessRunner. 이미 cancel()했으면 바로 멈춘다.'
+        with self._lock:
+            self.runner = runner
+            if self.cancelled: runner.cancel()
+    
+    def cancel(self):
+        '''기다리는 중이면 실행하지 않고, 실행중이면 process group을 멈춘다. 
+        
+        return : 끝나기 전에 cancel했으면 True
+        '''
+        with self._lock:
+            self.cancelled = True
+            if self.runner: self.runner.cancel()
+        if self.limit: self.limit.wakeup()
+        return not self.done()
+    
+    def isCancelled(self):
+        return self.cancelled
+    
+    def done(self):
+        return self._done.is_set()
     
-    p.wait()
-    out = p.stdout.read()
-    return p.returncode, out
+    def addDoneCallback(self, callback):
+        '끝나면 callback(future)를 호출한다. 이미 끝났으면 바로 호출한다.'
+        with self._lock:
+            if not self.done():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+    
+    def wait(self, timeout=None):
+        '끝날때까지 기다린다. return : 끝났으면 True'
+        if timeout is not None:
+            return self._done.wait(timeout)
+        # wait()에 timeout을 줘야 Ctrl-C를 받는다.
+        while not self._done.wait(1):
+            pass
+        return True
+    
+    def result(self):
+        '''func(future)의 반환값. func이 던진 exception은 다시 던진다.
+        
+        실행하기 전에 cancel()했으면 None
+        '''
+        self.wait()
+        if self.error:
+            raise self.error[0], self.error[1], self.error[2]
+        return self.value
+    
+    def _run(self):
+        try:
+            if self.limit is None or self.limit.acquire(self.isCancelled):
+                try:
+                    self.value = self.func(self)
+                finally:
+                    if self.limit: self.limit.release()
+        except Exception:
+            self.error = sys.exc_info()
+        with self._lock:
+            self._done.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+def _parseSdks(output):
+    '''xcodebuild -showsdks 출력
+    
+    return : [{'sdk' : 'iphoneos5.0', 'name' : 'iOS 5.0', 'group' : 'iOS SDKs'}]
+    '''
+    ret = []
+    group = None
+    for line in output.splitlines():
+        m = re.match(r'\s*(.*?)\s+-sdk ([0-9a-zA-Z._]+)', line)
+        if m:
+            ret.append({'sdk' : m.group(2), 'name' : m.group(1), 'group' : group})
+        elif line.strip().endswith(':'):
+            group = line.strip()[:-1]
+    return ret
+
+
+def _parseList(output):
+    '''xcodebuild -list 출력
+    
+    return : {'project', 'targets', 'configurations', 'schemes', 'defaultConfiguration'}
+    '''
+    ret = {'project' : None, 'targets' : [], 'configurations' : [], 'schemes' : [], 
+           'defaultConfiguration' : None}
+    sections = {'Targets:' : 'targets', 'Build Configurations:' : 'configurations', 'Schemes:' : 'schemes'}
+    section = None
+    for line in output.splitlines():
+        text = line.strip()
+        m = re.match(r'Information about project "(.*)":', text)
+        if m:
+            ret['project'] = m.group(1)
+        elif text in sections:
+            section = sections[text]
+        elif not text:
+            section = None
+        elif section:
+            ret[section].append(text)
+        else:
+            m = re.search(r'then "(.*)" is used', text)
+            if m: ret['defaultConfiguration'] = m.group(1)
+    return ret
+
+
+class ToolchainCache(object):
+    '''xcodebuild -showsdks, -list, -version 결과를 |path|( JSON )에 저장한다.
+    
+    xcodebuild 실행 file의 경로와 mtime, DEVELOPER_DIR, xcode-select 설정이 같으면 
+    xcodebuild를 다시 실행하지 않는다. -list는 project file의 mtime도 같아야 한다.
+    기본 경로는 환경변수 XCODETOOLS_TOOLCHAIN_CACHE로 바꿀 수 있다.
+    '''
+    # xcode-select -s 로 바꾸는 link
+    xcodeSelectLink = '/var/db/xcode_select_link'
+    
+    _default = None
+    
+    def __init__(self, path='~/.xcodetools/toolchain.json'):
+        self.path = os.path.expanduser(path)
+        self.entries = None
+        self.lock = threading.Lock()
+    
+    @classmethod
+    def getDefault(cls):
+        path = os.environ.get('XCODETOOLS_TOOLCHAIN_CACHE', '~/.xcodetools/toolchain.json')
+        if cls._default is None or cls._default.path != os.path.expanduser(path):
+            cls._default = ToolchainCache(path)
+        return cls._default
+    
+    def getToolchainKey(self):
+        '사용할 xcodebuild를 나타내는 값. xcodebuild가 없으면 None'
+        from distutils.spawn import find_executable
+        path = find_executable('xcodebuild')
+        if not path: return None
+        path = os.path.realpath(path)
+        key = [path, os.path.getmtime(path), os.environ.get('DEVELOPER_DIR')]
+        if os.path.lexists(self.xcodeSelectLink):
+            key.append(os.path.realpath(self.xcodeSelectLink))
+        return json.dumps(key)
+    
+    def getProjectKey(self, projfile):
+        '|projfile|의 project.pbxproj, scheme file들의 mtime. project가 없으면 None'
+        if not projfile:
+            projects = glob.glob('*.xcodeproj')
+            if len(projects) != 1: return None
+            projfile = projects[0]
+        pbxproj = os.path.join(projfile, 'project.pbxproj')
+        if not os.path.exists(pbxproj): return None
+        files = [pbxproj] + glob.glob(os.path.join(projfile, '*data', '*', 'xcschemes', '*.xcscheme')) \
+                          + glob.glob(os.path.join(projfile, '*data', 'xcschemes', '*.xcscheme'))
+        return json.dumps([os.path.abspath(projfile)] + sorted((f, os.path.getmtime(f)) for f in files))
+    
+    def get(self, name, compute, projfile=None):
+        '''|name|에 저장한 값. 없으면 compute()로 계산해서 저장한다. 
+        
+        compute()가 None을 반환하면 저장하지 않는다.
+        '''
+        toolchain = self.getToolchainKey()
+        if toolchain is None: 
+            return compute()
+        if projfile is not None:
+            project = self.getProjectKey(projfile)
+            if project is None: return compute()
+            name = '%s %s' % (name, project)
+        
+        with self.lock:
+            entries = self._load()
+            entry = entries.get(toolchain, {})
+            if name in entry: 
+                return entry[name]
+        
+        value = compute()
+        if value is None: return None
+        with self.lock:
+            # 다른 process가 저장한 것을 지우지 않도록 다시 읽는다.
+            self.entries = None
+            entries = self._load()
+            entries.setdefault(toolchain, {})[name] = value
+            self._save(entries)
+        return value
+    
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+    
+    def _load(self):
+        if self.entries is None:
+            try:
+                self.entries = json.load(open(self.path))
+            except (IOError, ValueError):
+                self.entries = {}
+        return self.entries
+    
+    def _save(self, entries):
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmppath = '%s.%d.tmp' % (self.path, os.getpid())
+        f = open(tmppath, 'w')
+        json.dump(entries, f, indent=1, sort_keys=True)
+        f.close()
+        os.rename(tmppath, self.path)
 
 
 class Xcodebuild:
@@ -52,13 +549,60 @@ class Xcodebuild:
         self.target = target
         self.flags = {'RUN_CLANG_STATIC_ANALYZER':'NO'}
         self.arch = []
+        self.version = None
+        # xcodebuild 실행 시간 제한 (초)
+        self.timeout = None
+        # xcodebuild 출력을 받을 listener( listener(stream, line) )
+        self.listeners = []
+        # 출력을 sys.stdout, sys.stderr에 쓴다.
+        self.echo = True
+        self.runner = None
+        # 마지막 build, clean의 XcodebuildLog
+        self.log = None
+        # -showsdks, -list, -version 결과를 저장하는 ToolchainCache. None이면 저장하지 않는다.
+        self.toolchainCache = ToolchainCache.getDefault()
+        # buildAsync(), cleanAsync()의 동시 실행 수 제한. None이면 제한하지 않는다.
+        self.concurrencyLimit = ConcurrencyLimit.getDefault()
         
+    def copy(self):
+        '같은 설정의 Xcodebuild. 따로 바꿔서 동시에 실행할 수 있다.'
+        other = copy.copy(self)
+        other.flags = dict(self.flags)
+        other.arch = list(self.arch)
+        other.listeners = list(self.listeners)
+        other.runner = None
+        other.log = None
+        return other
+    
+    def _cached(self, name, compute, projfile=None):
+        if self.toolchainCache is None: 
+            return compute()
+        return self.toolchainCache.get(name, compute, projfile)
+    
     def getSdks(self):
         if self.sdks: return self.sdks
-        _, msg = _system('xcodebuild -showsdks')
-        self.sdks = re.findall(r'-sdk ([0-9a-zA-Z._]*)', msg)
+        self.sdks = [info['sdk'] for info in self.getSdkInfo()]
         return self.sdks
     
+    def getSdkInfo(self):
+        '''xcodebuild -showsdks 결과 
+        
+        return : [{'sdk' : 'iphoneos5.0', 'name' : 'iOS 5.0', 'group' : 'iOS SDKs'}]
+        '''
+        def compute():
+            code, msg = _system('xcodebuild -showsdks')
+            return code == 0 and _parseSdks(msg) or None
+        return self._cached('showsdks', compute) or []
+    
+    def getVersion(self):
+        'xcodebuild -version 출력. 실행할 수 없으면 None'
+        if self.version is None:
+            def compute():
+                code, msg = _system('xcodebuild -version')
+                return code == 0 and msg.strip() or None
+            self.version = self._cached('version', compute) or ''
+        return self.version or None
+    
     def getSdksForIphone(self):
         sdk = self.getSdks()
         return [x for x in sdk if x.startswith('iphone')]
@@ -75,13 +619,33 @@ class Xcodebuild:
         else:
             self.arch = arch
     
+    def addListener(self, listener):
+        self.listeners.append(listener)
+    
     def build(self):
-        self._doXcodebuild('build')
+        return self._doXcodebuild('build')
     
     def clean(self):
-        self._doXcodebuild('clean')
+        return self._doXcodebuild('clean')
+    
+    def buildAsync(self):
+        '''build()를 다른 thread에서 실행한다. 
+        
+        return : ProcessFuture. result()는 ProcessResult
+        runner, log를 같이 쓰므로 동시에 여러 build를 하려면 copy()한 Xcodebuild마다 호출한다.
+        '''
+        return ProcessFuture(lambda future: self._doXcodebuild('build', future), self.concurrencyLimit).start()
+    
+    def cleanAsync(self):
+        'clean()을 다른 thread에서 실행한다. return : ProcessFuture'
+        return ProcessFuture(lambda future: self._doXcodebuild('clean', future), self.concurrencyLimit).start()
+    
+    def cancel(self):
+        '실행중인 xcodebuild를 멈춘다.'
+        runner = self.runner
+        if runner: runner.cancel()
     
-    def _doXcodebuild(self, cmd):
+    def _doXcodebuild(self, cmd, future=None):
         cmds = ['xcodebuild']
         if self.configuration:
             cmds.append('-configuration')
@@ -108,7 +672,18 @@ class Xcodebuild:
                 cmds.append('%s=%s' % (k,v))
         
         #print cmds
-        subprocess.call(cmds)
+        self.runner = ProcessRunner(cmds, timeout=self.timeout)
+        if self.echo: 
+            self.runner.addListener(_echo)
+        for listener in self.listeners:
+            self.runner.addListener(listener)
+        self.log = XcodebuildLog()
+        self.runner.addListener(self.log)
+        if future: 
+            future.setRunner(self.runner)
+        result = self.runner.run()
+        self.log.finish(result.endTime)
+        return result
     
     def setConfiguration(self, configuration):
         self.configuration = configuration
@@ -117,20 +692,41 @@ class Xcodebuild:
         self.sdk = sdk
         
     def getList(self):
+        '''xcodebuild -list 결과
+        
+        return : {'project', 'targets', 'configurations', 'schemes', 'defaultConfiguration'}
+                 실패하면 None
+        '''
         cmds = ['xcodebuild']
         if self.projfile:
             cmds.append('-project')
             cmds.append(self.projfile)
         cmds.append('-list')
         
-        _, msg = _system(cmds)
-        
+        def compute():
+            code, msg = _system(cmds)
+            return code == 0 and _parseList(msg) or None
+        return self._cached('list', compute, self.projfile)
         
+
 class Lipo(object):
-    ' lipo를 이용해서 fat file을 만드는 함수'
-    def __init__(self):
+    ''' lipo를 이용해서 fat file을 만드는 함수
+    
+    |backend|
+        'lipo' : lipo를 실행한다.
+        'python' : macho.createFat()으로 만든다. lipo가 없어도 되고 process를 만들지 않는다.
+        None : lipo가 있으면 'lipo', 없으면 'python'
+    '''
+    def __init__(self, backend=None):
         self.libs = []
         self.flags = {}
+        if backend is None:
+            from distutils.spawn import find_executable
+            backend = find_executable('lipo') and 'lipo' or 'python'
+        assert backend in ('lipo', 'python'), backend
+        self.backend = backend
+        # createAsync()의 동시 실행 수 제한
+        self.concurrencyLimit = ConcurrencyLimit.getDefault()
        
     def setFlag(self,k,v):
          self.flags[k] = v
@@ -138,23 +734,239 @@ class Lipo(object):
     def addLib(self,lib):
         self.libs.append(lib)
         
-    def create(self,outpath):
+    def createAsync(self, outpath):
+        '''create()를 다른 thread에서 실행한다. 
+        
+        return : ProcessFuture. result()는 create()의 반환값
+        '''
+        libs = list(self.libs)
+        return ProcessFuture(lambda future: self.create(outpath, future, libs), self.concurrencyLimit).start()
+    
+    def create(self, outpath, future=None, libs=None):
+        if libs is None: libs = self.libs
+        if self.backend == 'python':
+            try:
+                createFat(libs, outpath)
+            except (MachOError, IOError, OSError), e:
+                print 'lipo: %s' % e
+                return False
+            return True
+        
         cmds = ['lipo']
         cmds.append('-create')
         cmds.append('-output')
         cmds.append(outpath)
-        cmds.extend(self.libs)
+        cmds.extend(libs)
 
         
         if self.flags:
             for k,v in self.flags.iteritems():
                 cmds.append('%s=%s' % (k,v))
-        ret = subprocess.call(cmds)
-        return ret == 0
+        runner = ProcessRunner(cmds)
+        runner.addListener(_echo)
+        if future:
+            future.setRunner(runner)
+        return runner.run().returncode == 0
+    
+    def info(self, path):
+        'lipo -info 출력. 읽을 수 없으면 None'
+        if self.backend == 'python':
+            try:
+                with MachOFile(path) as f:
+                    return f.getInfo()
+            except (MachOError, IOError, OSError), e:
+                print 'lipo: %s' % e
+                return None
+        result = ProcessRunner(['lipo', '-info', path]).run()
+        return result.succeeded() and result.getOutput('stdout').strip() or None
+    
+    def thin(self, path, arch, outpath):
+        'fat file |path|에서 |arch|만 |outpath|에 쓴다. ( lipo -thin )'
+        if self.backend == 'python':
+            try:
+                with MachOFile(path) as f:
+                    f.thin(arch, outpath)
+            except (MachOError, IOError, OSError), e:
+                print 'lipo: %s' % e
+                return False
+            return True
+        runner = ProcessRunner(['lipo', path, '-thin', arch, '-output', outpath])
+        runner.addListener(_echo)
+        return runner.run().returncode == 0
+
+
+class BuildJob(object):
+    '''BuildScheduler에서 실행할 일.
+    
+    state : 'waiting', 'running', 'succeeded', 'failed', 'skipped'( 의존하는 job이 실패 )
+    func()가 exception 없이 False가 아닌 값을 반환하면 성공이다. 
+    반환값은 result, exception은 error에 저장한다.
+    priority가 높은 job부터 시작하고, cancel()은 실행중인 job을 멈출때 호출한다.
+    '''
+    def __init__(self, name, func, deps=(), priority=0, cancel=None):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.priority = priority
+        self.cancel = cancel
+        self.state = 'waiting'
+        self.result = None
+        self.error = None
+        self.start = None
+        self.end = None
+    
+    def getElapsed(self):
+        if self.start is None or self.end is None: return None
+        return self.end - self.start
+    
+    def isDone(self):
+        return self.state in ('succeeded', 'failed', 'skipped')
+    
+    def __repr__(self):
+        return '<BuildJob %s %s>' % (self.name, self.state)
+
+
+class BuildScheduler(object):
+    '''의존 관계가 있는 job들을 최대 |maxJobs|개씩 thread에서 동시에 실행한다.
+    
+    job은 의존하는 job이 모두 성공하면 priority가 높은 순서, 같으면 추가한 순서대로 
+    시작한다. 의존하는 job이 실패하면 실행하지 않고 skipped가 된다. |keepGoing|이 
+    아니면 job 하나가 실패하면 실행중인 job을 cancel()하고 나머지는 skipped가 된다.
+    실행중인 job에서 addJob()으로 job을 추가할 수 있다. 
+    listener( listener(job) )는 job이 시작하고 끝날때 호출된다.
+    
+    usage:
+    
+    scheduler = BuildScheduler(4)
+    device = scheduler.addJob('device', lambda: build('iphoneos'))
+    simulator = scheduler.addJob('simulator', lambda: build('iphonesimulator'))
+    scheduler.addJob('lipo', lambda: lipo(), [device, simulator])
+    scheduler.run()
+    
+    '''
+    def __init__(self, maxJobs=None, keepGoing=True):
+        self.maxJobs = maxJobs or multiprocessing.cpu_count()
+        self.keepGoing = keepGoing
+        self.jobs = []
+        self.listeners = []
+        # keepGoing이 아닐때 job이 실패하면 True
+        self.stopped = False
+        self._cond = threading.Condition()
+        self._running = 0
+    
+    def addListener(self, listener):
+        self.listeners.append(listener)
+    
+    def addJob(self, name, func, deps=(), priority=0, cancel=None):
+        job = BuildJob(name, func, deps, priority, cancel)
+        with self._cond:
+            self.jobs.append(job)
+            self._cond.notify_all()
+        return job
+    
+    def run(self):
+        '''모든 job이 끝날때까지 실행한다. return : 모든 job이 성공했으면 True'''
+        with self._cond:
+            while True:
+                self._startReadyJobs()
+                if self._running == 0 and all(job.isDone() for job in self.jobs):
+                    break
+                # timeout을 줘야 Ctrl-C를 받는다.
+                self._cond.wait(1)
+        return all(job.state == 'succeeded' for job in self.jobs)
+    
+    def _startReadyJobs(self):
+        ready = []
+        for job in self.jobs:
+            if job.state != 'waiting': continue
+            if self.stopped or any(dep.state in ('failed', 'skipped') for dep in job.deps):
+                job.state = 'skipped'
+                self._notify(job)
+            elif all(dep.state == 'succeeded' for dep in job.deps):
+                ready.append(job)
+        
+        # sort는 stable이므로 priority가 같으면 추가한 순서
+        ready.sort(key=lambda job: -job.priority)
+        for job in ready[:max(0, self.maxJobs - self._running)]:
+            job.state = 'running'
+            job.start = time.time()
+            self._running += 1
+            self._notify(job)
+            thread = threading.Thread(target=self._runJob, args=(job,))
+            thread.daemon = True
+            thread.start()
+    
+    def _runJob(self, job):
+        try:
+            job.result = job.func()
+            state = job.result is False and 'failed' or 'succeeded'
+        except Exception, e:
+            job.error = e
+            state = 'failed'
+        with self._cond:
+            job.end = time.time()
+            job.state = state
+            self._running -= 1
+            self._notify(job)
+            if state == 'failed' and not self.keepGoing and not self.stopped:
+                self.stopped = True
+                for other in self.jobs:
+                    if other.state == 'running' and other.cancel: 
+                        other.cancel()
+            self._cond.notify_all()
+    
+    def _notify(self, job):
+        for listener in self.listeners:
+            listener(job)
+
+
+class BuildVariant(object):
+    '''LibBuild에서 따로 build하는 ( sdk, arch, configuration )
+    
+    sdk가 None이면 project의 기본 sdk( iphoneos ), arch가 None이면 기본 arch로 build한다.
+    '''
+    def __init__(self, sdk=None, arch=None, configuration='Release'):
+        self.sdk = sdk
+        self.arch = arch
+        self.configuration = configuration
+        self.result = None
+    
+    def getName(self):
+        return '%s-%s-%s' % (self.configuration, self.sdk or 'default', self.arch or 'default')
+    
+    def getPlatform(self):
+        'iphonesimulator5.0 -> iphonesimulator'
+        return self.sdk and re.sub(r'[0-9.]+$', '', self.sdk) or 'iphoneos'
+    
+    def getBuildDir(self, outdir):
+        'variant마다 따로 쓰는 BUILD_DIR'
+        return os.path.join(os.path.abspath(outdir), 'variants', self.getName())
+    
+    def getProductsDir(self, outdir):
+        'xcodebuild가 library를 만드는 directory'
+        return os.path.join(self.getBuildDir(outdir), '%s-%s' % (self.configuration, self.getPlatform()))
+    
+    def __repr__(self):
+        return '<BuildVariant %s>' % self.getName()
 
 
 class LibBuild(object):
-    def __init__(self,projfile = None, configuration = None, target = None, libs=None, outdir='__build__'):
+    '''device, simulator용으로 build한 library들을 lipo로 합친다.
+    
+    |variants|( BuildVariant )마다 다른 BUILD_DIR에서 최대 |jobs|개씩 동시에 build하고, 
+    모든 variant의 build가 끝나면 library마다 lipo를 동시에 실행한다. 
+    variant의 출력은 BUILD_DIR/xcodebuild.log에 저장한다.
+    
+    |cache|( xcodecache.BuildCache )가 있으면 입력이 같은 variant는 build하지 않고 
+    cache의 library를 복사한다. lipo 결과도 입력 library가 같으면 복사한다.
+    |lipo|는 Lipo의 backend ( 'lipo', 'python' )
+    
+    |incremental|이면 |outdir|을 지우지 않고 지난 build의 BUILD_DIR, OBJROOT에서 이어서 build한다.
+    variant의 설정( sdk, arch, flags )이나 xcodebuild가 바뀐 경우에만 그 variant의 BUILD_DIR을 
+    지운다. lipo는 입력 library의 내용이 바뀐 경우에만 실행하고 나머지는 upToDate에 넣는다.
+    '''
+    def __init__(self,projfile = None, configuration = None, target = None, libs=None, outdir='__build__',
+                 variants=None, jobs=None, cache=None, lipo=None, incremental=False):
         
         if not projfile:
             import glob
@@ -174,38 +986,221 @@ class LibBuild(object):
         self.outdir = outdir
         self.libs = libs
         self.outputs = []
+        self.variants = variants
+        self.jobs = jobs
+        self.cache = cache
+        self.lipo = lipo
+        self.incremental = incremental
+        # incremental build에서 바뀌지 않아서 lipo하지 않은 library
+        self.upToDate = []
+        self.scheduler = None
+    
+    def getDefaultVariants(self):
+        '기본 sdk로 device용, 가장 최신 simulator sdk로 i386 build'
+        configuration = self.xcodebuild.configuration or 'Release'
+        simulators = sorted(filter(lambda x : 'simulator' in x, self.xcodebuild.getSdksForIphone()))
+        return [BuildVariant(None, None, configuration), 
+                BuildVariant(simulators.pop(), 'i386', configuration)]
         
     def build(self):
-        self.cleanup()
-
-        self.xcodebuild.setBuildDir(self.outdir)
-        self.xcodebuild.clean()
-        self.xcodebuild.build()
-
-        sdk_simulator = sorted(filter(lambda x : 'simulator' in x, self.xcodebuild.getSdksForIphone())).pop()
-        self.xcodebuild.setSdk(sdk_simulator)
-        self.xcodebuild.setArch(('i386'))
-        self.xcodebuild.build()
-        self.makeBigLib()
-        
-    def makeBigLib(self):
-        import glob
+        '''return : 모든 build와 lipo가 성공했으면 True'''
+        if not self.incremental:
+            self.cleanup()
         self.outputs = []
-
+        self.upToDate = []
+        
+        variants = self.variants or self.getDefaultVariants()
+        if self.cache or self.incremental:
+            self.xcodebuild.getVersion()
+        self.scheduler = BuildScheduler(self.jobs)
+        builds = [self.scheduler.addJob(v.getName(), functools.partial(self._buildVariant, v)) for v in variants]
+        products = [v.getProductsDir(self.outdir) for v in variants]
+        if self.libs:
+            self._addLipoJobs(products, builds)
+        else:
+            # library 목록은 build한 다음에 안다.
+            self.scheduler.addJob('libs', lambda: self._addLipoJobs(products, builds), builds)
+        return self.scheduler.run()
+    
+    def _buildVariant(self, variant):
+        xcodebuild = self.xcodebuild.copy()
+        xcodebuild.setConfiguration(variant.configuration)
+        xcodebuild.setSdk(variant.sdk or '')
+        xcodebuild.setArch(variant.arch or [])
+        builddir = variant.getBuildDir(self.outdir)
+        xcodebuild.setBuildDir(builddir)
+        xcodebuild.flags['OBJROOT'] = os.path.join(builddir, 'Intermediates')
+        
+        # BUILD_DIR, OBJROOT는 결과에 영향이 없다.
+        flags = dict((k, v) for k, v in xcodebuild.flags.iteritems() if k not in ('BUILD_DIR', 'OBJROOT'))
+        variant.cleaned = False
+        if self.incremental:
+            settings = [os.path.abspath(xcodebuild.projfile), xcodebuild.target, variant.configuration,
+                        variant.sdk, variant.arch, flags, xcodebuild.getVersion(), 
+                        ToolchainCache.getDefault().getToolchainKey()]
+            variant.cleaned = self._cleanIfChanged(variant, settings)
+        
+        key = None
+        variant.cached = False
+        if self.cache:
+            key = self.cache.getFingerprint(xcodebuild.projfile, xcodebuild.target, variant.configuration,
+                                            variant.sdk, variant.arch, [flags, xcodebuild.getVersion()])
+            if key and self.cache.restore(key, variant.getProductsDir(self.outdir)):
+                variant.cached = True
+                return True
+        
+        # 여러 xcodebuild의 출력이 섞이지 않도록 file에 쓴다.
+        if not os.path.isdir(builddir):
+            os.makedirs(builddir)
+        recorder = XcodebuildLogRecorder(os.path.join(builddir, 'xcodebuild.log'))
+        xcodebuild.echo = False
+        xcodebuild.addListener(recorder)
+        try:
+            variant.result = xcodebuild.build()
+        finally:
+            recorder.close()
+        for error in xcodebuild.log.getErrors():
+            print '%s: %s' % (variant.getName(), error)
+        if not variant.result.succeeded(): 
+            return False
+        if key:
+            products = variant.getProductsDir(self.outdir)
+            self.cache.store(key, [os.path.join(products, lib) for lib in os.listdir(products) if lib.endswith('.a')])
+        return True
+    
+    def _cleanIfChanged(self, variant, settings):
+        '''|settings|가 지난 build와 다르면 |variant|의 BUILD_DIR을 지운다. 
+        
+        return : 지웠으면 True
+        '''
+        builddir = variant.getBuildDir(self.outdir)
+        path = os.path.join(builddir, 'settings.json')
+        text = json.dumps(settings, sort_keys=True)
+        try:
+            if open(path).read() == text: return False
+        except IOError:
+            pass
+        cleaned = os.path.exists(builddir)
+        if cleaned:
+            shutil.rmtree(builddir)
+        os.makedirs(builddir)
+        f = open(path, 'w')
+        f.write(text)
+        f.close()
+        return cleaned
+    
+    def _getLipoState(self, inputs, output):
+        '''|inputs|의 [ 경로, 크기, mtime, sha1 ]. 지난 lipo 때와 크기, mtime이 같은 file은 읽지 않는다.
+        
+        return : ( 지난 lipo 때와 내용이 같고 |output|이 있으면 True, 상태 ) 
+        '''
+        path = os.path.join(os.path.dirname(output), '.lipo', os.path.basename(output) + '.json')
+        try:
+            old = json.load(open(path))
+        except (IOError, ValueError):
+            old = []
+        entries = dict((entry[0], entry) for entry in old)
+        state = []
+        for lib in inputs:
+            st = os.stat(lib)
+            entry = entries.get(lib)
+            if entry and entry[1:3] == [st.st_size, st.st_mtime]:
+                digest = entry[3]
+            else:
+                digest = _hashFile(lib)
+            state.append([lib, st.st_size, st.st_mtime, digest])
+        unchanged = os.path.exists(output) and [(e[0], e[3]) for e in old] == [(e[0], e[3]) for e in state]
+        return unchanged, state
+    
+    def _saveLipoState(self, output, state):
+        dirname = os.path.join(os.path.dirname(output), '.lipo')
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        f = open(os.path.join(dirname, os.path.basename(output) + '.json'), 'w')
+        json.dump(state, f)
+        f.close()
+    
+    def _addLipoJobs(self, products, builds):
+        '|products| folder마다 있는 library를 합치는 job을 추가한다.'
         if not self.libs:
-            _,_,libs = os.walk(os.path.join(self.outdir,'Release-iphoneos')).next()
+            _,_,libs = os.walk(products[0]).next()
             self.libs = filter(lambda x : x.endswith('.a'), libs)
-
         for lib in self.libs:
-            lib_os = os.path.join(self.outdir, 'Release-iphoneos', os.path.basename(lib))
-            lib_sim = os.path.join(self.outdir, 'Release-iphonesimulator', os.path.basename(lib))
             fat_lib = os.path.join(self.outdir, os.path.basename(lib))
-
-            l = Lipo()
-            l.addLib(lib_os)
-            l.addLib(lib_sim)
-            l.create(fat_lib)
+            inputs = [os.path.join(dirpath, os.path.basename(lib)) for dirpath in products]
+            self.scheduler.addJob('lipo %s' % os.path.basename(lib), 
+                                  functools.partial(self._lipo, inputs, fat_lib), builds)
             self.outputs.append(fat_lib)
+    
+    def _lipo(self, inputs, output):
+        state = None
+        if self.incremental:
+            unchanged, state = self._getLipoState(inputs, output)
+            if unchanged:
+                # mtime이 바뀌었으면 다음에 다시 읽지 않도록 저장한다.
+                self._saveLipoState(output, state)
+                self.upToDate.append(output)
+                return True
+        key = None
+        if self.cache:
+            key = self.cache.getFilesKey(inputs, ['lipo', os.path.basename(output)])
+            if self.cache.restore(key, os.path.dirname(output)):
+                if state: self._saveLipoState(output, state)
+                return True
+        l = Lipo(self.lipo)
+        for lib in inputs:
+            l.addLib(lib)
+        if not l.create(output):
+            return False
+        if key:
+            self.cache.store(key, [output])
+        if state:
+            self._saveLipoState(output, state)
+        return True
+        
+    def verify(self, symbols=(), threads=None):
+        '''lipo로 만든 library에 모든 variant의 architecture가 있고 |symbols|를 export하는지 
+        lipo -info, nm 없이 확인한다.
+        
+        return : 문제 [(path, message)]. 없으면 []
+        '''
+        variants = self.variants or self.getDefaultVariants()
+        archs = [v.arch for v in variants]
+        problems = []
+        for info in scanLibraries(self.outputs, threads, symbols=bool(symbols)):
+            path = info['path']
+            if 'error' in info:
+                problems.append((path, info['error']))
+                continue
+            if len(info['archs']) != len(variants):
+                problems.append((path, '%d architectures (%s), expected %d' % 
+                                 (len(info['archs']), ' '.join(info['archs']), len(variants))))
+            for arch in archs:
+                if arch and arch not in info['archs']:
+                    problems.append((path, 'no architecture %s' % arch))
+            for s in info['slices']:
+                for symbol in symbols:
+                    if symbol not in s['symbols']:
+                        problems.append((path, '%s does not export %s' % (s['arch'], symbol)))
+        return problems
+        
+    def makeBigLib(self, lipo=None):
+        '''build한 library들을 lipo로 합친다. |lipo| : Lipo의 backend
+        
+        variants가 없고 outdir/variants도 없으면 예전처럼 outdir/Release-iphoneos와 
+        outdir/Release-iphonesimulator의 library를 합친다.
+        '''
+        if lipo: 
+            self.lipo = lipo
+        self.outputs = []
+        if self.variants is None and not os.path.isdir(os.path.join(self.outdir, 'variants')):
+            products = [os.path.join(self.outdir, 'Release-iphoneos'), 
+                        os.path.join(self.outdir, 'Release-iphonesimulator')]
+        else:
+            products = [v.getProductsDir(self.outdir) for v in self.variants or self.getDefaultVariants()]
+        self.scheduler = BuildScheduler(self.jobs)
+        self._addLipoJobs(products, [])
+        return self.scheduler.run()
 
     def getLibs(self):
         return self.outputs
@@ -215,6 +1210,625 @@ class LibBuild(object):
             shutil.rmtree(self.outdir)
 
         
+def _writeScript(dirpath, name, source):
+    'test용 python script |dirpath|/|name|을 만든다.'
+    path = os.path.join(dirpath, name)
+    f = open(path, 'w')
+    f.write('#!%s\n%s' % (sys.executable, source))
+    f.close()
+    os.chmod(path, 0755)
+    return path
+
+
+class ProcessRunnerTestCase(unittest.TestCase):
+    # 출력을 많이 하는 xcodebuild 대신 쓰는 script. stdout, stderr에 번갈아 쓴다.
+    noisy = '''
+import sys
+size = int(sys.argv[1])
+line = 'x' * 99 + '\\n'
+for i in range(size / 100):
+    (i % 3 and sys.stdout or sys.stderr).write(line)
+sys.stdout.write('done\\n')
+sys.exit(3)
+'''
+    
+    def setUp(self):
+        import tempfile
+        self.tempdir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+    
+    def testLargeOutput(self):
+        # pipe buffer( 64KB )보다 훨씬 큰 출력
+        size = 16 * 1024 * 1024
+        script = _writeScript(self.tempdir, 'noisy', self.noisy)
+        counts = {'stdout' : 0, 'stderr' : 0}
+        last = {}
+        def count(stream, line):
+            counts[stream] += 1
+            last[stream] = line
+        runner = ProcessRunner([script, str(size)], bufferLines=10)
+        runner.addListener(count)
+        result = runner.run()
+        
+        self.assertEqual(result.returncode, 3)
+        self.assertFalse(result.succeeded())
+        self.assertEqual(result.lines, counts)
+        self.assertEqual(result.lines['stdout'] + result.lines['stderr'], size / 100 + 1)
+        self.assertEqual(result.bytes['stdout'] + result.bytes['stderr'], size / 100 * 100 + 5)
+        self.assertEqual(len(result.output), 10)
+        self.assertEqual(last['stdout'], 'done\n')
+        self.assertTrue(result.getElapsed() > 0)
+    
+    def testTimeout(self):
+        script = _writeScript(self.tempdir, 'sleep', 'import time\nprint "start"\ntime.sleep(30)\n')
+        result = ProcessRunner([script], timeout=0.5).run()
+        self.assertTrue(result.timedOut)
+        self.assertEqual(result.returncode, -signal.SIGTERM)
+        self.assertTrue(result.getElapsed() < 10)
+        self.assertEqual(result.getOutput(), 'start\n')
+    
+    def testCancel(self):
+        # process group 전체를 멈춘다.
+        script = _writeScript(self.tempdir, 'child', '''
+import sys, subprocess
+subprocess.Popen([sys.executable, '-c', 'import time; print "child"; time.sleep(30)']).wait()
+''')
+        runner = ProcessRunner([script])
+        started = threading.Event()
+        runner.addListener(lambda stream, line: started.set())
+        runner.start()
+        started.wait(10)
+        runner.cancel()
+        result = runner.wait()
+        self.assertTrue(result.cancelled)
+        self.assertFalse(result.succeeded())
+        self.assertTrue(result.getElapsed() < 10)
+    
+    def testNotFound(self):
+        result = ProcessRunner([os.path.join(self.tempdir, 'none')]).run()
+        self.assertEqual(result.returncode, None)
+        self.assertEqual(result.error.errno, errno.ENOENT)
+    
+    def testGetSdks(self):
+        _writeScript(self.tempdir, 'xcodebuild', '''
+print "iOS SDKs:"
+print "\\tiOS 5.0                        \\t-sdk iphoneos5.0"
+print "iOS Simulator SDKs:"
+print "\\tSimulator - iOS 5.0            \\t-sdk iphonesimulator5.0"
+''')
+        path = os.environ['PATH']
+        os.environ['PATH'] = self.tempdir + os.pathsep + path
+        try:
+            xcodebuild = Xcodebuild()
+            xcodebuild.toolchainCache = None
+            self.assertEqual(xcodebuild.getSdksForIphone(), ['iphoneos5.0', 'iphonesimulator5.0'])
+        finally:
+            os.environ['PATH'] = path
+    
+    def testBuildLog(self):
+        _writeScript(self.tempdir, 'xcodebuild', '''
+import sys
+sys.stdout.write(open(%r).read())
+''' % os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'build-failed.log'))
+        path = os.environ['PATH']
+        os.environ['PATH'] = self.tempdir + os.pathsep + path
+        try:
+            xcodebuild = Xcodebuild('Sample.xcodeproj', 'Debug')
+            xcodebuild.echo = False
+            result = xcodebuild.build()
+        finally:
+            os.environ['PATH'] = path
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(xcodebuild.log.succeeded, False)
+        self.assertEqual([s.name for s in xcodebuild.log.steps], ['Core/Parser.m', 'Core/Lexer.m'])
+        self.assertTrue(result.startTime <= xcodebuild.log.steps[0].start <= xcodebuild.log.end <= result.endTime)
+
+
+class _FakeToolchainTestCase(unittest.TestCase):
+    '''|xcodebuild|, |lipo| script를 PATH 앞에 두는 test. 환경변수는 tearDown에서 되돌린다.'''
+    
+    def setUp(self):
+        import tempfile
+        self.tempdir = tempfile.mkdtemp()
+        _writeScript(self.tempdir, 'xcodebuild', self.xcodebuild)
+        _writeScript(self.tempdir, 'lipo', self.lipo)
+        self.events = os.path.join(self.tempdir, 'events')
+        self.environ = dict(os.environ)
+        os.environ['PATH'] = self.tempdir + os.pathsep + os.environ['PATH']
+        os.environ['FAKE_EVENTS'] = self.events
+        os.environ['XCODETOOLS_TOOLCHAIN_CACHE'] = os.path.join(self.tempdir, 'toolchain.json')
+        self.outdir = os.path.join(self.tempdir, 'out')
+    
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tempdir)
+    
+    def getMaxConcurrency(self):
+        events = sorted((float(t), kind == 'start' and 1 or -1) for kind, _, t in 
+                        (line.split() for line in open(self.events)))
+        running = count = 0
+        for _, delta in events:
+            running += delta
+            count = max(count, running)
+        return count
+
+
+class LibBuildTestCase(_FakeToolchainTestCase):
+    # sleep하고 library를 만드는 xcodebuild. 시작, 끝난 시간을 events에 쓴다.
+    xcodebuild = '''
+import os, sys, time
+args = sys.argv[1:]
+if '-version' in args:
+    print "Xcode 4.2"
+    sys.exit(0)
+if '-showsdks' in args:
+    print "iOS SDKs:"
+    print "\\tiOS 5.0                        \\t-sdk iphoneos5.0"
+    print "iOS Simulator SDKs:"
+    print "\\tSimulator - iOS 4.3            \\t-sdk iphonesimulator4.3"
+    print "\\tSimulator - iOS 5.0            \\t-sdk iphonesimulator5.0"
+    sys.exit(0)
+opts = {'-sdk' : 'iphoneos', '-arch' : 'armv7', '-configuration' : 'Release'}
+for i, arg in enumerate(args):
+    if arg in opts: opts[arg] = args[i + 1]
+    if '=' in arg: opts.update([arg.split('=', 1)])
+name = '%(-sdk)s-%(-arch)s' % opts
+events = os.environ['FAKE_EVENTS']
+def event(kind):
+    fd = os.open(events, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    os.write(fd, '%s %s %f\\n' % (kind, name, time.time()))
+    os.close(fd)
+event('start')
+print 'building', name
+time.sleep(float(os.environ.get('FAKE_SLEEP', '0.3')))
+event('end')
+if opts['-sdk'] == os.environ.get('FAKE_FAIL'):
+    print 'error: failed'
+    sys.exit(65)
+platform = opts['-sdk'].rstrip('0123456789.')
+products = os.path.join(opts['BUILD_DIR'], '%s-%s' % (opts['-configuration'], platform))
+os.makedirs(products)
+for lib in ('libFoo.a', 'libBar.a'):
+    open(os.path.join(products, lib), 'w').write('%s %s\\n' % (lib, name))
+'''
+    lipo = '''
+import sys
+args = sys.argv[1:]
+output = args[args.index('-output') + 1]
+out = open(output, 'w')
+for path in args[args.index('-output') + 2:]:
+    out.write(open(path).read())
+'''
+    
+    def testDefaultVariants(self):
+        builder = LibBuild('Sample.xcodeproj', outdir=self.outdir)
+        self.assertTrue(builder.build())
+        self.assertEqual(sorted(builder.outputs), 
+                         [os.path.join(self.outdir, 'libBar.a'), os.path.join(self.outdir, 'libFoo.a')])
+        self.assertEqual(open(os.path.join(self.outdir, 'libFoo.a')).read(), 
+                         'libFoo.a iphoneos-armv7\nlibFoo.a iphonesimulator5.0-i386\n')
+        log = os.path.join(self.outdir, 'variants', 'Release-default-default', 'xcodebuild.log')
+        self.assertTrue('building iphoneos-armv7' in open(log).read())
+    
+    def testConcurrency(self):
+        variants = [BuildVariant('iphoneos5.0', arch) for arch in ('armv6', 'armv7')] + \
+                   [BuildVariant(sdk, 'i386') for sdk in ('iphonesimulator4.3', 'iphonesimulator5.0')]
+        builder = LibBuild('Sample.xcodeproj', libs=['libFoo.a'], outdir=self.outdir, variants=variants, jobs=2)
+        self.assertTrue(builder.build())
+        # fake xcodebuild가 기록한 시작, 끝 시간으로 동시에 실행한 수를 센다.
+        self.assertEqual(self.getMaxConcurrency(), 2)
+        self.assertEqual(open(self.events).read().count('start'), 4)
+        self.assertEqual(len(open(os.path.join(self.outdir, 'libFoo.a')).readlines()), 4)
+        self.assertFalse(os.path.exists(os.path.join(self.outdir, 'libBar.a')))
+    
+    def testFailed(self):
+        os.environ['FAKE_FAIL'] = 'iphonesimulator5.0'
+        variants = [BuildVariant(), BuildVariant('iphonesimulator5.0', 'i386')]
+        builder = LibBuild('Sample.xcodeproj', libs=['libFoo.a'], outdir=self.outdir, variants=variants, jobs=2)
+        self.assertFalse(builder.build())
+        states = dict((job.name, job.state) for job in builder.scheduler.jobs)
+        self.assertEqual(states, {'Release-default-default' : 'succeeded', 
+                                  'Release-iphonesimulator5.0-i386' : 'failed', 
+                                  'lipo libFoo.a' : 'skipped'})
+        self.assertEqual(variants[1].result.returncode, 65)
+        self.assertFalse(os.path.exists(os.path.join(self.outdir, 'libFoo.a')))
+    
+    def testMakeBigLib(self):
+        # outdir에 직접 build한 library. xcodebuild -showsdks를 실행하지 않는다.
+        os.remove(os.path.join(self.tempdir, 'xcodebuild'))
+        for platform in ('iphoneos', 'iphonesimulator'):
+            products = os.path.join(self.outdir, 'Release-' + platform)
+            os.makedirs(products)
+            open(os.path.join(products, 'libFoo.a'), 'w').write('libFoo.a %s\n' % platform)
+        builder = LibBuild('Sample.xcodeproj', outdir=self.outdir)
+        self.assertTrue(builder.makeBigLib())
+        self.assertEqual(builder.getLibs(), [os.path.join(self.outdir, 'libFoo.a')])
+        self.assertEqual(open(os.path.join(self.outdir, 'libFoo.a')).read(), 
+                         'libFoo.a iphoneos\nlibFoo.a iphonesimulator\n')
+    
+    def testPythonLipo(self):
+        # build하면 macho fixture를 복사하는 xcodebuild
+        _writeScript(self.tempdir, 'xcodebuild', '''
+import os, sys, shutil
+args = sys.argv[1:]
+opts = dict(arg.split('=', 1) for arg in args if '=' in arg)
+sdk = args[args.index('-sdk') + 1]
+arch = args[args.index('-arch') + 1]
+products = os.path.join(opts['BUILD_DIR'], 'Release-' + sdk.rstrip('0123456789.'))
+os.makedirs(products)
+shutil.copy(os.path.join(%r, 'libfoo-%%s.a' %% arch), os.path.join(products, 'libfoo.a'))
+''' % os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'macho'))
+        variants = [BuildVariant('iphoneos7.0', 'armv7'), BuildVariant('iphoneos7.0', 'arm64'),
+                    BuildVariant('iphonesimulator7.0', 'i386')]
+        builder = LibBuild('Sample.xcodeproj', outdir=self.outdir, variants=variants, lipo='python')
+        self.assertTrue(builder.build())
+        
+        lipo = Lipo('python')
+        fat = os.path.join(self.outdir, 'libfoo.a')
+        self.assertEqual(lipo.info(fat), 'Architectures in the fat file: %s are: i386 armv7 arm64' % fat)
+        thin = os.path.join(self.tempdir, 'libfoo-i386.a')
+        self.assertTrue(lipo.thin(fat, 'i386', thin))
+        self.assertEqual(lipo.info(thin), 'Non-fat file: %s is architecture: i386' % thin)
+        self.assertFalse(lipo.thin(fat, 'x86_64', thin))
+        
+        self.assertEqual(builder.verify(['_foo', '_barData']), [])
+        self.assertEqual(builder.verify(['_none']), 
+                         [(fat, '%s does not export _none' % arch) for arch in ('i386', 'armv7', 'arm64')])
+        builder.variants.append(BuildVariant('iphoneos7.0', 'armv7s'))
+        self.assertEqual(builder.verify(), [(fat, '3 architectures (i386 armv7 arm64), expected 4'), 
+                                            (fat, 'no architecture armv7s')])
+        
+        # 같은 architecture는 합칠 수 없다.
+        lipo.addLib(thin)
+        lipo.addLib(thin)
+        self.assertFalse(lipo.create(os.path.join(self.tempdir, 'dup.a')))
+    
+    def testScheduler(self):
+        scheduler = BuildScheduler(3)
+        order = []
+        def job(name, result=True):
+            def run():
+                order.append(name)
+                if result == 'raise': raise ValueError(name)
+                return result
+            return run
+        a = scheduler.addJob('a', job('a'))
+        b = scheduler.addJob('b', job('b', 'raise'))
+        c = scheduler.addJob('c', lambda: scheduler.addJob('d', job('d'), [a]), [a])
+        e = scheduler.addJob('e', job('e'), [b])
+        scheduler.addJob('f', job('f'), [e])
+        self.assertFalse(scheduler.run())
+        self.assertEqual([job.state for job in scheduler.jobs], 
+                         ['succeeded', 'failed', 'succeeded', 'skipped', 'skipped', 'succeeded'])
+        self.assertTrue(isinstance(b.error, ValueError))
+        self.assertEqual(sorted(order), ['a', 'b', 'd'])
+    
+    def testPriority(self):
+        scheduler = BuildScheduler(1, keepGoing=False)
+        order = []
+        def job(name, result=True):
+            return lambda: order.append(name) or result
+        scheduler.addJob('low', job('low'))
+        scheduler.addJob('fail', job('fail', False), priority=1)
+        scheduler.addJob('high', job('high'), priority=2)
+        self.assertFalse(scheduler.run())
+        self.assertEqual(order, ['high', 'fail'])
+        self.assertTrue(scheduler.stopped)
+        self.assertEqual([job.state for job in scheduler.jobs], ['skipped', 'failed', 'succeeded'])
+
+
+class LibBuildIncrementalTestCase(_FakeToolchainTestCase):
+    # 바뀐 source만 compile하고 바뀐 object가 있는 library만 다시 만드는 xcodebuild
+    # object 첫줄에 source의 mtime을 쓰고, compile한 file 수를 events에 쓴다.
+    xcodebuild = '''
+import os, sys, time
+args = sys.argv[1:]
+if '-version' in args:
+    print "Xcode 4.2"
+    sys.exit(0)
+opts = {'-sdk' : 'iphoneos', '-arch' : 'armv7', '-configuration' : 'Release'}
+for i, arg in enumerate(args):
+    if arg in opts: opts[arg] = args[i + 1]
+    if '=' in arg: opts.update([arg.split('=', 1)])
+name = '%(-sdk)s-%(-arch)s' % opts
+platform = opts['-sdk'].rstrip('0123456789.')
+products = os.path.join(opts['BUILD_DIR'], '%s-%s' % (opts['-configuration'], platform))
+objdir = os.path.join(opts['OBJROOT'], name)
+for path in (products, objdir):
+    if not os.path.isdir(path): os.makedirs(path)
+sources = os.environ['FAKE_SOURCES']
+compiled = []
+for source in sorted(os.listdir(sources)):
+    path = os.path.join(sources, source)
+    obj = os.path.join(objdir, source + '.o')
+    stamp = repr(os.path.getmtime(path))
+    if os.path.exists(obj) and open(obj).readline().strip() == stamp: continue
+    time.sleep(float(os.environ.get('FAKE_COMPILE', '0.01')))
+    open(obj, 'w').write('%s\\n%s %s\\n' % (stamp, name, open(path).read()))
+    compiled.append(source)
+for lib in ('foo', 'bar'):
+    out = os.path.join(products, 'lib%s.a' % lib.capitalize())
+    objs = sorted(o for o in os.listdir(objdir) if o.startswith(lib))
+    if os.path.exists(out) and not [s for s in compiled if s.startswith(lib)]: continue
+    open(out, 'w').write(''.join(open(os.path.join(objdir, o)).readlines()[1] for o in objs))
+open(os.environ['FAKE_EVENTS'], 'a').write('compile %s %d\\n' % (name, len(compiled)))
+'''
+    lipo = '''
+import os, sys
+args = sys.argv[1:]
+output = args[args.index('-output') + 1]
+out = open(output, 'w')
+for path in args[args.index('-output') + 2:]:
+    out.write(open(path).read())
+open(os.environ['FAKE_EVENTS'], 'a').write('lipo %s\\n' % os.path.basename(output))
+'''
+    
+    def setUp(self):
+        _FakeToolchainTestCase.setUp(self)
+        self.sources = os.path.join(self.tempdir, 'sources')
+        os.mkdir(self.sources)
+        for i in range(10):
+            self.writeSource('%s%d.m' % (i % 2 and 'bar' or 'foo', i), 'source %d' % i)
+        os.environ['FAKE_SOURCES'] = self.sources
+    
+    def writeSource(self, name, text, mtime=None):
+        path = os.path.join(self.sources, name)
+        open(path, 'w').write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+    
+    def createLibBuild(self, incremental=True):
+        variants = [BuildVariant('iphoneos5.0', 'armv7'), BuildVariant('iphonesimulator5.0', 'i386')]
+        libbuild = LibBuild('Foo.xcodeproj', 'Release', 'Foo', outdir=self.outdir, variants=variants, 
+                            lipo='lipo', incremental=incremental)
+        libbuild.xcodebuild.toolchainCache = None
+        return libbuild
+    
+    def build(self, libbuild):
+        '''return : ( variant별 compile한 file 수, lipo한 library )'''
+        if os.path.exists(self.events): 
+            os.remove(self.events)
+        self.assertTrue(libbuild.build())
+        events = [line.split() for line in open(self.events)]
+        return (sorted(int(e[2]) for e in events if e[0] == 'compile'), 
+                sorted(e[1] for e in events if e[0] == 'lipo'))
+    
+    def testIncremental(self):
+        libbuild = self.createLibBuild()
+        self.assertEqual(self.build(libbuild), ([10, 10], ['libBar.a', 'libFoo.a']))
+        fooLib = os.path.join(self.outdir, 'libFoo.a')
+        barLib = os.path.join(self.outdir, 'libBar.a')
+        
+        # 바뀐 것이 없으면 compile, lipo하지 않는다.
+        self.assertEqual(self.build(libbuild), ([0, 0], []))
+        self.assertEqual(sorted(libbuild.upToDate), [barLib, fooLib])
+        self.assertEqual([v.cleaned for v in libbuild.variants], [False, False])
+        
+        # 바뀐 source만 compile하고 그 library만 lipo한다.
+        self.writeSource('foo2.m', 'changed', time.time() + 10)
+        self.assertEqual(self.build(self.createLibBuild()), ([1, 1], ['libFoo.a']))
+        self.assertTrue('iphonesimulator5.0-i386 changed' in open(fooLib).read())
+        
+        # flag가 바뀌면 variant를 clean한다. library 내용이 같으면 lipo하지 않는다.
+        libbuild.xcodebuild.flags['GCC_OPTIMIZATION_LEVEL'] = 's'
+        self.assertEqual(self.build(libbuild), ([10, 10], []))
+        self.assertEqual([v.cleaned for v in libbuild.variants], [True, True])
+        
+        # incremental이 아니면 모두 지우고 다시 build한다.
+        self.assertEqual(self.build(self.createLibBuild(False)), ([10, 10], ['libBar.a', 'libFoo.a']))
+
+
+class ProcessFutureTestCase(_FakeToolchainTestCase):
+    xcodebuild = LibBuildTestCase.xcodebuild
+    lipo = LibBuildTestCase.lipo
+    
+    def createXcodebuild(self, sdk, limit):
+        xcodebuild = Xcodebuild('Foo.xcodeproj', 'Release', 'Foo')
+        xcodebuild.echo = False
+        xcodebuild.toolchainCache = None
+        xcodebuild.concurrencyLimit = limit
+        xcodebuild.setSdk(sdk)
+        xcodebuild.setBuildDir(os.path.join(self.tempdir, sdk))
+        return xcodebuild
+    
+    def testBuildAsync(self):
+        os.environ['FAKE_SLEEP'] = '0.5'
+        limit = ConcurrencyLimit(2)
+        lines = []
+        done = []
+        futures = []
+        for i in range(4):
+            xcodebuild = self.createXcodebuild('iphoneos%d' % i, limit)
+            xcodebuild.addListener(lambda stream, line: lines.append(line))
+            future = xcodebuild.buildAsync()
+            future.addDoneCallback(done.append)
+            futures.append(future)
+        # 시작하자마자 반환한다.
+        self.assertFalse(futures[-1].done())
+        self.assertFalse(futures[-1].wait(0.1))
+        
+        results = [future.result() for future in futures]
+        self.assertTrue(all(result.succeeded() for result in results))
+        self.assertEqual(sorted(lines), ['building iphoneos%d-armv7\n' % i for i in range(4)])
+        self.assertEqual(sorted(done), sorted(futures))
+        self.assertEqual(limit.running, 0)
+        
+        # 같은 ConcurrencyLimit을 쓰는 build는 2개씩 실행한다.
+        self.assertEqual(self.getMaxConcurrency(), 2)
+    
+    def testCancel(self):
+        os.environ['FAKE_SLEEP'] = '30'
+        limit = ConcurrencyLimit(1)
+        started = threading.Event()
+        running = self.createXcodebuild('iphoneos', limit)
+        running.addListener(lambda stream, line: started.set())
+        first = running.buildAsync()
+        second = self.createXcodebuild('iphonesimulator', limit).buildAsync()
+        started.wait(10)
+        
+        self.assertTrue(second.cancel())
+        self.assertTrue(second.wait(10))
+        self.assertEqual(second.result(), None)
+        
+        self.assertTrue(first.cancel())
+        result = first.result()
+        self.assertTrue(result.cancelled)
+        self.assertEqual(result.returncode, -signal.SIGTERM)
+        self.assertTrue(result.getElapsed() < 10)
+        self.assertFalse(first.cancel())
+        self.assertEqual(open(self.events).read().count('start'), 1)
+    
+    def testLipoAsync(self):
+        output = os.path.join(self.tempdir, 'libFoo.a')
+        for backend in ('lipo', 'python'):
+            lipo = Lipo(backend)
+            lipo.concurrencyLimit = ConcurrencyLimit(1)
+            for name in ('libFoo.a-1', 'libFoo.a-2'):
+                path = os.path.join(self.tempdir, name)
+                open(path, 'w').write(name)
+                lipo.addLib(path)
+            future = lipo.createAsync(output)
+            # 반환한 뒤에 addLib()해도 영향이 없다.
+            lipo.addLib(output)
+            if backend == 'lipo':
+                self.assertEqual(future.result(), True)
+                self.assertEqual(open(output).read(), 'libFoo.a-1libFoo.a-2')
+            else:
+                # Mach-O가 아니다.
+                self.assertEqual(future.result(), False)
+
+
+class ToolchainCacheTestCase(unittest.TestCase):
+    # 실행할 때마다 FAKE_CALLS에 인자를 쓰는 xcodebuild
+    xcodebuild = '''
+import os, sys
+args = sys.argv[1:]
+open(os.environ['FAKE_CALLS'], 'a').write(' '.join(args) + '\\n')
+if '-showsdks' in args:
+    print "Mac OS X SDKs:"
+    print "\\tMac OS X 10.7                  \\t-sdk macosx10.7"
+    print ""
+    print "iOS SDKs:"
+    print "\\tiOS 5.0                        \\t-sdk iphoneos5.0"
+    print ""
+    print "iOS Simulator SDKs:"
+    print "\\tSimulator - iOS 5.0            \\t-sdk iphonesimulator5.0"
+elif '-list' in args:
+    print 'Information about project "Foo":'
+    print '    Targets:'
+    print '        Foo'
+    print '        FooTests'
+    print ''
+    print '    Build Configurations:'
+    print '        Debug'
+    print '        Release'
+    print ''
+    print '    If no build configuration is specified and -scheme is not passed then "Release" is used.'
+    print ''
+    print '    Schemes:'
+    print '        Foo'
+else:
+    sys.exit(1)
+'''
+    
+    def setUp(self):
+        import tempfile
+        self.tempdir = tempfile.mkdtemp()
+        self.xcodebuildPath = _writeScript(self.tempdir, 'xcodebuild', self.xcodebuild)
+        self.calls = os.path.join(self.tempdir, 'calls')
+        self.environ = dict(os.environ)
+        os.environ['PATH'] = self.tempdir + os.pathsep + os.environ['PATH']
+        os.environ['FAKE_CALLS'] = self.calls
+        os.environ.pop('DEVELOPER_DIR', None)
+        self.cachePath = os.path.join(self.tempdir, 'cache', 'toolchain.json')
+        self.projfile = os.path.join(self.tempdir, 'Foo.xcodeproj')
+        os.mkdir(self.projfile)
+        open(os.path.join(self.projfile, 'project.pbxproj'), 'w').write('{}')
+    
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.tempdir)
+    
+    def getCalls(self):
+        if not os.path.exists(self.calls): return []
+        return open(self.calls).read().splitlines()
+    
+    def createXcodebuild(self, projfile=None):
+        xcodebuild = Xcodebuild(projfile)
+        xcodebuild.toolchainCache = ToolchainCache(self.cachePath)
+        return xcodebuild
+    
+    def touch(self, path):
+        # mtime 해상도가 1초인 file system에서도 바뀌도록 한다.
+        mtime = os.path.getmtime(path) + 10
+        os.utime(path, (mtime, mtime))
+    
+    def testSdks(self):
+        xcodebuild = self.createXcodebuild()
+        self.assertEqual(xcodebuild.getSdks(), ['macosx10.7', 'iphoneos5.0', 'iphonesimulator5.0'])
+        self.assertEqual(xcodebuild.getSdkInfo()[1], 
+                         {'sdk' : 'iphoneos5.0', 'name' : 'iOS 5.0', 'group' : 'iOS SDKs'})
+        self.assertEqual(len(self.getCalls()), 1)
+        
+        # 다른 process에서도 저장한 결과를 쓴다.
+        self.assertEqual(len(self.createXcodebuild().getSdkInfo()), 3)
+        self.assertEqual(len(self.getCalls()), 1)
+        
+        # xcodebuild가 바뀌면 다시 실행한다.
+        self.touch(self.xcodebuildPath)
+        self.assertEqual(len(self.createXcodebuild().getSdkInfo()), 3)
+        self.assertEqual(len(self.getCalls()), 2)
+        
+        os.environ['DEVELOPER_DIR'] = self.tempdir
+        self.createXcodebuild().getSdks()
+        self.assertEqual(len(self.getCalls()), 3)
+        
+        # 실패한 결과는 저장하지 않는다.
+        self.createXcodebuild().getVersion()
+        self.createXcodebuild().getVersion()
+        self.assertEqual(len(self.getCalls()), 5)
+    
+    def testList(self):
+        info = self.createXcodebuild(self.projfile).getList()
+        self.assertEqual(info, {'project' : 'Foo', 'targets' : ['Foo', 'FooTests'], 
+                                'configurations' : ['Debug', 'Release'], 'schemes' : ['Foo'], 
+                                'defaultConfiguration' : 'Release'})
+        self.assertEqual(self.createXcodebuild(self.projfile).getList(), info)
+        self.assertEqual(len(self.getCalls()), 1)
+        
+        # project나 scheme이 바뀌면 다시 실행한다.
+        self.touch(os.path.join(self.projfile, 'project.pbxproj'))
+        self.createXcodebuild(self.projfile).getList()
+        self.assertEqual(len(self.getCalls()), 2)
+        
+        schemes = os.path.join(self.projfile, 'xcshareddata', 'xcschemes')
+        os.makedirs(schemes)
+        open(os.path.join(schemes, 'Foo.xcscheme'), 'w').write('<Scheme/>')
+        self.createXcodebuild(self.projfile).getList()
+        self.createXcodebuild(self.projfile).getList()
+        self.assertEqual(len(self.getCalls()), 3)
+        
+        # toolchainCache가 None이면 매번 실행한다.
+        xcodebuild = self.createXcodebuild(self.projfile)
+        xcodebuild.toolchainCache = None
+        xcodebuild.getList()
+        self.assertEqual(len(self.getCalls()), 4)
+    
+    def testNotFound(self):
+        # xcodebuild를 실행할 수 없으면 None
+        os.environ['PATH'] = os.path.join(self.tempdir, 'cache')
+        xcodebuild = Xcodebuild(self.projfile)
+        xcodebuild.toolchainCache = None
+        self.assertEqual(xcodebuild.getSdkInfo(), [])
+        self.assertEqual(xcodebuild.getSdks(), [])
+        self.assertEqual(xcodebuild.getVersion(), None)
+        self.assertEqual(xcodebuild.getList(), None)
+
+
 class XcodeTest(unittest.TestCase):
     def setUp(self):
         path = '/Users/jinni/local/src/core-plot/framework/CorePlot-CocoaTouch.xcodeproj'
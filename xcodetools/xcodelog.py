@@ -0,0 +1,451 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+
+'''\
+xcodebuild의 출력을 분석하는 library
+
+xcodebuild 출력을 한줄씩 받아서 CompileC, Ld, Libtool, CopyPNGFile 같은 build
+단계와 warning, error를 만든다. 단계의 시작은 그 단계의 첫 줄을 받은 시간,
+끝은 다음 단계( 혹은 target, ** BUILD ... ** )의 첫 줄을 받은 시간이다.
+xcodebuild는 단계마다 출력을 모아서 쓰므로 병렬로 build하면 시간은 대략적이다.
+
+usage:
+
+log = XcodebuildLog()
+xcodebuild.addListener(log)             # Xcodebuild, ProcessRunner listener
+xcodebuild.build()
+log.finish()
+log.report()                            # 오래 걸린 단계
+log.saveJSON('build.json')
+
+XcodebuildLog.parseFile('build.log').report()
+
+XcodebuildLogRecorder로 줄마다 받은 시간을 붙여서 저장한 log는 parseFile()로
+읽을때 그 시간을 사용한다.
+
+'''
+
+__all__ = ['BuildStep', 'BuildDiagnostic', 'XcodebuildLog', 'XcodebuildLogRecorder']
+
+import os
+import re
+import sys
+import time
+import json
+import unittest
+
+
+# xcodebuild가 출력하는 build 단계
+_stepKinds = ('CompileC', 'Ld', 'Libtool', 'CopyPNGFile', 'CpResource', 'CpHeader',
+              'CopyStringsFile', 'CopyPlistFile', 'CompileXIB', 'CompileStoryboard',
+              'ProcessInfoPlistFile', 'ProcessPCH', 'ProcessPCH++', 'PhaseScriptExecution',
+              'GenerateDSYMFile', 'CreateUniversalBinary', 'Touch', 'CodeSign', 'Strip',
+              'SetOwnerAndGroup', 'SetMode', 'Preprocess', 'Ditto', 'Analyze',
+              'ProcessProductPackaging', 'Validate')
+
+# 이름으로 쓸 argument ( 없으면 첫번째, 보통 만드는 file )
+_stepNameArgs = {'CompileC' : 1, 'CopyPNGFile' : 1, 'CpResource' : 1, 'CpHeader' : 1,
+                 'CopyStringsFile' : 1, 'CopyPlistFile' : 1, 'ProcessInfoPlistFile' : 1,
+                 'ProcessPCH' : 1, 'ProcessPCH++' : 1, 'Analyze' : 0}
+
+_archs = ('i386', 'x86_64', 'armv6', 'armv7', 'armv7s', 'arm64')
+
+_stepre = re.compile(r'^(%s) (.*)$' % '|'.join(re.escape(k) for k in _stepKinds))
+_targetre = re.compile(r'^=== (?:BUILD|CLEAN|ANALYZE) (?:\w+ )*TARGET (.+) OF PROJECT (.+) WITH (?:THE DEFAULT )?CONFIGURATION (?:\'?)(.+?)(?:\'?) ===$')
+_diagnosticre = re.compile(r'^(?:(?P<file>[^\s:][^:]*?):(?:(?P<line>\d+):)?(?:(?P<column>\d+):)? )?'
+                           r'(?P<severity>warning|error|fatal error): (?P<message>.*)$')
+_resultre = re.compile(r'^\*\* (\w+) (SUCCEEDED|FAILED) \*\*$')
+_timestampre = re.compile(r'^(\d+\.\d+)\t')
+
+
+def _splitArgs(text):
+    'xcodebuild가 출력한 argument들. 경로 안의 공백은 "\\ "로 escape되어 있다.'
+    return [a.replace('\\ ', ' ') for a in re.findall(r'(?:\\ |\S)+', text)]
+
+
+class BuildStep(object):
+    '''xcodebuild의 build 단계 ( CompileC, Ld, ... )
+
+    kind     : 단계 종류
+    args     : 단계 이름 다음의 argument들
+    name     : CompileC는 source file, 나머지는 보통 만드는 file
+    arch     : argument 중 architecture ( 없으면 None )
+    target, project, configuration : 단계가 속한 target
+    start, end, duration : 시간 (초). 시간을 모르면 None
+    command  : 실행한 command ( cd, setenv 다음 줄 )
+    diagnostics : 단계에서 나온 BuildDiagnostic들
+    '''
+    def __init__(self, kind, args, start=None, target=None):
+        self.kind = kind
+        self.args = _splitArgs(args)
+        index = _stepNameArgs.get(kind, 0)
+        self.name = len(self.args) > index and self.args[index] or args
+        self.arch = None
+        for arg in self.args:
+            if arg in _archs:
+                self.arch = arg
+                break
+        self.target, self.project, self.configuration = target or (None, None, None)
+        self.start = start
+        self.end = None
+        self.command = None
+        self.diagnostics = []
+        self.failed = False
+
+    def getDuration(self):
+        if self.start is None or self.end is None: return None
+        return self.end - self.start
+
+    duration = property(getDuration)
+
+    def getWarnings(self):
+        return [d for d in self.diagnostics if d.kind == 'warning']
+
+    def getErrors(self):
+        return [d for d in self.diagnostics if d.kind == 'error']
+
+    def toJSON(self):
+        return {'kind' : self.kind, 'name' : self.name, 'arch' : self.arch, 'args' : self.args,
+                'target' : self.target, 'project' : self.project, 'configuration' : self.configuration,
+                'start' : self.start, 'end' : self.end, 'duration' : self.duration,
+                'command' : self.command, 'failed' : self.failed,
+                'warnings' : len(self.getWarnings()), 'errors' : len(self.getErrors())}
+
+    def __repr__(self):
+        return '<BuildStep %s %s %s>' % (self.kind, self.name, self.arch or '')
+
+
+class BuildDiagnostic(object):
+    '''compiler, linker 등의 warning, error
+
+    kind     : 'warning' 혹은 'error' ( fatal error 포함 )
+    file, line, column : 위치. 없으면 None ( ld: warning: ... 는 file이 'ld' )
+    step     : 나온 BuildStep ( 단계 밖에서 나왔으면 None )
+    '''
+    def __init__(self, severity, message, file=None, line=None, column=None, step=None, timestamp=None):
+        self.kind = severity == 'warning' and 'warning' or 'error'
+        self.severity = severity
+        self.message = message
+        self.file = file
+        self.line = line and int(line) or None
+        self.column = column and int(column) or None
+        self.step = step
+        self.timestamp = timestamp
+
+    def toJSON(self):
+        return {'kind' : self.kind, 'severity' : self.severity, 'message' : self.message,
+                'file' : self.file, 'line' : self.line, 'column' : self.column,
+                'step' : self.step and self.step.name, 'timestamp' : self.timestamp}
+
+    def __str__(self):
+        location = ':'.join(str(x) for x in (self.file, self.line, self.column) if x)
+        return '%s%s: %s' % (location and location + ': ' or '', self.severity, self.message)
+
+
+class XcodebuildLog(object):
+    '''xcodebuild 출력을 한줄씩 받아서 분석한다.
+
+    단계가 끝나면 BuildStep을, warning이나 error가 나오면 BuildDiagnostic을
+    listener( listener(event) )에 넘긴다. event.kind로 구분한다.
+    ProcessRunner, Xcodebuild의 listener로 쓸 수 있다. ( log(stream, line) )
+    '''
+    def __init__(self):
+        self.steps = []
+        self.diagnostics = []
+        self.listeners = []
+        # 'BUILD SUCCEEDED' 이면 True, FAILED이면 False, 끝나지 않았으면 None
+        self.succeeded = None
+        self.failedCommands = []
+        self.start = None
+        self.end = None
+        self._step = None
+        self._target = None
+        self._inFailures = False
+
+    def addListener(self, listener):
+        self.listeners.append(listener)
+
+    def removeListener(self, listener):
+        self.listeners.remove(listener)
+
+    def __call__(self, stream, line):
+        self.feed(line)
+
+    def feed(self, line, timestamp=None):
+        '''한 줄을 분석한다. |timestamp|가 없으면 지금 시간'''
+        if timestamp is None: timestamp = time.time()
+        if self.start is None: self.start = timestamp
+        self.end = timestamp
+        line = line.rstrip('\r\n')
+
+        if self._inFailures:
+            if line.startswith('\t'):
+                self.failedCommands.append(line.strip())
+                self._markFailed(line.strip())
+                return
+            self._inFailures = False
+
+        match = _stepre.match(line)
+        if match:
+            self._finishStep(timestamp)
+            self._step = BuildStep(match.group(1), match.group(2), timestamp, self._target)
+            return
+
+        match = _diagnosticre.match(line)
+        if match:
+            diagnostic = BuildDiagnostic(match.group('severity'), match.group('message'),
+                                         match.group('file'), match.group('line'),
+                                         match.group('column'), self._step, timestamp)
+            self.diagnostics.append(diagnostic)
+            if self._step: self._step.diagnostics.append(diagnostic)
+            self._notify(diagnostic)
+            return
+
+        if line.startswith('=== '):
+            self._finishStep(timestamp)
+            match = _targetre.match(line)
+            self._target = match and match.groups() or None
+        elif line.startswith('** '):
+            self._finishStep(timestamp)
+            match = _resultre.match(line)
+            if match: self.succeeded = match.group(2) == 'SUCCEEDED'
+        elif line == 'The following build commands failed:':
+            self._finishStep(timestamp)
+            self._inFailures = True
+        elif self._step and self._step.command is None and line.startswith('    '):
+            command = line.strip()
+            if not command.startswith('cd ') and not command.startswith('setenv '):
+                self._step.command = command
+
+    def feedLines(self, lines):
+        '''여러 줄을 분석한다. XcodebuildLogRecorder가 붙인 시간이 있으면 사용한다.'''
+        for line in lines:
+            match = _timestampre.match(line)
+            if match:
+                self.feed(line[match.end():], float(match.group(1)))
+            else:
+                self.feed(line, None)
+
+    def finish(self, timestamp=None):
+        '''마지막 단계를 끝낸다. |timestamp|가 없으면 마지막 줄의 시간'''
+        self._finishStep(timestamp is None and self.end or timestamp)
+        return self
+
+    @staticmethod
+    def parseFile(path):
+        '''xcodebuild log file을 분석한다.
+
+        시간이 없는 log( xcodebuild > build.log )는 시간 정보가 없다.
+        '''
+        log = XcodebuildLog()
+        f = open(path)
+        try:
+            timed = _timestampre.match(f.readline() or '')
+            f.seek(0)
+            if timed:
+                log.feedLines(f)
+            else:
+                for line in f:
+                    log.feed(line, 0.0)
+                log.start = log.end = None
+                for step in log.steps:
+                    step.start = step.end = None
+        finally:
+            f.close()
+        return log.finish()
+
+    def _finishStep(self, timestamp):
+        step = self._step
+        if step:
+            step.end = timestamp
+            self.steps.append(step)
+            self._step = None
+            self._notify(step)
+
+    def _markFailed(self, command):
+        match = _stepre.match(command)
+        if not match: return
+        args = _splitArgs(match.group(2))
+        for step in self.steps:
+            if step.kind == match.group(1) and step.args == args:
+                step.failed = True
+
+    def _notify(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    #
+    # 결과
+    #
+
+    def getElapsed(self):
+        if self.start is None or self.end is None: return None
+        return self.end - self.start
+
+    def getWarnings(self):
+        return [d for d in self.diagnostics if d.kind == 'warning']
+
+    def getErrors(self):
+        return [d for d in self.diagnostics if d.kind == 'error']
+
+    def getSlowestSteps(self, count=10, kind=None):
+        '오래 걸린 |count|개의 단계. |kind|가 주어지면 그 종류만'
+        steps = [s for s in self.steps if s.duration is not None and (kind is None or s.kind == kind)]
+        return sorted(steps, key=lambda s: -s.duration)[:count]
+
+    def getSummary(self):
+        '''단계 종류별 ( 개수, 시간 합 ). 시간 합이 큰 순서
+
+        return : [ (kind, count, total seconds), ... ]
+        '''
+        summary = {}
+        for step in self.steps:
+            count, total = summary.get(step.kind, (0, 0.0))
+            summary[step.kind] = (count + 1, total + (step.duration or 0.0))
+        return sorted(((k, c, t) for k, (c, t) in summary.iteritems()), key=lambda x: (-x[2], x[0]))
+
+    def toJSON(self):
+        return {'succeeded' : self.succeeded,
+                'start' : self.start, 'end' : self.end, 'elapsed' : self.getElapsed(),
+                'steps' : [s.toJSON() for s in self.steps],
+                'diagnostics' : [d.toJSON() for d in self.diagnostics],
+                'summary' : [{'kind' : k, 'count' : c, 'total' : t} for k, c, t in self.getSummary()],
+                'failedCommands' : self.failedCommands}
+
+    def saveJSON(self, path):
+        f = open(path, 'w')
+        try:
+            json.dump(self.toJSON(), f, indent=2, sort_keys=True)
+        finally:
+            f.close()
+
+    def report(self, out=None, count=10):
+        '오래 걸린 단계와 종류별 시간을 출력한다.'
+        out = out or sys.stdout
+        if self.getElapsed() is not None:
+            out.write('slowest steps:\n')
+            for step in self.getSlowestSteps(count):
+                out.write('%10.3fs  %-20s %s%s\n' % (step.duration, step.kind, step.name,
+                                                    step.arch and ' (%s)' % step.arch or ''))
+            out.write('\n')
+        out.write('%-22s %6s %11s\n' % ('step', 'count', 'time'))
+        for kind, number, total in self.getSummary():
+            timed = self.getElapsed() is not None and '%10.3fs' % total or '%11s' % '-'
+            out.write('%-22s %6d %s\n' % (kind, number, timed))
+        out.write('\n')
+        for diagnostic in self.getErrors():
+            out.write('%s\n' % diagnostic)
+        result = {True : 'BUILD SUCCEEDED', False : 'BUILD FAILED', None : 'not finished'}[self.succeeded]
+        elapsed = self.getElapsed()
+        out.write('%d steps, %d warnings, %d errors, %s%s\n' % (len(self.steps), len(self.getWarnings()),
+                                                               len(self.getErrors()), result,
+                                                               elapsed is not None and ' in %.3fs' % elapsed or ''))
+
+
+class XcodebuildLogRecorder(object):
+    '''xcodebuild 출력을 받은 시간과 함께 file에 저장하는 listener.
+
+    줄마다 "<time.time()>\\t<줄>" 형식으로 쓴다. XcodebuildLog.parseFile()로 읽는다.
+    '''
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def __call__(self, stream, line):
+        self.file.write('%.3f\t%s' % (time.time(), line if line.endswith('\n') else line + '\n'))
+
+    def close(self):
+        self.file.close()
+
+
+_testdata = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+
+class XcodebuildLogTestCase(unittest.TestCase):
+    def testSucceeded(self):
+        log = XcodebuildLog.parseFile(os.path.join(_testdata, 'build-succeeded.log'))
+        self.assertTrue(log.succeeded)
+        self.assertEqual([s.kind for s in log.steps],
+                         ['ProcessPCH', 'CompileC', 'CompileC', 'CompileC', 'CompileC',
+                          'Libtool', 'Ld', 'CopyPNGFile', 'CopyPNGFile', 'ProcessInfoPlistFile'])
+        self.assertEqual(log.getElapsed(), 21.75)
+
+        slowest = log.getSlowestSteps(3)
+        self.assertEqual([(s.kind, s.name, s.duration) for s in slowest],
+                         [('CompileC', 'Sample/Big View.m', 12.25), ('Ld',
+                           '/Users/jinni/src/Sample/build/Release-iphoneos/Sample.app/Sample', 3.0),
+                          ('ProcessPCH', 'Sample/Sample-Prefix.pch', 2.5)])
+        self.assertEqual(slowest[0].arch, 'armv7')
+        self.assertEqual((slowest[0].target, slowest[0].project, slowest[0].configuration),
+                         ('Sample', 'Sample', 'Release'))
+        self.assertTrue(slowest[0].command.startswith('/Developer/Platforms/iPhoneOS.platform/Developer/usr/bin/clang '))
+        self.assertEqual([s.arch for s in log.getSlowestSteps(kind='CompileC') if s.name == 'Sample/main.m'],
+                         ['armv7', 'armv7s'])
+        self.assertEqual(log.getSummary()[0], ('CompileC', 4, 15.0))
+        self.assertEqual(log.getSummary()[-1], ('ProcessInfoPlistFile', 1, 0.125))
+
+        warnings = log.getWarnings()
+        self.assertEqual(len(warnings), 3)
+        self.assertEqual((warnings[0].file, warnings[0].line, warnings[0].column),
+                         ('/Users/jinni/src/Sample/Sample/AppDelegate.m', 27, 9))
+        self.assertEqual(warnings[0].step.name, 'Sample/AppDelegate.m')
+        self.assertEqual(warnings[2].file, 'ld')
+        self.assertEqual(warnings[2].step.kind, 'Ld')
+        self.assertEqual(log.getErrors(), [])
+
+        data = json.loads(json.dumps(log.toJSON()))
+        self.assertEqual(len(data['steps']), 10)
+        self.assertEqual(data['steps'][2]['warnings'], 2)
+
+        import StringIO
+        out = StringIO.StringIO()
+        log.report(out, 1)
+        self.assertTrue('    12.250s  CompileC             Sample/Big View.m (armv7)\n' in out.getvalue())
+        self.assertTrue(out.getvalue().endswith('10 steps, 3 warnings, 0 errors, BUILD SUCCEEDED in 21.750s\n'))
+
+    def testFailed(self):
+        log = XcodebuildLog.parseFile(os.path.join(_testdata, 'build-failed.log'))
+        self.assertEqual(log.succeeded, False)
+        self.assertEqual(log.getElapsed(), None)
+        self.assertEqual([(s.name, s.failed, s.duration) for s in log.steps],
+                         [('Core/Parser.m', True, None), ('Core/Lexer.m', False, None)])
+
+        errors = log.getErrors()
+        self.assertEqual([(e.file, e.line, e.step and e.step.name) for e in errors],
+                         [('/Users/jinni/src/Sample/Core/Parser.m', 52, 'Core/Parser.m'), (None, None, None)])
+        self.assertEqual(str(errors[1]), "error: There is no SDK with the name or path 'iphonesimulator4.3'")
+        self.assertEqual(len(log.failedCommands), 1)
+        self.assertEqual(len(log.getWarnings()), 1)
+
+    def testStreaming(self):
+        # listener로 받으면서 바로 event를 만든다.
+        log = XcodebuildLog()
+        events = []
+        log.addListener(events.append)
+        lines = open(os.path.join(_testdata, 'build-failed.log')).readlines()
+        for i, line in enumerate(lines[:19]):
+            log.feed(line, 100.0 + i)
+        self.assertEqual([e.kind for e in events], ['warning', 'error'])
+        log('stdout', lines[19])
+        self.assertEqual([e.kind for e in events], ['warning', 'error', 'CompileC'])
+        self.assertEqual(events[2].start, 106.0)
+        self.assertEqual(events[2].getErrors(), [events[1]])
+        self.assertEqual(log.succeeded, None)
+
+    def testRecorder(self):
+        import tempfile
+        path = tempfile.mktemp('.log')
+        try:
+            recorder = XcodebuildLogRecorder(path)
+            lines = open(os.path.join(_testdata, 'build-failed.log')).readlines()
+            for line in lines:
+                recorder('stdout', line)
+            recorder.close()
+            log = XcodebuildLog.parseFile(path)
+            self.assertEqual(len(log.steps), 2)
+            self.assertTrue(log.getElapsed() >= 0)
+            self.assertTrue(log.steps[0].duration >= 0)
+        finally:
+            os.remove(path)
+
+
+if __name__=='__main__':
+    unittest.main()